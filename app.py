@@ -17,8 +17,8 @@ print("🚀 STEP 0: app.py iniciado com sucesso", flush=True)
 
 try:
     from modules.validator import startup_validation
-    from modules.pluggy import create_connect_token
-    from modules.db import save_client
+    from modules.pluggy import get_connect_token, prefetch_connect_token
+    from modules.client_writer import save_client_deferred
     print("✅ STEP 1: Imports concluídos", flush=True)
 except Exception as e:
     print("🔥 ERRO nos imports:", e, flush=True)
@@ -71,7 +71,8 @@ try:
         email = st.session_state.form_data.get("email", "")
 
         if name and email:
-            save_client(name, email, item_id)
+            # Com DB_WRITE_BEHIND=1 apenas enfileira; o worker grava em lote
+            save_client_deferred(name, email, item_id)
             print("✅ STEP 7: save_client() executado", flush=True)
             st.success("Conta conectada com sucesso!")
         else:
@@ -91,10 +92,19 @@ try:
     st.caption("Conecte sua conta bancária via Pluggy com segurança.")
     print("✅ STEP 8: UI renderizada", flush=True)
 
-    with st.form("client_form"):
-        name = st.text_input("Nome completo", st.session_state.form_data["name"])
-        email = st.text_input("E-mail", st.session_state.form_data["email"])
-        submit = st.form_submit_button("Conectar conta")
+    # Fora de um st.form: o on_change do e-mail dispara assim que o campo
+    # perde o foco, e o token do usuário é emitido enquanto ele ainda clica.
+    # Só para um e-mail completo; o token do valor anterior é descartado
+    def prefetch_email_token():
+        st.session_state.prefetched_email = prefetch_connect_token(
+            st.session_state.client_email.strip(), replaces=st.session_state.get("prefetched_email"),
+        )
+
+    name = st.text_input("Nome completo", st.session_state.form_data["name"], key="client_name")
+    email = st.text_input(
+        "E-mail", st.session_state.form_data["email"], key="client_email", on_change=prefetch_email_token,
+    )
+    submit = st.button("Conectar conta")
 
     print("✅ STEP 9: Form renderizado", flush=True)
 except Exception as e:
@@ -111,8 +121,9 @@ try:
             print("⚠️ Campos vazios no submit", flush=True)
             st.warning("Preencha todos os campos.")
         else:
+            email = email.strip()
             st.session_state.form_data = {"name": name, "email": email}
-            token = create_connect_token(client_user_id=email)
+            token = get_connect_token(client_user_id=email)
             st.session_state.connect_token = token
             print("✅ STEP 11: Token Pluggy gerado", flush=True)
 except Exception as e:
@@ -127,38 +138,98 @@ try:
         st.info("Abrindo o Pluggy Connect…")
         print("✅ STEP 12: Exibindo widget Pluggy", flush=True)
 
-                # Open Pluggy Connect in a new window to avoid iframe sandboxing issues
-                token = st.session_state.connect_token
-                # Render a client-side button that opens the Pluggy widget in a new window
-                # (opening from a user click avoids popup blockers)
-                safe_html = """
-                <div>
-                    <p>Clique no botão para abrir o widget do Pluggy (abre em nova janela).</p>
-                    <button id="open-pluggy" style="padding:10px 16px;font-size:16px;">Abrir Pluggy</button>
-                    <div id="pluggy-fallback" style="margin-top:8px;color:#b00;display:none;">Se o popup não abrir, permita popups no navegador e tente novamente.</div>
-                </div>
-                <script>
-                    document.getElementById('open-pluggy').addEventListener('click', function(){
-                        const win = window.open('', 'pluggy_connect', 'width=520,height=720');
-                        if (!win) {
-                            document.getElementById('pluggy-fallback').style.display = 'block';
-                            return;
-                        }
-                        // Write the HTML into the popup and load Pluggy script
-                        const html = `<!doctype html><html><head><meta charset='utf-8'><title>Pluggy Connect</title></head><body><div id='root'></div><script src='https://cdn.pluggy.ai/pluggy-connect/v2.9.2/pluggy-connect.js'></script><script>document.addEventListener('DOMContentLoaded', function(){ try { const connect = new PluggyConnect({token: "__CONNECT_TOKEN__"}); if (typeof connect.open === 'function') { connect.open(); } else { document.body.innerHTML = '<p>Plugin carregado mas "connect.open" não disponível.</p>'; } } catch(e){ document.body.innerHTML = '<p>Erro ao abrir Pluggy: '+String(e)+'</p>'; } });</script></body></html>`;
-                        win.document.open();
-                        win.document.write(html);
-                        win.document.close();
-                    });
-                </script>
-                """
-                # inject the token safely to avoid interfering with JS braces
-                safe_html = safe_html.replace('__CONNECT_TOKEN__', token)
-                st.components.v1.html(safe_html, height=130)
+        # Open Pluggy Connect in a new window to avoid iframe sandboxing issues
+        token = st.session_state.connect_token
+        # Render a client-side button that opens the Pluggy widget in a new window
+        # (opening from a user click avoids popup blockers)
+        safe_html = """
+        <div>
+            <p>Clique no botão para abrir o widget do Pluggy (abre em nova janela).</p>
+            <button id="open-pluggy" style="padding:10px 16px;font-size:16px;">Abrir Pluggy</button>
+            <div id="pluggy-fallback" style="margin-top:8px;color:#b00;display:none;">Se o popup não abrir, permita popups no navegador e tente novamente.</div>
+        </div>
+        <script>
+            document.getElementById('open-pluggy').addEventListener('click', function(){
+                const win = window.open('', 'pluggy_connect', 'width=520,height=720');
+                if (!win) {
+                    document.getElementById('pluggy-fallback').style.display = 'block';
+                    return;
+                }
+                // Write the HTML into the popup and load Pluggy script
+                const html = `<!doctype html><html><head><meta charset='utf-8'><title>Pluggy Connect</title></head><body><div id='root'></div><script src='https://cdn.pluggy.ai/pluggy-connect/v2.9.2/pluggy-connect.js'></script><script>document.addEventListener('DOMContentLoaded', function(){ try { const connect = new PluggyConnect({token: "__CONNECT_TOKEN__"}); if (typeof connect.open === 'function') { connect.open(); } else { document.body.innerHTML = '<p>Plugin carregado mas "connect.open" não disponível.</p>'; } } catch(e){ document.body.innerHTML = '<p>Erro ao abrir Pluggy: '+String(e)+'</p>'; } });</script></body></html>`;
+                win.document.open();
+                win.document.write(html);
+                win.document.close();
+            });
+        </script>
+        """
+        # inject the token safely to avoid interfering with JS braces
+        safe_html = safe_html.replace('__CONNECT_TOKEN__', token)
+        st.components.v1.html(safe_html, height=130)
         print("✅ STEP 13: Widget Pluggy renderizado", flush=True)
 except Exception as e:
     print("🔥 ERRO no widget Pluggy:", e, flush=True)
     traceback.print_exc()
 
+# =========================================================
+# EXPORTAÇÃO (suporte): /?export=1, protegida por EXPORT_ACCESS_KEY
+# =========================================================
+try:
+    export_key = os.getenv("EXPORT_ACCESS_KEY")
+    if export_key and st.query_params.get("export"):
+        import hmac
+        from modules.export import EXPORT_FORMATS, export_to_temp_file
+
+        def discard_export():
+            # Chamado no clique do download: o arquivo já foi entregue ao navegador
+            export_file = st.session_state.pop("export_file", None)
+            if export_file:
+                export_file.discard()
+
+        st.divider()
+        st.subheader("Exportar dados de um cliente")
+        with st.form("export_form"):
+            access_key = st.text_input("Chave de acesso", type="password")
+            target = st.text_input("item_id ou e-mail do cliente")
+            fmt = st.selectbox("Formato", EXPORT_FORMATS)
+            generate = st.form_submit_button("Gerar arquivo")
+
+        if generate:
+            discard_export()
+            if not hmac.compare_digest(access_key.encode(), export_key.encode()):
+                st.error("Chave de acesso inválida.")
+            elif not target.strip():
+                st.warning("Informe o item_id ou o e-mail.")
+            else:
+                target = target.strip()
+                by_email = "@" in target
+                item_id, email = (None, target) if by_email else (target, None)
+                # O export vai em streaming para um arquivo temporário em disco
+                # (limitado a EXPORT_APP_MAX_BYTES); a sessão guarda só o caminho
+                try:
+                    with st.spinner("Exportando transações..."):
+                        export_file = export_to_temp_file(fmt, item_id=item_id, email=email)
+                except ValueError as export_error:
+                    st.warning(str(export_error))
+                else:
+                    st.session_state.export_file = export_file
+                    print(f"✅ Export {fmt}: {export_file.rows} transações, {export_file.size} bytes", flush=True)
+
+        export_file = st.session_state.get("export_file")
+        if export_file:
+            st.caption(f"{export_file.rows} transações ({export_file.size / (1024 * 1024):.1f} MB)")
+            with export_file.open() as data:
+                st.download_button(
+                    "Baixar arquivo",
+                    data=data,
+                    file_name=export_file.name,
+                    mime="text/csv" if export_file.name.endswith(".csv") else "application/octet-stream",
+                    on_click=discard_export,
+                )
+except Exception as e:
+    print("🔥 ERRO na exportação:", e, flush=True)
+    traceback.print_exc()
+    st.error(f"Erro ao exportar: {e}")
+
 print("✅ STEP FINAL: Script finalizado com sucesso", flush=True)
 sys.stdout.flush()
@@ -0,0 +1,383 @@
+# modules/analytics.py
+"""
+Transaction analytics over synced Pluggy data.
+
+Transactions are streamed out of Postgres with COPY ... TO STDOUT (CSV)
+straight into a columnar pandas frame (categoricals for ids, int64 cents,
+datetime64 dates), and every report is a vectorized NumPy/pandas
+group-by over those columns, with no per-transaction Python code:
+
+- monthly_summary(): income, expense and net per client and month;
+- category_breakdown(): spending per client and category with shares;
+- running_balances(): end-of-day balance per account.
+
+The monthly summary shown on the dashboard comes straight from the
+financefly_monthly_aggregates rollup (load_monthly_aggregates()), which
+save_transactions() keeps current, so it costs one row per account and
+month instead of a scan of the period's transactions.
+
+Amounts follow Pluggy's sign convention: positive is money in, negative
+is money out.
+"""
+
+import io
+import logging
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from psycopg import sql
+
+from modules.db import pooled_conn
+
+logger = logging.getLogger(__name__)
+
+FRAME_COLUMNS = ("client", "item_id", "account_id", "tx_date", "amount_cents", "category", "status", "type")
+
+FRAME_DTYPES = {
+    "client": "category",
+    "item_id": "category",
+    "account_id": "category",
+    "amount_cents": "int64",
+    "category": "category",
+    "status": "int8",
+    "type": "int8",
+}
+
+# Clients without a financefly_clients row (e.g. accounts of a removed
+# client) are reported under their item_id
+TRANSACTIONS_COPY_SQL = """
+COPY (
+    SELECT COALESCE(c.email, a.item_id), a.item_id, t.account_id, t.tx_date, t.amount_cents,
+           cat.pluggy_category_id, t.status, t.type
+    FROM financefly_transactions t
+    JOIN financefly_accounts a ON a.id = t.account_id
+    LEFT JOIN financefly_clients c ON c.item_id = a.item_id
+    LEFT JOIN financefly_categories cat ON cat.id = t.category_id
+    WHERE {}
+) TO STDOUT WITH (FORMAT csv)
+"""
+
+ACCOUNT_BALANCES_SQL = """
+SELECT a.id::text, a.balance_cents
+FROM financefly_accounts a
+WHERE a.balance_cents IS NOT NULL AND {}
+"""
+
+MONTHLY_AGGREGATES_SQL = """
+SELECT COALESCE(c.email, a.item_id), m.month,
+       sum(m.income_cents)::bigint, sum(m.expense_cents)::bigint, sum(m.transactions)::bigint
+FROM financefly_monthly_aggregates m
+JOIN financefly_accounts a ON a.id = m.account_id
+LEFT JOIN financefly_clients c ON c.item_id = a.item_id
+WHERE m.transactions > 0 AND {}
+GROUP BY 1, 2
+ORDER BY 1, 2
+"""
+
+
+def _filters(item_ids, email, date_from=None, date_to=None):
+    if item_ids is None and email is None:
+        raise ValueError("Informe item_ids ou email")
+    conditions, params = [], []
+    if item_ids is not None:
+        conditions.append(sql.SQL("a.item_id = ANY(%s)"))
+        params.append(list(item_ids))
+    if email is not None:
+        conditions.append(sql.SQL("a.item_id IN (SELECT item_id FROM financefly_clients WHERE email = %s)"))
+        params.append(email)
+    # Plain bounds on tx_date so Postgres prunes monthly partitions
+    if date_from is not None:
+        conditions.append(sql.SQL("t.tx_date >= %s"))
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append(sql.SQL("t.tx_date <= %s"))
+        params.append(date_to)
+    return sql.SQL(" AND ").join(conditions), params
+
+
+def empty_frame():
+    """Transaction frame with no rows and the FRAME_COLUMNS dtypes."""
+    frame = pd.DataFrame({column: pd.Series(dtype="object") for column in FRAME_COLUMNS})
+    frame["tx_date"] = pd.Series(dtype="datetime64[ns]")
+    return frame.astype(FRAME_DTYPES)
+
+
+def load_transactions(item_ids=None, email=None, date_from=None, date_to=None, conn=None):
+    """
+    Loads the transactions of some items (or of every item of a client)
+    into a columnar frame.
+
+    Args:
+        item_ids (list, optional): Pluggy item ids
+        email (str, optional): Client e-mail (all of its items)
+        date_from (date, optional): First day included
+        date_to (date, optional): Last day included
+        conn (psycopg.Connection, optional): Connection to use (a pooled one when None)
+
+    Returns:
+        pandas.DataFrame: FRAME_COLUMNS, one row per transaction
+
+    Raises:
+        ValueError: When neither item_ids nor email is given
+    """
+    where, params = _filters(item_ids, email, date_from, date_to)
+    if conn is None:
+        with pooled_conn() as pooled:
+            return load_transactions(item_ids, email, date_from, date_to, pooled)
+    buffer = io.BytesIO()
+    with conn.cursor() as cur:
+        with cur.copy(sql.SQL(TRANSACTIONS_COPY_SQL).format(where), params) as copy:
+            for data in copy:
+                buffer.write(data)
+    if not buffer.tell():
+        return empty_frame()
+    buffer.seek(0)
+    return pd.read_csv(
+        buffer,
+        names=list(FRAME_COLUMNS),
+        dtype=FRAME_DTYPES,
+        parse_dates=["tx_date"],
+        date_format="%Y-%m-%d",
+    )
+
+
+def load_account_balances(item_ids=None, email=None, conn=None):
+    """
+    Current balance of each account, as last synced from Pluggy.
+
+    Returns:
+        pandas.Series: balance_cents indexed by account_id
+
+    Raises:
+        ValueError: When neither item_ids nor email is given
+    """
+    where, params = _filters(item_ids, email)
+    if conn is None:
+        with pooled_conn() as pooled:
+            return load_account_balances(item_ids, email, pooled)
+    rows = conn.execute(sql.SQL(ACCOUNT_BALANCES_SQL).format(where), params).fetchall()
+    return pd.Series(
+        [balance for _, balance in rows],
+        index=pd.Index([account_id for account_id, _ in rows], name="account_id"),
+        dtype="int64",
+        name="balance_cents",
+    )
+
+
+def load_monthly_aggregates(item_ids=None, email=None, date_from=None, conn=None):
+    """
+    Monthly summary read from the maintained aggregates; same frame as
+    monthly_summary() over the same transactions.
+
+    Args:
+        item_ids (list, optional): Pluggy item ids
+        email (str, optional): Client e-mail (all of its items)
+        date_from (date, optional): Months starting on or after this day
+        conn (psycopg.Connection, optional): Connection to use (a pooled one when None)
+
+    Returns:
+        pandas.DataFrame: client, month, income_cents, expense_cents, net_cents and transactions
+
+    Raises:
+        ValueError: When neither item_ids nor email is given
+    """
+    where, params = _filters(item_ids, email)
+    if date_from is not None:
+        where = sql.SQL(" AND ").join([where, sql.SQL("m.month >= date_trunc('month', %s::date)")])
+        params.append(date_from)
+    if conn is None:
+        with pooled_conn() as pooled:
+            return load_monthly_aggregates(item_ids, email, date_from, pooled)
+    rows = conn.execute(sql.SQL(MONTHLY_AGGREGATES_SQL).format(where), params).fetchall()
+    columns = list(zip(*rows)) or [()] * 5
+    income = np.array(columns[2], dtype="int64")
+    expense = np.array(columns[3], dtype="int64")
+    return pd.DataFrame({
+        "client": pd.Categorical(columns[0]),
+        "month": np.array(columns[1], dtype="datetime64[M]").astype("datetime64[s]"),
+        "income_cents": income,
+        "expense_cents": expense,
+        "net_cents": income - expense,
+        "transactions": np.array(columns[4], dtype="int64"),
+    })
+
+
+# =========================================================
+# Reports
+# =========================================================
+# Above this many possible groups, sparse keys are grouped by sorting
+DENSE_GROUP_LIMIT = 1 << 25
+
+
+def _group_sums(codes, sizes, *values):
+    """
+    Sums values per combination of integer codes, ordered by the codes.
+
+    The codes are folded into one integer key and grouped with
+    np.bincount (or np.unique when the key space is too sparse). Sums are
+    accumulated in float64, exact for integer cents below 2**53.
+
+    Returns:
+        tuple: (codes of each present group, rows per group, sums per value)
+    """
+    key = np.zeros(len(codes[0]), dtype="int64")
+    for code, size in zip(codes, sizes):
+        key = key * size + code
+    total = int(np.prod(sizes, dtype="int64"))
+    if total <= DENSE_GROUP_LIMIT:
+        counts = np.bincount(key, minlength=total)
+        present = np.flatnonzero(counts)
+        sums = [np.bincount(key, weights=value, minlength=total)[present] for value in values]
+        counts = counts[present]
+    else:
+        present, inverse = np.unique(key, return_inverse=True)
+        counts = np.bincount(inverse)
+        sums = [np.bincount(inverse, weights=value, minlength=len(present)) for value in values]
+    return np.unravel_index(present, sizes), counts, [np.rint(summed).astype("int64") for summed in sums]
+
+
+def _codes(column):
+    # NaN (code -1) gets its own slot after the categories
+    categories = column.cat.categories
+    codes = column.cat.codes.to_numpy().astype("int64")
+    return np.where(codes < 0, len(categories), codes), len(categories) + 1, categories
+
+
+def _offsets(dates, unit):
+    values = dates.to_numpy().astype(f"datetime64[{unit}]").astype("int64")
+    first = values.min() if len(values) else 0
+    return values - first, int(values.max() - first + 1) if len(values) else 1, first
+
+
+def _from_codes(codes, categories):
+    return pd.Categorical.from_codes(np.where(codes == len(categories), -1, codes), categories)
+
+
+def monthly_summary(frame):
+    """
+    Income, expense and net per client and month, ordered by client and month.
+
+    Returns:
+        pandas.DataFrame: client, month (datetime64, first day), income_cents,
+                          expense_cents, net_cents and transactions
+    """
+    amount = frame["amount_cents"].to_numpy()
+    clients, client_slots, client_names = _codes(frame["client"])
+    months, month_slots, first_month = _offsets(frame["tx_date"], "M")
+    (client, month), counts, (income, expense) = _group_sums(
+        (clients, months), (client_slots, month_slots),
+        np.where(amount > 0, amount, 0), np.where(amount < 0, -amount, 0),
+    )
+    return pd.DataFrame({
+        "client": _from_codes(client, client_names),
+        "month": (first_month + month).astype("datetime64[M]").astype("datetime64[s]"),
+        "income_cents": income,
+        "expense_cents": expense,
+        "net_cents": income - expense,
+        "transactions": counts,
+    })
+
+
+def category_breakdown(frame):
+    """
+    Spending (negative amounts) per client and category, largest first
+    within each client. Uncategorized spending has category NaN.
+
+    Returns:
+        pandas.DataFrame: client, category, expense_cents, transactions and
+                          share (of the client's total spending)
+    """
+    amount = frame["amount_cents"].to_numpy()
+    spent = amount < 0
+    clients, client_slots, client_names = _codes(frame["client"])
+    categories, category_slots, category_names = _codes(frame["category"])
+    (client, category), counts, (expense,) = _group_sums(
+        (clients[spent], categories[spent]), (client_slots, category_slots), -amount[spent]
+    )
+    # Groups come ordered by client: per-client totals by run boundaries
+    starts = np.flatnonzero(np.r_[True, client[1:] != client[:-1]]) if len(client) else np.array([], "int64")
+    totals = np.add.reduceat(expense, starts) if len(starts) else expense
+    share = expense / np.repeat(totals, np.diff(np.r_[starts, len(client)]))
+    order = np.lexsort((-expense, client))
+    return pd.DataFrame({
+        "client": _from_codes(client[order], client_names),
+        "category": _from_codes(category[order], category_names),
+        "expense_cents": expense[order],
+        "transactions": counts[order],
+        "share": share[order],
+    })
+
+
+def running_balances(frame, current_balances=None):
+    """
+    End-of-day balance per account on every day it had transactions,
+    ordered by account and day.
+
+    With current_balances (e.g. load_account_balances()), balances are
+    anchored so the last day matches the account's current balance; the
+    frame must then hold every transaction up to today. Accounts without
+    a current balance start at zero (cumulative net flow).
+
+    Args:
+        frame (pandas.DataFrame): Transaction frame
+        current_balances (pandas.Series|dict, optional): balance_cents by account_id
+
+    Returns:
+        pandas.DataFrame: account_id, tx_date, amount_cents (day's net) and balance_cents
+    """
+    accounts, account_slots, account_names = _codes(frame["account_id"])
+    days, day_slots, first_day = _offsets(frame["tx_date"], "D")
+    (account, day), _, (day_total,) = _group_sums(
+        (accounts, days), (account_slots, day_slots), frame["amount_cents"].to_numpy()
+    )
+    # Cumulative sum restarted at each account: global cumsum minus the
+    # cumsum before the account's first day
+    running = np.cumsum(day_total)
+    new_account = np.r_[True, account[1:] != account[:-1]] if len(account) else np.array([], bool)
+    starts = np.flatnonzero(new_account)
+    group = np.cumsum(new_account) - 1
+    cumulative = running - (running - day_total)[starts][group]
+    balance = cumulative
+    if current_balances is not None and len(account):
+        anchors = (
+            pd.Series(current_balances, dtype="float64")
+            .reindex(account_names.astype(str))
+            .to_numpy()
+        )
+        anchors = np.r_[anchors, np.nan][account]
+        ends = np.r_[starts[1:], len(account)] - 1
+        # Balance at the end of a day = current balance - what came after it
+        after = cumulative[ends][group] - cumulative
+        balance = np.where(np.isnan(anchors), cumulative, anchors - after)
+    return pd.DataFrame({
+        "account_id": _from_codes(account, account_names),
+        "tx_date": (first_day + day).astype("datetime64[D]").astype("datetime64[ns]"),
+        "amount_cents": day_total,
+        "balance_cents": np.asarray(balance).astype("int64"),
+    })
+
+
+def dashboard(item_ids=None, email=None, months=12, today=None):
+    """
+    Every report for a client's last `months` months of transactions.
+
+    Returns:
+        dict: monthly, categories and balances frames, plus transactions (row count)
+
+    Raises:
+        ValueError: When neither item_ids nor email is given
+    """
+    today = today or date.today()
+    first_month = pd.Timestamp(today).to_period("M") - (months - 1)
+    date_from = first_month.to_timestamp().date()
+    with pooled_conn() as conn:
+        frame = load_transactions(item_ids, email, date_from=date_from, conn=conn)
+        balances = load_account_balances(item_ids, email, conn=conn)
+        monthly = load_monthly_aggregates(item_ids, email, date_from=date_from, conn=conn)
+    return {
+        "transactions": len(frame),
+        "monthly": monthly,
+        "categories": category_breakdown(frame),
+        "balances": running_balances(frame, balances),
+    }
@@ -0,0 +1,159 @@
+# modules/circuit_breaker.py
+"""
+Circuit breaker for calls to external services.
+
+CLOSED: calls go through; outcomes are kept in a sliding time window and
+the breaker opens when the failure rate crosses the threshold.
+OPEN: calls are rejected immediately until the cool-down elapses.
+HALF_OPEN: a single probe call is let through; its success closes the
+breaker, its failure opens it again.
+"""
+
+import time
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker with a time-based failure-rate window.
+    """
+
+    def __init__(self, name, failure_rate_threshold=0.5, window_seconds=60.0,
+                 min_calls=5, cooldown_seconds=30.0):
+        """
+        Args:
+            name (str): Name used in logs and metrics
+            failure_rate_threshold (float): Failure ratio (0-1] that opens the breaker
+            window_seconds (float): Sliding window of outcomes considered
+            min_calls (int): Minimum outcomes in the window before it may open
+            cooldown_seconds (float): Time spent OPEN before a probe is allowed
+        """
+        if not 0 < failure_rate_threshold <= 1:
+            raise ValueError("failure_rate_threshold deve estar entre 0 e 1")
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.window_seconds = window_seconds
+        self.min_calls = max(1, int(min_calls))
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._state = CLOSED
+        self._state_since = time.monotonic()
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._outcomes = deque()
+        self._failures = 0
+        self._rejected = 0
+        self._transitions = {}
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def allow_request(self):
+        """
+        Returns True when the call may proceed. In HALF_OPEN only the first
+        caller (the probe) is allowed; it must report record_success(),
+        record_failure() or release().
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._maybe_half_open(now)
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._transition(CLOSED, time.monotonic())
+                return
+            self._record(False)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._transition(OPEN, now)
+                return
+            if self._state == OPEN:
+                return
+            self._record(True)
+            total = len(self._outcomes)
+            if total >= self.min_calls and self._failures / total >= self.failure_rate_threshold:
+                self._transition(OPEN, now)
+
+    def release(self):
+        """Gives back an allowed call that never reached the service."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def _record(self, failed):
+        now = time.monotonic()
+        self._outcomes.append((now, failed))
+        if failed:
+            self._failures += 1
+        cutoff = now - self.window_seconds
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            _, old_failed = self._outcomes.popleft()
+            if old_failed:
+                self._failures -= 1
+
+    def _maybe_half_open(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.cooldown_seconds:
+            self._transition(HALF_OPEN, now)
+
+    def _transition(self, new_state, now):
+        old_state = self._state
+        transition = f"{old_state}->{new_state}"
+        self._transitions[transition] = self._transitions.get(transition, 0) + 1
+        self._state = new_state
+        self._state_since = now
+        self._probe_in_flight = False
+        if new_state == OPEN:
+            self._opened_at = now
+        if new_state == CLOSED:
+            self._outcomes.clear()
+            self._failures = 0
+        log = logger.warning if new_state == OPEN else logger.info
+        log(f"Circuit breaker '{self.name}' {transition}")
+
+    def stats(self):
+        """
+        Returns:
+            dict: state, seconds_in_state, window_calls, window_failures,
+                  rejected and transitions (count per "from->to")
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._maybe_half_open(now)
+            return {
+                "state": self._state,
+                "seconds_in_state": now - self._state_since,
+                "window_calls": len(self._outcomes),
+                "window_failures": self._failures,
+                "rejected": self._rejected,
+                "transitions": dict(self._transitions),
+            }
+
+    def reset(self):
+        """Closes the breaker and clears window and counters."""
+        with self._lock:
+            self._reset_state()
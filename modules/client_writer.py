@@ -0,0 +1,363 @@
+# modules/client_writer.py
+"""
+Write-behind queue for financefly_clients.
+
+With DB_WRITE_BEHIND enabled, save_client_deferred() only enqueues the row
+and returns; a background worker drains the queue in batches through
+save_clients(). Batches that can't be written (Postgres unreachable) and
+rows that don't fit in the queue are appended to a local JSON-lines spill
+file, which is replayed when the process starts (start_client_writer())
+and periodically while running. Inserts are upserts on item_id that only
+fill in a missing name, so replaying a row twice is harmless.
+
+A batch the database rejects for another reason (a bad row) is retried
+row by row; rows that still fail go to a quarantine file next to the
+spill, so one bad row never holds back the others.
+"""
+
+import os
+import json
+import queue
+import atexit
+import threading
+import logging
+
+import psycopg
+
+from modules.db import get_env, save_client, save_clients
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED = get_env("DB_WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+QUEUE_MAXSIZE = int(get_env("DB_WRITE_BEHIND_QUEUE_SIZE", "1000"))
+BATCH_SIZE = int(get_env("DB_WRITE_BEHIND_BATCH_SIZE", "200"))
+# Max seconds a row waits in the queue for its batch to fill
+FLUSH_INTERVAL_SECONDS = float(get_env("DB_WRITE_BEHIND_FLUSH_INTERVAL", "0.5"))
+# Period of spill file replay attempts while the database is down
+REPLAY_INTERVAL_SECONDS = float(get_env("DB_WRITE_BEHIND_REPLAY_INTERVAL", "30"))
+SPILL_PATH = get_env("DB_WRITE_BEHIND_SPILL_PATH", os.path.join(".financefly", "clients_spill.jsonl"))
+
+# Database unreachable (includes pool timeouts): keep the rows for later
+UNAVAILABLE_ERRORS = (psycopg.OperationalError,)
+
+_STOP = object()
+
+
+def unique_by_item_id(rows):
+    """One row per item_id, preferring one with a name (like db.BULK_INSERT_SQL), in first-seen order."""
+    unique = {}
+    for row in rows:
+        current = unique.get(row[2])
+        if current is None or not current[0] or row[0]:
+            unique[row[2]] = row
+    return list(unique.values())
+
+
+class ClientWriteBehind:
+    """
+    Bounded in-process queue of client rows drained by a batching worker,
+    with durable spill to a local file.
+    """
+
+    def __init__(self, spill_path=SPILL_PATH, maxsize=QUEUE_MAXSIZE, batch_size=BATCH_SIZE,
+                 flush_interval_seconds=FLUSH_INTERVAL_SECONDS,
+                 replay_interval_seconds=REPLAY_INTERVAL_SECONDS, writer=save_clients,
+                 quarantine_path=None):
+        """
+        Args:
+            spill_path (str): JSON-lines file for rows not yet written
+            maxsize (int): Queue capacity; overflow goes straight to the spill file
+            batch_size (int): Maximum rows per save_clients() call
+            flush_interval_seconds (float): Max wait for a batch to fill
+            replay_interval_seconds (float): Period of spill replay attempts
+            writer (callable): Bulk writer taking an iterable of (name, email, item_id)
+            quarantine_path (str, optional): JSON-lines file for rows the
+                database keeps rejecting; next to the spill file when None
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size deve ser maior que zero")
+        self.spill_path = spill_path
+        self.quarantine_path = quarantine_path or os.path.splitext(spill_path)[0] + "_quarantine.jsonl"
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.replay_interval_seconds = replay_interval_seconds
+        self._writer = writer
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._spill_lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._worker = None
+        self._stopped = False
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "write_failures": 0,
+            "quarantined": 0,
+        }
+
+    # -----------------------------------------------------
+    # Producer side
+    # -----------------------------------------------------
+    def enqueue(self, name, email, item_id):
+        """
+        Queues a client row without touching the database. When the queue
+        is full the row is spilled to disk instead of blocking the caller.
+        """
+        row = (name, email, item_id)
+        self.start()
+        if self._stopped:
+            self._spill([row])
+            return
+        try:
+            self._queue.put_nowait(row)
+            self._count("enqueued")
+        except queue.Full:
+            logger.warning("Write-behind queue full; spilling row to disk")
+            self._spill([row])
+
+    def start(self):
+        """Starts the worker (idempotent); replays any spill left by a previous run."""
+        with self._state_lock:
+            if self._worker is not None or self._stopped:
+                return
+            self._worker = threading.Thread(target=self._run, name="financefly-client-writer", daemon=True)
+            self._worker.start()
+
+    def flush(self, timeout=None):
+        """
+        Blocks until every queued row was written or spilled, then tries to
+        replay the spill file.
+
+        Returns:
+            bool: True when nothing is left in the queue or the spill file
+        """
+        if self._worker is not None:
+            if timeout is None:
+                self._queue.join()
+            else:
+                self._join(timeout)
+        self.replay_spill()
+        return self._queue.unfinished_tasks == 0 and not self.pending_spill()
+
+    def stop(self, timeout=10):
+        """Flushes the queue and stops the worker (called at shutdown)."""
+        with self._state_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            worker = self._worker
+        if worker is None:
+            return
+        self._queue.put(_STOP)
+        worker.join(timeout)
+
+    def _join(self, timeout):
+        done = threading.Event()
+        threading.Thread(target=lambda: (self._queue.join(), done.set()), daemon=True).start()
+        done.wait(timeout)
+
+    # -----------------------------------------------------
+    # Worker
+    # -----------------------------------------------------
+    def _run(self):
+        self.replay_spill()
+        while True:
+            try:
+                first = self._queue.get(timeout=self.replay_interval_seconds)
+            except queue.Empty:
+                self.replay_spill()
+                continue
+            batch, stop = self._collect(first)
+            if batch:
+                self._write(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+            if stop:
+                self.replay_spill()
+                return
+
+    def _collect(self, first):
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                row = self._queue.get(timeout=self.flush_interval_seconds)
+            except queue.Empty:
+                break
+            if row is _STOP:
+                return batch, True
+            batch.append(row)
+        return batch, False
+
+    def _write(self, batch):
+        written, pending = self._write_rows(batch)
+        if pending:
+            self._count("write_failures")
+            self._spill(pending)
+        if written:
+            self._count("written", written)
+            self._count("batches")
+
+    def _write_rows(self, rows):
+        """
+        Writes rows, isolating the ones the database rejects.
+
+        Returns:
+            tuple: (rows written, rows to keep for later because the
+                    database is unavailable)
+        """
+        rows = unique_by_item_id(rows)
+        try:
+            self._writer(rows)
+            return len(rows), []
+        except UNAVAILABLE_ERRORS as unavailable:
+            logger.warning(f"Write-behind batch of {len(rows)} rows failed, database unavailable: {unavailable}")
+            return 0, rows
+        except Exception as batch_error:
+            logger.warning(f"Write-behind batch of {len(rows)} rows rejected, retrying row by row: {batch_error}")
+        written = 0
+        for position, row in enumerate(rows):
+            try:
+                self._writer([row])
+                written += 1
+            except UNAVAILABLE_ERRORS as unavailable:
+                logger.warning(f"Database unavailable while retrying rows one by one: {unavailable}")
+                return written, rows[position:]
+            except Exception as row_error:
+                logger.error(f"Write-behind row for item {row[2]} rejected, quarantined: {row_error}")
+                self._quarantine(row, row_error)
+        return written, []
+
+    # -----------------------------------------------------
+    # Spill file
+    # -----------------------------------------------------
+    def _spill(self, rows, count=True):
+        with self._spill_lock:
+            directory = os.path.dirname(self.spill_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as spill:
+                for row in rows:
+                    spill.write(json.dumps(list(row)) + "\n")
+                spill.flush()
+                os.fsync(spill.fileno())
+        if count:
+            self._count("spilled", len(rows))
+
+    def _quarantine(self, row, error):
+        with self._spill_lock:
+            directory = os.path.dirname(self.quarantine_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.quarantine_path, "a", encoding="utf-8") as quarantine:
+                quarantine.write(json.dumps({"row": list(row), "error": str(error)}) + "\n")
+                quarantine.flush()
+                os.fsync(quarantine.fileno())
+        self._count("quarantined")
+
+    def pending_spill(self):
+        """True when the spill file holds rows not yet written."""
+        with self._spill_lock:
+            return self._has_rows(self.spill_path) or self._has_rows(self.spill_path + ".replay")
+
+    @staticmethod
+    def _has_rows(path):
+        return os.path.exists(path) and os.path.getsize(path) > 0
+
+    def replay_spill(self):
+        """
+        Writes spilled rows to the database. The spill file is moved aside
+        first so new spills don't race with the replay; rows not written
+        because the database is unavailable are appended back, rows it
+        rejects are quarantined.
+
+        Returns:
+            int: Rows replayed
+        """
+        with self._replay_lock:
+            return self._replay(self.spill_path + ".replay")
+
+    def _replay(self, replay_path):
+        with self._spill_lock:
+            # A .replay file left behind means a previous replay was interrupted
+            if not os.path.exists(replay_path):
+                if not self._has_rows(self.spill_path):
+                    return 0
+                os.replace(self.spill_path, replay_path)
+            with open(replay_path, encoding="utf-8") as spill:
+                lines = [line for line in spill if line.strip()]
+        rows = []
+        for line in lines:
+            try:
+                name, email, item_id = json.loads(line)
+                rows.append((name, email, item_id))
+            except (ValueError, TypeError) as parse_error:
+                self._quarantine([line.rstrip("\n")], parse_error)
+        written, pending = self._write_rows(rows) if rows else (0, [])
+        if pending:
+            logger.info(f"Spill replay postponed for {len(pending)} rows, database still unavailable")
+            self._spill(pending, count=False)
+        with self._spill_lock:
+            os.remove(replay_path)
+        self._count("replayed", written)
+        return written
+
+    # -----------------------------------------------------
+    # Metrics
+    # -----------------------------------------------------
+    def _count(self, key, amount=1):
+        with self._state_lock:
+            self._stats[key] += amount
+
+    def stats(self):
+        """
+        Returns:
+            dict: queue_depth plus enqueued, written, batches, spilled,
+                  replayed, write_failures and quarantined counters
+        """
+        with self._state_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
+
+
+# =========================================================
+# PROCESS-WIDE WRITER
+# =========================================================
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_client_writer():
+    """Returns the process-wide ClientWriteBehind (created lazily, flushed at exit)."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ClientWriteBehind()
+            atexit.register(_writer.stop)
+        return _writer
+
+
+def start_client_writer():
+    """
+    Starts the process-wide writer at process start when DB_WRITE_BEHIND is
+    enabled, so a spill left by a previous process is replayed right away
+    instead of on the first new client.
+    """
+    if WRITE_BEHIND_ENABLED:
+        get_client_writer().start()
+
+
+def save_client_deferred(name, email, item_id):
+    """
+    Saves a client through the write-behind queue when DB_WRITE_BEHIND is
+    enabled, or synchronously with save_client() otherwise.
+    """
+    if WRITE_BEHIND_ENABLED:
+        get_client_writer().enqueue(name, email, item_id)
+        return None
+    return save_client(name, email, item_id)
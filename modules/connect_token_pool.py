@@ -0,0 +1,328 @@
+# modules/connect_token_pool.py
+"""
+Pre-minted Pluggy connect tokens.
+
+Anonymous tokens (no clientUserId) are interchangeable, so a background
+thread keeps a small pool of them between a low and a high watermark and
+hands them out without any network call. Per-user tokens can't be pooled;
+prefetch_connect_token() mints one speculatively as soon as the user's id
+(a well-formed e-mail) is known so it is ready when the form is submitted,
+and drops the one minted for the value it replaces.
+"""
+
+import os
+import re
+import time
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.pluggy_utils import (
+    PluggyClient,
+    create_connect_token,
+    token_expires_in,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Pluggy connect tokens are valid for 30 minutes. Tokens with less than
+# CONNECT_TOKEN_MIN_REMAINING_SECONDS left are discarded so the widget
+# session never starts with an almost expired token.
+CONNECT_TOKEN_TTL_SECONDS = 30 * 60
+CONNECT_TOKEN_MIN_REMAINING_SECONDS = float(os.getenv("PLUGGY_TOKEN_MIN_REMAINING", str(10 * 60)))
+POOL_LOW_WATERMARK = int(os.getenv("PLUGGY_TOKEN_POOL_LOW", "2"))
+POOL_HIGH_WATERMARK = int(os.getenv("PLUGGY_TOKEN_POOL_HIGH", "5"))
+POOL_REFILL_INTERVAL_SECONDS = 30
+# A submit waits for a prefetch still in flight at most until one request's
+# timeout has passed since the prefetch started, then mints its own token
+SPECULATIVE_WAIT_SECONDS = HTTP_CONNECT_TIMEOUT + HTTP_READ_TIMEOUT
+SPECULATIVE_MAX_PENDING = 500
+
+# Only a complete address is worth a speculative mint (not each keystroke)
+EMAIL_PATTERN = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s.]{2,}")
+
+
+class ConnectTokenPool:
+    """
+    Thread-safe pool of anonymous connect tokens plus speculative per-user tokens.
+    """
+
+    def __init__(self, client=None, low_watermark=POOL_LOW_WATERMARK,
+                 high_watermark=POOL_HIGH_WATERMARK,
+                 min_remaining_seconds=CONNECT_TOKEN_MIN_REMAINING_SECONDS,
+                 refill_interval_seconds=POOL_REFILL_INTERVAL_SECONDS):
+        """
+        Args:
+            client (PluggyClient, optional): Client used to mint tokens (from env when None)
+            low_watermark (int): Refill starts when fewer tokens are pooled
+            high_watermark (int): Refill stops at this many tokens
+            min_remaining_seconds (float): Tokens expiring sooner are discarded
+            refill_interval_seconds (float): Period of the expiry sweep
+        """
+        if low_watermark < 0 or high_watermark < max(1, low_watermark):
+            raise ValueError("Watermarks inválidos para o pool de tokens")
+        self._client = client
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.min_remaining_seconds = min_remaining_seconds
+        self.refill_interval_seconds = refill_interval_seconds
+
+        self._lock = threading.Lock()
+        self._tokens = deque()
+        self._speculative = {}
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._refill_thread = None
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="pluggy-token-prefetch")
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "minted": 0,
+            "discarded_expired": 0,
+            "refill_failures": 0,
+            "speculative_minted": 0,
+            "speculative_hits": 0,
+            "speculative_misses": 0,
+            "speculative_discarded": 0,
+        }
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = PluggyClient()
+        return self._client
+
+    # -----------------------------------------------------
+    # Anonymous pool
+    # -----------------------------------------------------
+    def take(self):
+        """
+        Returns a pooled anonymous token, or None when the pool is empty.
+        Starts the background refill on first use.
+        """
+        self.start()
+        with self._lock:
+            self._discard_expired()
+            token = self._tokens.popleft()[0] if self._tokens else None
+            self._stats["hits" if token else "misses"] += 1
+            below_low = len(self._tokens) < self.low_watermark
+        if below_low:
+            self._wakeup.set()
+        return token
+
+    def size(self):
+        with self._lock:
+            self._discard_expired()
+            return len(self._tokens)
+
+    def start(self):
+        """Starts the refill thread (idempotent)."""
+        with self._lock:
+            if self._refill_thread is not None or self._stopped.is_set():
+                return
+            self._refill_thread = threading.Thread(
+                target=self._refill_loop, name="pluggy-token-pool", daemon=True
+            )
+            self._refill_thread.start()
+
+    def stop(self):
+        """Stops the refill thread and pending speculative mints."""
+        self._stopped.set()
+        self._wakeup.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        thread = self._refill_thread
+        if thread is not None:
+            thread.join(timeout=5)
+
+    def _usable(self, expires_at, now=None):
+        return expires_at - (now or time.monotonic()) > self.min_remaining_seconds
+
+    def _discard_expired(self):
+        now = time.monotonic()
+        kept = deque(item for item in self._tokens if self._usable(item[1], now))
+        self._stats["discarded_expired"] += len(self._tokens) - len(kept)
+        self._tokens = kept
+
+    def _mint(self, client_user_id=None):
+        token = self.client.create_connect_token(client_user_id)
+        expires_at = time.monotonic() + token_expires_in(token, CONNECT_TOKEN_TTL_SECONDS)
+        return token, expires_at
+
+    def _refill_loop(self):
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            with self._lock:
+                self._discard_expired()
+                missing = self.high_watermark - len(self._tokens)
+                needs_refill = len(self._tokens) < self.low_watermark
+            if needs_refill:
+                for _ in range(missing):
+                    if self._stopped.is_set():
+                        return
+                    try:
+                        item = self._mint()
+                    except Exception as mint_error:
+                        logger.warning(f"Connect token pool refill failed: {mint_error}")
+                        with self._lock:
+                            self._stats["refill_failures"] += 1
+                        break
+                    with self._lock:
+                        self._tokens.append(item)
+                        self._stats["minted"] += 1
+            self._wakeup.wait(self.refill_interval_seconds)
+
+    # -----------------------------------------------------
+    # Speculative per-user tokens
+    # -----------------------------------------------------
+    def prefetch(self, client_user_id, replaces=None):
+        """
+        Starts minting a token for client_user_id in background, unless one
+        is already pending or ready.
+
+        Args:
+            client_user_id (str): User identifier for the token
+            replaces (str, optional): Previous identifier of the same user
+                (e.g. a corrected e-mail) whose prefetch is discarded
+        """
+        if replaces and replaces != client_user_id:
+            self.discard(replaces)
+        if not client_user_id or self._stopped.is_set():
+            return
+        with self._lock:
+            pending = self._speculative.get(client_user_id)
+            if pending is not None and not self._failed_or_expired(pending[0]):
+                return
+            if len(self._speculative) >= SPECULATIVE_MAX_PENDING:
+                self._drop_done_speculative()
+                if len(self._speculative) >= SPECULATIVE_MAX_PENDING:
+                    return
+            future = self._executor.submit(self._mint, client_user_id)
+            self._speculative[client_user_id] = (future, time.monotonic())
+            self._stats["speculative_minted"] += 1
+
+    def discard(self, client_user_id):
+        """Drops the prefetch for client_user_id, cancelling it if not started yet."""
+        with self._lock:
+            pending = self._speculative.pop(client_user_id, None)
+            if pending is not None:
+                pending[0].cancel()
+                self._stats["speculative_discarded"] += 1
+
+    def take_for_user(self, client_user_id, wait_seconds=SPECULATIVE_WAIT_SECONDS):
+        """
+        Returns the prefetched token for client_user_id, or None when there
+        is none or it failed/expired. Each prefetched token is handed out once.
+
+        A mint still in flight is waited for until wait_seconds have passed
+        since it started, so a stuck prefetch delays the caller's own mint
+        by at most one request's timeout.
+        """
+        with self._lock:
+            pending = self._speculative.pop(client_user_id, None)
+        token = None
+        if pending is not None:
+            future, started = pending
+            try:
+                token, expires_at = future.result(timeout=max(0.0, started + wait_seconds - time.monotonic()))
+                if not self._usable(expires_at):
+                    token = None
+            except Exception as prefetch_error:
+                logger.info(f"Speculative connect token not usable: {prefetch_error!r}")
+                token = None
+        with self._lock:
+            self._stats["speculative_hits" if token else "speculative_misses"] += 1
+        return token
+
+    def _failed_or_expired(self, future):
+        if not future.done():
+            return False
+        if future.cancelled() or future.exception() is not None:
+            return True
+        return not self._usable(future.result()[1])
+
+    def _drop_done_speculative(self):
+        for user_id, (future, _) in list(self._speculative.items()):
+            if self._failed_or_expired(future):
+                del self._speculative[user_id]
+
+    def stats(self):
+        """
+        Returns:
+            dict: pool size, hits/misses, minted, discarded_expired,
+                  refill_failures and speculative counters
+        """
+        with self._lock:
+            self._discard_expired()
+            stats = dict(self._stats)
+            stats["size"] = len(self._tokens)
+            stats["speculative_pending"] = len(self._speculative)
+            return stats
+
+
+# =========================================================
+# PROCESS-WIDE POOL
+# =========================================================
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_connect_token_pool():
+    """Returns the process-wide ConnectTokenPool (created lazily)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectTokenPool()
+        return _pool
+
+
+def is_valid_email(value):
+    """True when value is a syntactically complete e-mail address."""
+    return bool(value) and EMAIL_PATTERN.fullmatch(value) is not None
+
+
+def prefetch_connect_token(email, replaces=None):
+    """
+    Speculatively mints a connect token for a user's e-mail in background
+    and discards the one prefetched for the e-mail it replaces. Nothing is
+    minted for an incomplete address. Errors are swallowed;
+    get_connect_token() falls back to a normal mint.
+
+    Args:
+        email (str): E-mail typed by the user (the token's clientUserId)
+        replaces (str, optional): E-mail previously prefetched for the same user
+
+    Returns:
+        str: email when it is a valid address (pass it as replaces on the
+             next change), otherwise None
+    """
+    if not is_valid_email(email):
+        email = None
+    try:
+        get_connect_token_pool().prefetch(email, replaces=replaces)
+    except Exception as prefetch_error:
+        logger.warning(f"Could not prefetch connect token: {prefetch_error}")
+    return email
+
+
+def get_connect_token(client_user_id=None):
+    """
+    Returns a connect token, from the pool when possible.
+
+    Anonymous requests take a pre-minted token; per-user requests take the
+    token prefetched for that user. Otherwise a token is minted now.
+
+    Args:
+        client_user_id (str, optional): User identifier for the token
+
+    Returns:
+        str: Access token for Pluggy Connect widget
+
+    Raises:
+        ValueError: User-friendly error messages for various failure scenarios
+    """
+    pool = get_connect_token_pool()
+    token = pool.take_for_user(client_user_id) if client_user_id else pool.take()
+    return token or create_connect_token(client_user_id)
@@ -1,7 +1,12 @@
 # db.py
 import os
+import json
+import atexit
+import threading
+import weakref
 import psycopg
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 
 # =========================================================
 # Helper para carregar variáveis (Streamlit Cloud + Local)
@@ -31,6 +36,27 @@ DB_CONFIG = {
     "sslmode": get_env("DB_SSLMODE", "require"),
 }
 
+# Força timeout e SSL (Railway exige)
+CONNECT_KWARGS = {**DB_CONFIG, "connect_timeout": 10, "target_session_attrs": "read-write"}
+
+
+# =========================================================
+# Pool de conexões (um por processo, criado sob demanda)
+# =========================================================
+POOL_CONFIG = {
+    "min_size": int(get_env("DB_POOL_MIN_SIZE", "1")),
+    "max_size": int(get_env("DB_POOL_MAX_SIZE", "10")),
+    # Conexões ociosas acima de min_size são fechadas após max_idle segundos
+    "max_idle": float(get_env("DB_POOL_MAX_IDLE", "300")),
+    # Conexões são recicladas após max_lifetime segundos
+    "max_lifetime": float(get_env("DB_POOL_MAX_LIFETIME", "1800")),
+    # Tempo máximo de espera por uma conexão livre
+    "timeout": float(get_env("DB_POOL_TIMEOUT", "10")),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
 
 # =========================================================
 # Criação da tabela
@@ -45,34 +71,373 @@ CREATE TABLE IF NOT EXISTS financefly_clients (
 );
 """
 
+# =========================================================
+# SQL compartilhado (db.py e db_async.py)
+# =========================================================
+INSERT_CLIENT_SQL = """
+INSERT INTO financefly_clients (name, email, item_id)
+VALUES (%s, %s, %s)
+ON CONFLICT (item_id) DO UPDATE SET name = EXCLUDED.name
+    WHERE financefly_clients.name = '' AND EXCLUDED.name <> ''
+RETURNING id;
+"""
+
+SELECT_CLIENT_BY_ITEM_ID_SQL = """
+SELECT id, name, email, item_id, created_at
+FROM financefly_clients
+WHERE item_id = %s;
+"""
+
+SELECT_CLIENTS_BY_EMAIL_SQL = """
+SELECT id, name, email, item_id, created_at
+FROM financefly_clients
+WHERE email = %s
+ORDER BY created_at;
+"""
+
+SELECT_CLIENTS_SQL = """
+SELECT id, name, email, item_id, created_at
+FROM financefly_clients
+ORDER BY created_at DESC;
+"""
+
+CLIENT_EXISTS_SQL = """
+SELECT EXISTS (SELECT 1 FROM financefly_clients WHERE item_id = %s);
+"""
+
+
+# =========================================================
+# Prepared statements
+# =========================================================
+# Consultas quentes, preparadas no servidor uma vez por conexão do pool
+# (prepare=True do psycopg) e reaproveitadas nas execuções seguintes.
+PREPARED_STATEMENTS = {
+    "insert_client": INSERT_CLIENT_SQL,
+    "client_by_item_id": SELECT_CLIENT_BY_ITEM_ID_SQL,
+    "clients_by_email": SELECT_CLIENTS_BY_EMAIL_SQL,
+    "client_exists": CLIENT_EXISTS_SQL,
+}
+
+_prepared_on = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+_prepared_counts = {}
+
+
+def _count_prepared(conn, name):
+    """Registra uma execução; a primeira em cada conexão conta como prepare."""
+    if name not in PREPARED_STATEMENTS:
+        raise KeyError(f"Prepared statement desconhecido: {name}")
+    with _prepared_lock:
+        prepared = _prepared_on.setdefault(conn, set())
+        counts = _prepared_counts.setdefault(name, {"prepares": 0, "executes": 0})
+        if name not in prepared:
+            prepared.add(name)
+            counts["prepares"] += 1
+        counts["executes"] += 1
+    return PREPARED_STATEMENTS[name]
+
+
+def execute_prepared(cur, name, params):
+    """Executa o statement registrado `name` como prepared statement."""
+    sql = _count_prepared(cur.connection, name)
+    return cur.execute(sql, params, prepare=True)
+
+
+def prepared_statement_stats():
+    """
+    Contadores por statement: prepares (uma vez por conexão) e executes.
+    Com reaproveitamento, executes cresce muito mais rápido que prepares.
+    """
+    with _prepared_lock:
+        return {name: dict(counts) for name, counts in _prepared_counts.items()}
+
+
+def reset_prepared_statement_stats():
+    with _prepared_lock:
+        _prepared_counts.clear()
+
 
 def get_conn():
-    # Força timeout e SSL (Railway exige)
-    return psycopg.connect(**DB_CONFIG, connect_timeout=10, target_session_attrs="read-write")
+    """Conexão avulsa (fora do pool). Prefira pooled_conn()."""
+    return psycopg.connect(**CONNECT_KWARGS)
+
+
+def get_pool():
+    """
+    Retorna o pool de conexões do processo, criando-o na primeira chamada.
+    Cada conexão é verificada (health check) ao ser retirada do pool.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    kwargs=CONNECT_KWARGS,
+                    check=ConnectionPool.check_connection,
+                    name="financefly",
+                    open=True,
+                    **POOL_CONFIG,
+                )
+                atexit.register(close_pool)
+    return _pool
+
+
+def pooled_conn():
+    """
+    Context manager que empresta uma conexão do pool.
+    Faz commit ao sair sem erro e rollback em caso de exceção.
+    """
+    return get_pool().connection()
+
+
+def close_pool():
+    """Fecha o pool (chamado automaticamente no shutdown do processo)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def pool_stats():
+    """
+    Métricas do pool: tamanho, conexões livres, utilização e tempo de espera.
+    Retorna {} se o pool ainda não foi criado.
+    """
+    return _pool_metrics(_pool)
+
+
+def _pool_metrics(pool):
+    if pool is None:
+        return {}
+    stats = pool.get_stats()
+    size = stats.get("pool_size", 0)
+    available = stats.get("pool_available", 0)
+    requests_num = stats.get("requests_num", 0)
+    stats["in_use"] = size - available
+    stats["utilization"] = (size - available) / pool.max_size if pool.max_size else 0.0
+    stats["avg_wait_ms"] = stats.get("requests_wait_ms", 0) / requests_num if requests_num else 0.0
+    return stats
 
 
 def init_db():
-    try:
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(DDL)
-        conn.commit()
-        cur.close()
-        conn.close()
-        print("✅ init_db executado com sucesso")
-    except Exception as e:
-        print("🔥 ERRO init_db:", e)
+    """
+    Aplica o schema pelas migrações versionadas; atalho para
+    migrations.ensure_schema(), o único caminho de criação do schema.
+
+    Returns:
+        dict: Resultado de ensure_schema() (ok, version, applied, error)
+    """
+    # Import local: modules.migrations importa este módulo
+    from modules.migrations import ensure_schema
+    return ensure_schema()
 
 
 def save_client(name, email, item_id):
-    sql = """
-    INSERT INTO financefly_clients (name, email, item_id)
-    VALUES (%s, %s, %s)
-    ON CONFLICT (item_id) DO NOTHING
-    RETURNING id;
-    """
-    with get_conn() as conn, conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(sql, (name, email, item_id))
+    with pooled_conn() as conn, conn.cursor(row_factory=dict_row) as cur:
+        execute_prepared(cur, "insert_client", (name, email, item_id))
         row = cur.fetchone()
         conn.commit()
         return row["id"] if row else None
+
+
+def get_client_by_item_id(item_id):
+    """Retorna o cliente (dict) com esse item_id, ou None."""
+    with pooled_conn() as conn, conn.cursor(row_factory=dict_row) as cur:
+        execute_prepared(cur, "client_by_item_id", (item_id,))
+        return cur.fetchone()
+
+
+def client_exists(item_id):
+    """True se já existe cliente com esse item_id."""
+    with pooled_conn() as conn, conn.cursor() as cur:
+        execute_prepared(cur, "client_exists", (item_id,))
+        return cur.fetchone()[0]
+
+
+def get_clients_by_email(email):
+    """Retorna todos os clientes (dicts) com esse e-mail, do mais antigo ao mais novo."""
+    with pooled_conn() as conn, conn.cursor(row_factory=dict_row) as cur:
+        execute_prepared(cur, "clients_by_email", (email,))
+        return cur.fetchall()
+
+
+def get_all_clients():
+    """Retorna todos os clientes (dicts), do mais recente ao mais antigo."""
+    with pooled_conn() as conn, conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(SELECT_CLIENTS_SQL)
+        return cur.fetchall()
+
+
+# =========================================================
+# Ingestão em lote
+# =========================================================
+STAGING_DDL = """
+CREATE TEMP TABLE financefly_clients_staging (
+    name TEXT,
+    email TEXT,
+    item_id TEXT
+) ON COMMIT DROP;
+"""
+
+# Um item_id repetido no lote vira uma linha só (de preferência a que tem
+# nome): o ON CONFLICT DO UPDATE não pode tocar a mesma linha duas vezes
+BULK_INSERT_SQL = """
+INSERT INTO financefly_clients (name, email, item_id)
+SELECT DISTINCT ON (item_id) name, email, item_id FROM financefly_clients_staging
+ORDER BY item_id, (COALESCE(name, '') <> '') DESC
+ON CONFLICT (item_id) DO UPDATE SET name = EXCLUDED.name
+    WHERE financefly_clients.name = '' AND EXCLUDED.name <> ''
+RETURNING item_id;
+"""
+
+
+def _client_row(row):
+    if isinstance(row, dict):
+        return row["name"], row["email"], row["item_id"]
+    name, email, item_id = row
+    return name, email, item_id
+
+
+def save_clients(rows):
+    """
+    Insere muitos clientes em uma única transação.
+
+    As linhas são enviadas via COPY para uma tabela temporária (sem
+    materializar o iterável em memória) e depois gravadas com um único
+    INSERT ... ON CONFLICT (item_id): um item já cadastrado só é alterado
+    para preencher o nome quando estava vazio. item_ids repetidos no lote
+    contam uma vez.
+
+    Args:
+        rows (iterable): Tuplas (name, email, item_id) ou dicts com essas chaves
+
+    Returns:
+        list: item_ids inseridos ou cujo nome foi preenchido (os demais já
+              existentes são ignorados)
+    """
+    with pooled_conn() as conn, conn.cursor() as cur:
+        cur.execute(STAGING_DDL)
+        with cur.copy("COPY financefly_clients_staging (name, email, item_id) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(_client_row(row))
+        cur.execute(BULK_INSERT_SQL)
+        return [item_id for (item_id,) in cur.fetchall()]
+
+
+# =========================================================
+# Eventos de webhook da Pluggy
+# =========================================================
+WEBHOOK_EVENTS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS financefly_webhook_events (
+        event_id TEXT PRIMARY KEY,
+        event TEXT NOT NULL,
+        item_id TEXT,
+        payload JSONB NOT NULL,
+        received_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS financefly_webhook_events_item_idx
+        ON financefly_webhook_events (item_id, received_at);
+    """,
+]
+
+WEBHOOK_STAGING_DDL = """
+CREATE TEMP TABLE financefly_webhook_staging (
+    event_id TEXT,
+    event TEXT,
+    item_id TEXT,
+    client_user_id TEXT,
+    payload JSONB
+) ON COMMIT DROP;
+"""
+
+WEBHOOK_INSERT_SQL = """
+INSERT INTO financefly_webhook_events (event_id, event, item_id, payload)
+SELECT DISTINCT ON (event_id) event_id, event, item_id, payload
+FROM financefly_webhook_staging
+ON CONFLICT (event_id) DO NOTHING
+RETURNING event_id;
+"""
+
+# item/created chega mesmo se o usuário fechar a aba antes do redirect;
+# o nome fica vazio até o redirect (ou nunca, se a aba foi fechada)
+WEBHOOK_CLIENTS_SQL = """
+INSERT INTO financefly_clients (name, email, item_id)
+SELECT DISTINCT ON (item_id) '', client_user_id, item_id
+FROM financefly_webhook_staging
+WHERE event = 'item/created' AND item_id IS NOT NULL AND client_user_id IS NOT NULL
+ON CONFLICT (item_id) DO NOTHING;
+"""
+
+
+def save_webhook_events(events):
+    """
+    Grava um lote de eventos de webhook em uma única transação.
+
+    Eventos já gravados (mesmo event_id) são ignorados, então reenviar um
+    lote é seguro. Eventos item/created também registram o cliente
+    (clientUserId é o e-mail usado no connect token).
+
+    Args:
+        events (iterable): Dicts com event_id, event, item_id,
+            client_user_id e payload (dict)
+
+    Returns:
+        list: event_ids efetivamente inseridos
+    """
+    with pooled_conn() as conn, conn.cursor() as cur:
+        cur.execute(WEBHOOK_STAGING_DDL)
+        with cur.copy(
+            "COPY financefly_webhook_staging (event_id, event, item_id, client_user_id, payload) FROM STDIN"
+        ) as copy:
+            for event in events:
+                copy.write_row((
+                    event["event_id"],
+                    event["event"],
+                    event.get("item_id"),
+                    event.get("client_user_id"),
+                    json.dumps(event["payload"]),
+                ))
+        cur.execute(WEBHOOK_INSERT_SQL)
+        inserted = [event_id for (event_id,) in cur.fetchall()]
+        cur.execute(WEBHOOK_CLIENTS_SQL)
+        return inserted
+
+
+# =========================================================
+# Pipeline mode (várias instruções em uma ida e volta)
+# =========================================================
+def execute_pipeline(operations):
+    """
+    Executa uma sequência de instruções em uma única ida e volta usando o
+    pipeline mode do psycopg.
+
+    As instruções são enviadas juntas e sincronizadas uma única vez no fim;
+    o Postgres as executa como uma só transação implícita, então uma falha
+    em qualquer instrução desfaz todas.
+
+    Args:
+        operations (iterable): Pares (sql, params)
+
+    Returns:
+        list: Para cada instrução, as linhas retornadas (dicts) ou None
+              quando ela não retorna linhas
+    """
+    with pooled_conn() as conn:
+        cursors = []
+        # Sem autocommit o psycopg sincroniza o BEGIN e o COMMIT à parte
+        conn.autocommit = True
+        try:
+            with conn.pipeline():
+                for sql, params in operations:
+                    cur = conn.cursor(row_factory=dict_row)
+                    cursors.append(cur)
+                    cur.execute(sql, params)
+            return [cur.fetchall() if cur.description else None for cur in cursors]
+        finally:
+            for cur in cursors:
+                cur.close()
+            conn.autocommit = False
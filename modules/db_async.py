@@ -0,0 +1,141 @@
+# db_async.py
+"""
+Versão assíncrona (asyncio) de modules/db.py.
+
+Usa a API assíncrona do psycopg com um AsyncConnectionPool, de modo que um
+único event loop mantenha centenas de operações no banco em andamento sem
+uma thread por conexão. SQL e configuração vêm de modules/db.py; o schema
+é o das migrações (modules/migrations.py).
+
+O pool fica preso ao event loop em que foi criado; chame
+close_async_pool() antes de encerrar o loop.
+"""
+
+import asyncio
+
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from modules.db import (
+    CONNECT_KWARGS,
+    POOL_CONFIG,
+    STAGING_DDL,
+    BULK_INSERT_SQL,
+    _client_row,
+    _pool_metrics,
+    _count_prepared,
+)
+from modules.migrations import ensure_schema
+
+_pool = None
+
+
+# =========================================================
+# Pool assíncrono
+# =========================================================
+async def get_async_pool():
+    """
+    Retorna o pool assíncrono do processo, criando-o na primeira chamada.
+    Conexões são verificadas (health check) ao sair do pool.
+    """
+    global _pool
+    if _pool is None:
+        _pool = AsyncConnectionPool(
+            kwargs=CONNECT_KWARGS,
+            check=AsyncConnectionPool.check_connection,
+            name="financefly-async",
+            open=False,
+            **POOL_CONFIG,
+        )
+    # open() é idempotente; garante o pool aberto mesmo com chamadas concorrentes
+    await _pool.open()
+    return _pool
+
+
+async def close_async_pool():
+    """Fecha o pool assíncrono."""
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.close()
+
+
+def async_pool_stats():
+    """Métricas do pool assíncrono (mesmo formato de db.pool_stats())."""
+    return _pool_metrics(_pool)
+
+
+async def execute_prepared(cur, name, params):
+    """Executa o statement registrado `name` (db.PREPARED_STATEMENTS) como prepared statement."""
+    sql = _count_prepared(cur.connection, name)
+    return await cur.execute(sql, params, prepare=True)
+
+
+# =========================================================
+# Operações
+# =========================================================
+async def init_db():
+    """
+    Versão assíncrona de db.init_db(): roda migrations.ensure_schema() em
+    uma thread, sem bloquear o event loop.
+
+    Returns:
+        dict: Resultado de ensure_schema() (ok, version, applied, error)
+    """
+    return await asyncio.to_thread(ensure_schema)
+
+
+async def save_client(name, email, item_id):
+    pool = await get_async_pool()
+    async with pool.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+        await execute_prepared(cur, "insert_client", (name, email, item_id))
+        row = await cur.fetchone()
+        return row["id"] if row else None
+
+
+async def save_clients(rows):
+    """
+    Versão assíncrona de db.save_clients (COPY + INSERT único).
+
+    Args:
+        rows (iterable | async iterable): Tuplas (name, email, item_id) ou dicts
+
+    Returns:
+        list: item_ids inseridos ou cujo nome foi preenchido
+    """
+    pool = await get_async_pool()
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await cur.execute(STAGING_DDL)
+        async with cur.copy("COPY financefly_clients_staging (name, email, item_id) FROM STDIN") as copy:
+            if hasattr(rows, "__aiter__"):
+                async for row in rows:
+                    await copy.write_row(_client_row(row))
+            else:
+                for row in rows:
+                    await copy.write_row(_client_row(row))
+        await cur.execute(BULK_INSERT_SQL)
+        return [item_id for (item_id,) in await cur.fetchall()]
+
+
+async def get_client_by_item_id(item_id):
+    """Retorna o cliente (dict) com esse item_id, ou None."""
+    pool = await get_async_pool()
+    async with pool.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+        await execute_prepared(cur, "client_by_item_id", (item_id,))
+        return await cur.fetchone()
+
+
+async def client_exists(item_id):
+    """True se já existe cliente com esse item_id."""
+    pool = await get_async_pool()
+    async with pool.connection() as conn, conn.cursor() as cur:
+        await execute_prepared(cur, "client_exists", (item_id,))
+        return (await cur.fetchone())[0]
+
+
+async def get_clients_by_email(email):
+    """Retorna todos os clientes (dicts) com esse e-mail, do mais antigo ao mais novo."""
+    pool = await get_async_pool()
+    async with pool.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+        await execute_prepared(cur, "clients_by_email", (email,))
+        return await cur.fetchall()
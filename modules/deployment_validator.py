@@ -96,7 +96,7 @@ class DeploymentValidator:
         self.log_validation("=== DATABASE CONNECTIVITY VALIDATION ===", component="DB")
         
         try:
-            from modules.db import DB_CONFIG, get_conn
+            from modules.db import DB_CONFIG, pooled_conn, pool_stats
             
             # Log connection parameters (without sensitive data)
             self.log_validation(f"Testing connection to: {DB_CONFIG.get('host')}:{DB_CONFIG.get('port', '5432')}", component="DB")
@@ -106,7 +106,7 @@ class DeploymentValidator:
             
             # Test basic connection
             self.log_validation("Testing database connection...", component="DB")
-            with get_conn() as conn:
+            with pooled_conn() as conn:
                 with conn.cursor() as cur:
                     # Test connection with version query
                     cur.execute("SELECT version();")
@@ -144,6 +144,12 @@ class DeploymentValidator:
                         self.validation_results["database"] = False
                         return False
             
+            stats = pool_stats()
+            self.log_validation(
+                f"✅ Connection pool: {stats.get('pool_size', 0)}/{stats.get('pool_max', 0)} connections, "
+                f"avg wait {stats.get('avg_wait_ms', 0.0):.1f} ms",
+                component="DB",
+            )
             self.validation_results["database"] = True
             return True
             
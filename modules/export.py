@@ -0,0 +1,408 @@
+# modules/export.py
+"""
+Export of everything stored behind a Pluggy item or a client e-mail.
+
+Rows are read one month at a time and written straight to the output, so
+the client never holds more than a fetch batch (CSV) or a row group
+(Parquet), whatever the size of the export:
+
+- CSV: one header line, then each month's COPY ... TO STDOUT output as it
+  arrives; Postgres formats the rows, no per-row Python work;
+- Parquet: rows from a server-side (named) cursor, one row group per month
+  (a month larger than EXPORT_ROW_GROUP_ROWS is split into several row
+  groups), so readers can skip months using the row group statistics.
+
+Querying month by month keeps each ORDER BY to one partition, small enough
+to sort in EXPORT_WORK_MEM instead of spilling the whole export to disk.
+
+The app goes through export_to_temp_file(): the export lands in a temporary
+file capped at EXPORT_APP_MAX_BYTES (larger ones are refused and belong to
+the CLI) that is removed once downloaded or when its session ends.
+
+Usage:
+    python -m modules.export (--item-id ID | --email EMAIL) [--format csv|parquet] [-o FILE]
+"""
+
+import os
+import sys
+import time
+import weakref
+import logging
+import tempfile
+import argparse
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from psycopg import sql
+
+from modules.db import get_env, pooled_conn
+from modules.finance_db import TRANSACTION_STATUS, TRANSACTION_TYPE
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = int(get_env("EXPORT_BATCH_SIZE", "10000"))
+EXPORT_ROW_GROUP_ROWS = int(get_env("EXPORT_ROW_GROUP_ROWS", "1000000"))
+# work_mem for the export transaction (each month's sort)
+EXPORT_WORK_MEM = get_env("EXPORT_WORK_MEM", "64MB")
+# Largest export served by the app; the whole file goes through the download
+EXPORT_APP_MAX_BYTES = int(get_env("EXPORT_APP_MAX_BYTES", str(100 * 1024 * 1024)))
+
+EXPORT_FORMATS = ("csv", "parquet")
+
+EXPORT_SCHEMA = pa.schema([
+    ("client_email", pa.string()),
+    ("client_name", pa.string()),
+    ("item_id", pa.string()),
+    ("account_id", pa.string()),
+    ("account_name", pa.string()),
+    ("account_type", pa.string()),
+    ("currency_code", pa.string()),
+    ("transaction_id", pa.string()),
+    ("tx_date", pa.date32()),
+    ("amount_cents", pa.int64()),
+    ("category", pa.string()),
+    ("category_name", pa.string()),
+    ("status", pa.string()),
+    ("type", pa.string()),
+    ("description", pa.string()),
+    ("updated_at", pa.timestamp("us", tz="UTC")),
+])
+
+EXPORT_COLUMNS = tuple(EXPORT_SCHEMA.names)
+
+
+def _labels(column, codes):
+    # Enum codes back to Pluggy's names, as stored by finance_db
+    return sql.SQL("CASE {} {} END").format(
+        sql.SQL(column),
+        sql.SQL(" ").join(
+            sql.SQL("WHEN {} THEN {}").format(sql.Literal(code), sql.Literal(name))
+            for name, code in codes.items()
+        ),
+    )
+
+
+# ids cast to text in Postgres: cheaper than building uuid.UUID objects
+EXPORT_SQL = sql.SQL("""
+SELECT c.email, c.name, a.item_id, a.id::text, a.name, a.type, a.currency_code,
+       t.id::text, t.tx_date, t.amount_cents, cat.pluggy_category_id, cat.name,
+       {status}, {type}, t.description, t.updated_at
+FROM financefly_transactions t
+JOIN financefly_accounts a ON a.id = t.account_id
+LEFT JOIN financefly_clients c ON c.item_id = a.item_id
+LEFT JOIN financefly_categories cat ON cat.id = t.category_id
+WHERE {where} AND t.tx_date >= %s AND t.tx_date < %s
+ORDER BY t.tx_date
+""")
+
+EXPORT_RANGE_SQL = sql.SQL("""
+SELECT min(t.tx_date), max(t.tx_date)
+FROM financefly_transactions t
+JOIN financefly_accounts a ON a.id = t.account_id
+WHERE {where}
+""")
+
+
+def _where(item_id, email):
+    if (item_id is None) == (email is None):
+        raise ValueError("Informe item_id ou email (apenas um)")
+    if item_id is not None:
+        return sql.SQL("a.item_id = %s"), [item_id]
+    return sql.SQL("a.item_id IN (SELECT item_id FROM financefly_clients WHERE email = %s)"), [email]
+
+
+def _next_month(month):
+    return date(month.year + 1, 1, 1) if month.month == 12 else date(month.year, month.month + 1, 1)
+
+
+def _export_query(where):
+    return EXPORT_SQL.format(
+        status=_labels("t.status", TRANSACTION_STATUS),
+        type=_labels("t.type", TRANSACTION_TYPE),
+        where=where,
+    )
+
+
+def _months(conn, where, params):
+    # (month, next month) from the first to the last transaction's month
+    first, last = conn.execute(EXPORT_RANGE_SQL.format(where=where), params).fetchone()
+    if first is None:
+        return
+    conn.execute(sql.SQL("SET LOCAL work_mem = {}").format(sql.Literal(EXPORT_WORK_MEM)))
+    month = first.replace(day=1)
+    while month <= last:
+        following = _next_month(month)
+        yield month, following
+        month = following
+
+
+def iter_export_batches(item_id=None, email=None, conn=None, batch_size=None):
+    """
+    Rows of an export in batches, month by month, read through a
+    server-side cursor.
+
+    Args:
+        item_id (str, optional): Pluggy item id
+        email (str, optional): Client e-mail (all of its items)
+        conn (psycopg.Connection, optional): Connection to use (a pooled one when None)
+        batch_size (int, optional): Rows per fetch (EXPORT_BATCH_SIZE by default)
+
+    Yields:
+        tuple: (month, rows) with up to batch_size row tuples in
+               EXPORT_COLUMNS order; months ascending, rows ordered by date
+
+    Raises:
+        ValueError: Unless exactly one of item_id and email is given
+    """
+    where, params = _where(item_id, email)
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    if conn is None:
+        with pooled_conn() as pooled:
+            yield from iter_export_batches(item_id, email, pooled, batch_size)
+        return
+    query = _export_query(where)
+    for month, following in _months(conn, where, params):
+        with conn.cursor(name="financefly_export") as cur:
+            cur.itersize = batch_size
+            cur.execute(query, params + [month, following])
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield month, rows
+
+
+def copy_csv(out, item_id=None, email=None, conn=None):
+    """
+    Writes an export as UTF-8 CSV with a header line, streaming each
+    month's COPY output straight into out.
+
+    Args:
+        out: Binary file object
+        item_id (str, optional): Pluggy item id
+        email (str, optional): Client e-mail (all of its items)
+        conn (psycopg.Connection, optional): Connection to use (a pooled one when None)
+
+    Returns:
+        dict: rows written
+
+    Raises:
+        ValueError: Unless exactly one of item_id and email is given
+    """
+    where, params = _where(item_id, email)
+    if conn is None:
+        with pooled_conn() as pooled:
+            return copy_csv(out, item_id, email, pooled)
+    copy_sql = sql.SQL("COPY ({}) TO STDOUT WITH (FORMAT csv)").format(_export_query(where))
+    out.write((",".join(EXPORT_COLUMNS) + "\r\n").encode())
+    rows = 0
+    with conn.cursor() as cur:
+        for month, following in _months(conn, where, params):
+            with cur.copy(copy_sql, params + [month, following]) as copy:
+                for data in copy:
+                    out.write(data)
+            rows += cur.rowcount
+    return {"rows": rows}
+
+
+def _record_batch(rows):
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, EXPORT_SCHEMA)],
+        schema=EXPORT_SCHEMA,
+    )
+
+
+def write_parquet(batches, out, row_group_rows=None):
+    """
+    Writes export batches as Parquet with one row group per month.
+
+    Args:
+        batches (iterable): (month, rows) pairs from iter_export_batches()
+        out: Binary file object or path
+        row_group_rows (int, optional): Largest row group (EXPORT_ROW_GROUP_ROWS by default)
+
+    Returns:
+        dict: rows and row_groups written
+    """
+    row_group_rows = row_group_rows or EXPORT_ROW_GROUP_ROWS
+    stats = {"rows": 0, "row_groups": 0}
+    pending, pending_rows, pending_month = [], 0, None
+
+    def flush():
+        nonlocal pending, pending_rows
+        if pending:
+            writer.write_table(pa.Table.from_batches(pending), row_group_size=pending_rows)
+            stats["rows"] += pending_rows
+            stats["row_groups"] += 1
+        pending, pending_rows = [], 0
+
+    with pq.ParquetWriter(out, EXPORT_SCHEMA, compression="zstd") as writer:
+        for month, rows in batches:
+            if month != pending_month:
+                flush()
+                pending_month = month
+            while rows:
+                take = rows[:row_group_rows - pending_rows]
+                pending.append(_record_batch(take))
+                pending_rows += len(take)
+                rows = rows[len(take):]
+                if pending_rows >= row_group_rows:
+                    flush()
+        flush()
+    return stats
+
+
+def export_transactions(out, fmt="csv", item_id=None, email=None, conn=None, batch_size=None):
+    """
+    Streams every transaction of an item (or of every item of a client)
+    into a CSV or Parquet file.
+
+    Args:
+        out: Binary file object (or path, for Parquet)
+        fmt (str): "csv" or "parquet"
+        item_id (str, optional): Pluggy item id
+        email (str, optional): Client e-mail (all of its items)
+        conn (psycopg.Connection, optional): Connection to use (a pooled one when None)
+        batch_size (int, optional): Rows per fetch for Parquet (EXPORT_BATCH_SIZE by default)
+
+    Returns:
+        dict: rows, row_groups (Parquet), duration_seconds and rows_per_second
+
+    Raises:
+        ValueError: Unknown format, or not exactly one of item_id and email
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato inválido: {fmt} (use {' ou '.join(EXPORT_FORMATS)})")
+    _where(item_id, email)
+    start = time.monotonic()
+    if fmt == "csv":
+        stats = copy_csv(out, item_id, email, conn)
+    else:
+        batches = iter_export_batches(item_id, email, conn, batch_size)
+        try:
+            stats = write_parquet(batches, out)
+        finally:
+            batches.close()
+    stats["duration_seconds"] = time.monotonic() - start
+    stats["rows_per_second"] = stats["rows"] / stats["duration_seconds"] if stats["duration_seconds"] else 0.0
+    logger.info(
+        f"Exported {stats['rows']} transactions ({fmt}) for {item_id or email} "
+        f"in {stats['duration_seconds']:.2f}s ({stats['rows_per_second']:,.0f} rows/s)"
+    )
+    return stats
+
+
+def export_filename(fmt, item_id=None, email=None):
+    """Default file name for an export, e.g. financefly_ana_at_x.com_2025-01-31.parquet."""
+    key = (item_id or email or "export").replace("@", "_at_")
+    safe = "".join(char if char.isalnum() or char in "._-" else "_" for char in key)
+    return f"financefly_{safe}_{date.today():%Y-%m-%d}.{fmt}"
+
+
+class _LimitedWriter:
+    """Binary file wrapper that refuses to grow past max_bytes."""
+
+    def __init__(self, out, max_bytes):
+        self._out = out
+        self.max_bytes = max_bytes
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        if self.written > self.max_bytes:
+            raise ValueError(
+                f"Exportação maior que {self.max_bytes / (1024 * 1024):g} MB: "
+                "use a linha de comando (python -m modules.export)"
+            )
+        return self._out.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._out, name)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ExportFile:
+    """
+    Finished export in a temporary file. Only the path is held; the file is
+    removed by discard(), when the object is garbage collected (e.g. with
+    the Streamlit session state holding it) or at process exit.
+    """
+
+    def __init__(self, path, name, stats):
+        self.path = path
+        self.name = name
+        self.rows = stats["rows"]
+        self.size = os.path.getsize(path)
+        self._finalizer = weakref.finalize(self, _remove, path)
+
+    def open(self):
+        """Opens the file for reading (binary)."""
+        return open(self.path, "rb")
+
+    def discard(self):
+        """Removes the file (idempotent)."""
+        self._finalizer()
+
+
+def export_to_temp_file(fmt="csv", item_id=None, email=None, max_bytes=None, conn=None):
+    """
+    Runs export_transactions() into a temporary file for a later download.
+
+    Args:
+        fmt (str): "csv" or "parquet"
+        item_id (str, optional): Pluggy item id
+        email (str, optional): Client e-mail (all of its items)
+        max_bytes (int, optional): Size cap (EXPORT_APP_MAX_BYTES by default)
+        conn (psycopg.Connection, optional): Connection to use (a pooled one when None)
+
+    Returns:
+        ExportFile: Path, download name, rows and size of the export
+
+    Raises:
+        ValueError: Export larger than max_bytes (the partial file is removed),
+            unknown format, or not exactly one of item_id and email
+    """
+    fd, path = tempfile.mkstemp(prefix="financefly_export_", suffix=f".{fmt}")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            stats = export_transactions(_LimitedWriter(out, max_bytes or EXPORT_APP_MAX_BYTES),
+                                        fmt, item_id, email, conn)
+    except BaseException:
+        _remove(path)
+        raise
+    return ExportFile(path, export_filename(fmt, item_id, email), stats)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a client's transactions to CSV or Parquet")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--item-id", help="Pluggy item id")
+    target.add_argument("--email", help="Client e-mail (all of its items)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("-o", "--output", help="Output file (default: generated name; '-' for stdout)")
+    args = parser.parse_args(argv)
+
+    output = args.output or export_filename(args.format, args.item_id, args.email)
+    if output == "-":
+        stats = export_transactions(sys.stdout.buffer, args.format, args.item_id, args.email)
+    else:
+        with open(output, "wb") as out:
+            stats = export_transactions(out, args.format, args.item_id, args.email)
+    print(
+        f"{stats['rows']} transactions -> {output} in {stats['duration_seconds']:.2f}s "
+        f"({stats['rows_per_second']:,.0f} rows/s)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
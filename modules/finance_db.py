@@ -0,0 +1,855 @@
+# finance_db.py
+"""
+Contas, transações e saldos dos items Pluggy.
+
+Layout pensado para dezenas de milhões de linhas:
+- valores em centavos (BIGINT), nunca float;
+- categoria como SMALLINT (tabela financefly_categories mapeia o
+  categoryId da Pluggy), status e tipo como SMALLINT;
+- ids Pluggy (UUID) como UUID (16 bytes) em vez de texto;
+- financefly_transactions particionada por mês em tx_date, com índice BRIN
+  em tx_date (datas chegam quase em ordem) e btree em (account_id, tx_date).
+
+As tabelas são criadas pela migração 4 (modules/migrations.py); as
+partições mensais são criadas sob demanda por save_transactions().
+"""
+
+import time
+import logging
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+from psycopg import sql
+from psycopg.rows import dict_row
+
+from modules.db import get_env, pooled_conn
+
+logger = logging.getLogger(__name__)
+
+# Códigos compactos dos enums da Pluggy
+TRANSACTION_STATUS = {"POSTED": 0, "PENDING": 1}
+TRANSACTION_TYPE = {"DEBIT": 0, "CREDIT": 1}
+
+# Distância máxima (dias) entre a data da pendente e a da lançada que a substitui
+RECONCILE_WINDOW_DAYS = int(get_env("RECONCILE_WINDOW_DAYS", "7"))
+
+FINANCE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS financefly_categories (
+        id SMALLSERIAL PRIMARY KEY,
+        pluggy_category_id TEXT NOT NULL UNIQUE,
+        name TEXT
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS financefly_accounts (
+        id UUID PRIMARY KEY,
+        item_id TEXT NOT NULL,
+        type TEXT NOT NULL,
+        subtype TEXT,
+        name TEXT,
+        number TEXT,
+        currency_code CHAR(3) NOT NULL DEFAULT 'BRL',
+        balance_cents BIGINT,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS financefly_accounts_item_id_idx ON financefly_accounts (item_id);",
+    """
+    CREATE TABLE IF NOT EXISTS financefly_balances (
+        account_id UUID NOT NULL,
+        as_of DATE NOT NULL,
+        balance_cents BIGINT NOT NULL,
+        PRIMARY KEY (account_id, as_of)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS financefly_transactions (
+        id UUID NOT NULL,
+        account_id UUID NOT NULL,
+        tx_date DATE NOT NULL,
+        amount_cents BIGINT NOT NULL,
+        category_id SMALLINT,
+        status SMALLINT NOT NULL DEFAULT 0,
+        type SMALLINT NOT NULL DEFAULT 0,
+        description TEXT,
+        updated_at TIMESTAMPTZ,
+        PRIMARY KEY (id, tx_date)
+    ) PARTITION BY RANGE (tx_date);
+    """,
+    "CREATE INDEX IF NOT EXISTS financefly_transactions_tx_date_brin "
+    "ON financefly_transactions USING brin (tx_date);",
+    "CREATE INDEX IF NOT EXISTS financefly_transactions_account_date_idx "
+    "ON financefly_transactions (account_id, tx_date);",
+]
+
+# Cursores do sync incremental (modules/transaction_sync.py): high-water
+# mark por conta e, durante uma sincronização, a janela e a próxima página
+# a buscar (permite retomar após um crash no meio da paginação)
+SYNC_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS financefly_sync_cursors (
+        account_id UUID PRIMARY KEY,
+        item_id TEXT NOT NULL,
+        last_tx_date DATE,
+        last_updated_at TIMESTAMPTZ,
+        window_from DATE,
+        next_page INTEGER,
+        window_max_date DATE,
+        window_max_updated_at TIMESTAMPTZ,
+        synced_at TIMESTAMPTZ
+    );
+    """,
+]
+
+# O sync nunca filtrou por updatedAt (a API de transações do Pluggy só
+# filtra por data): a janela é sempre last_tx_date - OVERLAP_DAYS
+SYNC_DROP_UPDATED_AT_DDL = [
+    "ALTER TABLE financefly_sync_cursors "
+    "DROP COLUMN IF EXISTS last_updated_at, DROP COLUMN IF EXISTS window_max_updated_at;",
+]
+
+# Totais por conta e mês mantidos por save_transactions() e
+# delete_transactions(); leituras de resumo mensal ficam O(meses)
+AGGREGATES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS financefly_monthly_aggregates (
+        account_id UUID NOT NULL,
+        month DATE NOT NULL,
+        income_cents BIGINT NOT NULL DEFAULT 0,
+        expense_cents BIGINT NOT NULL DEFAULT 0,
+        transactions INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (account_id, month)
+    );
+    """,
+    # Backfill a partir das transações já gravadas
+    """
+    INSERT INTO financefly_monthly_aggregates (account_id, month, income_cents, expense_cents, transactions)
+    SELECT account_id, date_trunc('month', tx_date)::date,
+           sum(GREATEST(amount_cents, 0)), sum(GREATEST(-amount_cents, 0)), count(*)
+    FROM financefly_transactions
+    GROUP BY 1, 2
+    ON CONFLICT (account_id, month) DO NOTHING;
+    """,
+]
+
+# Séries recorrentes (assinaturas, salário...) detectadas por
+# modules/recurring.py; client é o e-mail (ou o item_id sem cliente)
+RECURRING_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS financefly_recurring (
+        client TEXT NOT NULL,
+        counterparty TEXT NOT NULL,
+        direction SMALLINT NOT NULL,
+        account_id UUID,
+        description TEXT,
+        period TEXT NOT NULL,
+        period_days SMALLINT NOT NULL,
+        amount_cents BIGINT NOT NULL,
+        occurrences INTEGER NOT NULL,
+        regularity REAL NOT NULL,
+        first_date DATE NOT NULL,
+        last_date DATE NOT NULL,
+        next_date DATE NOT NULL,
+        active BOOLEAN NOT NULL,
+        detected_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (client, counterparty, direction, amount_cents)
+    );
+    """,
+]
+
+# Pares PENDING -> POSTED com ids diferentes conciliados por
+# reconcile_pending(): a pendente sai de financefly_transactions e fica
+# registrada aqui (o próximo sync não a grava de novo)
+RECONCILIATION_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS financefly_transaction_reconciliations (
+        pending_id UUID PRIMARY KEY,
+        posted_id UUID NOT NULL UNIQUE,
+        account_id UUID NOT NULL,
+        amount_cents BIGINT NOT NULL,
+        pending_date DATE NOT NULL,
+        posted_date DATE NOT NULL,
+        reconciled_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+    """,
+    # Pendentes são poucas: índice parcial pequeno para achá-las por conta
+    "CREATE INDEX IF NOT EXISTS financefly_transactions_pending_idx "
+    "ON financefly_transactions (account_id, amount_cents) WHERE status = 1;",
+]
+
+
+# =========================================================
+# Conversões
+# =========================================================
+def to_cents(amount):
+    """Converte um valor (float/str/Decimal em reais) para centavos inteiros."""
+    if amount is None:
+        return None
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def partition_name(month):
+    return f"financefly_transactions_{month:%Y_%m}"
+
+
+def _month_bounds(month):
+    start = date(month.year, month.month, 1)
+    end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+# =========================================================
+# Partições mensais
+# =========================================================
+PARTITION_LOCK_ID = 0x66667478  # "fftx"
+
+MISSING_PARTITIONS_SQL = """
+SELECT month
+FROM unnest(%s::date[]) AS month
+WHERE to_regclass(format('financefly_transactions_%%s', to_char(month, 'YYYY_MM'))) IS NULL;
+"""
+
+
+def ensure_partitions(conn, months):
+    """
+    Cria as partições mensais que faltam para `months` (datas do dia 1)
+    dentro da transação corrente de `conn`.
+
+    Returns:
+        list: Meses cujas partições foram criadas
+    """
+    if not months:
+        return []
+    missing = [month for (month,) in conn.execute(MISSING_PARTITIONS_SQL, (list(months),)).fetchall()]
+    if not missing:
+        return []
+    # Serializa criações concorrentes (outros processos/réplicas)
+    conn.execute("SELECT pg_advisory_xact_lock(%s)", (PARTITION_LOCK_ID,))
+    for month in sorted(missing):
+        start, end = _month_bounds(month)
+        conn.execute(
+            sql.SQL(
+                "CREATE TABLE IF NOT EXISTS {} PARTITION OF financefly_transactions "
+                "FOR VALUES FROM ({}) TO ({})"
+            ).format(sql.Identifier(partition_name(month)), sql.Literal(start), sql.Literal(end))
+        )
+    return missing
+
+
+# =========================================================
+# Upserts em lote
+# =========================================================
+TRANSACTION_COLUMNS = (
+    "id", "account_id", "tx_date", "amount_cents", "category",
+    "status", "type", "description", "updated_at",
+)
+
+TRANSACTIONS_STAGING_DDL = """
+CREATE TEMP TABLE financefly_transactions_staging (
+    id UUID,
+    account_id UUID,
+    tx_date DATE,
+    amount_cents BIGINT,
+    category TEXT,
+    status SMALLINT,
+    type SMALLINT,
+    description TEXT,
+    updated_at TIMESTAMPTZ
+) ON COMMIT DROP;
+"""
+
+# Um id repetido no mesmo lote fica com a versão mais recente
+DEDUP_STAGING_SQL = """
+DELETE FROM financefly_transactions_staging s
+USING financefly_transactions_staging newer
+WHERE s.id = newer.id
+  AND (COALESCE(newer.updated_at, '-infinity'), newer.ctid)
+    > (COALESCE(s.updated_at, '-infinity'), s.ctid);
+"""
+
+# Pendente já conciliada com a lançada que a substituiu (a Pluggy ainda
+# pode devolvê-la na janela de sobreposição) não volta para a tabela
+DROP_RECONCILED_SQL = """
+DELETE FROM financefly_transactions_staging s
+USING financefly_transaction_reconciliations r
+WHERE r.pending_id = s.id AND s.status = 1;
+"""
+
+# Tabela temporária não passa pelo autovacuum: sem estatísticas o
+# planejador supõe milhares de linhas e varre financefly_transactions
+# inteira nos joins por id em vez de usar a chave primária
+ANALYZE_STAGING_SQL = "ANALYZE financefly_transactions_staging;"
+
+UPSERT_CATEGORIES_SQL = """
+INSERT INTO financefly_categories (pluggy_category_id)
+SELECT DISTINCT category FROM financefly_transactions_staging WHERE category IS NOT NULL
+ON CONFLICT (pluggy_category_id) DO NOTHING;
+"""
+
+# Diferença que o lote causa nos agregados, calculada antes do upsert
+# (enquanto as versões antigas ainda estão na tabela): subtrai a versão
+# antiga e soma a nova de cada transação cuja conta, mês ou valor mudou.
+# ORDER BY: lotes concorrentes travam as linhas dos agregados na mesma ordem
+AGGREGATE_DELTA_SQL = """
+INSERT INTO financefly_monthly_aggregates AS agg
+    (account_id, month, income_cents, expense_cents, transactions)
+SELECT account_id, month, sum(income), sum(expense), sum(n)
+FROM (
+    SELECT t.account_id, date_trunc('month', t.tx_date)::date AS month,
+           -GREATEST(t.amount_cents, 0) AS income, -GREATEST(-t.amount_cents, 0) AS expense, -1 AS n
+    FROM financefly_transactions t
+    JOIN financefly_transactions_staging s ON s.id = t.id
+    WHERE (t.account_id, date_trunc('month', t.tx_date), t.amount_cents)
+        IS DISTINCT FROM (s.account_id, date_trunc('month', s.tx_date), s.amount_cents)
+    UNION ALL
+    SELECT s.account_id, date_trunc('month', s.tx_date)::date,
+           GREATEST(s.amount_cents, 0), GREATEST(-s.amount_cents, 0), 1
+    FROM financefly_transactions_staging s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM financefly_transactions t
+        WHERE t.id = s.id
+          AND (t.account_id, date_trunc('month', t.tx_date), t.amount_cents)
+              = (s.account_id, date_trunc('month', s.tx_date), s.amount_cents)
+    )
+) delta
+GROUP BY account_id, month
+ORDER BY account_id, month
+ON CONFLICT (account_id, month) DO UPDATE SET
+    income_cents = agg.income_cents + EXCLUDED.income_cents,
+    expense_cents = agg.expense_cents + EXCLUDED.expense_cents,
+    transactions = agg.transactions + EXCLUDED.transactions;
+"""
+
+# Transação cuja data mudou (ex.: PENDING -> POSTED) muda de partição
+DELETE_MOVED_SQL = """
+DELETE FROM financefly_transactions t
+USING financefly_transactions_staging s
+WHERE t.id = s.id AND t.tx_date <> s.tx_date;
+"""
+
+# O WHERE compara todas as colunas gravadas: uma que ficasse de fora (como
+# account_id) deixaria a linha antiga enquanto AGGREGATE_DELTA_SQL já moveu
+# os totais
+UPSERT_TRANSACTIONS_SQL = """
+INSERT INTO financefly_transactions
+    (id, account_id, tx_date, amount_cents, category_id, status, type, description, updated_at)
+SELECT s.id, s.account_id, s.tx_date, s.amount_cents, c.id, s.status, s.type, s.description, s.updated_at
+FROM financefly_transactions_staging s
+LEFT JOIN financefly_categories c ON c.pluggy_category_id = s.category
+ON CONFLICT (id, tx_date) DO UPDATE SET
+    account_id = EXCLUDED.account_id,
+    amount_cents = EXCLUDED.amount_cents,
+    category_id = EXCLUDED.category_id,
+    status = EXCLUDED.status,
+    type = EXCLUDED.type,
+    description = EXCLUDED.description,
+    updated_at = EXCLUDED.updated_at
+WHERE (financefly_transactions.account_id, financefly_transactions.amount_cents,
+       financefly_transactions.category_id, financefly_transactions.status,
+       financefly_transactions.type, financefly_transactions.description,
+       financefly_transactions.updated_at)
+  IS DISTINCT FROM
+      (EXCLUDED.account_id, EXCLUDED.amount_cents, EXCLUDED.category_id, EXCLUDED.status,
+       EXCLUDED.type, EXCLUDED.description, EXCLUDED.updated_at);
+"""
+
+
+def transaction_row(tx):
+    """
+    Converte uma transação no formato da API Pluggy para a tupla de
+    TRANSACTION_COLUMNS usada por save_transactions().
+    """
+    return (
+        tx["id"],
+        tx["accountId"],
+        str(tx["date"])[:10],
+        to_cents(tx["amount"]),
+        tx.get("categoryId"),
+        TRANSACTION_STATUS.get(tx.get("status") or "POSTED", 0),
+        TRANSACTION_TYPE.get(tx.get("type") or "DEBIT", 0),
+        tx.get("description"),
+        tx.get("updatedAt"),
+    )
+
+
+def save_transactions(rows, conn=None):
+    """
+    Upsert em lote de transações pelo id Pluggy.
+
+    As linhas vão por COPY para uma tabela temporária; partições e
+    categorias que faltam são criadas e um único INSERT ... ON CONFLICT
+    grava tudo, reescrevendo só as linhas que mudaram. Os agregados
+    mensais recebem a diferença na mesma transação. Pendentes já
+    conciliadas (ver reconcile_pending()) são descartadas.
+
+    Um mesmo item não deve ser gravado por dois processos ao mesmo tempo
+    (o SyncScheduler garante isso): as diferenças de lotes concorrentes
+    que mudam as mesmas transações se sobreporiam.
+
+    Args:
+        rows (iterable): Tuplas na ordem de TRANSACTION_COLUMNS (ver transaction_row())
+        conn (psycopg.Connection, optional): Conexão/transação do chamador;
+            uma do pool (com commit) quando None
+
+    Returns:
+        int: Linhas inseridas ou atualizadas
+    """
+    if conn is None:
+        with pooled_conn() as pooled:
+            return save_transactions(rows, pooled)
+    with conn.cursor() as cur:
+        cur.execute(TRANSACTIONS_STAGING_DDL)
+        with cur.copy(
+            sql.SQL("COPY financefly_transactions_staging ({}) FROM STDIN").format(
+                sql.SQL(", ").join(map(sql.Identifier, TRANSACTION_COLUMNS))
+            )
+        ) as copy:
+            for row in rows:
+                copy.write_row(row)
+        cur.execute(DEDUP_STAGING_SQL)
+        cur.execute(DROP_RECONCILED_SQL)
+        cur.execute(ANALYZE_STAGING_SQL)
+        cur.execute(
+            "SELECT DISTINCT date_trunc('month', tx_date)::date FROM financefly_transactions_staging"
+        )
+        months = [month for (month,) in cur.fetchall()]
+        ensure_partitions(conn, months)
+        cur.execute(UPSERT_CATEGORIES_SQL)
+        cur.execute(AGGREGATE_DELTA_SQL)
+        cur.execute(DELETE_MOVED_SQL)
+        cur.execute(UPSERT_TRANSACTIONS_SQL)
+        return cur.rowcount
+
+
+DELETE_TRANSACTIONS_SQL = """
+WITH deleted AS (
+    DELETE FROM financefly_transactions
+    WHERE id = ANY(%s::uuid[])
+    RETURNING account_id, tx_date, amount_cents
+), applied AS (
+    INSERT INTO financefly_monthly_aggregates AS agg
+        (account_id, month, income_cents, expense_cents, transactions)
+    SELECT account_id, date_trunc('month', tx_date)::date,
+           -sum(GREATEST(amount_cents, 0)), -sum(GREATEST(-amount_cents, 0)), -count(*)
+    FROM deleted
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (account_id, month) DO UPDATE SET
+        income_cents = agg.income_cents + EXCLUDED.income_cents,
+        expense_cents = agg.expense_cents + EXCLUDED.expense_cents,
+        transactions = agg.transactions + EXCLUDED.transactions
+)
+SELECT count(*) FROM deleted;
+"""
+
+
+def delete_transactions(ids, conn=None):
+    """
+    Remove transações (ex.: apagadas na Pluggy) e desconta dos agregados.
+
+    Args:
+        ids (iterable): ids Pluggy das transações
+        conn (psycopg.Connection, optional): Conexão do chamador; uma do pool quando None
+
+    Returns:
+        int: Transações removidas
+    """
+    if conn is None:
+        with pooled_conn() as pooled:
+            return delete_transactions(ids, pooled)
+    return conn.execute(DELETE_TRANSACTIONS_SQL, (list(ids),)).fetchone()[0]
+
+
+UPSERT_ACCOUNTS_SQL = """
+INSERT INTO financefly_accounts
+    (id, item_id, type, subtype, name, number, currency_code, balance_cents, updated_at)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
+ON CONFLICT (id) DO UPDATE SET
+    item_id = EXCLUDED.item_id,
+    type = EXCLUDED.type,
+    subtype = EXCLUDED.subtype,
+    name = EXCLUDED.name,
+    number = EXCLUDED.number,
+    currency_code = EXCLUDED.currency_code,
+    balance_cents = EXCLUDED.balance_cents,
+    updated_at = NOW();
+"""
+
+UPSERT_BALANCE_SQL = """
+INSERT INTO financefly_balances (account_id, as_of, balance_cents)
+VALUES (%s, %s, %s)
+ON CONFLICT (account_id, as_of) DO UPDATE SET balance_cents = EXCLUDED.balance_cents;
+"""
+
+
+def account_row(account):
+    """Converte uma conta no formato da API Pluggy para os parâmetros de save_accounts()."""
+    return (
+        account["id"],
+        account["itemId"],
+        account["type"],
+        account.get("subtype"),
+        account.get("name"),
+        account.get("number"),
+        account.get("currencyCode") or "BRL",
+        to_cents(account.get("balance")),
+    )
+
+
+def save_accounts(rows, conn=None):
+    """
+    Upsert de contas (poucas por item) e do saldo do dia de cada uma em
+    financefly_balances.
+
+    Args:
+        rows (iterable): Tuplas de account_row()
+        conn (psycopg.Connection, optional): Conexão do chamador; uma do pool quando None
+
+    Returns:
+        int: Contas gravadas
+    """
+    if conn is None:
+        with pooled_conn() as pooled:
+            return save_accounts(rows, pooled)
+    rows = list(rows)
+    today = date.today()
+    with conn.cursor() as cur:
+        cur.executemany(UPSERT_ACCOUNTS_SQL, rows)
+        balances = [(row[0], today, row[7]) for row in rows if row[7] is not None]
+        if balances:
+            cur.executemany(UPSERT_BALANCE_SQL, balances)
+    return len(rows)
+
+
+# =========================================================
+# Cursores de sincronização
+# =========================================================
+SYNC_CURSOR_FIELDS = (
+    "account_id", "item_id", "last_tx_date", "window_from",
+    "next_page", "window_max_date", "synced_at",
+)
+
+UPSERT_SYNC_CURSOR_SQL = """
+INSERT INTO financefly_sync_cursors
+    (account_id, item_id, last_tx_date, window_from, next_page, window_max_date, synced_at)
+VALUES (%(account_id)s, %(item_id)s, %(last_tx_date)s, %(window_from)s,
+        %(next_page)s, %(window_max_date)s, %(synced_at)s)
+ON CONFLICT (account_id) DO UPDATE SET
+    item_id = EXCLUDED.item_id,
+    last_tx_date = EXCLUDED.last_tx_date,
+    window_from = EXCLUDED.window_from,
+    next_page = EXCLUDED.next_page,
+    window_max_date = EXCLUDED.window_max_date,
+    synced_at = EXCLUDED.synced_at;
+"""
+
+
+def load_sync_cursor(account_id, conn=None):
+    """Cursor de sincronização da conta (dict com SYNC_CURSOR_FIELDS) ou None."""
+    if conn is None:
+        with pooled_conn() as pooled:
+            return load_sync_cursor(account_id, pooled)
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(
+            sql.SQL("SELECT {} FROM financefly_sync_cursors WHERE account_id = %s").format(
+                sql.SQL(", ").join(map(sql.Identifier, SYNC_CURSOR_FIELDS))
+            ),
+            (account_id,),
+        )
+        return cur.fetchone()
+
+
+def save_sync_cursor(cursor, conn=None):
+    """Grava o cursor (dict com SYNC_CURSOR_FIELDS)."""
+    if conn is None:
+        with pooled_conn() as pooled:
+            return save_sync_cursor(cursor, pooled)
+    conn.execute(UPSERT_SYNC_CURSOR_SQL, cursor)
+
+
+# Idade da sincronização completa mais antiga entre as contas do item,
+# pelo relógio do banco (o mesmo para todas as réplicas); conta que
+# nunca completou deixa o item sem valor
+SYNC_LAG_SQL = """
+SELECT item_id,
+       CASE WHEN bool_and(synced_at IS NOT NULL)
+            THEN extract(epoch FROM now() - min(synced_at))::float8
+       END
+FROM financefly_sync_cursors
+WHERE item_id = ANY(%s)
+GROUP BY item_id;
+"""
+
+
+def load_sync_lag(item_ids, conn=None):
+    """
+    Segundos desde a última sincronização completa de cada item, gravada
+    por qualquer processo em financefly_sync_cursors.synced_at.
+
+    Args:
+        item_ids (iterable): Items consultados
+        conn (psycopg.Connection, optional): Conexão do chamador; uma do pool quando None
+
+    Returns:
+        dict: item_id -> segundos, ou None quando alguma conta do item
+              nunca completou; items sem cursor ficam de fora
+    """
+    if conn is None:
+        with pooled_conn() as pooled:
+            return load_sync_lag(item_ids, pooled)
+    return dict(conn.execute(SYNC_LAG_SQL, (list(item_ids),)).fetchall())
+
+
+# =========================================================
+# Verificação dos agregados
+# =========================================================
+# Agregados recalculados do zero comparados com os mantidos; linhas
+# ausentes de um dos lados contam como zero
+AGGREGATE_DRIFT_SQL = """
+WITH expected AS (
+    SELECT account_id, date_trunc('month', tx_date)::date AS month,
+           sum(GREATEST(amount_cents, 0))::bigint AS income_cents,
+           sum(GREATEST(-amount_cents, 0))::bigint AS expense_cents,
+           count(*)::int AS transactions
+    FROM financefly_transactions
+    WHERE {scope}
+    GROUP BY 1, 2
+), stored AS (
+    SELECT account_id, month, income_cents, expense_cents, transactions
+    FROM financefly_monthly_aggregates
+    WHERE {scope}
+)
+SELECT COALESCE(e.account_id, s.account_id) AS account_id,
+       COALESCE(e.month, s.month) AS month,
+       COALESCE(e.income_cents, 0) AS expected_income_cents,
+       COALESCE(s.income_cents, 0) AS stored_income_cents,
+       COALESCE(e.expense_cents, 0) AS expected_expense_cents,
+       COALESCE(s.expense_cents, 0) AS stored_expense_cents,
+       COALESCE(e.transactions, 0) AS expected_transactions,
+       COALESCE(s.transactions, 0) AS stored_transactions
+FROM expected e
+FULL OUTER JOIN stored s ON s.account_id = e.account_id AND s.month = e.month
+WHERE (COALESCE(e.income_cents, 0), COALESCE(e.expense_cents, 0), COALESCE(e.transactions, 0))
+    IS DISTINCT FROM (COALESCE(s.income_cents, 0), COALESCE(s.expense_cents, 0), COALESCE(s.transactions, 0))
+ORDER BY 1, 2;
+"""
+
+REPAIR_AGGREGATE_SQL = """
+INSERT INTO financefly_monthly_aggregates (account_id, month, income_cents, expense_cents, transactions)
+VALUES (%(account_id)s, %(month)s, %(expected_income_cents)s, %(expected_expense_cents)s,
+        %(expected_transactions)s)
+ON CONFLICT (account_id, month) DO UPDATE SET
+    income_cents = EXCLUDED.income_cents,
+    expense_cents = EXCLUDED.expense_cents,
+    transactions = EXCLUDED.transactions;
+"""
+
+
+def verify_aggregates(item_ids=None, repair=False, conn=None):
+    """
+    Recalcula os agregados mensais a partir das transações e aponta as
+    diferenças (drift) em relação aos mantidos incrementalmente.
+
+    Args:
+        item_ids (list, optional): Limita a verificação às contas desses items
+        repair (bool): Sobrescreve os agregados divergentes com o valor recalculado
+        conn (psycopg.Connection, optional): Conexão do chamador; uma do pool quando None
+
+    Returns:
+        dict: drift (lista de dicts com os valores esperados e gravados por
+              conta e mês), repaired e duration_seconds
+    """
+    if conn is None:
+        with pooled_conn() as pooled:
+            return verify_aggregates(item_ids, repair, pooled)
+    start = time.monotonic()
+    if item_ids is None:
+        scope, params = sql.SQL("TRUE"), ()
+    else:
+        scope = sql.SQL("account_id IN (SELECT id FROM financefly_accounts WHERE item_id = ANY(%s))")
+        params = (list(item_ids), list(item_ids))
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(sql.SQL(AGGREGATE_DRIFT_SQL).format(scope=scope), params)
+        drift = cur.fetchall()
+        if repair and drift:
+            cur.executemany(REPAIR_AGGREGATE_SQL, drift)
+    if drift:
+        logger.warning(f"Monthly aggregates drift in {len(drift)} account-months{' (repaired)' if repair else ''}")
+    return {
+        "drift": drift,
+        "repaired": len(drift) if repair else 0,
+        "duration_seconds": time.monotonic() - start,
+    }
+
+
+# =========================================================
+# Conciliação pendente -> lançada
+# =========================================================
+# Mesma chave de modules.recurring.normalize_counterparty(): maiúsculas,
+# sem dígitos e pontuação (a pendente e a lançada trazem números de
+# autorização, parcela ou data diferentes na descrição)
+MATCH_KEY_SQL = "btrim(regexp_replace(upper(COALESCE({0}, '')), '[^[:alpha:]]+', ' ', 'g'))"
+
+# Uma rodada da conciliação, em um comando:
+# - pending/posted: pendentes das contas e lançadas ainda não conciliadas
+#   no intervalo de datas das pendentes (PENDING_RANGE_SQL; datas como
+#   parâmetros podam partições e dão ao planner o tamanho certo de cada lado);
+# - pairs: hash join das pendentes (poucas, lado construído) com as
+#   lançadas em (conta, valor) dentro da janela de datas; a descrição
+#   normalizada (regexp, cara) só é comparada nesses poucos pares;
+# - candidates: cada par recebe a posição na lista de candidatas da
+#   pendente e na da lançada, pela distância em dias e o id do outro lado;
+# - pares que são a melhor opção dos dois lados são conciliados: o
+#   mapeamento é gravado, a pendente removida e descontada dos agregados.
+# Compras iguais no mesmo dia disputam as mesmas candidatas; o par de
+# menor (distância, ids) sempre é mútuo, então cada rodada concilia ao
+# menos um par enquanto houver candidatas (ver reconcile_pending())
+PENDING_RANGE_SQL = """
+SELECT min(tx_date), max(tx_date) FROM financefly_transactions
+WHERE status = 1 AND account_id = ANY(%s::uuid[]);
+"""
+
+RECONCILE_SQL = """
+WITH pending AS (
+    SELECT id, account_id, tx_date, amount_cents, description
+    FROM financefly_transactions
+    WHERE status = 1 AND account_id = ANY(%(account_ids)s::uuid[])
+      AND tx_date BETWEEN %(date_from)s AND %(date_to)s
+), posted AS (
+    SELECT t.id, t.account_id, t.tx_date, t.amount_cents, t.description
+    FROM financefly_transactions t
+    WHERE t.status = 0 AND t.account_id = ANY(%(account_ids)s::uuid[])
+      AND t.tx_date BETWEEN %(date_from)s::date - 1 AND %(date_to)s::date + %(window)s
+      AND NOT EXISTS (SELECT 1 FROM financefly_transaction_reconciliations r WHERE r.posted_id = t.id)
+), pairs AS MATERIALIZED (
+    SELECT p.id AS pending_id, q.id AS posted_id, p.account_id, p.amount_cents,
+           p.tx_date AS pending_date, q.tx_date AS posted_date,
+           p.description AS pending_description, q.description AS posted_description
+    FROM pending p
+    JOIN posted q ON q.account_id = p.account_id AND q.amount_cents = p.amount_cents
+    WHERE q.tx_date - p.tx_date BETWEEN -1 AND %(window)s
+), candidates AS (
+    SELECT pending_id, posted_id, account_id, amount_cents, pending_date, posted_date,
+           row_number() OVER (PARTITION BY pending_id
+                              ORDER BY abs(posted_date - pending_date), posted_id) AS pending_rank,
+           row_number() OVER (PARTITION BY posted_id
+                              ORDER BY abs(posted_date - pending_date), pending_id) AS posted_rank
+    FROM pairs
+    WHERE {posted_key} = {pending_key}
+), linked AS (
+    INSERT INTO financefly_transaction_reconciliations
+        (pending_id, posted_id, account_id, amount_cents, pending_date, posted_date)
+    SELECT pending_id, posted_id, account_id, amount_cents, pending_date, posted_date
+    FROM candidates
+    WHERE pending_rank = 1 AND posted_rank = 1
+    ON CONFLICT DO NOTHING
+    RETURNING pending_id, pending_date
+), deleted AS (
+    DELETE FROM financefly_transactions t
+    USING linked l
+    WHERE t.id = l.pending_id AND t.tx_date = l.pending_date
+    RETURNING t.account_id, t.tx_date, t.amount_cents
+), applied AS (
+    INSERT INTO financefly_monthly_aggregates AS agg
+        (account_id, month, income_cents, expense_cents, transactions)
+    SELECT account_id, date_trunc('month', tx_date)::date,
+           -sum(GREATEST(amount_cents, 0)), -sum(GREATEST(-amount_cents, 0)), -count(*)
+    FROM deleted
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (account_id, month) DO UPDATE SET
+        income_cents = agg.income_cents + EXCLUDED.income_cents,
+        expense_cents = agg.expense_cents + EXCLUDED.expense_cents,
+        transactions = agg.transactions + EXCLUDED.transactions
+)
+SELECT count(*) FROM deleted;
+""".format(pending_key=MATCH_KEY_SQL.format("pending_description"),
+         posted_key=MATCH_KEY_SQL.format("posted_description"))
+
+
+def reconcile_pending(account_ids, window_days=None, conn=None):
+    """
+    Concilia transações PENDING com as POSTED que as substituíram.
+
+    A Pluggy pode devolver uma compra primeiro como pendente e depois
+    como lançada com outro id; as duas somariam nos totais. Uma pendente
+    e uma lançada da mesma conta, mesmo valor e mesma descrição
+    normalizada, com datas a até window_days uma da outra, formam um par
+    (um para um, preferindo as datas mais próximas): a pendente é
+    removida (e descontada dos agregados) e o par fica registrado em
+    financefly_transaction_reconciliations.
+
+    Args:
+        account_ids (iterable): Contas a conciliar
+        window_days (int, optional): Janela em dias; RECONCILE_WINDOW_DAYS quando None
+        conn (psycopg.Connection, optional): Conexão do chamador; uma do pool quando None
+
+    Returns:
+        int: Pendentes conciliadas
+    """
+    if conn is None:
+        with pooled_conn() as pooled:
+            return reconcile_pending(account_ids, window_days, pooled)
+    account_ids = sorted(set(map(str, account_ids)))
+    if not account_ids:
+        return 0
+    date_from, date_to = conn.execute(PENDING_RANGE_SQL, (account_ids,)).fetchone()
+    if date_from is None:
+        return 0
+    params = {
+        "account_ids": account_ids,
+        "date_from": date_from,
+        "date_to": date_to,
+        "window": RECONCILE_WINDOW_DAYS if window_days is None else window_days,
+    }
+    reconciled = 0
+    while True:
+        matched = conn.execute(RECONCILE_SQL, params).fetchone()[0]
+        reconciled += matched
+        if not matched:
+            return reconciled
+
+
+# =========================================================
+# Séries recorrentes
+# =========================================================
+RECURRING_COLUMNS = (
+    "client", "counterparty", "direction", "account_id", "description", "period", "period_days",
+    "amount_cents", "occurrences", "regularity", "first_date", "last_date", "next_date", "active",
+)
+
+
+def save_recurring(clients, rows, conn=None):
+    """
+    Substitui as séries recorrentes gravadas dos clientes informados.
+
+    Args:
+        clients (list): Clientes (e-mail ou item_id) recalculados; os que
+            não têm linhas ficam sem séries
+        rows (iterable): Tuplas na ordem de RECURRING_COLUMNS
+        conn (psycopg.Connection, optional): Conexão do chamador; uma do pool quando None
+
+    Returns:
+        int: Séries gravadas
+    """
+    if conn is None:
+        with pooled_conn() as pooled:
+            return save_recurring(clients, rows, pooled)
+    clients = sorted(set(clients))
+    with conn.cursor() as cur:
+        # Um cliente por vez: duas detecções do mesmo cliente (réplicas)
+        # não intercalam DELETE e COPY. Ordem fixa evita deadlock
+        for client in clients:
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (client,))
+        cur.execute("DELETE FROM financefly_recurring WHERE client = ANY(%s)", (clients,))
+        written = 0
+        with cur.copy(
+            sql.SQL("COPY financefly_recurring ({}) FROM STDIN").format(
+                sql.SQL(", ").join(map(sql.Identifier, RECURRING_COLUMNS))
+            )
+        ) as copy:
+            for row in rows:
+                copy.write_row(row)
+                written += 1
+    return written
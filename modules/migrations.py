@@ -0,0 +1,286 @@
+# migrations.py
+"""
+Migrações versionadas do schema.
+
+Cada migração tem um número de versão e é registrada na tabela
+schema_version ao ser aplicada; rodar run_migrations() de novo só aplica
+as que faltam. Migrações comuns rodam em uma transação junto com o
+registro da versão. Migrações "concurrent" (CREATE INDEX CONCURRENTLY) não
+podem rodar em transação: rodam em autocommit e são idempotentes
+(IF NOT EXISTS + remoção de índice inválido deixado por uma tentativa
+interrompida).
+
+ensure_schema() roda as migrações uma única vez por processo (protegido
+por um lock local e por um advisory lock do Postgres entre réplicas) e
+guarda o resultado, de modo que os reruns do Streamlit não fazem nenhuma
+ida ao banco por causa do schema.
+"""
+
+import time
+import logging
+import threading
+
+from psycopg import sql
+
+from modules.db import DDL, WEBHOOK_EVENTS_DDL, pooled_conn
+from modules.finance_db import (
+    FINANCE_DDL, SYNC_DDL, AGGREGATES_DDL, RECURRING_DDL, RECONCILIATION_DDL, SYNC_DROP_UPDATED_AT_DDL,
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION_DDL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+"""
+
+# Em ordem de versão. "concurrent": True para migrações que não podem
+# rodar dentro de uma transação; devem ter uma única instrução.
+MIGRATIONS = [
+    {
+        "version": 1,
+        "description": "create financefly_clients",
+        "statements": [DDL],
+    },
+    {
+        "version": 2,
+        "description": "index financefly_clients.email",
+        "statements": [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS financefly_clients_email_idx "
+            "ON financefly_clients (email);"
+        ],
+        "concurrent": True,
+        "index": "financefly_clients_email_idx",
+    },
+    {
+        "version": 3,
+        "description": "index financefly_clients.created_at",
+        "statements": [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS financefly_clients_created_at_idx "
+            "ON financefly_clients (created_at);"
+        ],
+        "concurrent": True,
+        "index": "financefly_clients_created_at_idx",
+    },
+    {
+        "version": 4,
+        "description": "accounts, balances and month-partitioned transactions",
+        "statements": FINANCE_DDL,
+    },
+    {
+        "version": 5,
+        "description": "transaction sync cursors",
+        "statements": SYNC_DDL,
+    },
+    {
+        "version": 6,
+        "description": "pluggy webhook events",
+        "statements": WEBHOOK_EVENTS_DDL,
+    },
+    {
+        "version": 7,
+        "description": "monthly aggregates per account",
+        "statements": AGGREGATES_DDL,
+    },
+    {
+        "version": 8,
+        "description": "recurring transaction series",
+        "statements": RECURRING_DDL,
+    },
+    {
+        "version": 9,
+        "description": "pending to posted transaction reconciliations",
+        "statements": RECONCILIATION_DDL,
+    },
+    {
+        "version": 10,
+        "description": "drop unused updatedAt marks from sync cursors",
+        "statements": SYNC_DROP_UPDATED_AT_DDL,
+    },
+]
+
+INVALID_INDEX_SQL = """
+SELECT 1
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+WHERE c.relname = %s AND NOT i.indisvalid;
+"""
+
+
+def applied_versions(conn):
+    """Versões já registradas em schema_version."""
+    conn.execute(SCHEMA_VERSION_DDL)
+    return {row[0] for row in conn.execute("SELECT version FROM schema_version").fetchall()}
+
+
+def _record(conn, migration):
+    conn.execute(
+        "INSERT INTO schema_version (version, description) VALUES (%s, %s) "
+        "ON CONFLICT (version) DO NOTHING",
+        (migration["version"], migration["description"]),
+    )
+
+
+def _apply_transactional(conn, migration):
+    with conn.transaction():
+        for statement in migration["statements"]:
+            conn.execute(statement)
+        _record(conn, migration)
+
+
+def _apply_concurrent(conn, migration):
+    index = migration.get("index")
+    # Um CREATE INDEX CONCURRENTLY interrompido deixa um índice inválido
+    # que o IF NOT EXISTS não recria
+    if index and conn.execute(INVALID_INDEX_SQL, (index,)).fetchone():
+        logger.warning(f"Dropping invalid index {index} left by an interrupted migration")
+        conn.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.Identifier(index)))
+    for statement in migration["statements"]:
+        conn.execute(statement)
+    _record(conn, migration)
+
+
+def run_migrations(conn=None, migrations=MIGRATIONS):
+    """
+    Aplica as migrações pendentes em ordem de versão.
+
+    Args:
+        conn (psycopg.Connection, optional): Conexão a usar (uma do pool quando None)
+        migrations (list): Migrações disponíveis
+
+    Returns:
+        list: Versões aplicadas nesta chamada
+    """
+    if conn is None:
+        with pooled_conn() as pooled:
+            return run_migrations(pooled, migrations)
+
+    previous_autocommit = conn.autocommit
+    # autocommit: cada migração controla a própria transação e
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma
+    conn.autocommit = True
+    try:
+        done = applied_versions(conn)
+        applied = []
+        for migration in sorted(migrations, key=lambda m: m["version"]):
+            if migration["version"] in done:
+                continue
+            logger.info(f"Applying migration {migration['version']}: {migration['description']}")
+            if migration.get("concurrent"):
+                _apply_concurrent(conn, migration)
+            else:
+                _apply_transactional(conn, migration)
+            applied.append(migration["version"])
+        return applied
+    finally:
+        conn.autocommit = previous_autocommit
+
+
+def current_version(conn=None):
+    """Maior versão aplicada (0 quando nenhuma)."""
+    if conn is None:
+        with pooled_conn() as pooled:
+            return current_version(pooled)
+    versions = applied_versions(conn)
+    return max(versions) if versions else 0
+
+
+# =========================================================
+# Inicialização única por processo
+# =========================================================
+# Chave do pg_advisory_lock que serializa migrações entre réplicas
+SCHEMA_LOCK_ID = 0x66666C79  # "ffly"
+# Após uma falha, nova tentativa só depois desse intervalo
+SCHEMA_INIT_RETRY_SECONDS = 30
+# Espera máxima pelo advisory lock enquanto outra réplica migra
+SCHEMA_LOCK_TIMEOUT_SECONDS = 120
+SCHEMA_LOCK_POLL_SECONDS = 0.5
+
+_init_lock = threading.Lock()
+_init_result = None
+
+
+def ensure_schema():
+    """
+    Aplica DDL e migrações pendentes uma vez por processo.
+
+    O sucesso fica em cache: chamadas seguintes retornam o mesmo resultado
+    sem tocar no banco. Uma falha também é devolvida, mas uma nova tentativa
+    é feita após SCHEMA_INIT_RETRY_SECONDS.
+
+    Returns:
+        dict: ok, version, applied (versões aplicadas), error, duration_seconds
+    """
+    global _init_result
+    result = _init_result
+    if result is not None and (result["ok"] or time.monotonic() < result["retry_at"]):
+        return result
+    with _init_lock:
+        result = _init_result
+        if result is not None and (result["ok"] or time.monotonic() < result["retry_at"]):
+            return result
+        _init_result = _initialize()
+        return _init_result
+
+
+def _initialize():
+    start = time.monotonic()
+    try:
+        with pooled_conn() as conn:
+            conn.autocommit = True
+            try:
+                # Só uma réplica migra por vez; as outras esperam e encontram tudo aplicado
+                _acquire_schema_lock(conn)
+                try:
+                    applied = run_migrations(conn)
+                    version = current_version(conn)
+                finally:
+                    conn.execute("SELECT pg_advisory_unlock(%s)", (SCHEMA_LOCK_ID,))
+            finally:
+                conn.autocommit = False
+    except Exception as init_error:
+        logger.error(f"Schema initialization failed: {init_error}")
+        return {
+            "ok": False,
+            "version": None,
+            "applied": [],
+            "error": str(init_error),
+            "duration_seconds": time.monotonic() - start,
+            "retry_at": time.monotonic() + SCHEMA_INIT_RETRY_SECONDS,
+        }
+    logger.info(f"Schema at version {version}; applied {applied or 'nothing'}")
+    return {
+        "ok": True,
+        "version": version,
+        "applied": applied,
+        "error": None,
+        "duration_seconds": time.monotonic() - start,
+        "retry_at": None,
+    }
+
+
+def _acquire_schema_lock(conn):
+    # pg_try_advisory_lock em loop em vez de pg_advisory_lock: uma sessão
+    # bloqueada em pg_advisory_lock mantém uma transação aberta, e o
+    # CREATE INDEX CONCURRENTLY da réplica que tem o lock espera por ela
+    # (deadlock)
+    deadline = time.monotonic() + SCHEMA_LOCK_TIMEOUT_SECONDS
+    while not conn.execute("SELECT pg_try_advisory_lock(%s)", (SCHEMA_LOCK_ID,)).fetchone()[0]:
+        if time.monotonic() >= deadline:
+            raise TimeoutError("Timeout aguardando outra instância aplicar as migrações")
+        time.sleep(SCHEMA_LOCK_POLL_SECONDS)
+
+
+def schema_status():
+    """Resultado da última ensure_schema(), ou None se ainda não rodou."""
+    return _init_result
+
+
+def reset_schema_status():
+    """Esquece o resultado em cache (usado em testes)."""
+    global _init_result
+    with _init_lock:
+        _init_result = None
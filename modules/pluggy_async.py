@@ -0,0 +1,274 @@
+# modules/pluggy_async.py
+"""
+Asyncio client for the Pluggy API.
+
+AsyncPluggyClient exposes the same surface as PluggyClient (authenticate,
+get_api_key, create_connect_token) as coroutines on httpx.AsyncClient, so
+batch jobs can fan out hundreds of calls from one event loop without a
+thread per call. It shares PluggyClient's process-wide state: the API key
+cache, the per-endpoint rate limiters and circuit breakers, and the retry
+counters. It also uses the same retry policy and user-facing error mapping,
+so a burst from a batch job throttles the app's own calls as well.
+"""
+
+import asyncio
+import logging
+
+import httpx
+
+from modules import pluggy_utils
+from modules.pluggy_utils import (
+    PluggyClient,
+    validate_environment,
+    parse_auth_response,
+    parse_connect_token_response,
+    request_error_to_value_error,
+    RequestAttempts,
+)
+
+logger = logging.getLogger(__name__)
+
+# Same bound as the synchronous client's per-host connection pool
+DEFAULT_MAX_CONCURRENCY = pluggy_utils.HTTP_POOL_MAXSIZE
+
+
+def transport_error_to_value_error(error, operation):
+    """
+    Maps an httpx transport exception to the same user-facing ValueError
+    PluggyClient raises for the equivalent requests exception.
+    """
+    if isinstance(error, httpx.TimeoutException):
+        error = TimeoutError(str(error))
+    elif isinstance(error, httpx.TransportError):
+        error = ConnectionError(str(error))
+    return request_error_to_value_error(error, operation)
+
+
+class AsyncPluggyClient:
+    """
+    Asyncio counterpart of PluggyClient with bounded concurrency.
+
+    Usage:
+        async with AsyncPluggyClient(max_concurrency=20) as client:
+            tokens = await client.create_connect_tokens(emails)
+    """
+
+    def __init__(self, config=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, http_client=None):
+        """
+        Initialize AsyncPluggyClient.
+
+        Args:
+            config (dict, optional): Same as PluggyClient; validated from env when None
+            max_concurrency (int): Maximum Pluggy requests in flight at once
+            http_client (httpx.AsyncClient, optional): Client to send requests with;
+                when None one is created (and closed by aclose()) with
+                max_concurrency pooled connections
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency deve ser maior que zero")
+        if config is None:
+            config = validate_environment()
+
+        self.client_id = config["client_id"]
+        self.client_secret = config["client_secret"]
+        self.base_url = config["base_url"]
+        self._cache_key = (self.base_url, self.client_id)
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._owns_http_client = http_client is None
+        self._http = http_client or httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        )
+        self._auth_task = None
+
+    # -----------------------------------------------------
+    # API key
+    # -----------------------------------------------------
+    async def get_api_key(self):
+        """
+        Returns a cached API key, authenticating only on cache miss.
+        Concurrent misses share a single in-flight authentication.
+
+        Raises:
+            ValueError: User-friendly error messages from authenticate()
+        """
+        api_key = PluggyClient._api_key_cache.get(self._cache_key)
+        if api_key:
+            return api_key
+        return await self._auth_flight(self._cached_or_authenticate)
+
+    async def reauthenticate(self):
+        """Forces a new API key, joining an authentication already in flight."""
+        return await self._auth_flight(self.authenticate)
+
+    async def _cached_or_authenticate(self):
+        return PluggyClient._api_key_cache.peek(self._cache_key) or await self.authenticate()
+
+    async def _auth_flight(self, authenticate):
+        if self._auth_task is None or self._auth_task.done():
+            self._auth_task = asyncio.ensure_future(authenticate())
+        # A cancelled waiter must not cancel the authentication the others wait for
+        return await asyncio.shield(self._auth_task)
+
+    def invalidate_api_key(self, api_key=None):
+        """Removes the cached API key (e.g. after a 401 from Pluggy)."""
+        PluggyClient._api_key_cache.invalidate(self._cache_key, api_key)
+
+    async def authenticate(self):
+        """
+        Authenticates with Pluggy API and returns API key.
+
+        Raises:
+            ValueError: Same user-friendly messages as PluggyClient.authenticate()
+        """
+        try:
+            logger.info("Starting Pluggy API authentication")
+            response = await self._request(
+                "POST",
+                "auth",
+                f"{self.base_url}/auth",
+                headers={"accept": "application/json", "content-type": "application/json"},
+                json={"clientId": self.client_id, "clientSecret": self.client_secret},
+            )
+            api_key = parse_auth_response(response.status_code, response.text, response.json)
+            logger.info("Pluggy authentication successful")
+            PluggyClient._api_key_cache.put(self._cache_key, api_key)
+            return api_key
+
+        except httpx.HTTPError as transport_error:
+            raise transport_error_to_value_error(transport_error, "authenticate")
+
+        except ValueError:
+            raise
+
+        except Exception as unexpected_error:
+            logger.error(f"Unexpected error in authenticate: {unexpected_error}", exc_info=True)
+            raise ValueError(pluggy_utils.UNEXPECTED_ERROR_MESSAGES["authenticate"])
+
+    # -----------------------------------------------------
+    # Connect tokens
+    # -----------------------------------------------------
+    async def create_connect_token(self, client_user_id=None):
+        """
+        Creates a Pluggy Connect token.
+
+        Args:
+            client_user_id (str, optional): User identifier for the token
+
+        Raises:
+            ValueError: Same user-friendly messages as PluggyClient.create_connect_token()
+        """
+        try:
+            api_key = await self.get_api_key()
+            payload = {"clientUserId": client_user_id} if client_user_id else {}
+            response = await self._post_connect_token(api_key, payload)
+
+            # Same recovery as PluggyClient: the cached key may have been revoked
+            if response.status_code == 401:
+                logger.warning("Connect token rejected with 401, re-authenticating once")
+                self.invalidate_api_key(api_key)
+                api_key = await self.reauthenticate()
+                response = await self._post_connect_token(api_key, payload)
+
+            return parse_connect_token_response(response.status_code, response.text, response.json)
+
+        except httpx.HTTPError as transport_error:
+            raise transport_error_to_value_error(transport_error, "create_connect_token")
+
+        except ValueError:
+            raise
+
+        except Exception as unexpected_error:
+            logger.error(f"Unexpected error in create_connect_token: {unexpected_error}", exc_info=True)
+            raise ValueError(pluggy_utils.UNEXPECTED_ERROR_MESSAGES["create_connect_token"])
+
+    async def _post_connect_token(self, api_key, payload):
+        return await self._request(
+            "POST",
+            "connect_token",
+            f"{self.base_url}/connect_token",
+            headers={
+                "accept": "application/json",
+                "content-type": "application/json",
+                "X-API-KEY": api_key,
+            },
+            json=payload,
+        )
+
+    async def create_connect_tokens(self, client_user_ids, return_exceptions=True):
+        """
+        Creates connect tokens for many users concurrently (at most
+        max_concurrency requests in flight).
+
+        Args:
+            client_user_ids (iterable): User identifiers
+            return_exceptions (bool): Return ValueError instances in place of
+                                      failed tokens instead of raising the first one
+
+        Returns:
+            list: Tokens (or exceptions) in the same order as client_user_ids
+
+        Raises:
+            ValueError: When authentication itself fails
+        """
+        # Authenticate once up front so the fan-out doesn't start with a cache miss per task
+        await self.get_api_key()
+        return await asyncio.gather(
+            *(self.create_connect_token(user_id) for user_id in client_user_ids),
+            return_exceptions=return_exceptions,
+        )
+
+    # -----------------------------------------------------
+    # Transport
+    # -----------------------------------------------------
+    async def _request(self, method, endpoint, url, **kwargs):
+        """
+        Sends a request through the endpoint's shared circuit breaker and
+        rate limiter, retrying as RequestAttempts decides (the same policy
+        as PluggyClient); waits are asyncio sleeps, so the event loop is
+        never blocked.
+
+        Raises:
+            ValueError: Service unavailable message while the breaker is open, or
+                        rate limit message when the queue wait exceeds
+                        RATE_LIMIT_MAX_WAIT_SECONDS
+        """
+        attempts = RequestAttempts(endpoint)
+        timeout = httpx.Timeout(pluggy_utils.HTTP_READ_TIMEOUT, connect=pluggy_utils.HTTP_CONNECT_TIMEOUT)
+        while True:
+            attempts.admit()
+            try:
+                acquired = await attempts.limiter.acquire_async(timeout=pluggy_utils.RATE_LIMIT_MAX_WAIT_SECONDS)
+            except asyncio.CancelledError:
+                attempts.abandon()
+                raise
+            attempts.acquired(acquired)
+            try:
+                async with self._semaphore:
+                    response = await self._http.request(method, url, timeout=timeout, **kwargs)
+            except asyncio.CancelledError:
+                attempts.abandon()
+                raise
+            except httpx.TransportError as transport_error:
+                delay = attempts.transport_error(transport_error)
+                if delay is None:
+                    raise
+            except Exception:
+                attempts.failed()
+                raise
+            else:
+                delay = attempts.response(response)
+                if delay is None:
+                    return response
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        """Closes the HTTP client when it was created here."""
+        if self._owns_http_client:
+            await self._http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
@@ -6,12 +6,69 @@ and unit tests. It was previously available as `modules.pluggy_utils`.
 """
 
 import os
+import json
+import time
+import base64
+import threading
 import requests
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from modules.rate_limiter import TokenBucket, parse_retry_after, backoff_delay
+from modules.circuit_breaker import CircuitBreaker
 
 logger = logging.getLogger(__name__)
 
+# Pluggy API keys are valid for 2 hours. Keys are dropped from the cache
+# shortly before they expire and refreshed in background a bit earlier.
+API_KEY_TTL_SECONDS = 2 * 60 * 60
+API_KEY_EXPIRY_MARGIN_SECONDS = 5 * 60
+API_KEY_REFRESH_AHEAD_SECONDS = 15 * 60
+
+# Shared HTTP connection pool for api.pluggy.ai (see get_http_session)
+HTTP_POOL_CONNECTIONS = int(os.getenv("PLUGGY_HTTP_POOL_CONNECTIONS", "4"))
+HTTP_POOL_MAXSIZE = int(os.getenv("PLUGGY_HTTP_POOL_MAXSIZE", "20"))
+HTTP_POOL_BLOCK = os.getenv("PLUGGY_HTTP_POOL_BLOCK", "false").lower() == "true"
+HTTP_CONNECT_TIMEOUT = float(os.getenv("PLUGGY_HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("PLUGGY_HTTP_READ_TIMEOUT", "15"))
+HTTP_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+# Client-side rate limits per Pluggy endpoint: (requests per second, burst).
+# Requests over the limit are queued for up to RATE_LIMIT_MAX_WAIT_SECONDS.
+RATE_LIMITS = {
+	"auth": (
+		float(os.getenv("PLUGGY_AUTH_RATE_PER_SECOND", "2")),
+		int(os.getenv("PLUGGY_AUTH_BURST", "5")),
+	),
+	"connect_token": (
+		float(os.getenv("PLUGGY_CONNECT_TOKEN_RATE_PER_SECOND", "10")),
+		int(os.getenv("PLUGGY_CONNECT_TOKEN_BURST", "20")),
+	),
+}
+DEFAULT_RATE_LIMIT = (10.0, 20)
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("PLUGGY_RATE_LIMIT_MAX_WAIT", "30"))
+
+# Retries: 429 is always retried (the request was not processed); transport
+# errors and 502/503/504 only for endpoints that are safe to repeat
+MAX_RETRIES = int(os.getenv("PLUGGY_MAX_RETRIES", "3"))
+RETRY_BACKOFF_BASE_SECONDS = 0.5
+RETRY_BACKOFF_MAX_SECONDS = 8.0
+RETRYABLE_STATUS_CODES = (502, 503, 504)
+IDEMPOTENT_ENDPOINTS = {"auth", "accounts", "transactions"}
+
+# Pagination: pages fetched ahead of the one being consumed
+PAGINATION_MAX_IN_FLIGHT = int(os.getenv("PLUGGY_PAGINATION_MAX_IN_FLIGHT", "2"))
+
+# Circuit breaker per endpoint: opens when the failure rate (transport errors
+# and 5xx) over the window reaches the threshold, fails fast while open and
+# lets a single probe through after the cool-down
+BREAKER_FAILURE_RATE = float(os.getenv("PLUGGY_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_WINDOW_SECONDS = float(os.getenv("PLUGGY_BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("PLUGGY_BREAKER_MIN_CALLS", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("PLUGGY_BREAKER_COOLDOWN_SECONDS", "30"))
+
 # =========================================================
 # ENVIRONMENT VALIDATION
 # =========================================================
@@ -75,6 +132,466 @@ def get_pluggy_config():
 	"""
 	return validate_environment()
 
+# =========================================================
+# ERROR MAPPING (shared by PluggyClient and AsyncPluggyClient)
+# =========================================================
+SERVICE_UNAVAILABLE_MESSAGE = "Serviço Pluggy temporariamente indisponível. Tente novamente em alguns minutos."
+
+AUTH_STATUS_ERRORS = {
+	401: ("Pluggy authentication failed: Invalid credentials",
+		  "Credenciais Pluggy inválidas. Verifique a configuração."),
+	403: ("Pluggy authentication failed: Access forbidden",
+		  "Acesso negado pelo serviço Pluggy. Verifique suas permissões."),
+	429: ("Pluggy authentication failed: Rate limit exceeded",
+		  "Muitas tentativas de conexão. Aguarde alguns minutos e tente novamente."),
+}
+
+CONNECT_TOKEN_STATUS_ERRORS = {
+	401: ("Connect token generation failed: Invalid API key",
+		  "Erro de autorização ao gerar token. Tente novamente."),
+	400: ("Connect token generation failed: Bad request",
+		  "Dados inválidos para geração do token. Verifique as informações."),
+	429: ("Connect token generation failed: Rate limit exceeded",
+		  "Muitas tentativas de geração de token. Aguarde alguns minutos."),
+}
+
+DATA_STATUS_ERRORS = {
+	401: ("Pluggy data request failed: Invalid API key",
+		  "Erro de autorização ao consultar dados da Pluggy. Tente novamente."),
+	404: ("Pluggy data request failed: Not found",
+		  "Conexão bancária não encontrada na Pluggy."),
+	429: ("Pluggy data request failed: Rate limit exceeded",
+		  "Muitas consultas à Pluggy. Aguarde alguns minutos."),
+}
+
+ENDPOINT_STATUS_ERRORS = {
+	"auth": AUTH_STATUS_ERRORS,
+	"connect_token": CONNECT_TOKEN_STATUS_ERRORS,
+	"accounts": DATA_STATUS_ERRORS,
+	"transactions": DATA_STATUS_ERRORS,
+}
+
+UNEXPECTED_ERROR_MESSAGES = {
+	"authenticate": "Erro interno ao autenticar com Pluggy. Tente novamente ou contate o suporte.",
+	"create_connect_token": "Erro interno ao gerar token de conexão. Tente novamente ou contate o suporte.",
+	"fetch_data": "Erro interno ao consultar dados da Pluggy. Tente novamente ou contate o suporte.",
+}
+
+
+def status_error_message(status_code, text, status_errors, fallback_message):
+	"""
+	Maps a non-200 Pluggy status code to a user-friendly message.
+	Returns None for 200.
+    
+	Args:
+		status_code (int): HTTP status code
+		text (str): Response body (logged only)
+		status_errors (dict): status -> (log message, user message)
+		fallback_message (str): User message for unmapped codes, may use {status_code}
+	"""
+	if status_code == 200:
+		return None
+	if status_code in status_errors:
+		log_message, user_message = status_errors[status_code]
+		logger.error(f"{log_message} - {text}" if status_code == 400 else log_message)
+		return user_message
+	if status_code >= 500:
+		logger.error(f"Pluggy server error: {status_code}")
+		return SERVICE_UNAVAILABLE_MESSAGE
+	logger.error(f"Pluggy request failed with status {status_code}: {text}")
+	return fallback_message.format(status_code=status_code)
+
+
+def _parse_json_field(read_json, field):
+	try:
+		return read_json().get(field)
+	except ValueError as json_error:
+		logger.error(f"Invalid JSON response from Pluggy: {json_error}")
+		raise ValueError("Resposta inválida do serviço Pluggy. Tente novamente.")
+
+
+def parse_auth_response(status_code, text, read_json):
+	"""
+	Validates a /auth response and returns the API key.
+	read_json is a callable returning the decoded body.
+    
+	Raises:
+		ValueError: User-friendly error message
+	"""
+	message = status_error_message(
+		status_code, text, AUTH_STATUS_ERRORS, "Erro de autenticação Pluggy (código {status_code})"
+	)
+	if message:
+		raise ValueError(message)
+	api_key = _parse_json_field(read_json, "apiKey")
+	if not api_key:
+		logger.error("No API key received from Pluggy authentication")
+		raise ValueError("Falha na autenticação: API key não recebida")
+	return api_key
+
+
+def parse_connect_token_response(status_code, text, read_json):
+	"""
+	Validates a /connect_token response and returns the access token.
+	read_json is a callable returning the decoded body.
+    
+	Raises:
+		ValueError: User-friendly error message
+	"""
+	message = status_error_message(
+		status_code, text, CONNECT_TOKEN_STATUS_ERRORS, "Erro ao gerar token de conexão (código {status_code})"
+	)
+	if message:
+		raise ValueError(message)
+	access_token = _parse_json_field(read_json, "accessToken")
+	if not access_token:
+		logger.error("No access token received from Pluggy")
+		raise ValueError("Falha na geração do token: token não recebido")
+	return access_token
+
+
+def request_error_to_value_error(error, operation):
+	"""
+	Converts a transport-level exception into the user-facing ValueError.
+	Understands requests and asyncio timeout/connection errors.
+    
+	Args:
+		error (Exception): Transport exception
+		operation (str): Operation name used in logs
+	"""
+	if isinstance(error, (requests.exceptions.Timeout, TimeoutError)):
+		logger.error(f"Timeout error in {operation}: {error}")
+		return ValueError("Timeout ao conectar com o serviço Pluggy. Verifique sua conexão e tente novamente.")
+	if isinstance(error, (requests.exceptions.ConnectionError, ConnectionError)):
+		logger.error(f"Connection error in {operation}: {error}")
+		return ValueError("Erro de conexão com o serviço Pluggy. Verifique sua internet e tente novamente.")
+	if isinstance(error, requests.exceptions.HTTPError):
+		logger.error(f"HTTP error in {operation}: {error}")
+		return ValueError("Erro HTTP ao comunicar com o serviço Pluggy. Tente novamente em alguns minutos.")
+	logger.error(f"Request error in {operation}: {error}")
+	return ValueError("Erro ao comunicar com o serviço Pluggy. Tente novamente em alguns minutos.")
+
+# =========================================================
+# HTTP SESSION POOL
+# =========================================================
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+	"""
+	Returns the process-wide requests.Session used for Pluggy calls.
+	Created lazily; connections are kept alive and reused across
+	Streamlit sessions instead of paying TCP + TLS setup per request.
+    
+	HTTP_POOL_MAXSIZE bounds the kept-alive connections per host and
+	HTTP_POOL_CONNECTIONS the number of hosts pooled; with
+	PLUGGY_HTTP_POOL_BLOCK=true callers wait for a free connection instead
+	of opening extra, non-pooled ones.
+	"""
+	global _http_session
+	if _http_session is None:
+		with _http_session_lock:
+			if _http_session is None:
+				session = requests.Session()
+				adapter = HTTPAdapter(
+					pool_connections=HTTP_POOL_CONNECTIONS,
+					pool_maxsize=HTTP_POOL_MAXSIZE,
+					pool_block=HTTP_POOL_BLOCK,
+				)
+				session.mount("https://", adapter)
+				session.mount("http://", adapter)
+				session.headers.update({"Connection": "keep-alive"})
+				_http_session = session
+				logger.info(
+					f"Pluggy HTTP pool created (maxsize={HTTP_POOL_MAXSIZE}, "
+					f"connections={HTTP_POOL_CONNECTIONS}, block={HTTP_POOL_BLOCK})"
+				)
+	return _http_session
+
+
+def close_http_session():
+	"""Closes the shared HTTP session and its pooled connections."""
+	global _http_session
+	with _http_session_lock:
+		if _http_session is not None:
+			_http_session.close()
+			_http_session = None
+
+# =========================================================
+# API KEY CACHE
+# =========================================================
+def token_expires_in(token, default_ttl=API_KEY_TTL_SECONDS):
+	"""
+	Returns the remaining lifetime (seconds) of a Pluggy API key or connect
+	token. Both are JWTs; the "exp" claim is used when readable, otherwise
+	default_ttl is assumed.
+	"""
+	try:
+		payload = token.split(".")[1]
+		payload += "=" * (-len(payload) % 4)
+		exp = json.loads(base64.urlsafe_b64decode(payload)).get("exp")
+		if exp:
+			return float(exp) - time.time()
+	except Exception:
+		pass
+	return default_ttl
+
+
+class _ApiKeyCache:
+	"""
+	Thread-safe, process-wide cache of Pluggy API keys keyed by
+	(base_url, client_id), with hit/miss/refresh counters.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._entries = {}
+		self._refreshing = set()
+		self._stats = self._empty_stats()
+
+	@staticmethod
+	def _empty_stats():
+		return {
+			"hits": 0,
+			"misses": 0,
+			"refreshes": 0,
+			"refresh_failures": 0,
+			"invalidations": 0,
+		}
+
+	def get(self, key, on_refresh=None):
+		"""
+		Returns the cached API key, or None when missing or about to expire.
+		Inside the refresh window on_refresh() is started in a daemon
+		thread (at most one per cache key) while the current key is served.
+		"""
+		now = time.monotonic()
+		with self._lock:
+			entry = self._entries.get(key)
+			if not entry or now >= entry["expires_at"] - API_KEY_EXPIRY_MARGIN_SECONDS:
+				self._stats["misses"] += 1
+				return None
+			self._stats["hits"] += 1
+			start_refresh = (
+				on_refresh is not None
+				and now >= entry["expires_at"] - API_KEY_REFRESH_AHEAD_SECONDS
+				and key not in self._refreshing
+			)
+			if start_refresh:
+				self._refreshing.add(key)
+			api_key = entry["api_key"]
+
+		if start_refresh:
+			threading.Thread(
+				target=self._run_refresh, args=(key, on_refresh), daemon=True
+			).start()
+		return api_key
+
+	def peek(self, key):
+		"""Returns the usable cached API key without touching the counters."""
+		with self._lock:
+			entry = self._entries.get(key)
+			if not entry or time.monotonic() >= entry["expires_at"] - API_KEY_EXPIRY_MARGIN_SECONDS:
+				return None
+			return entry["api_key"]
+
+	def put(self, key, api_key, expires_in=None):
+		if api_key and expires_in is None:
+			expires_in = token_expires_in(api_key)
+		with self._lock:
+			if not api_key:
+				self._entries.pop(key, None)
+			else:
+				self._entries[key] = {
+					"api_key": api_key,
+					"expires_at": time.monotonic() + expires_in,
+				}
+
+	def invalidate(self, key, api_key=None):
+		"""Drops the cached key (only if it is still api_key, when given)."""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry and (api_key is None or entry["api_key"] == api_key):
+				del self._entries[key]
+				self._stats["invalidations"] += 1
+
+	def stats(self):
+		with self._lock:
+			stats = dict(self._stats)
+			stats["cached_keys"] = len(self._entries)
+			return stats
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self._refreshing.clear()
+			self._stats = self._empty_stats()
+
+	def _run_refresh(self, key, on_refresh):
+		try:
+			on_refresh()
+			with self._lock:
+				self._stats["refreshes"] += 1
+		except Exception as refresh_error:
+			logger.warning(f"Background Pluggy API key refresh failed: {refresh_error}")
+			with self._lock:
+				self._stats["refresh_failures"] += 1
+		finally:
+			with self._lock:
+				self._refreshing.discard(key)
+
+
+class _SingleFlight:
+	"""
+	Runs at most one call per key at a time. Callers arriving while a call
+	is in flight wait for it and share its result (or its exception).
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._calls = {}
+		self.coalesced = 0
+
+	def do(self, key, fn):
+		with self._lock:
+			call = self._calls.get(key)
+			leader = call is None
+			if leader:
+				call = {"done": threading.Event(), "result": None, "error": None}
+				self._calls[key] = call
+			else:
+				self.coalesced += 1
+
+		if not leader:
+			call["done"].wait()
+			if call["error"] is not None:
+				raise call["error"]
+			return call["result"]
+
+		try:
+			call["result"] = fn()
+			return call["result"]
+		except Exception as error:
+			call["error"] = error
+			raise
+		finally:
+			with self._lock:
+				self._calls.pop(key, None)
+			call["done"].set()
+
+	def clear(self):
+		with self._lock:
+			self.coalesced = 0
+
+# =========================================================
+# RETRY POLICY
+# =========================================================
+class RequestAttempts:
+	"""
+	Retry policy of one Pluggy request, shared by PluggyClient and
+	AsyncPluggyClient so both transports make the same decisions.
+
+	It holds the endpoint's circuit breaker and rate limiter, decides
+	whether an outcome is returned or retried and after which delay, and
+	counts the retries. The transport only acquires the limiter, sends the
+	request and waits the returned delay (time.sleep or asyncio.sleep).
+	"""
+
+	def __init__(self, endpoint):
+		self.endpoint = endpoint
+		self.limiter = PluggyClient._rate_limiter(endpoint)
+		self.breaker = PluggyClient._circuit_breaker(endpoint)
+		self.attempt = 0
+		self.idempotent = endpoint in IDEMPOTENT_ENDPOINTS
+
+	def admit(self):
+		"""
+		Checks the circuit breaker before an attempt.
+
+		Raises:
+			ValueError: Service unavailable message while the breaker is open
+		"""
+		if not self.breaker.allow_request():
+			logger.error(f"Pluggy {self.endpoint} circuit breaker is open, failing fast")
+			raise ValueError(SERVICE_UNAVAILABLE_MESSAGE)
+
+	def acquired(self, acquired):
+		"""
+		Takes the result of the transport's limiter acquire.
+
+		Raises:
+			ValueError: Rate limit message when the queue wait exceeded
+						RATE_LIMIT_MAX_WAIT_SECONDS
+		"""
+		if not acquired:
+			self.breaker.release()
+			logger.error(f"Pluggy {self.endpoint} rate limiter queue wait exceeded {RATE_LIMIT_MAX_WAIT_SECONDS}s")
+			status_errors = ENDPOINT_STATUS_ERRORS.get(self.endpoint, AUTH_STATUS_ERRORS)
+			raise ValueError(status_errors[429][1])
+
+	def abandon(self):
+		"""Gives back an admitted attempt that never got an outcome (cancelled)."""
+		self.breaker.release()
+
+	def failed(self):
+		"""Records an unexpected error (not retried)."""
+		self.breaker.record_failure()
+
+	def transport_error(self, error):
+		"""
+		Records a timeout or connection error.
+
+		Returns:
+			float: Seconds to wait before retrying, or None to raise the error
+		"""
+		self.breaker.record_failure()
+		if not (self._can_retry() and self.idempotent):
+			return None
+		delay = self._backoff()
+		logger.warning(f"Pluggy {self.endpoint} transport error ({error}), retrying in {delay:.2f}s")
+		return self._retry(delay)
+
+	def response(self, response):
+		"""
+		Records a response. A 429 pauses the shared limiter for Retry-After
+		(or a jittered backoff) so every caller slows down, and the request
+		is queued again; 502/503/504 are retried only for IDEMPOTENT_ENDPOINTS.
+
+		Returns:
+			float: Seconds to wait before retrying, or None to return the response
+		"""
+		status_code = response.status_code
+		if status_code >= 500:
+			self.breaker.record_failure()
+		else:
+			self.breaker.record_success()
+
+		if status_code == 429 and self._can_retry():
+			delay = parse_retry_after(response.headers.get("Retry-After"))
+			if delay is None:
+				delay = self._backoff()
+			logger.warning(f"Pluggy {self.endpoint} returned 429, queueing retry in {delay:.2f}s")
+			self.limiter.pause(delay)
+			# The limiter holds the wait; the retry queues for a token right away
+			return self._retry(0.0)
+		if status_code in RETRYABLE_STATUS_CODES and self._can_retry() and self.idempotent:
+			delay = self._backoff()
+			logger.warning(f"Pluggy {self.endpoint} returned {status_code}, retrying in {delay:.2f}s")
+			return self._retry(delay)
+		return None
+
+	def _can_retry(self):
+		return self.attempt < MAX_RETRIES
+
+	def _backoff(self):
+		return backoff_delay(self.attempt, RETRY_BACKOFF_BASE_SECONDS, RETRY_BACKOFF_MAX_SECONDS)
+
+	def _retry(self, delay):
+		self.attempt += 1
+		PluggyClient._count_retry(self.endpoint)
+		return delay
+
 # =========================================================
 # PLUGGY API CLIENT
 # =========================================================
@@ -82,15 +599,27 @@ class PluggyClient:
 	"""
 	Client for interacting with Pluggy API.
 	Handles authentication and connect token generation.
+
+	API keys are shared by every instance in the process through a
+	class-level cache, so short-lived clients don't re-authenticate.
 	"""
+
+	_api_key_cache = _ApiKeyCache()
+	_auth_flight = _SingleFlight()
+	_rate_limiters = {}
+	_retry_counts = {}
+	_registry_lock = threading.Lock()
+	_circuit_breakers = {}
     
-	def __init__(self, config=None):
+	def __init__(self, config=None, session=None):
 		"""
 		Initialize PluggyClient with configuration.
         
 		Args:
 			config (dict, optional): Configuration dict with client_id, client_secret, base_url
 								   If None, will validate environment automatically
+			session (requests.Session, optional): HTTP session to use
+								   If None, the shared pooled session is used
 		"""
 		if config is None:
 			config = validate_environment()
@@ -98,7 +627,150 @@ class PluggyClient:
 		self.client_id = config["client_id"]
 		self.client_secret = config["client_secret"]
 		self.base_url = config["base_url"]
-		self._api_key = None
+		self._cache_key = (self.base_url, self.client_id)
+		self._session = session or get_http_session()
+
+	@property
+	def _api_key(self):
+		"""Current API key for these credentials (shared process-wide)."""
+		return self._api_key_cache.peek(self._cache_key)
+
+	@_api_key.setter
+	def _api_key(self, api_key):
+		self._api_key_cache.put(self._cache_key, api_key)
+
+	@classmethod
+	def api_key_cache_stats(cls):
+		"""
+		Returns API key cache counters for monitoring.
+        
+		Returns:
+			dict: hits, misses, refreshes, refresh_failures, invalidations,
+				  cached_keys, coalesced_auth_waits
+		"""
+		stats = cls._api_key_cache.stats()
+		stats["coalesced_auth_waits"] = cls._auth_flight.coalesced
+		return stats
+
+	@classmethod
+	def reset_api_key_cache(cls):
+		"""Drops every cached API key and resets the counters."""
+		cls._api_key_cache.clear()
+		cls._auth_flight.clear()
+
+	@classmethod
+	def _rate_limiter(cls, endpoint):
+		with cls._registry_lock:
+			bucket = cls._rate_limiters.get(endpoint)
+			if bucket is None:
+				rate, burst = RATE_LIMITS.get(endpoint, DEFAULT_RATE_LIMIT)
+				bucket = TokenBucket(endpoint, rate, burst)
+				cls._rate_limiters[endpoint] = bucket
+			return bucket
+
+	@classmethod
+	def configure_rate_limit(cls, endpoint, rate, burst):
+		"""
+		Replaces the process-wide rate limit of an endpoint.
+        
+		Args:
+			endpoint (str): Endpoint name, e.g. "auth" or "connect_token"
+			rate (float): Requests per second
+			burst (int): Requests allowed at once before queueing
+		"""
+		with cls._registry_lock:
+			cls._rate_limiters[endpoint] = TokenBucket(endpoint, rate, burst)
+
+	@classmethod
+	def rate_limit_stats(cls):
+		"""
+		Returns rate limiter metrics per endpoint for monitoring.
+        
+		Returns:
+			dict: endpoint -> queue depth, wait-time histogram, pauses and retries
+		"""
+		with cls._registry_lock:
+			buckets = dict(cls._rate_limiters)
+			retries = dict(cls._retry_counts)
+		stats = {}
+		for endpoint, bucket in buckets.items():
+			stats[endpoint] = bucket.stats()
+			stats[endpoint]["retries"] = retries.get(endpoint, 0)
+		return stats
+
+	@classmethod
+	def _count_retry(cls, endpoint):
+		with cls._registry_lock:
+			cls._retry_counts[endpoint] = cls._retry_counts.get(endpoint, 0) + 1
+
+	@classmethod
+	def reset_rate_limiters(cls):
+		"""Drops every rate limiter (recreated with the configured limits on next use)."""
+		with cls._registry_lock:
+			cls._rate_limiters.clear()
+			cls._retry_counts.clear()
+
+	@classmethod
+	def _circuit_breaker(cls, endpoint):
+		with cls._registry_lock:
+			breaker = cls._circuit_breakers.get(endpoint)
+			if breaker is None:
+				breaker = CircuitBreaker(
+					endpoint,
+					failure_rate_threshold=BREAKER_FAILURE_RATE,
+					window_seconds=BREAKER_WINDOW_SECONDS,
+					min_calls=BREAKER_MIN_CALLS,
+					cooldown_seconds=BREAKER_COOLDOWN_SECONDS,
+				)
+				cls._circuit_breakers[endpoint] = breaker
+			return breaker
+
+	@classmethod
+	def circuit_breaker_stats(cls):
+		"""
+		Returns circuit breaker state and transition counts per endpoint.
+        
+		Returns:
+			dict: endpoint -> state, seconds_in_state, window counts, rejected, transitions
+		"""
+		with cls._registry_lock:
+			breakers = dict(cls._circuit_breakers)
+		return {endpoint: breaker.stats() for endpoint, breaker in breakers.items()}
+
+	@classmethod
+	def reset_circuit_breakers(cls):
+		"""Drops every circuit breaker (recreated closed on next use)."""
+		with cls._registry_lock:
+			cls._circuit_breakers.clear()
+
+	def get_api_key(self):
+		"""
+		Returns a valid API key, authenticating only on cache miss.
+		Keys close to expiry keep being served while refreshed in background.
+		Concurrent misses share a single in-flight authentication.
+        
+		Raises:
+			ValueError: User-friendly error messages from authenticate()
+		"""
+		api_key = self._api_key_cache.get(self._cache_key, on_refresh=self.reauthenticate)
+		if api_key:
+			return api_key
+		return self._auth_flight.do(self._cache_key, self._cached_or_authenticate)
+
+	def reauthenticate(self):
+		"""
+		Forces a new API key, joining an authentication already in flight
+		for the same credentials instead of starting another one.
+		"""
+		return self._auth_flight.do(self._cache_key, self.authenticate)
+
+	def _cached_or_authenticate(self):
+		# Another flight may have stored a key between our miss and this call
+		return self._api_key or self.authenticate()
+
+	def invalidate_api_key(self, api_key=None):
+		"""Removes the cached API key (e.g. after a 401 from Pluggy)."""
+		self._api_key_cache.invalidate(self._cache_key, api_key)
     
 	def authenticate(self):
 		"""
@@ -120,61 +792,21 @@ class PluggyClient:
 			}
             
 			logger.debug(f"Authenticating with Pluggy API at {auth_url}")
-			auth_resp = requests.post(
+			auth_resp = self._post(
+				"auth",
 				auth_url,
 				headers={"accept": "application/json", "content-type": "application/json"},
-				json=auth_payload,
-				timeout=15
+				json=auth_payload
 			)
 
-			# Handle authentication errors with specific logging
-			if auth_resp.status_code == 401:
-				logger.error("Pluggy authentication failed: Invalid credentials")
-				raise ValueError("Credenciais Pluggy inválidas. Verifique a configuração.")
-			elif auth_resp.status_code == 403:
-				logger.error("Pluggy authentication failed: Access forbidden")
-				raise ValueError("Acesso negado pelo serviço Pluggy. Verifique suas permissões.")
-			elif auth_resp.status_code == 429:
-				logger.error("Pluggy authentication failed: Rate limit exceeded")
-				raise ValueError("Muitas tentativas de conexão. Aguarde alguns minutos e tente novamente.")
-			elif auth_resp.status_code >= 500:
-				logger.error(f"Pluggy server error during auth: {auth_resp.status_code}")
-				raise ValueError("Serviço Pluggy temporariamente indisponível. Tente novamente em alguns minutos.")
-			elif auth_resp.status_code != 200:
-				logger.error(f"Pluggy authentication failed with status {auth_resp.status_code}: {auth_resp.text}")
-				raise ValueError(f"Erro de autenticação Pluggy (código {auth_resp.status_code})")
-
-			# Parse authentication response
-			try:
-				auth_data = auth_resp.json()
-				api_key = auth_data.get("apiKey")
-			except ValueError as json_error:
-				logger.error(f"Invalid JSON response from Pluggy auth: {json_error}")
-				raise ValueError("Resposta inválida do serviço Pluggy. Tente novamente.")
-            
-			if not api_key:
-				logger.error("No API key received from Pluggy authentication")
-				raise ValueError("Falha na autenticação: API key não recebida")
+			api_key = parse_auth_response(auth_resp.status_code, auth_resp.text, auth_resp.json)
 
 			logger.info("Pluggy authentication successful")
 			self._api_key = api_key
 			return api_key
         
-		except requests.exceptions.Timeout as timeout_error:
-			logger.error(f"Timeout error in authenticate: {timeout_error}")
-			raise ValueError("Timeout ao conectar com o serviço Pluggy. Verifique sua conexão e tente novamente.")
-        
-		except requests.exceptions.ConnectionError as conn_error:
-			logger.error(f"Connection error in authenticate: {conn_error}")
-			raise ValueError("Erro de conexão com o serviço Pluggy. Verifique sua internet e tente novamente.")
-        
-		except requests.exceptions.HTTPError as http_error:
-			logger.error(f"HTTP error in authenticate: {http_error}")
-			raise ValueError("Erro HTTP ao comunicar com o serviço Pluggy. Tente novamente em alguns minutos.")
-        
 		except requests.exceptions.RequestException as req_error:
-			logger.error(f"Request error in authenticate: {req_error}")
-			raise ValueError("Erro ao comunicar com o serviço Pluggy. Tente novamente em alguns minutos.")
+			raise request_error_to_value_error(req_error, "authenticate")
         
 		except ValueError:
 			# Re-raise ValueError exceptions (these are user-friendly messages)
@@ -183,7 +815,7 @@ class PluggyClient:
 		except Exception as unexpected_error:
 			# Log the actual error for debugging but show user-friendly message
 			logger.error(f"Unexpected error in authenticate: {unexpected_error}", exc_info=True)
-			raise ValueError("Erro interno ao autenticar com Pluggy. Tente novamente ou contate o suporte.")
+			raise ValueError(UNEXPECTED_ERROR_MESSAGES["authenticate"])
     
 	def create_connect_token(self, client_user_id=None):
 		"""
@@ -201,74 +833,30 @@ class PluggyClient:
 		try:
 			logger.info(f"Starting token generation for user: {client_user_id or 'anonymous'}")
             
-			# Ensure we have an API key
-			if not self._api_key:
-				self.authenticate()
+			# Ensure we have an API key (cached process-wide)
+			api_key = self.get_api_key()
             
 			# Generate connect token
-			token_url = f"{self.base_url}/connect_token"
-			token_headers = {
-				"accept": "application/json",
-				"content-type": "application/json",
-				"X-API-KEY": self._api_key
-			}
 			token_payload = {"clientUserId": client_user_id} if client_user_id else {}
+			token_resp = self._post_connect_token(api_key, token_payload)
 
-			logger.debug(f"Generating connect token at {token_url}")
-			token_resp = requests.post(
-				token_url, 
-				headers=token_headers, 
-				json=token_payload, 
-				timeout=15
-			)
-
-			# Handle token generation errors with specific logging
+			# A 401 usually means the cached key was revoked or expired early:
+			# drop it and retry once with a fresh key
 			if token_resp.status_code == 401:
-				logger.error("Connect token generation failed: Invalid API key")
-				raise ValueError("Erro de autorização ao gerar token. Tente novamente.")
-			elif token_resp.status_code == 400:
-				logger.error(f"Connect token generation failed: Bad request - {token_resp.text}")
-				raise ValueError("Dados inválidos para geração do token. Verifique as informações.")
-			elif token_resp.status_code == 429:
-				logger.error("Connect token generation failed: Rate limit exceeded")
-				raise ValueError("Muitas tentativas de geração de token. Aguarde alguns minutos.")
-			elif token_resp.status_code >= 500:
-				logger.error(f"Pluggy server error during token generation: {token_resp.status_code}")
-				raise ValueError("Serviço Pluggy temporariamente indisponível. Tente novamente em alguns minutos.")
-			elif token_resp.status_code != 200:
-				logger.error(f"Connect token generation failed with status {token_resp.status_code}: {token_resp.text}")
-				raise ValueError(f"Erro ao gerar token de conexão (código {token_resp.status_code})")
-
-			# Parse token response
-			try:
-				token_data = token_resp.json()
-				access_token = token_data.get("accessToken")
-			except ValueError as json_error:
-				logger.error(f"Invalid JSON response from connect token endpoint: {json_error}")
-				raise ValueError("Resposta inválida do serviço Pluggy. Tente novamente.")
-            
-			if not access_token:
-				logger.error("No access token received from Pluggy")
-				raise ValueError("Falha na geração do token: token não recebido")
+				logger.warning("Connect token rejected with 401, re-authenticating once")
+				self.invalidate_api_key(api_key)
+				api_key = self.reauthenticate()
+				token_resp = self._post_connect_token(api_key, token_payload)
+
+			access_token = parse_connect_token_response(
+				token_resp.status_code, token_resp.text, token_resp.json
+			)
 
 			logger.info(f"Connect token generated successfully for user: {client_user_id or 'anonymous'}")
 			return access_token
         
-		except requests.exceptions.Timeout as timeout_error:
-			logger.error(f"Timeout error in create_connect_token: {timeout_error}")
-			raise ValueError("Timeout ao conectar com o serviço Pluggy. Verifique sua conexão e tente novamente.")
-        
-		except requests.exceptions.ConnectionError as conn_error:
-			logger.error(f"Connection error in create_connect_token: {conn_error}")
-			raise ValueError("Erro de conexão com o serviço Pluggy. Verifique sua internet e tente novamente.")
-        
-		except requests.exceptions.HTTPError as http_error:
-			logger.error(f"HTTP error in create_connect_token: {http_error}")
-			raise ValueError("Erro HTTP ao comunicar com o serviço Pluggy. Tente novamente em alguns minutos.")
-        
 		except requests.exceptions.RequestException as req_error:
-			logger.error(f"Request error in create_connect_token: {req_error}")
-			raise ValueError("Erro ao comunicar com o serviço Pluggy. Tente novamente em alguns minutos.")
+			raise request_error_to_value_error(req_error, "create_connect_token")
         
 		except ValueError:
 			# Re-raise ValueError exceptions (these are user-friendly messages)
@@ -277,7 +865,205 @@ class PluggyClient:
 		except Exception as unexpected_error:
 			# Log the actual error for debugging but show user-friendly message
 			logger.error(f"Unexpected error in create_connect_token: {unexpected_error}", exc_info=True)
-			raise ValueError("Erro interno ao gerar token de conexão. Tente novamente ou contate o suporte.")
+			raise ValueError(UNEXPECTED_ERROR_MESSAGES["create_connect_token"])
+
+	def _post_connect_token(self, api_key, token_payload):
+		token_url = f"{self.base_url}/connect_token"
+		token_headers = {
+			"accept": "application/json",
+			"content-type": "application/json",
+			"X-API-KEY": api_key
+		}
+
+		logger.debug(f"Generating connect token at {token_url}")
+		return self._post(
+			"connect_token",
+			token_url, 
+			headers=token_headers, 
+			json=token_payload
+		)
+
+	def list_accounts(self, item_id):
+		"""
+		Lists the accounts of a Pluggy item.
+
+		Args:
+			item_id (str): Pluggy item id
+
+		Returns:
+			list: Account objects as returned by Pluggy
+
+		Raises:
+			ValueError: User-friendly error messages for various failure scenarios
+		"""
+		return self._get_data("accounts", "/accounts", {"itemId": item_id}).get("results", [])
+
+	def list_transactions_page(self, account_id, page=1, page_size=500, date_from=None, date_to=None):
+		"""
+		Fetches one page of an account's transactions.
+
+		Args:
+			account_id (str): Pluggy account id
+			page (int): 1-based page number
+			page_size (int): Transactions per page (Pluggy allows up to 500)
+			date_from (str|date, optional): Only transactions on or after this date
+			date_to (str|date, optional): Only transactions on or before this date
+
+		Returns:
+			dict: Pluggy page with "results", "page", "totalPages" and "total"
+
+		Raises:
+			ValueError: User-friendly error messages for various failure scenarios
+		"""
+		params = {"accountId": account_id, "page": page, "pageSize": page_size}
+		if date_from:
+			params["from"] = str(date_from)
+		if date_to:
+			params["to"] = str(date_to)
+		return self._get_data("transactions", "/transactions", params)
+
+	def iter_transaction_pages(self, account_id, page_size=500, date_from=None, date_to=None,
+							   start_page=1, max_in_flight=PAGINATION_MAX_IN_FLIGHT):
+		"""
+		Yields an account's transaction pages in order, fetching up to
+		max_in_flight following pages concurrently while the caller
+		processes the current one. At most max_in_flight + 1 pages are held
+		in memory, whatever the total size.
+
+		Args:
+			account_id (str): Pluggy account id
+			page_size (int): Transactions per page
+			date_from (str|date, optional): Only transactions on or after this date
+			date_to (str|date, optional): Only transactions on or before this date
+			start_page (int): First page to fetch (to resume a paging run)
+			max_in_flight (int): Pages prefetched ahead; 0 disables prefetch
+
+		Yields:
+			dict: Pluggy page with "results", "page", "totalPages" and "total"
+
+		Raises:
+			ValueError: User-friendly error messages, raised when the failed page is reached
+		"""
+		def fetch(page):
+			return self.list_transactions_page(account_id, page, page_size, date_from, date_to)
+
+		first = fetch(start_page)
+		total_pages = first.get("totalPages") or start_page
+		if not first.get("results"):
+			total_pages = start_page
+		next_pages = iter(range(start_page + 1, total_pages + 1))
+		if max_in_flight < 1 or start_page >= total_pages:
+			yield first
+			for page in next_pages:
+				yield fetch(page)
+			return
+
+		executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="pluggy-pages")
+		in_flight = deque()
+		try:
+			# The window is filled before the first page is handed over
+			for page in next_pages:
+				in_flight.append(executor.submit(fetch, page))
+				if len(in_flight) >= max_in_flight:
+					break
+			yield first
+			while in_flight:
+				current = in_flight.popleft().result()
+				next_page = next(next_pages, None)
+				if next_page is not None:
+					in_flight.append(executor.submit(fetch, next_page))
+				yield current
+		finally:
+			# Consumer stopped early or a page failed: drop what is still queued
+			for future in in_flight:
+				future.cancel()
+			executor.shutdown(wait=False, cancel_futures=True)
+
+	def iter_transactions(self, account_id, **kwargs):
+		"""
+		Yields an account's transactions one by one (see iter_transaction_pages).
+
+		Raises:
+			ValueError: User-friendly error messages for various failure scenarios
+		"""
+		for page in self.iter_transaction_pages(account_id, **kwargs):
+			yield from page.get("results") or []
+
+	def _get_data(self, endpoint, path, params):
+		try:
+			api_key = self.get_api_key()
+			response = self._get_with_key(endpoint, path, params, api_key)
+
+			# Same recovery as create_connect_token: the cached key may have been revoked
+			if response.status_code == 401:
+				logger.warning(f"Pluggy {endpoint} rejected with 401, re-authenticating once")
+				self.invalidate_api_key(api_key)
+				api_key = self.reauthenticate()
+				response = self._get_with_key(endpoint, path, params, api_key)
+
+			message = status_error_message(
+				response.status_code, response.text, DATA_STATUS_ERRORS,
+				"Erro ao consultar dados da Pluggy (código {status_code})"
+			)
+			if message:
+				raise ValueError(message)
+			try:
+				return response.json()
+			except ValueError as json_error:
+				logger.error(f"Invalid JSON response from Pluggy: {json_error}")
+				raise ValueError("Resposta inválida do serviço Pluggy. Tente novamente.")
+
+		except requests.exceptions.RequestException as req_error:
+			raise request_error_to_value_error(req_error, f"get_{endpoint}")
+
+		except ValueError:
+			raise
+
+		except Exception as unexpected_error:
+			logger.error(f"Unexpected error fetching Pluggy {endpoint}: {unexpected_error}", exc_info=True)
+			raise ValueError(UNEXPECTED_ERROR_MESSAGES["fetch_data"])
+
+	def _get_with_key(self, endpoint, path, params, api_key):
+		logger.debug(f"Fetching Pluggy {endpoint} {params}")
+		return self._request(
+			"get",
+			endpoint,
+			f"{self.base_url}{path}",
+			headers={"accept": "application/json", "X-API-KEY": api_key},
+			params=params,
+		)
+
+	def _post(self, endpoint, url, **kwargs):
+		return self._request("post", endpoint, url, **kwargs)
+
+	def _request(self, method, endpoint, url, **kwargs):
+		"""
+		Sends a request through the endpoint's circuit breaker and rate
+		limiter, retrying as RequestAttempts decides.
+
+		Raises:
+			ValueError: Service unavailable message while the breaker is open, or
+						rate limit message when the queue wait exceeds
+						RATE_LIMIT_MAX_WAIT_SECONDS
+		"""
+		attempts = RequestAttempts(endpoint)
+		while True:
+			attempts.admit()
+			attempts.acquired(attempts.limiter.acquire(timeout=RATE_LIMIT_MAX_WAIT_SECONDS))
+			try:
+				response = getattr(self._session, method)(url, timeout=HTTP_TIMEOUT, **kwargs)
+			except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as transport_error:
+				delay = attempts.transport_error(transport_error)
+				if delay is None:
+					raise
+			except Exception:
+				attempts.failed()
+				raise
+			else:
+				delay = attempts.response(response)
+				if delay is None:
+					return response
+			time.sleep(delay)
 
 # =========================================================
 # CONVENIENCE FUNCTIONS
@@ -285,7 +1071,8 @@ class PluggyClient:
 def create_connect_token(client_user_id=None):
 	"""
 	Convenience function to create a connect token.
-	Creates a PluggyClient instance and generates a token.
+	Creates a PluggyClient instance and generates a token; the API key
+	is reused from the process-wide cache when available.
     
 	Args:
 		client_user_id (str, optional): User identifier for the token
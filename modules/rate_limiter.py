@@ -0,0 +1,199 @@
+# modules/rate_limiter.py
+"""
+Client-side rate limiting helpers.
+
+TokenBucket is a thread-safe token bucket whose acquire() blocks (queues)
+until a token is available, and which can be paused for every caller at
+once when the server answers 429 with Retry-After. acquire_async() waits
+the same way without blocking the event loop. Queue depth and a
+wait-time histogram are kept for monitoring.
+"""
+
+import time
+import random
+import asyncio
+import threading
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the wait-time histogram buckets
+WAIT_HISTOGRAM_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header (delay in seconds or HTTP date).
+    Returns the delay in seconds, or None when missing/invalid.
+    """
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """Exponential backoff with full jitter for the given retry attempt (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate` tokens/second up to `burst`.
+    """
+
+    def __init__(self, name, rate, burst):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate deve ser positivo e burst pelo menos 1")
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._queue_depth = 0
+        self._max_queue_depth = 0
+        self._acquired = 0
+        self._timeouts = 0
+        self._pauses = 0
+        self._wait_total = 0.0
+        self._histogram = [0] * (len(WAIT_HISTOGRAM_BUCKETS) + 1)
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout=None):
+        """
+        Takes one token, waiting in queue while the bucket is empty or paused.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait; None waits forever
+
+        Returns:
+            bool: True when a token was taken, False on timeout
+        """
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._cond:
+            self._enter_queue()
+            try:
+                while True:
+                    wait = self._take_or_wait(start, deadline)
+                    if isinstance(wait, bool):
+                        return wait
+                    self._cond.wait(wait)
+            finally:
+                self._queue_depth -= 1
+
+    async def acquire_async(self, timeout=None):
+        """
+        Same as acquire() for asyncio callers: the event loop keeps running
+        while this coroutine waits for a token.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait; None waits forever
+
+        Returns:
+            bool: True when a token was taken, False on timeout
+        """
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._cond:
+            self._enter_queue()
+        try:
+            while True:
+                with self._cond:
+                    wait = self._take_or_wait(start, deadline)
+                if isinstance(wait, bool):
+                    return wait
+                await asyncio.sleep(wait)
+        finally:
+            with self._cond:
+                self._queue_depth -= 1
+
+    def _enter_queue(self):
+        self._queue_depth += 1
+        self._max_queue_depth = max(self._max_queue_depth, self._queue_depth)
+
+    def _take_or_wait(self, start, deadline):
+        # Called with the lock held: True when a token was taken, False on
+        # timeout, otherwise the seconds to wait before trying again
+        now = time.monotonic()
+        self._refill(now)
+        if now < self._paused_until:
+            wait = self._paused_until - now
+        elif self._tokens >= 1:
+            self._tokens -= 1
+            self._record_wait(now - start)
+            return True
+        else:
+            wait = (1 - self._tokens) / self.rate
+        if deadline is not None:
+            if now >= deadline:
+                self._timeouts += 1
+                return False
+            wait = min(wait, deadline - now)
+        return wait
+
+    def pause(self, seconds):
+        """Blocks every caller for `seconds` (e.g. server Retry-After)."""
+        with self._cond:
+            self._pauses += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self._cond.notify_all()
+
+    def _record_wait(self, waited):
+        self._acquired += 1
+        self._wait_total += waited
+        for index, upper in enumerate(WAIT_HISTOGRAM_BUCKETS):
+            if waited <= upper:
+                self._histogram[index] += 1
+                return
+        self._histogram[-1] += 1
+
+    def stats(self):
+        """
+        Returns:
+            dict: queue_depth, max_queue_depth, acquired, timeouts, pauses,
+                  avg_wait_seconds and wait_histogram (count per bucket upper bound)
+        """
+        with self._cond:
+            labels = [str(upper) for upper in WAIT_HISTOGRAM_BUCKETS] + ["+Inf"]
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "queue_depth": self._queue_depth,
+                "max_queue_depth": self._max_queue_depth,
+                "acquired": self._acquired,
+                "timeouts": self._timeouts,
+                "pauses": self._pauses,
+                "avg_wait_seconds": self._wait_total / self._acquired if self._acquired else 0.0,
+                "wait_histogram": dict(zip(labels, self._histogram)),
+            }
+
+    def reset(self):
+        """Refills the bucket, clears any pause and resets the counters."""
+        with self._cond:
+            self._tokens = self.burst
+            self._updated = time.monotonic()
+            self._paused_until = 0.0
+            self._reset_stats()
+            self._cond.notify_all()
@@ -0,0 +1,325 @@
+# modules/recurring.py
+"""
+Recurring transaction (subscription, salary, rent...) detection.
+
+A series is a run of posted transactions of one client with the same
+counterparty (normalized description), the same direction (money in or
+out), amounts within RECURRING_AMOUNT_TOLERANCE of each other and dates
+spaced by a regular period (weekly to yearly).
+
+Detection never compares transactions pairwise. Everything is a sort plus
+vectorized passes over the sorted arrays, O(n log n) for n transactions:
+
+1. sort by (client, counterparty, direction, amount) and start a new
+   amount cluster wherever the amount exceeds the cluster's smallest
+   amount by more than the tolerance;
+2. sort by (cluster, date); consecutive differences are the intervals;
+3. per cluster, the median interval picks the period and the share of
+   intervals within the period's tolerance decides whether it recurs.
+
+detect_recurring_for_items() is the batch stage run after a sync
+(SyncScheduler post_sync): it reloads only the clients whose items
+received new or changed transactions and replaces their stored series.
+"""
+
+import io
+import time
+import logging
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from modules.db import get_env, pooled_conn
+from modules.finance_db import RECURRING_COLUMNS, save_recurring
+
+logger = logging.getLogger(__name__)
+
+# History considered (two yearly occurrences fit)
+RECURRING_LOOKBACK_DAYS = int(get_env("RECURRING_LOOKBACK_DAYS", "400"))
+# Relative amount difference still considered "the same" payment
+RECURRING_AMOUNT_TOLERANCE = float(get_env("RECURRING_AMOUNT_TOLERANCE", "0.15"))
+# Share of intervals that must match the period
+RECURRING_MIN_REGULARITY = float(get_env("RECURRING_MIN_REGULARITY", "0.75"))
+
+# name, days, tolerance in days, minimum occurrences. Two occurrences are
+# enough only for yearly series (the lookback holds no more); two purchases
+# of similar amount ~6 months apart are too common to call semiannual
+PERIODS = (
+    ("weekly", 7, 1, 4),
+    ("biweekly", 14, 2, 3),
+    ("monthly", 30, 4, 3),
+    ("quarterly", 91, 8, 3),
+    ("semiannual", 182, 12, 3),
+    ("yearly", 365, 15, 2),
+)
+
+_PERIOD_NAMES = np.array([name for name, _, _, _ in PERIODS] + [None], dtype=object)
+_PERIOD_DAYS = np.array([days for _, days, _, _ in PERIODS])
+_PERIOD_TOLERANCE = np.array([tolerance for _, _, tolerance, _ in PERIODS])
+_PERIOD_MIN_OCCURRENCES = np.array([minimum for _, _, _, minimum in PERIODS])
+
+FRAME_COLUMNS = ("client", "item_id", "account_id", "tx_date", "amount_cents", "description")
+
+# Posted transactions only: a pending one is replaced by its posted version
+TRANSACTIONS_COPY_SQL = """
+COPY (
+    SELECT COALESCE(c.email, a.item_id), a.item_id, t.account_id, t.tx_date, t.amount_cents, t.description
+    FROM financefly_transactions t
+    JOIN financefly_accounts a ON a.id = t.account_id
+    LEFT JOIN financefly_clients c ON c.item_id = a.item_id
+    WHERE t.status = 0 AND t.amount_cents <> 0 AND t.tx_date >= %s AND a.item_id = ANY(%s)
+) TO STDOUT WITH (FORMAT csv)
+"""
+
+# Every item of the clients owning the given items (a client's series can
+# span several banks)
+CLIENT_ITEMS_SQL = """
+SELECT COALESCE(c.email, i.item_id), COALESCE(other.item_id, i.item_id)
+FROM unnest(%s::text[]) AS i(item_id)
+LEFT JOIN financefly_clients c ON c.item_id = i.item_id
+LEFT JOIN financefly_clients other ON other.email = c.email
+"""
+
+
+def normalize_counterparty(descriptions):
+    """
+    Counterparty key from transaction descriptions: upper case, digits and
+    punctuation removed (dates, installment and card numbers vary between
+    occurrences), single spaces.
+
+    Args:
+        descriptions (pandas.Series): Raw descriptions
+
+    Returns:
+        pandas.Series: Normalized keys ("" when nothing is left)
+    """
+    # Descriptions repeat a lot: run the string work once per distinct value
+    codes, uniques = pd.factorize(descriptions.fillna(""))
+    keys = (
+        pd.Series(uniques, dtype="object")
+        .str.upper()
+        .str.replace(r"[\d\W_]+", " ", regex=True)
+        .str.strip()
+        .to_numpy()
+    )
+    return pd.Series(keys[codes] if len(keys) else np.array([], dtype=object), index=descriptions.index)
+
+
+def _runs(*keys):
+    # Start flags of runs of equal consecutive keys in sorted arrays
+    if not len(keys[0]):
+        return np.zeros(0, dtype=bool)
+    new = np.zeros(len(keys[0]), dtype=bool)
+    new[0] = True
+    for key in keys:
+        new[1:] |= key[1:] != key[:-1]
+    return new
+
+
+def _amount_cluster_starts(sorted_magnitude, key_start):
+    # A cluster is anchored at its smallest amount and ends at the first
+    # amount above anchor * (1 + tolerance). Comparing each amount with the
+    # previous one instead would chain any slowly climbing run of amounts
+    # (groceries) into one cluster
+    limit = 1 + RECURRING_AMOUNT_TOLERANCE
+    jump = np.r_[False, sorted_magnitude[1:] > sorted_magnitude[:-1] * limit]
+    starts = key_start | jump
+    # Anchored clusters only split the chained ones: walk the few chained
+    # clusters wider than the tolerance, one searchsorted per anchor
+    first = np.flatnonzero(starts)
+    end = np.r_[first[1:], len(starts)]
+    wide = sorted_magnitude[end - 1] > sorted_magnitude[first] * limit
+    for anchor, stop in zip(first[wide].tolist(), end[wide].tolist()):
+        while True:
+            anchor += int(np.searchsorted(sorted_magnitude[anchor:stop], sorted_magnitude[anchor] * limit, side="right"))
+            if anchor >= stop:
+                break
+            starts[anchor] = True
+    return starts
+
+
+def detect_recurring(frame, today=None):
+    """
+    Finds recurring series in a transaction frame (any number of clients).
+
+    Args:
+        frame (pandas.DataFrame): client, account_id, tx_date, amount_cents
+            and description columns (see FRAME_COLUMNS)
+        today (date, optional): Reference for the active flag
+
+    Returns:
+        pandas.DataFrame: RECURRING_COLUMNS, one row per series, ordered by
+                          client and counterparty. direction is 1 (money in)
+                          or -1 (money out); amount_cents is the median
+                          absolute amount.
+    """
+    today = np.datetime64(today or date.today(), "D")
+    counterparty = normalize_counterparty(frame["description"])
+    usable = (counterparty != "").to_numpy() & (frame["amount_cents"].to_numpy() != 0)
+    frame, counterparty = frame[usable], counterparty[usable]
+    if not len(frame):
+        return _empty_result()
+
+    amount = frame["amount_cents"].to_numpy()
+    direction = np.sign(amount).astype("int8")
+    magnitude = np.abs(amount)
+    day = frame["tx_date"].to_numpy().astype("datetime64[D]").astype("int64")
+    clients, client_names = pd.factorize(frame["client"])
+    counterparties, counterparty_names = pd.factorize(counterparty)
+
+    # 1. Amount clusters within (client, counterparty, direction)
+    order = np.lexsort((magnitude, direction, counterparties, clients))
+    key_start = _runs(clients[order], counterparties[order], direction[order])
+    sorted_magnitude = magnitude[order]
+    cluster_sorted = np.cumsum(_amount_cluster_starts(sorted_magnitude, key_start)) - 1
+    cluster = np.empty(len(order), dtype="int64")
+    cluster[order] = cluster_sorted
+    clusters = int(cluster_sorted[-1]) + 1
+    counts = np.bincount(cluster_sorted, minlength=clusters)
+    amount_starts = np.flatnonzero(np.r_[True, cluster_sorted[1:] != cluster_sorted[:-1]])
+    median_amount = sorted_magnitude[amount_starts + (counts - 1) // 2]
+
+    # 2. Intervals between consecutive dates of each cluster
+    by_date = np.lexsort((day, cluster))
+    cluster_by_date = cluster[by_date]
+    day_by_date = day[by_date]
+    same = cluster_by_date[1:] == cluster_by_date[:-1]
+    intervals = np.diff(day_by_date)[same]
+    interval_cluster = cluster_by_date[1:][same]
+    date_starts = np.flatnonzero(np.r_[True, ~same])
+    date_ends = np.r_[date_starts[1:], len(by_date)] - 1
+
+    # 3. Median interval -> period, share of intervals matching it
+    n_intervals = counts - 1
+    by_interval = np.lexsort((intervals, interval_cluster))
+    interval_starts = np.r_[0, np.cumsum(n_intervals)[:-1]]
+    has_intervals = n_intervals > 0
+    median_interval = np.zeros(clusters, dtype="int64")
+    median_interval[has_intervals] = intervals[by_interval][
+        interval_starts[has_intervals] + (n_intervals[has_intervals] - 1) // 2
+    ]
+    distance = np.abs(median_interval[:, None] - _PERIOD_DAYS[None, :])
+    fits = distance <= _PERIOD_TOLERANCE[None, :]
+    period = np.where(fits.any(axis=1), np.argmax(fits, axis=1), len(PERIODS))
+    known = period < len(PERIODS)
+    period_days = np.r_[_PERIOD_DAYS, 0][period]
+    tolerance = np.r_[_PERIOD_TOLERANCE, 0][period]
+    matching = np.abs(intervals - period_days[interval_cluster]) <= tolerance[interval_cluster]
+    regularity = np.divide(
+        np.bincount(interval_cluster, weights=matching, minlength=clusters),
+        n_intervals,
+        out=np.zeros(clusters),
+        where=has_intervals,
+    )
+    recurring = (
+        known
+        & (counts >= np.r_[_PERIOD_MIN_OCCURRENCES, 0][period])
+        & (regularity >= RECURRING_MIN_REGULARITY)
+    )
+
+    found = np.flatnonzero(recurring)
+    first_day = day_by_date[date_starts][found]
+    last_day = day_by_date[date_ends][found]
+    last_row = by_date[date_ends][found]
+    next_day = last_day + median_interval[found]
+    first_row = order[amount_starts][found]
+    result = pd.DataFrame({
+        "client": np.asarray(client_names)[clients[first_row]],
+        "counterparty": np.asarray(counterparty_names)[counterparties[first_row]],
+        "direction": direction[first_row],
+        "account_id": frame["account_id"].to_numpy()[last_row],
+        "description": frame["description"].to_numpy()[last_row],
+        "period": _PERIOD_NAMES[period[found]],
+        "period_days": median_interval[found],
+        "amount_cents": median_amount[found],
+        "occurrences": counts[found],
+        "regularity": regularity[found],
+        "first_date": first_day.astype("datetime64[D]"),
+        "last_date": last_day.astype("datetime64[D]"),
+        "next_date": next_day.astype("datetime64[D]"),
+        # Still running: the next occurrence isn't overdue
+        "active": next_day + tolerance[found] >= today.astype("int64"),
+    })
+    return result.sort_values(["client", "counterparty", "direction", "amount_cents"], ignore_index=True)
+
+
+def _empty_result():
+    return pd.DataFrame({column: pd.Series(dtype="object") for column in RECURRING_COLUMNS})
+
+
+def recurring_rows(found):
+    """Rows of a detect_recurring() frame as plain Python tuples for save_recurring()."""
+    columns = [
+        found[column].dt.date.tolist() if column.endswith("_date") else found[column].tolist()
+        for column in RECURRING_COLUMNS
+    ]
+    return list(zip(*columns))
+
+
+def load_transactions(item_ids, date_from, conn):
+    """
+    Posted transactions of the given items since date_from, as a frame
+    with FRAME_COLUMNS.
+    """
+    buffer = io.BytesIO()
+    with conn.cursor() as cur:
+        with cur.copy(TRANSACTIONS_COPY_SQL, (date_from, list(item_ids))) as copy:
+            for data in copy:
+                buffer.write(data)
+    if not buffer.tell():
+        return pd.DataFrame({column: pd.Series(dtype="object") for column in FRAME_COLUMNS})
+    buffer.seek(0)
+    return pd.read_csv(
+        buffer,
+        names=list(FRAME_COLUMNS),
+        dtype={"client": "category", "item_id": "category", "account_id": "category",
+               "amount_cents": "int64", "description": "object"},
+        parse_dates=["tx_date"],
+        date_format="%Y-%m-%d",
+        keep_default_na=False,
+        na_values={"description": [""]},
+    )
+
+
+def detect_recurring_for_items(item_ids, today=None, conn=None):
+    """
+    Batch stage after a sync: re-detects the recurring series of the
+    clients owning item_ids (over all of their items) and replaces what is
+    stored for them.
+
+    Args:
+        item_ids (iterable): Items whose transactions changed
+        today (date, optional): Reference date for the lookback and the active flag
+        conn (psycopg.Connection, optional): Connection to use (a pooled one when None)
+
+    Returns:
+        dict: clients, transactions (analyzed), recurring (series stored)
+              and duration_seconds
+    """
+    item_ids = sorted(set(item_ids))
+    if not item_ids:
+        return {"clients": 0, "transactions": 0, "recurring": 0, "duration_seconds": 0.0}
+    if conn is None:
+        with pooled_conn() as pooled:
+            return detect_recurring_for_items(item_ids, today, pooled)
+    start = time.monotonic()
+    today = today or date.today()
+    owners = conn.execute(CLIENT_ITEMS_SQL, (item_ids,)).fetchall()
+    clients = sorted({client for client, _ in owners})
+    frame = load_transactions(
+        {item_id for _, item_id in owners}, today - timedelta(days=RECURRING_LOOKBACK_DAYS), conn
+    )
+    found = detect_recurring(frame, today)
+    save_recurring(clients, recurring_rows(found), conn)
+    stats = {
+        "clients": len(clients),
+        "transactions": len(frame),
+        "recurring": len(found),
+        "duration_seconds": time.monotonic() - start,
+    }
+    logger.info(
+        f"Recurring detection: {stats['recurring']} series for {stats['clients']} clients "
+        f"from {stats['transactions']} transactions in {stats['duration_seconds']:.2f}s"
+    )
+    return stats
@@ -0,0 +1,392 @@
+# modules/sync_scheduler.py
+"""
+Parallel sync of many Pluggy items.
+
+SyncScheduler fans TransactionSyncEngine.sync_item() calls out over a
+worker pool:
+
+- at most max_workers items sync at once (global cap);
+- an item never syncs twice at the same time: in-process through a
+  process-wide running set, across replicas through a Postgres advisory
+  lock held for the duration of the sync;
+- recently connected items (newest created_at) are dispatched first;
+- items are grouped by client (email) and clients are served round-robin,
+  at most max_per_client items each at a time, so a customer with many
+  connections can't starve the others.
+
+Per-item progress (pages and transactions stored so far), queue wait,
+duration and lag since the last successful sync are exposed by metrics().
+The lag comes from financefly_sync_cursors.synced_at, so it counts syncs
+done by any replica or by an earlier process.
+
+After the workers finish, an optional post_sync stage gets the items whose
+sync inserted or changed transactions (sync_all_items() runs recurring
+transaction detection for their clients there).
+
+Run as a worker with `python -m modules.sync_scheduler`: pending migrations
+are applied, then sync_all_items() runs every SYNC_INTERVAL_SECONDS
+(`--once` for a single run).
+"""
+
+import time
+import signal
+import logging
+import argparse
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.db import get_env, get_all_clients, pooled_conn
+from modules.finance_db import load_sync_lag
+from modules.migrations import ensure_schema
+from modules.recurring import detect_recurring_for_items
+from modules.transaction_sync import TransactionSyncEngine
+
+logger = logging.getLogger(__name__)
+
+SYNC_MAX_WORKERS = int(get_env("SYNC_MAX_WORKERS", "4"))
+# Items of the same client syncing at once
+SYNC_MAX_PER_CLIENT = int(get_env("SYNC_MAX_PER_CLIENT", "1"))
+# Worker mode: time between the starts of two runs
+SYNC_INTERVAL_SECONDS = float(get_env("SYNC_INTERVAL_SECONDS", "900"))
+# First key of pg_try_advisory_lock(int, int); the second is hashtext(item_id)
+ITEM_LOCK_NAMESPACE = 0x66667363  # "ffsc"
+
+# Items syncing in this process, shared by every scheduler
+_running_items = set()
+_running_lock = threading.Lock()
+
+
+@contextmanager
+def advisory_item_lock(item_id):
+    """
+    Holds a session advisory lock for item_id on a pooled connection.
+
+    Yields:
+        bool: False when another session (replica) holds the lock
+    """
+    with pooled_conn() as conn:
+        conn.autocommit = True
+        try:
+            acquired = conn.execute(
+                "SELECT pg_try_advisory_lock(%s, hashtext(%s))", (ITEM_LOCK_NAMESPACE, item_id)
+            ).fetchone()[0]
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    conn.execute("SELECT pg_advisory_unlock(%s, hashtext(%s))", (ITEM_LOCK_NAMESPACE, item_id))
+        finally:
+            conn.autocommit = False
+
+
+def _priority_key(item):
+    # Newest created_at first; items without one go last
+    created_at = item.get("created_at")
+    return (created_at is not None, created_at)
+
+
+class SyncScheduler:
+    """
+    Runs item syncs on a bounded worker pool with per-item exclusion,
+    recency priority and round-robin fairness across clients.
+    """
+
+    def __init__(self, engine=None, max_workers=SYNC_MAX_WORKERS, max_per_client=SYNC_MAX_PER_CLIENT,
+                 item_lock=advisory_item_lock, post_sync=None, sync_lag=load_sync_lag):
+        """
+        Args:
+            engine (TransactionSyncEngine, optional): Shared sync engine
+            max_workers (int): Items syncing at once
+            max_per_client (int): Items of one client syncing at once
+            item_lock (callable): item_id -> context manager yielding True
+                when this process may sync the item
+            post_sync (callable, optional): Batch stage called after each
+                run with the item_ids whose transactions changed
+            sync_lag (callable): item_ids -> {item_id: seconds since the
+                last successful sync} (read from the database by default)
+        """
+        if max_workers < 1 or max_per_client < 1:
+            raise ValueError("max_workers e max_per_client devem ser maiores que zero")
+        self.engine = engine or TransactionSyncEngine()
+        self.max_workers = max_workers
+        self.max_per_client = max_per_client
+        self._item_lock = item_lock
+        self._post_sync = post_sync
+        self._sync_lag = sync_lag
+        self._post_sync_result = None
+        self._run_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._ring = deque()
+        self._running = 0
+        self._running_per_client = {}
+        self._records = {}
+        self._started_at = None
+        self._finished_at = None
+
+    def run(self, items=None):
+        """
+        Syncs the given items (every client in financefly_clients when None)
+        and blocks until all of them finished, failed or were skipped.
+
+        Args:
+            items (list, optional): dicts with item_id and optionally email
+                and created_at
+
+        Returns:
+            dict: Summary counters (see summary())
+        """
+        with self._run_lock:
+            self._plan(get_all_clients() if items is None else items)
+            executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="financefly-sync")
+            try:
+                with self._cond:
+                    while True:
+                        self._dispatch(executor)
+                        if not self._running and not self._ring:
+                            break
+                        self._cond.wait()
+            finally:
+                executor.shutdown(wait=True)
+                self._finished_at = time.monotonic()
+            self._run_post_sync()
+            summary = self.summary()
+            logger.info(
+                f"Sync run finished: {summary['done']} done, {summary['failed']} failed, "
+                f"{summary['skipped']} skipped in {summary['seconds']:.2f}s"
+            )
+            return summary
+
+    def changed_items(self):
+        """Items of the current (or last) run that synced and wrote transactions."""
+        with self._cond:
+            return [
+                item_id for item_id, record in self._records.items()
+                if record["status"] == "done" and record.get("written")
+            ]
+
+    def _run_post_sync(self):
+        self._post_sync_result = None
+        changed = self.changed_items()
+        if self._post_sync is None or not changed:
+            return
+        try:
+            self._post_sync_result = self._post_sync(changed)
+        except Exception as stage_error:
+            # The sync itself succeeded; the stage runs again after the next one
+            logger.error(f"Post-sync stage failed for {len(changed)} items: {stage_error}")
+            self._post_sync_result = {"error": str(stage_error)}
+
+    # -----------------------------------------------------
+    # Planning and dispatch
+    # -----------------------------------------------------
+    def _plan(self, items):
+        now = time.time()
+        self._post_sync_result = None
+        with self._cond:
+            self._queues = {}
+            self._ring = deque()
+            self._running_per_client = {}
+            self._records = {}
+            self._started_at = time.monotonic()
+            self._finished_at = None
+            for rank, item in enumerate(sorted(items, key=_priority_key, reverse=True)):
+                item_id = item["item_id"]
+                if item_id in self._records:
+                    continue
+                client = item.get("email") or item_id
+                if client not in self._queues:
+                    # Clients enter the ring in order of their newest item
+                    self._queues[client] = deque()
+                    self._ring.append(client)
+                    self._running_per_client[client] = 0
+                self._queues[client].append(item_id)
+                self._records[item_id] = {
+                    "item_id": item_id,
+                    "client": client,
+                    "priority": rank,
+                    "status": "queued",
+                    "queued_at": now,
+                    "started_at": None,
+                    "finished_at": None,
+                    "wait_seconds": None,
+                    "duration_seconds": None,
+                    "accounts": 0,
+                    "pages": 0,
+                    "transactions": 0,
+                    "written": 0,
+                    "reconciled": 0,
+                    "error": None,
+                }
+
+    def _dispatch(self, executor):
+        # Called with self._cond held
+        while self._running < self.max_workers:
+            picked = self._next_item()
+            if picked is None:
+                return
+            item_id, client = picked
+            self._running += 1
+            self._running_per_client[client] += 1
+            self._records[item_id]["status"] = "running"
+            executor.submit(self._sync, item_id, client)
+
+    def _next_item(self):
+        # One item from the next client in the ring that is under its cap
+        for _ in range(len(self._ring)):
+            client = self._ring[0]
+            self._ring.rotate(-1)
+            if self._running_per_client[client] >= self.max_per_client:
+                continue
+            queue = self._queues[client]
+            item_id = queue.popleft()
+            if not queue:
+                self._ring.remove(client)
+            with _running_lock:
+                if item_id in _running_items:
+                    self._finish(item_id, "skipped", "already syncing in this process")
+                    return self._next_item()
+                _running_items.add(item_id)
+            return item_id, client
+        return None
+
+    # -----------------------------------------------------
+    # Worker
+    # -----------------------------------------------------
+    def _sync(self, item_id, client):
+        record = self._records[item_id]
+        record["started_at"] = time.time()
+        record["wait_seconds"] = record["started_at"] - record["queued_at"]
+        status, error = "done", None
+        try:
+            with self._item_lock(item_id) as acquired:
+                if acquired:
+                    # The engine updates pages/transactions in place as it goes
+                    self.engine.sync_item(item_id, stats=record)
+                else:
+                    status, error = "skipped", "locked by another instance"
+        except Exception as sync_error:
+            logger.error(f"Sync of item {item_id} failed: {sync_error}")
+            status, error = "failed", str(sync_error)
+        finally:
+            with _running_lock:
+                _running_items.discard(item_id)
+            with self._cond:
+                self._running -= 1
+                self._running_per_client[client] -= 1
+                self._finish(item_id, status, error)
+                self._cond.notify_all()
+
+    def _finish(self, item_id, status, error):
+        record = self._records[item_id]
+        record["status"] = status
+        record["error"] = error
+        record["finished_at"] = time.time()
+        if record["started_at"] is not None:
+            record["duration_seconds"] = record["finished_at"] - record["started_at"]
+
+    # -----------------------------------------------------
+    # Metrics
+    # -----------------------------------------------------
+    def metrics(self):
+        """
+        Per-item progress of the current (or last) run.
+
+        Returns:
+            dict: item_id -> status, priority, wait_seconds, duration_seconds,
+                  accounts, pages, transactions, error and lag_seconds
+                  (since the item's last successful sync by any process,
+                  None if never or when it can't be read)
+        """
+        now = time.time()
+        with self._cond:
+            records = {item_id: dict(record) for item_id, record in self._records.items()}
+        lags = {}
+        if records:
+            try:
+                lags = self._sync_lag(list(records))
+            except Exception as lag_error:
+                logger.warning(f"Could not read sync lag: {lag_error}")
+        for item_id, record in records.items():
+            record["lag_seconds"] = lags.get(item_id)
+            if record["status"] == "queued":
+                record["wait_seconds"] = now - record["queued_at"]
+        return records
+
+    def summary(self):
+        """
+        Returns:
+            dict: items, queued, running, done, failed, skipped,
+                  transactions, seconds and post_sync (the stage's result,
+                  None when it did not run) of the current (or last) run
+        """
+        with self._cond:
+            records = list(self._records.values())
+            started_at, finished_at = self._started_at, self._finished_at
+        summary = {"items": len(records), "queued": 0, "running": 0, "done": 0, "failed": 0, "skipped": 0}
+        for record in records:
+            summary[record["status"]] += 1
+        summary["transactions"] = sum(record["transactions"] for record in records)
+        if started_at is None:
+            summary["seconds"] = 0.0
+        else:
+            summary["seconds"] = (finished_at or time.monotonic()) - started_at
+        summary["post_sync"] = self._post_sync_result
+        return summary
+
+
+def sync_all_items():
+    """
+    Convenience wrapper: syncs every client's item with a default
+    scheduler, then re-detects recurring transactions of the clients
+    whose transactions changed.
+    """
+    return SyncScheduler(post_sync=detect_recurring_for_items).run()
+
+
+def run_forever(interval_seconds=SYNC_INTERVAL_SECONDS, stop_event=None, run=sync_all_items):
+    """
+    Calls run() every interval_seconds (start to start) until stop_event is
+    set. A failed run is logged and the next one still happens.
+
+    Args:
+        interval_seconds (float): Time between the starts of two runs
+        stop_event (threading.Event, optional): Stops the loop between runs
+        run (callable): One sync run (sync_all_items() by default)
+    """
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        started = time.monotonic()
+        try:
+            run()
+        except Exception as run_error:
+            logger.error(f"Sync run failed: {run_error}")
+        stop_event.wait(max(0.0, interval_seconds - (time.monotonic() - started)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync every client's Pluggy items")
+    parser.add_argument("--once", action="store_true", help="Run a single sync and exit")
+    parser.add_argument("--interval", type=float, default=SYNC_INTERVAL_SECONDS,
+                        help="Seconds between the starts of two runs")
+    args = parser.parse_args(argv)
+
+    schema = ensure_schema()
+    if not schema["ok"]:
+        logger.error(f"Sync worker not started, schema migration failed: {schema['error']}")
+        return 1
+    if args.once:
+        sync_all_items()
+        return 0
+    stop = threading.Event()
+    # A redeploy sends SIGTERM: the running sync finishes, no new one starts
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    run_forever(args.interval, stop)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(main())
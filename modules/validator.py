@@ -49,8 +49,24 @@ def startup_validation():
             "Algumas variáveis do banco não estão configuradas.\n"
             "O conector pode não conseguir salvar os dados."
         )
+    else:
+        # ------------------------------
+        # ✅ 3. Schema (uma vez por processo; reruns usam o cache)
+        # ------------------------------
+        from modules.migrations import ensure_schema
+
+        schema = ensure_schema()
+        if schema["ok"]:
+            print(f"[VALIDATOR] Schema OK (versão {schema['version']})")
+            # Write-behind: regrava já o spill deixado por um processo anterior
+            from modules.client_writer import start_client_writer
+
+            start_client_writer()
+        else:
+            print(f"[VALIDATOR] ERRO ao inicializar schema: {schema['error']}")
+            st.warning("Não foi possível preparar o banco de dados. O conector pode não conseguir salvar os dados.")
 
     # ------------------------------
-    # ✅ 3. Log final
+    # ✅ 4. Log final
     # ------------------------------
     print("=== STARTUP VALIDATION FINALIZADA ===")
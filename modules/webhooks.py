@@ -0,0 +1,473 @@
+# modules/webhooks.py
+"""
+Receiver for Pluggy webhooks (item/* and transactions/* events).
+
+POST /webhooks/pluggy answers as soon as the event is durable locally:
+it is checked against the recently seen event ids, appended to a local
+event log (JSON lines) and queued. A background worker drains the queue
+in batches into save_webhook_events() and advances the log checkpoint
+after each committed batch; on start, events past the checkpoint are
+replayed, so a crash never loses an acknowledged event. Postgres also
+dedups by event_id, so an event replayed after a crash between commit and
+checkpoint is stored once.
+
+Run standalone with `python -m modules.webhooks`: main() applies pending
+migrations and serves the app with waitress on WEBHOOK_PORT.
+"""
+
+import os
+import hmac
+import json
+import queue
+import atexit
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from flask import Flask, jsonify, request
+
+from modules.db import get_env, save_webhook_events
+from modules.migrations import ensure_schema
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/webhooks/pluggy"
+# Shared secret sent by Pluggy in WEBHOOK_SECRET_HEADER (configured with the webhook)
+WEBHOOK_SECRET = get_env("WEBHOOK_SECRET")
+WEBHOOK_SECRET_HEADER = "X-Webhook-Secret"
+WEBHOOK_PORT = int(get_env("WEBHOOK_PORT", "8080"))
+# waitress worker threads; each request only appends to the log and queues
+WEBHOOK_THREADS = int(get_env("WEBHOOK_THREADS", "8"))
+LOG_PATH = get_env("WEBHOOK_LOG_PATH", os.path.join(".financefly", "webhook_events.log"))
+# fsync every appended event (survives a host crash, not only a process crash)
+LOG_FSYNC = get_env("WEBHOOK_LOG_FSYNC", "1").lower() in ("1", "true", "yes")
+# The log is truncated once fully written and larger than this
+LOG_COMPACT_BYTES = int(get_env("WEBHOOK_LOG_COMPACT_BYTES", str(8 * 1024 * 1024)))
+QUEUE_MAXSIZE = int(get_env("WEBHOOK_QUEUE_SIZE", "10000"))
+BATCH_SIZE = int(get_env("WEBHOOK_BATCH_SIZE", "500"))
+FLUSH_INTERVAL_SECONDS = float(get_env("WEBHOOK_FLUSH_INTERVAL", "0.2"))
+# Wait between attempts while the database is unavailable
+RETRY_SECONDS = float(get_env("WEBHOOK_RETRY_SECONDS", "5"))
+# Recent event ids answered as duplicates without touching the database
+DEDUP_SIZE = int(get_env("WEBHOOK_DEDUP_SIZE", "100000"))
+
+_STOP = object()
+
+
+def parse_event(payload):
+    """
+    Normalizes a Pluggy webhook payload.
+
+    Returns:
+        dict: event_id, event, item_id, client_user_id and payload
+
+    Raises:
+        ValueError: When the payload is not a Pluggy event
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get("event"), str):
+        raise ValueError("Evento de webhook inválido")
+    event_id = payload.get("eventId")
+    if not event_id:
+        # Without an eventId, identical deliveries dedup by content. Not
+        # payload["id"]: in item events it is the item id, shared by
+        # every event of the item
+        event_id = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    item = payload.get("item") if isinstance(payload.get("item"), dict) else {}
+    return {
+        "event_id": str(event_id),
+        "event": payload["event"],
+        "item_id": payload.get("itemId") or item.get("id"),
+        "client_user_id": payload.get("clientUserId") or item.get("clientUserId"),
+        "payload": payload,
+    }
+
+
+class WebhookEventLog:
+    """
+    Append-only JSON-lines log with a checkpoint (byte offset up to which
+    every event is in the database).
+    """
+
+    def __init__(self, path=LOG_PATH, fsync=LOG_FSYNC):
+        self.path = path
+        self.checkpoint_path = path + ".checkpoint"
+        self.fsync = fsync
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "ab")
+        self._repair()
+
+    def _repair(self):
+        # A crash mid-append leaves a partial last line; it was never acknowledged
+        size = self.size()
+        if not size:
+            return
+        with open(self.path, "rb") as log:
+            data = log.read()
+        if not data.endswith(b"\n"):
+            self._file.truncate(data.rfind(b"\n") + 1)
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def append(self, event):
+        """Appends one event; returns the log offset just past it."""
+        self._file.write(json.dumps(event).encode() + b"\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def read(self, start=0):
+        """Yields (event, end_offset) for every complete line from start."""
+        with open(self.path, "rb") as log:
+            log.seek(start)
+            offset = start
+            for line in log:
+                if not line.endswith(b"\n"):
+                    return
+                offset += len(line)
+                try:
+                    yield json.loads(line), offset
+                except ValueError:
+                    logger.warning(f"Skipping corrupt webhook log line at offset {offset - len(line)}")
+
+    def checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as checkpoint:
+                return min(int(checkpoint.read().strip() or 0), self.size())
+        except FileNotFoundError:
+            return 0
+
+    def save_checkpoint(self, offset):
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as checkpoint:
+            checkpoint.write(str(offset))
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def compact(self):
+        """Empties the log; only valid when every event is checkpointed."""
+        self._file.truncate(0)
+        self._file.seek(0)
+        self.save_checkpoint(0)
+
+    def close(self):
+        self._file.close()
+
+
+class WebhookReceiver:
+    """
+    Acknowledges webhook events after logging them locally and writes
+    them to the database in batches from a background worker.
+    """
+
+    def __init__(self, log_path=LOG_PATH, writer=save_webhook_events, batch_size=BATCH_SIZE,
+                 flush_interval_seconds=FLUSH_INTERVAL_SECONDS, retry_seconds=RETRY_SECONDS,
+                 maxsize=QUEUE_MAXSIZE, dedup_size=DEDUP_SIZE, fsync=LOG_FSYNC,
+                 compact_bytes=LOG_COMPACT_BYTES):
+        """
+        Args:
+            log_path (str): Local event log (a .checkpoint file sits next to it)
+            writer (callable): Batch writer taking a list of parsed events
+            batch_size (int): Maximum events per writer call
+            flush_interval_seconds (float): Max wait for a batch to fill
+            retry_seconds (float): Wait between attempts while the writer fails
+            maxsize (int): Queue capacity; beyond it events are refused (503)
+            dedup_size (int): Recent event ids remembered in memory
+            fsync (bool): fsync the log on every event
+            compact_bytes (int): Log size that triggers truncation once written
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size deve ser maior que zero")
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.retry_seconds = retry_seconds
+        self.dedup_size = dedup_size
+        self.compact_bytes = compact_bytes
+        self._writer = writer
+        self._log = WebhookEventLog(log_path, fsync)
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._seen = OrderedDict()
+        # Serializes dedup + log append + enqueue, so queue order is log order
+        self._accept_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._worker = None
+        self._stopped = False
+        self._stats = {
+            "received": 0,
+            "duplicates": 0,
+            "refused": 0,
+            "replayed": 0,
+            "written": 0,
+            "already_stored": 0,
+            "batches": 0,
+            "write_failures": 0,
+        }
+
+    # -----------------------------------------------------
+    # Producer side
+    # -----------------------------------------------------
+    def accept(self, payload):
+        """
+        Logs and queues one webhook payload.
+
+        Returns:
+            str: "accepted", "duplicate" or "busy" (queue full, retry later)
+
+        Raises:
+            ValueError: When the payload is not a Pluggy event
+        """
+        event = parse_event(payload)
+        self.start()
+        with self._accept_lock:
+            if event["event_id"] in self._seen:
+                self._count("duplicates")
+                return "duplicate"
+            if self._stopped or self._queue.full():
+                self._count("refused")
+                return "busy"
+            offset = self._log.append(event)
+            self._remember(event["event_id"])
+            self._queue.put_nowait((event, offset))
+        self._count("received")
+        return "accepted"
+
+    def _remember(self, event_id):
+        self._seen[event_id] = None
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+
+    def start(self):
+        """Replays events not yet written (idempotent) and starts the worker."""
+        if self._worker is not None:
+            return
+        # Replayed events must be queued before any new one (checkpoint order)
+        with self._accept_lock:
+            with self._state_lock:
+                if self._worker is not None or self._stopped:
+                    return
+                self._worker = threading.Thread(target=self._run, name="financefly-webhook-writer", daemon=True)
+                self._worker.start()
+            self._replay()
+
+    def _replay(self):
+        checkpoint = self._log.checkpoint()
+        replayed = 0
+        for event, offset in self._log.read():
+            self._remember(event["event_id"])
+            if offset > checkpoint:
+                # Blocking put: the worker is already draining
+                self._queue.put((event, offset))
+                replayed += 1
+        if replayed:
+            logger.info(f"Replaying {replayed} webhook events from the local log")
+            self._count("replayed", replayed)
+
+    def flush(self, timeout=None):
+        """
+        Blocks until every queued event was written.
+
+        Returns:
+            bool: True when nothing is left to write
+        """
+        if self._worker is not None:
+            if timeout is None:
+                self._queue.join()
+            else:
+                done = threading.Event()
+                threading.Thread(target=lambda: (self._queue.join(), done.set()), daemon=True).start()
+                done.wait(timeout)
+        return self._queue.unfinished_tasks == 0
+
+    def stop(self, timeout=10):
+        """
+        Writes what is queued and stops the worker. Events the database
+        doesn't take within timeout stay in the log for the next start.
+        """
+        with self._state_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            worker = self._worker
+        if worker is not None:
+            try:
+                self._queue.put_nowait((_STOP, None))
+            except queue.Full:
+                # The worker notices _stopped once it drained the queue
+                pass
+            worker.join(timeout)
+            self._stopping.set()
+            worker.join(self.retry_seconds + 1)
+        with self._accept_lock:
+            self._log.close()
+
+    # -----------------------------------------------------
+    # Worker
+    # -----------------------------------------------------
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval_seconds)
+            except queue.Empty:
+                if self._stopped:
+                    return
+                continue
+            batch, stop = self._collect(first)
+            if batch:
+                self._write(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _collect(self, first):
+        if first[0] is _STOP:
+            return [], True
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                entry = self._queue.get(timeout=self.flush_interval_seconds)
+            except queue.Empty:
+                break
+            if entry[0] is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _write(self, batch):
+        events = [event for event, _ in batch]
+        while True:
+            try:
+                inserted = self._writer(events)
+                break
+            except Exception as write_error:
+                self._count("write_failures")
+                logger.warning(f"Webhook batch of {len(events)} events failed, retrying: {write_error}")
+                # Stopping: the events stay in the log and are replayed on the next start
+                if self._stopping.wait(self.retry_seconds):
+                    return
+        offset = batch[-1][1]
+        self._log.save_checkpoint(offset)
+        inserted = len(inserted) if inserted is not None else len(events)
+        self._count("written", inserted)
+        self._count("already_stored", len(events) - inserted)
+        self._count("batches")
+        if offset >= self.compact_bytes:
+            self._compact(offset)
+
+    def _compact(self, offset):
+        # Non-blocking: never wait on producers (a replay holds the lock while the queue is full)
+        if not self._accept_lock.acquire(blocking=False):
+            return
+        try:
+            if self._log.size() == offset:
+                self._log.compact()
+        finally:
+            self._accept_lock.release()
+
+    # -----------------------------------------------------
+    # Metrics
+    # -----------------------------------------------------
+    def _count(self, key, amount=1):
+        with self._state_lock:
+            self._stats[key] += amount
+
+    def stats(self):
+        """
+        Returns:
+            dict: queue_depth and log_bytes plus received, duplicates,
+                  refused, replayed, written, already_stored, batches and
+                  write_failures counters
+        """
+        with self._state_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["log_bytes"] = self._log.size()
+        return stats
+
+
+# =========================================================
+# HTTP APP
+# =========================================================
+def create_app(receiver=None, secret=WEBHOOK_SECRET):
+    """
+    Flask app exposing POST /webhooks/pluggy and GET /health (liveness only).
+
+    Args:
+        receiver (WebhookReceiver, optional): Defaults to the process-wide one
+        secret (str): Required value of WEBHOOK_SECRET_HEADER
+
+    Raises:
+        ValueError: Without a secret; the public endpoint would let anyone
+            record items
+    """
+    if not secret:
+        raise ValueError("WEBHOOK_SECRET não configurado: o receptor de webhooks não pode iniciar sem ele")
+    receiver = receiver or get_webhook_receiver()
+    receiver.start()
+    app = Flask(__name__)
+
+    @app.post(WEBHOOK_PATH)
+    def pluggy_webhook():
+        if not hmac.compare_digest(request.headers.get(WEBHOOK_SECRET_HEADER, ""), secret):
+            return jsonify(error="Não autorizado"), 401
+        try:
+            status = receiver.accept(request.get_json(silent=True))
+        except ValueError as invalid:
+            return jsonify(error=str(invalid)), 400
+        if status == "busy":
+            return jsonify(status=status), 503, {"Retry-After": "5"}
+        return jsonify(status=status), 200
+
+    @app.get("/health")
+    def health():
+        return jsonify(status="ok")
+
+    return app
+
+
+_receiver = None
+_receiver_lock = threading.Lock()
+
+
+def get_webhook_receiver():
+    """Returns the process-wide WebhookReceiver (created lazily, flushed at exit)."""
+    global _receiver
+    with _receiver_lock:
+        if _receiver is None:
+            _receiver = WebhookReceiver()
+            atexit.register(_receiver.stop)
+        return _receiver
+
+
+def main(serve=None):
+    """
+    Entry point of the webhook service.
+
+    The schema is brought up to date before the first event is accepted, so
+    the worker never writes into a missing financefly_webhook_events table.
+
+    Args:
+        serve (callable, optional): WSGI server; defaults to waitress.serve
+
+    Returns:
+        int: Exit status (1 when the migrations failed)
+    """
+    schema = ensure_schema()
+    if not schema["ok"]:
+        logger.error(f"Webhook service not started, schema migration failed: {schema['error']}")
+        return 1
+    if serve is None:
+        from waitress import serve
+    serve(create_app(), host="0.0.0.0", port=WEBHOOK_PORT, threads=WEBHOOK_THREADS)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(main())
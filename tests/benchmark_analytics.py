@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: vectorized transaction analytics (modules/analytics.py).
+
+Builds a synthetic transaction frame (default 10M rows over 5,000 clients,
+two years) and times each report over the whole frame and over one
+client's year, the dashboard case. A plain Python loop computing the
+monthly summary over the first 1M rows is shown for comparison.
+
+Usage:
+    python tests/benchmark_analytics.py [rows] [clients]
+"""
+
+import os
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modules.analytics import FRAME_DTYPES, monthly_summary, category_breakdown, running_balances
+
+
+def synthetic_frame(rows, clients, seed=42):
+    rng = np.random.default_rng(seed)
+    client = rng.integers(0, clients, rows)
+    # Two accounts per client
+    account = client * 2 + rng.integers(0, 2, rows)
+    days = rng.integers(0, 730, rows)
+    amount = np.where(rng.random(rows) < 0.15, rng.integers(1_000, 800_000, rows), -rng.integers(100, 50_000, rows))
+    category = rng.integers(0, 60, rows)
+    return pd.DataFrame({
+        "client": pd.Categorical.from_codes(client, [f"client{i}@example.com" for i in range(clients)]),
+        "item_id": pd.Categorical.from_codes(client, [f"item-{i}" for i in range(clients)]),
+        "account_id": pd.Categorical.from_codes(account, [f"acc-{i}" for i in range(clients * 2)]),
+        "tx_date": np.datetime64("2024-01-01") + days.astype("timedelta64[D]"),
+        "amount_cents": amount.astype("int64"),
+        "category": pd.Categorical.from_codes(category, [f"{i:02d}000000" for i in range(60)]),
+        "status": np.zeros(rows, dtype="int8"),
+        "type": (amount > 0).astype("int8"),
+    }).astype(FRAME_DTYPES)
+
+
+def timed(name, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>34}: {elapsed * 1000:9.1f} ms ({len(result):,} rows out)")
+    return result
+
+
+def loop_monthly(frame):
+    totals = defaultdict(lambda: [0, 0])
+    for client, tx_date, amount in zip(frame["client"], frame["tx_date"], frame["amount_cents"]):
+        key = (client, tx_date.year, tx_date.month)
+        totals[key][0 if amount > 0 else 1] += abs(amount)
+    return totals
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    start = time.perf_counter()
+    frame = synthetic_frame(rows, clients)
+    print(f"{rows:,} synthetic transactions, {clients:,} clients "
+          f"({frame.memory_usage(deep=False).sum() / 2**20:,.0f} MiB) built in {time.perf_counter() - start:.1f}s")
+
+    print("Whole frame:")
+    timed("monthly_summary", monthly_summary, frame)
+    timed("category_breakdown", category_breakdown, frame)
+    timed("running_balances", running_balances, frame)
+
+    one_client = frame[(frame["client"] == "client0@example.com") & (frame["tx_date"] >= "2025-01-01")]
+    one_client = one_client.assign(**{
+        column: one_client[column].cat.remove_unused_categories()
+        for column in ("client", "item_id", "account_id")
+    })
+    print(f"One client's year ({len(one_client):,} transactions):")
+    start = time.perf_counter()
+    timed("monthly_summary", monthly_summary, one_client)
+    timed("category_breakdown", category_breakdown, one_client)
+    timed("running_balances", running_balances, one_client, {"acc-0": 1_000_000})
+    print(f"{'dashboard total':>34}: {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+    sample = frame.head(1_000_000)
+    print("Python loop, first 1M rows:")
+    timed("monthly totals (loop)", loop_monthly, sample)
+    timed("monthly_summary (vectorized)", monthly_summary, sample)
+
+
+if __name__ == "__main__":
+    main()
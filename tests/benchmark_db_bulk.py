@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Benchmark: save_client loop vs save_clients (COPY + single INSERT).
+
+Needs a reachable Postgres configured through the usual DB_* variables.
+Rows are inserted with unique item_ids and removed afterwards.
+
+Usage:
+    python tests/benchmark_db_bulk.py [rows]
+"""
+
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modules.db import init_db, save_client, save_clients, pooled_conn, close_pool
+
+
+def rows(prefix, total):
+    for i in range(total):
+        yield (f"Cliente {i}", f"cliente{i}@example.com", f"{prefix}-{i}")
+
+
+def cleanup(prefix):
+    with pooled_conn() as conn:
+        conn.execute("DELETE FROM financefly_clients WHERE item_id LIKE %s", (f"{prefix}-%",))
+
+
+def run(name, func, prefix, total):
+    start = time.perf_counter()
+    inserted = func(prefix, total)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>12}: {inserted} rows in {elapsed:.3f}s ({inserted / elapsed:,.0f} rows/s)")
+    cleanup(prefix)
+
+
+def loop_insert(prefix, total):
+    return sum(1 for row in rows(prefix, total) if save_client(*row) is not None)
+
+
+def bulk_insert(prefix, total):
+    return len(save_clients(rows(prefix, total)))
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    init_db()
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    try:
+        run("save_client", loop_insert, f"{prefix}-loop", total)
+        run("save_clients", bulk_insert, f"{prefix}-bulk", total)
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
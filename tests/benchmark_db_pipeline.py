@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark: one connection event (insert client, read it back, update it)
+with one round trip per statement vs psycopg pipeline mode.
+
+Connections go through a local TCP proxy that counts round trips (each
+time the client talks again after the server answered) and can add
+one-way latency to server responses, to emulate a remote database such
+as Railway.
+
+Needs a reachable Postgres configured through the usual DB_* variables.
+
+Usage:
+    python tests/benchmark_db_pipeline.py [events] [latency_ms]
+"""
+
+import os
+import sys
+import time
+import uuid
+import socket
+import statistics
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+class LatencyProxy:
+    """TCP proxy to Postgres that delays server responses and counts round trips"""
+
+    def __init__(self, target_host, target_port, latency_seconds):
+        self.target_host = target_host
+        self.target_port = int(target_port)
+        self.latency_seconds = latency_seconds
+        self.round_trips = 0
+        self._lock = threading.Lock()
+        self._server = socket.create_server(("127.0.0.1", 0))
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _connect_target(self):
+        if self.target_host.startswith("/"):
+            upstream = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            upstream.connect(os.path.join(self.target_host, f".s.PGSQL.{self.target_port}"))
+            return upstream
+        upstream = socket.create_connection((self.target_host, self.target_port))
+        upstream.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return upstream
+
+    def _accept(self):
+        while True:
+            client, _ = self._server.accept()
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            upstream = self._connect_target()
+            turn = {"server_answered": True}
+            threading.Thread(target=self._pipe, args=(client, upstream, True, turn), daemon=True).start()
+            threading.Thread(target=self._pipe, args=(upstream, client, False, turn), daemon=True).start()
+
+    def _pipe(self, source, destination, client_to_server, turn):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                received_at = time.monotonic()
+                with self._lock:
+                    if client_to_server and turn["server_answered"]:
+                        self.round_trips += 1
+                    turn["server_answered"] = not client_to_server
+                if not client_to_server and self.latency_seconds:
+                    # Every chunk is delivered `latency` after it arrived (no serialization)
+                    time.sleep(max(0.0, received_at + self.latency_seconds - time.monotonic()))
+                destination.sendall(data)
+        except OSError:
+            pass
+        finally:
+            destination.close()
+
+    def reset(self):
+        with self._lock:
+            self.round_trips = 0
+
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+
+    proxy = LatencyProxy(os.getenv("DB_HOST", "localhost"), os.getenv("DB_PORT") or 5432, latency_ms / 1000)
+    os.environ.update({"DB_HOST": "127.0.0.1", "DB_PORT": str(proxy.port), "DB_POOL_MIN_SIZE": "1", "DB_POOL_MAX_SIZE": "1"})
+
+    from modules.db import (
+        init_db, pooled_conn, close_pool, execute_pipeline,
+        INSERT_CLIENT_SQL, SELECT_CLIENT_BY_ITEM_ID_SQL,
+    )
+    update_sql = "UPDATE financefly_clients SET name = %s WHERE item_id = %s"
+
+    def event_operations(item_id):
+        return [
+            (INSERT_CLIENT_SQL, ("Cliente", "cliente@example.com", item_id)),
+            (SELECT_CLIENT_BY_ITEM_ID_SQL, (item_id,)),
+            (update_sql, ("Cliente conectado", item_id)),
+        ]
+
+    def sequential(item_id):
+        with pooled_conn() as conn, conn.cursor() as cur:
+            for sql, params in event_operations(item_id):
+                cur.execute(sql, params)
+            conn.commit()
+
+    def pipelined(item_id):
+        execute_pipeline(event_operations(item_id))
+
+    init_db()
+    prefix = f"bench-pipe-{uuid.uuid4().hex[:8]}"
+    print(f"{events} events x 3 statements, +{latency_ms:g} ms per server response")
+    print("(round trips include the pool's health check on checkout)")
+    try:
+        for name, func in (("sequential", sequential), ("pipeline", pipelined)):
+            func(f"{prefix}-{name}-warmup")
+            proxy.reset()
+            latencies = []
+            for i in range(events):
+                start = time.perf_counter()
+                func(f"{prefix}-{name}-{i}")
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            print(
+                f"{name:>10}: {proxy.round_trips / events:.1f} round trips/event, "
+                f"p50 {statistics.median(latencies):.2f} ms, "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f} ms"
+            )
+        with pooled_conn() as conn:
+            conn.execute("DELETE FROM financefly_clients WHERE item_id LIKE %s", (f"{prefix}-%",))
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark: streaming CSV/Parquet export (modules/export.py).
+
+Loads a synthetic client (default 3M transactions over four accounts and
+two years) straight into Postgres with INSERT ... SELECT, then exports it
+to CSV and to Parquet in a temporary directory and reports rows/second,
+file size and the process' peak memory. The fixture is removed afterwards.
+
+Needs a reachable Postgres configured through the usual DB_* variables.
+
+Usage:
+    python tests/benchmark_export.py [rows]
+"""
+
+import os
+import sys
+import time
+import uuid
+import resource
+import tempfile
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modules.db import pooled_conn, close_pool
+from modules.migrations import ensure_schema
+from modules.finance_db import ensure_partitions
+from modules.export import export_transactions, iter_export_batches
+
+FIXTURE_SQL = """
+INSERT INTO financefly_transactions (id, account_id, tx_date, amount_cents, status, type, description, updated_at)
+SELECT gen_random_uuid(), (%(accounts)s::uuid[])[1 + i %% 4],
+       %(first)s::date + (i * 730::bigint / %(rows)s)::int,
+       CASE WHEN i %% 7 = 0 THEN 250000 ELSE -(100 + i %% 50000) END,
+       (i %% 20 = 0)::int, (i %% 7 = 0)::int, 'COMPRA CARTAO ' || (i %% 997), NOW()
+FROM generate_series(0, %(rows)s - 1) AS i
+"""
+
+
+def peak_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_fixture(item_id, email, accounts, rows):
+    first = date(2024, 1, 1)
+    with pooled_conn() as conn:
+        conn.execute(
+            "INSERT INTO financefly_clients (name, email, item_id) VALUES ('Benchmark', %s, %s)", (email, item_id)
+        )
+        for account in accounts:
+            conn.execute(
+                "INSERT INTO financefly_accounts (id, item_id, type, name) VALUES (%s, %s, 'BANK', 'Conta')",
+                (account, item_id),
+            )
+        ensure_partitions(conn, [date(2024 + m // 12, m % 12 + 1, 1) for m in range(25)])
+        conn.execute(FIXTURE_SQL, {"accounts": accounts, "first": first, "rows": rows})
+
+
+def cleanup(item_id, accounts):
+    with pooled_conn() as conn:
+        conn.execute("DELETE FROM financefly_transactions WHERE account_id = ANY(%s::uuid[])", (accounts,))
+        conn.execute("DELETE FROM financefly_accounts WHERE item_id = %s", (item_id,))
+        conn.execute("DELETE FROM financefly_clients WHERE item_id = %s", (item_id,))
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 3_000_000
+    if not ensure_schema()["ok"]:
+        sys.exit("Schema initialization failed")
+    suffix = uuid.uuid4().hex[:8]
+    item_id, email = f"bench-export-{suffix}", f"bench-{suffix}@example.com"
+    accounts = [str(uuid.uuid4()) for _ in range(4)]
+
+    start = time.perf_counter()
+    load_fixture(item_id, email, accounts, rows)
+    print(f"{rows:,} transactions loaded in {time.perf_counter() - start:.1f}s; baseline peak {peak_mib():,.0f} MiB")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # Fetch only: the Parquet path's cursor and row decoding, no writer
+            start = time.perf_counter()
+            fetched = sum(len(rows) for _, rows in iter_export_batches(email=email))
+            elapsed = time.perf_counter() - start
+            print(f"{'fetch only':>10}: {fetched:,} rows in {elapsed:.1f}s ({fetched / elapsed:,.0f} rows/s)")
+
+            for fmt in ("csv", "parquet"):
+                path = os.path.join(tmpdir, f"export.{fmt}")
+                with open(path, "wb") as out:
+                    stats = export_transactions(out, fmt, email=email)
+                groups = f", {stats['row_groups']} row groups" if "row_groups" in stats else ""
+                print(f"{fmt:>10}: {stats['rows']:,} rows in {stats['duration_seconds']:.1f}s "
+                      f"({stats['rows_per_second']:,.0f} rows/s), {os.path.getsize(path) / 2**20:,.0f} MiB"
+                      f"{groups}; peak {peak_mib():,.0f} MiB")
+    finally:
+        cleanup(item_id, accounts)
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bare requests.post vs pooled keep-alive session for Pluggy calls.
+
+Runs a local stub of the Pluggy /auth and /connect_token endpoints and
+issues connect tokens through PluggyClient with a fresh connection per
+request (old behaviour) and with the shared pooled session.
+
+Usage:
+    python tests/benchmark_pluggy_http.py [requests] [threads]
+"""
+
+import os
+import sys
+import json
+import time
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modules.pluggy_utils import PluggyClient, get_http_session, close_http_session
+
+
+class StubPluggyHandler(BaseHTTPRequestHandler):
+    """Minimal Pluggy API stub with HTTP/1.1 keep-alive"""
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this Nagle + delayed
+    # ACK add ~40 ms to every response on a kept-alive connection
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length", 0))
+        self.rfile.read(length)
+        if self.path == "/auth":
+            body = {"apiKey": "stub_api_key"}
+        else:
+            body = {"accessToken": "stub_connect_token"}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class UnpooledSession:
+    """Session stand-in reproducing the old requests.post per call"""
+
+    def post(self, *args, **kwargs):
+        return requests.post(*args, **kwargs)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(label, session, base_url, total, threads):
+    config = {"client_id": "bench_client", "client_secret": "bench_secret", "base_url": base_url}
+    PluggyClient.reset_api_key_cache()
+    # Warm-up: authenticate once so only /connect_token is measured
+    PluggyClient(config, session=session).create_connect_token("warmup@example.com")
+
+    def one(i):
+        start = time.perf_counter()
+        PluggyClient(config, session=session).create_connect_token(f"user{i}@example.com")
+        return (time.perf_counter() - start) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{label:<10} n={total:<5} p50={statistics.median(latencies):7.3f} ms  "
+        f"p99={percentile(latencies, 99):7.3f} ms  throughput={total / elapsed:8.1f} req/s"
+    )
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubPluggyHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(f"Stub Pluggy server at {base_url} ({threads} threads)")
+    try:
+        run("unpooled", UnpooledSession(), base_url, total, threads)
+        run("pooled", get_http_session(), base_url, total, threads)
+    finally:
+        close_http_session()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
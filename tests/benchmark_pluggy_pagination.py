@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark: streaming Pluggy transaction pagination.
+
+Pages through an account of the fake Pluggy server (tests/fake_pluggy_server.py)
+with a per-request latency and reports, for serial paging and for the
+prefetching paginator, the wall time and the peak Python memory while
+consuming the records. Collecting every page into a list first is shown
+for comparison. Peak memory includes the fake server's per-request
+allocations, which are the same in every run.
+
+Usage:
+    python tests/benchmark_pluggy_pagination.py [transactions] [latency_ms]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_pluggy_server import FakePluggyServer
+from modules.pluggy_utils import PluggyClient
+
+
+def consume(records):
+    count = 0
+    for _ in records:
+        count += 1
+    return count
+
+
+def run(name, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>22}: {count} transactions in {elapsed:.2f}s, peak {peak / 2**20:.1f} MiB")
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    PluggyClient.configure_rate_limit("transactions", rate=1000, burst=1000)
+
+    with FakePluggyServer() as server:
+        account = server.add_account("bench-item")
+        server.generate_transactions(account["id"], total, days=365)
+        server.latency_seconds = latency_ms / 1000
+        client = PluggyClient(server.config)
+        client.get_api_key()
+        account_id = account["id"]
+
+        run("list (all pages)", lambda: consume([
+            tx
+            for page in client.iter_transaction_pages(account_id, max_in_flight=0)
+            for tx in page["results"]
+        ]))
+        run("stream, serial", lambda: consume(client.iter_transactions(account_id, max_in_flight=0)))
+        for in_flight in (1, 2, 4):
+            run(f"stream, {in_flight} in flight",
+                lambda: consume(client.iter_transactions(account_id, max_in_flight=in_flight)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark: pending -> posted reconciliation (finance_db.reconcile_pending).
+
+Loads a synthetic client straight into Postgres (default 1M posted
+transactions over four accounts and two years) where 2% of the purchases
+also came first as a pending transaction with another id, a date up to
+two days earlier and other digits in the description, plus pending
+transactions still waiting to post. Times reconcile_pending() over the
+whole history, as after a full re-sync, checks every pair was found and
+nothing else, and that the monthly aggregates have no drift. A second run
+(nothing left to match) shows the cost of the stage on every sync. The
+fixture is removed afterwards.
+
+Needs a reachable Postgres configured through the usual DB_* variables.
+
+Usage:
+    python tests/benchmark_reconcile.py [rows]
+"""
+
+import os
+import sys
+import time
+import uuid
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modules.db import pooled_conn, close_pool
+from modules.migrations import ensure_schema
+from modules.finance_db import ensure_partitions, reconcile_pending, verify_aggregates
+
+# Posted purchases at 676 merchants; every 50th also has an earlier pending copy
+FIXTURE_SQL = """
+INSERT INTO financefly_transactions (id, account_id, tx_date, amount_cents, status, type, description, updated_at)
+SELECT gen_random_uuid(), (%(accounts)s::uuid[])[1 + i %% 4],
+       %(first)s::date + (i * 730::bigint / %(rows)s)::int - CASE WHEN copy = 1 THEN i %% 3 ELSE 0 END,
+       -(100 + i %% 50000), copy, 0,
+       'LOJA ' || chr(65 + i %% 26) || chr(65 + i / 26 %% 26)
+           || CASE WHEN copy = 1 THEN ' *' || (i %% 9973) ELSE ' ' || (i %% 97) || '/12' END,
+       NOW()
+FROM generate_series(0, %(rows)s - 1) AS i
+CROSS JOIN generate_series(0, 1) AS copy
+WHERE copy = 0 OR i %% 50 = 0
+"""
+
+# Pending transactions with no posted counterpart yet
+WAITING_SQL = """
+INSERT INTO financefly_transactions (id, account_id, tx_date, amount_cents, status, type, description, updated_at)
+SELECT gen_random_uuid(), (%(accounts)s::uuid[])[1 + i %% 4], %(last)s::date - i %% 5, -(70000 + i), 1, 0,
+       'LOJA ' || chr(65 + i %% 26) || chr(65 + i / 26 %% 26), NOW()
+FROM generate_series(0, %(waiting)s - 1) AS i
+"""
+
+
+def load_fixture(item_id, accounts, rows, waiting):
+    with pooled_conn() as conn:
+        for account in accounts:
+            conn.execute(
+                "INSERT INTO financefly_accounts (id, item_id, type, name) VALUES (%s, %s, 'BANK', 'Conta')",
+                (account, item_id),
+            )
+        ensure_partitions(conn, [date(2023 + m // 12, m % 12 + 1, 1) for m in range(12, 37)])
+        conn.execute(FIXTURE_SQL, {"accounts": accounts, "first": date(2024, 1, 1), "rows": rows})
+        conn.execute(WAITING_SQL, {"accounts": accounts, "last": date(2025, 12, 30), "waiting": waiting})
+        conn.execute("ANALYZE financefly_transactions")
+    # Loaded around save_transactions(): build the fixture's aggregates
+    verify_aggregates([item_id], repair=True)
+
+
+def cleanup(item_id, accounts):
+    with pooled_conn() as conn:
+        conn.execute("DELETE FROM financefly_transactions WHERE account_id = ANY(%s::uuid[])", (accounts,))
+        conn.execute("DELETE FROM financefly_transaction_reconciliations WHERE account_id = ANY(%s::uuid[])",
+                     (accounts,))
+        conn.execute("DELETE FROM financefly_monthly_aggregates WHERE account_id = ANY(%s::uuid[])", (accounts,))
+        conn.execute("DELETE FROM financefly_accounts WHERE item_id = %s", (item_id,))
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    waiting = 1_000
+    if not ensure_schema()["ok"]:
+        sys.exit("Schema initialization failed")
+    item_id = f"bench-reconcile-{uuid.uuid4().hex[:8]}"
+    accounts = [str(uuid.uuid4()) for _ in range(4)]
+    pairs = (rows + 49) // 50
+
+    start = time.perf_counter()
+    load_fixture(item_id, accounts, rows, waiting)
+    print(f"{rows + pairs + waiting:,} transactions loaded ({pairs:,} pending/posted pairs, "
+          f"{waiting:,} pending still waiting) in {time.perf_counter() - start:.1f}s")
+
+    try:
+        for label in ("full re-sync", "next sync"):
+            start = time.perf_counter()
+            reconciled = reconcile_pending(accounts)
+            elapsed = time.perf_counter() - start
+            print(f"{label:>12}: {reconciled:,} pending transactions reconciled in {elapsed:.2f}s")
+        with pooled_conn() as conn:
+            left = conn.execute(
+                "SELECT count(*) FROM financefly_transactions WHERE account_id = ANY(%s::uuid[]) AND status = 1",
+                (accounts,),
+            ).fetchone()[0]
+        drift = verify_aggregates([item_id])["drift"]
+        print(f"{left:,} pending left (expected {waiting:,}); aggregates drift in {len(drift)} account-months")
+    finally:
+        cleanup(item_id, accounts)
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
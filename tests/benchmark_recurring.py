@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark: recurring transaction detection (modules/recurring.py).
+
+Builds synthetic clients (a year of card purchases plus a handful of
+subscriptions, a salary and rent each) and times detect_recurring() at
+growing sizes. Time per transaction should stay roughly flat (n log n);
+a pairwise approach would grow with the size of each counterparty group.
+Each line also counts the planted monthly series found and any other
+series detected among the random purchases.
+
+Usage:
+    python tests/benchmark_recurring.py [max_rows]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modules.recurring import detect_recurring
+
+SUBSCRIPTIONS = ("NETFLIX COM", "SPOTIFY", "ACADEMIA SMART", "ALUGUEL", "PLANO CELULAR")
+MERCHANTS = [f"LOJA {chr(65 + i)}{chr(65 + j)}" for i in range(26) for j in range(26)]
+
+
+def synthetic_frame(clients, purchases_per_client=400, seed=5):
+    rng = np.random.default_rng(seed)
+    # Card purchases: random merchant, day and amount
+    rows = clients * purchases_per_client
+    client = np.repeat(np.arange(clients), purchases_per_client)
+    day = rng.integers(0, 365, rows)
+    amount = -rng.integers(500, 60_000, rows)
+    description = np.array(MERCHANTS, dtype=object)[rng.integers(0, len(MERCHANTS), rows)]
+    # Monthly series: fixed amount per client, +-2 days of jitter
+    months = 12
+    planted = clients * (len(SUBSCRIPTIONS) + 1)
+    series_client = np.repeat(np.arange(clients), len(SUBSCRIPTIONS) + 1)
+    series_name = np.tile(np.array(SUBSCRIPTIONS + ("SALARIO",), dtype=object), clients)
+    series_amount = np.where(series_name == "SALARIO", 1, -1) * rng.integers(1_000, 900_000, planted)
+    series_start = rng.integers(0, 28, planted)
+    client = np.r_[client, np.repeat(series_client, months)]
+    day = np.r_[day, (np.repeat(series_start, months) + np.tile(np.arange(months) * 30, planted)
+                      + rng.integers(-2, 3, planted * months)).clip(0)]
+    amount = np.r_[amount, np.repeat(series_amount, months)]
+    description = np.r_[description, np.repeat(series_name, months)]
+    frame = pd.DataFrame({
+        "client": pd.Categorical.from_codes(client, [f"client{i}@example.com" for i in range(clients)]),
+        "item_id": pd.Categorical.from_codes(client, [f"item-{i}" for i in range(clients)]),
+        "account_id": pd.Categorical.from_codes(client, [f"acc-{i}" for i in range(clients)]),
+        "tx_date": np.datetime64("2024-01-01") + day.astype("timedelta64[D]"),
+        "amount_cents": amount.astype("int64"),
+        "description": description,
+    })
+    return frame, planted
+
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 4_000_000
+    clients = 250
+    while True:
+        frame, planted = synthetic_frame(clients)
+        if len(frame) > max_rows:
+            break
+        start = time.perf_counter()
+        found = detect_recurring(frame, today=np.datetime64("2025-01-01"))
+        elapsed = time.perf_counter() - start
+        hits = int(((found["period"] == "monthly") & found["counterparty"].isin(SUBSCRIPTIONS + ("SALARIO",))).sum())
+        print(f"{len(frame):>10,} transactions, {clients:>6,} clients: {elapsed:7.2f}s "
+              f"({elapsed / len(frame) * 1e6:.2f} us/transaction), {hits:,}/{planted:,} planted series found, "
+              f"{len(found) - hits:,} others")
+        clients *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Load test: Pluggy webhook receiver.
+
+Starts the webhook app on a local port backed by the real batched writer
+and fires events from concurrent HTTP clients (10% redeliveries). It reports
+acknowledgement latency and throughput, then how long the writer takes to
+get every event into Postgres.
+
+Needs a reachable Postgres configured through the usual DB_* variables.
+Events and clients created here are removed afterwards.
+
+Usage:
+    python tests/benchmark_webhooks.py [events] [concurrency]
+"""
+
+import os
+import sys
+import time
+import uuid
+import logging
+import tempfile
+import statistics
+import threading
+
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from modules.db import pooled_conn, close_pool
+from modules.migrations import ensure_schema
+from modules.webhooks import WebhookReceiver, create_app, WEBHOOK_PATH, WEBHOOK_SECRET_HEADER
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+SECRET = "benchmark"
+
+
+def fire(url, events, latencies, statuses):
+    session = requests.Session()
+    session.headers[WEBHOOK_SECRET_HEADER] = SECRET
+    for payload in events:
+        start = time.perf_counter()
+        response = session.post(url, json=payload)
+        latencies.append(time.perf_counter() - start)
+        statuses.append(response.json()["status"])
+
+
+def stored(prefix):
+    with pooled_conn() as conn:
+        return conn.execute(
+            "SELECT count(*) FROM financefly_webhook_events WHERE event_id LIKE %s", (f"{prefix}-%",)
+        ).fetchone()[0]
+
+
+def cleanup(prefix):
+    with pooled_conn() as conn:
+        conn.execute("DELETE FROM financefly_webhook_events WHERE event_id LIKE %s", (f"{prefix}-%",))
+        conn.execute("DELETE FROM financefly_clients WHERE item_id LIKE %s", (f"{prefix}-%",))
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    if not ensure_schema()["ok"]:
+        sys.exit("Schema initialization failed")
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    events = []
+    for i in range(total):
+        name = "item/created" if i % 10 == 0 else "transactions/created"
+        events.append({
+            "event": name, "eventId": f"{prefix}-{i}", "itemId": f"{prefix}-item-{i // 10}",
+            "clientUserId": f"user{i // 10}@example.com",
+        })
+    # Redeliveries of already sent events
+    events += events[:total // 10]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        receiver = WebhookReceiver(log_path=os.path.join(tmpdir, "events.log"))
+        server = make_server("127.0.0.1", 0, create_app(receiver, secret=SECRET), threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}{WEBHOOK_PATH}"
+        latencies, statuses = [], []
+        try:
+            start = time.perf_counter()
+            threads = [
+                threading.Thread(target=fire, args=(url, events[i::concurrency], latencies, statuses))
+                for i in range(concurrency)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            acked = time.perf_counter() - start
+            receiver.flush()
+            drained = time.perf_counter() - start
+
+            print(f"{len(events)} requests from {concurrency} clients in {acked:.2f}s "
+                  f"({len(events) / acked:,.0f} req/s)")
+            print(f"ack latency: p50 {statistics.median(latencies) * 1000:.2f} ms, "
+                  f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms, max {max(latencies) * 1000:.2f} ms")
+            print(f"statuses: {statuses.count('accepted')} accepted, {statuses.count('duplicate')} duplicate, "
+                  f"{statuses.count('busy')} busy")
+            print(f"all events in Postgres after {drained:.2f}s: {stored(prefix)} rows, "
+                  f"{receiver.stats()['batches']} batches")
+        finally:
+            server.shutdown()
+            receiver.stop()
+            cleanup(prefix)
+            close_pool()
+
+
+if __name__ == "__main__":
+    main()
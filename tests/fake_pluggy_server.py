@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+In-process fake of the Pluggy API for tests and benchmarks.
+
+Serves /auth, /connect_token, /accounts and paginated /transactions from
+in-memory data over real HTTP, records every request and can inject
+failures, so PluggyClient and the sync engine run unmodified against it.
+
+Usage:
+    with FakePluggyServer() as server:
+        server.add_account('item-1', account)
+        server.add_transactions(account['id'], transactions)
+        client = PluggyClient(server.config)
+"""
+
+import json
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length", 0))
+        body = self.rfile.read(length)
+        self.server.fake.handle(self, "POST", body)
+
+    def do_GET(self):
+        self.server.fake.handle(self, "GET", b"")
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakePluggyServer:
+    """Fake Pluggy API on 127.0.0.1 with in-memory items, accounts and transactions"""
+
+    API_KEY = "fake_api_key"
+
+    def __init__(self, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+        self.accounts = {}          # item_id -> [account]
+        self.transactions = {}      # account_id -> [transaction]
+        self.requests = []          # (method, path, query dict)
+        self._failures = []         # [(method, path, status, remaining)]
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def config(self):
+        return {"client_id": "fake_client", "client_secret": "fake_secret", "base_url": self.base_url}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # -----------------------------------------------------
+    # Data setup
+    # -----------------------------------------------------
+    def add_account(self, item_id, account=None, **fields):
+        account = dict(account or {})
+        account.setdefault("id", str(uuid.uuid4()))
+        account.setdefault("itemId", item_id)
+        account.setdefault("type", "BANK")
+        account.setdefault("subtype", "CHECKING_ACCOUNT")
+        account.setdefault("name", "Conta Corrente")
+        account.setdefault("balance", 1000.0)
+        account.setdefault("currencyCode", "BRL")
+        account.update(fields)
+        with self._lock:
+            self.accounts.setdefault(item_id, []).append(account)
+            self.transactions.setdefault(account["id"], [])
+        return account
+
+    def add_transactions(self, account_id, transactions):
+        with self._lock:
+            self.transactions.setdefault(account_id, []).extend(transactions)
+
+    def generate_transactions(self, account_id, count, start=None, days=90):
+        """Adds `count` transactions spread over `days` days ending at `start` (today)."""
+        start = start or date.today()
+        generated = []
+        for i in range(count):
+            tx_date = start - timedelta(days=(i * days) // max(count, 1))
+            generated.append({
+                "id": str(uuid.uuid4()),
+                "accountId": account_id,
+                "date": f"{tx_date.isoformat()}T12:00:00.000Z",
+                "description": f"Transação {i}",
+                "amount": round(-((i % 97) + 1) * 1.37, 2),
+                "categoryId": f"0{i % 9 + 1}000000",
+                "status": "POSTED",
+                "type": "DEBIT",
+                "updatedAt": f"{tx_date.isoformat()}T12:00:00.000Z",
+            })
+        self.add_transactions(account_id, generated)
+        return generated
+
+    def fail_next(self, method, path, status, times=1):
+        """Makes the next `times` requests to path answer `status`."""
+        with self._lock:
+            self._failures.append([method, path, status, times])
+
+    def requests_for(self, path):
+        with self._lock:
+            return [query for method, request_path, query in self.requests if request_path == path]
+
+    # -----------------------------------------------------
+    # Request handling
+    # -----------------------------------------------------
+    def handle(self, handler, method, body):
+        parsed = urlparse(handler.path)
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        with self._lock:
+            self.requests.append((method, parsed.path, query))
+            failure = self._take_failure(method, parsed.path)
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if failure:
+            handler.send_json(failure, {"message": "injected failure"})
+            return
+        if method == "POST" and parsed.path == "/auth":
+            handler.send_json(200, {"apiKey": self.API_KEY})
+            return
+        if method == "POST" and parsed.path == "/connect_token":
+            handler.send_json(200, {"accessToken": "fake_connect_token"})
+            return
+        if handler.headers.get("X-API-KEY") != self.API_KEY:
+            handler.send_json(401, {"message": "unauthorized"})
+            return
+        if method == "GET" and parsed.path == "/accounts":
+            with self._lock:
+                results = list(self.accounts.get(query.get("itemId"), []))
+            handler.send_json(200, {"total": len(results), "results": results})
+            return
+        if method == "GET" and parsed.path == "/transactions":
+            handler.send_json(200, self._transactions_page(query))
+            return
+        handler.send_json(404, {"message": "not found"})
+
+    def _take_failure(self, method, path):
+        for failure in self._failures:
+            if failure[0] == method and failure[1] == path and failure[3] > 0:
+                failure[3] -= 1
+                return failure[2]
+        return None
+
+    def _transactions_page(self, query):
+        page = int(query.get("page", 1))
+        page_size = int(query.get("pageSize", 20))
+        date_from = query.get("from")
+        date_to = query.get("to")
+        with self._lock:
+            transactions = list(self.transactions.get(query.get("accountId"), []))
+        if date_from:
+            transactions = [tx for tx in transactions if tx["date"][:10] >= date_from]
+        if date_to:
+            transactions = [tx for tx in transactions if tx["date"][:10] <= date_to]
+        # Newest first, like Pluggy
+        transactions.sort(key=lambda tx: (tx["date"], tx["id"]), reverse=True)
+        total = len(transactions)
+        total_pages = max(1, -(-total // page_size))
+        results = transactions[(page - 1) * page_size:page * page_size]
+        return {"total": total, "totalPages": total_pages, "page": page, "results": results}
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/analytics.py
+
+Tests cover:
+- Monthly income/expense, category breakdown and running balances
+  against straightforward per-row computations
+- Dense and sparse grouping paths, empty frames, uncategorized spending
+- Loading transactions from COPY output into a typed frame
+- Reading the monthly summary from the maintained aggregates
+"""
+
+import unittest
+from collections import defaultdict
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+
+from modules import analytics
+
+
+def make_frame(rows):
+    """rows: (client, account_id, 'YYYY-MM-DD', amount_cents, category)"""
+    frame = pd.DataFrame(rows, columns=['client', 'account_id', 'tx_date', 'amount_cents', 'category'])
+    frame['item_id'] = frame['client']
+    frame['tx_date'] = pd.to_datetime(frame['tx_date'])
+    frame['status'] = 0
+    frame['type'] = 0
+    return frame[list(analytics.FRAME_COLUMNS)].astype(analytics.FRAME_DTYPES)
+
+
+def random_frame(rows=2000, seed=7):
+    rng = np.random.default_rng(seed)
+    clients = [f'c{i}@x.com' for i in rng.integers(0, 5, rows)]
+    accounts = [f'{client}-acc{i}' for client, i in zip(clients, rng.integers(0, 2, rows))]
+    dates = (np.datetime64('2024-01-01') + rng.integers(0, 400, rows).astype('timedelta64[D]')).astype(str)
+    amounts = rng.integers(-50_000, 50_000, rows)
+    categories = [None if i == 0 else f'0{i}000000' for i in rng.integers(0, 6, rows)]
+    return make_frame(list(zip(clients, accounts, dates, amounts, categories)))
+
+
+class TestMonthlySummary(unittest.TestCase):
+    """Test monthly_summary"""
+
+    def test_matches_row_by_row_totals(self):
+        """Test income/expense per client and month equal a plain loop"""
+        frame = random_frame()
+        expected = defaultdict(lambda: [0, 0, 0])
+        for client, tx_date, amount in zip(frame['client'], frame['tx_date'], frame['amount_cents']):
+            totals = expected[(client, tx_date.strftime('%Y-%m'))]
+            totals[0 if amount > 0 else 1] += abs(amount) if amount else 0
+            totals[2] += 1
+
+        summary = analytics.monthly_summary(frame)
+
+        got = {
+            (row.client, row.month.strftime('%Y-%m')): [row.income_cents, row.expense_cents, row.transactions]
+            for row in summary.itertuples()
+        }
+        self.assertEqual(got, {key: list(value) for key, value in expected.items()})
+        self.assertTrue((summary['net_cents'] == summary['income_cents'] - summary['expense_cents']).all())
+        self.assertEqual(list(summary[['client', 'month']].itertuples(index=False)),
+                         sorted(summary[['client', 'month']].itertuples(index=False)))
+
+    def test_sparse_path_matches_dense(self):
+        """Test grouping by sorting gives the same result as bincount"""
+        frame = random_frame()
+        dense = analytics.monthly_summary(frame)
+
+        with patch.object(analytics, 'DENSE_GROUP_LIMIT', 0):
+            sparse = analytics.monthly_summary(frame)
+
+        pd.testing.assert_frame_equal(dense, sparse)
+
+    def test_empty_frame(self):
+        """Test an empty frame gives an empty summary"""
+        summary = analytics.monthly_summary(analytics.empty_frame())
+
+        self.assertEqual(len(summary), 0)
+        self.assertIn('net_cents', summary.columns)
+
+
+class TestCategoryBreakdown(unittest.TestCase):
+    """Test category_breakdown"""
+
+    def test_spending_per_category(self):
+        """Test only negative amounts count and shares add up per client"""
+        frame = make_frame([
+            ('a', 'x', '2024-01-01', -300, 'food'),
+            ('a', 'x', '2024-01-02', -100, 'food'),
+            ('a', 'x', '2024-01-03', -600, 'rent'),
+            ('a', 'x', '2024-01-04', 5000, 'food'),
+            ('a', 'x', '2024-01-05', -1000, None),
+            ('b', 'y', '2024-01-01', -50, 'food'),
+        ])
+
+        breakdown = analytics.category_breakdown(frame)
+
+        rows = [
+            (row.client, None if pd.isna(row.category) else row.category, row.expense_cents, row.transactions)
+            for row in breakdown.itertuples()
+        ]
+        self.assertEqual(rows, [
+            ('a', None, 1000, 1),
+            ('a', 'rent', 600, 1),
+            ('a', 'food', 400, 2),
+            ('b', 'food', 50, 1),
+        ])
+        self.assertAlmostEqual(breakdown.loc[breakdown['client'] == 'a', 'share'].sum(), 1.0)
+        self.assertEqual(breakdown['share'].iloc[-1], 1.0)
+
+    def test_matches_row_by_row_totals(self):
+        """Test totals equal a plain loop on random data"""
+        frame = random_frame()
+        expected = defaultdict(int)
+        for client, category, amount in zip(frame['client'], frame['category'], frame['amount_cents']):
+            if amount < 0:
+                expected[(client, None if pd.isna(category) else category)] -= amount
+
+        breakdown = analytics.category_breakdown(frame)
+
+        got = {
+            (row.client, None if pd.isna(row.category) else row.category): row.expense_cents
+            for row in breakdown.itertuples()
+        }
+        self.assertEqual(got, dict(expected))
+
+
+class TestRunningBalances(unittest.TestCase):
+    """Test running_balances"""
+
+    def setUp(self):
+        self.frame = make_frame([
+            ('a', 'x', '2024-01-01', 1000, None),
+            ('a', 'x', '2024-01-01', -200, None),
+            ('a', 'x', '2024-01-03', -300, None),
+            ('a', 'y', '2024-01-02', 50, None),
+            ('a', 'x', '2024-01-02', 100, None),
+        ])
+
+    def test_cumulative_without_current_balance(self):
+        """Test balances start at zero and accumulate per account and day"""
+        balances = analytics.running_balances(self.frame)
+
+        rows = [(row.account_id, row.tx_date.strftime('%d'), row.amount_cents, row.balance_cents)
+                for row in balances.itertuples()]
+        self.assertEqual(rows, [
+            ('x', '01', 800, 800),
+            ('x', '02', 100, 900),
+            ('x', '03', -300, 600),
+            ('y', '02', 50, 50),
+        ])
+
+    def test_anchored_to_current_balance(self):
+        """Test the last day equals the current balance and earlier days follow"""
+        balances = analytics.running_balances(self.frame, {'x': 10_000})
+
+        x = balances[balances['account_id'] == 'x']['balance_cents'].tolist()
+        y = balances[balances['account_id'] == 'y']['balance_cents'].tolist()
+        self.assertEqual(x, [10_200, 10_300, 10_000])
+        self.assertEqual(y, [50])
+
+    def test_matches_groupby_cumsum(self):
+        """Test random data against a pandas group-by cumulative sum"""
+        frame = random_frame()
+        expected = (
+            frame.groupby(['account_id', 'tx_date'], observed=True)['amount_cents'].sum()
+            .groupby(level=0, observed=True).cumsum()
+        )
+
+        balances = analytics.running_balances(frame)
+
+        self.assertEqual(balances['balance_cents'].tolist(), expected.tolist())
+
+
+class TestLoadTransactions(unittest.TestCase):
+    """Test load_transactions"""
+
+    def setUp(self):
+        self.conn = MagicMock()
+        self.copy = self.conn.cursor.return_value.__enter__.return_value.copy.return_value.__enter__.return_value
+
+    def test_copy_output_parsed_into_typed_frame(self):
+        """Test CSV from COPY becomes a frame with compact dtypes"""
+        self.copy.__iter__.return_value = iter([
+            b'ana@x.com,item-1,acc-1,2024-01-05,-1005,05070000,0,0\n',
+            b'ana@x.com,item-1,acc-1,2024-02-01,250000,,0,1\n',
+        ])
+
+        frame = analytics.load_transactions(email='ana@x.com', conn=self.conn)
+
+        self.assertEqual(len(frame), 2)
+        self.assertEqual(frame['amount_cents'].tolist(), [-1005, 250000])
+        self.assertEqual(str(frame['client'].dtype), 'category')
+        self.assertEqual(frame['tx_date'].dt.month.tolist(), [1, 2])
+        self.assertTrue(pd.isna(frame['category'].iloc[1]))
+        params = self.conn.cursor.return_value.__enter__.return_value.copy.call_args.args[1]
+        self.assertEqual(params, ['ana@x.com'])
+
+    def test_no_rows(self):
+        """Test an empty result gives an empty typed frame"""
+        self.copy.__iter__.return_value = iter([])
+
+        frame = analytics.load_transactions(item_ids=['item-1'], conn=self.conn)
+
+        self.assertEqual(len(frame), 0)
+        self.assertEqual(list(frame.columns), list(analytics.FRAME_COLUMNS))
+
+    def test_requires_filter(self):
+        """Test loading everything by accident is refused"""
+        with self.assertRaises(ValueError):
+            analytics.load_transactions(conn=self.conn)
+
+
+class TestLoadMonthlyAggregates(unittest.TestCase):
+    """Test load_monthly_aggregates"""
+
+    def test_same_shape_as_monthly_summary(self):
+        """Test aggregate rows become the monthly_summary frame"""
+        conn = MagicMock()
+        conn.execute.return_value.fetchall.return_value = [
+            ('a', pd.Timestamp('2024-01-01').date(), 5000, 1000, 4),
+            ('a', pd.Timestamp('2024-02-01').date(), 0, 300, 1),
+        ]
+        expected = analytics.monthly_summary(make_frame([
+            ('a', 'x', '2024-01-01', 5000, None),
+            ('a', 'x', '2024-01-02', -300, None),
+            ('a', 'x', '2024-01-03', -600, None),
+            ('a', 'y', '2024-01-31', -100, None),
+            ('a', 'x', '2024-02-10', -300, None),
+        ]))
+
+        summary = analytics.load_monthly_aggregates(['item-1'], date_from='2024-01-01', conn=conn)
+
+        pd.testing.assert_frame_equal(summary, expected)
+        self.assertEqual(conn.execute.call_args.args[1], [['item-1'], '2024-01-01'])
+
+    def test_no_rows(self):
+        """Test no aggregates give an empty summary"""
+        conn = MagicMock()
+        conn.execute.return_value.fetchall.return_value = []
+
+        summary = analytics.load_monthly_aggregates(email='a@x.com', conn=conn)
+
+        self.assertEqual(len(summary), 0)
+        self.assertEqual(list(summary.columns), list(analytics.monthly_summary(analytics.empty_frame()).columns))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Tests for app.py, run through Streamlit's AppTest
+
+Tests cover:
+- Typing a complete e-mail prefetches the user's connect token; a
+  half-typed one doesn't and a corrected one replaces the previous prefetch
+- Submitting uses the prefetched token instead of minting another one
+- The export block keeps only a temporary file path in the session
+"""
+
+import os
+import unittest
+from unittest.mock import Mock, patch
+
+from streamlit.testing.v1 import AppTest
+
+from modules import connect_token_pool, export
+from modules.connect_token_pool import ConnectTokenPool
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+
+class TestConnectForm(unittest.TestCase):
+    """Test the connect form's token path"""
+
+    def setUp(self):
+        """Run the app against a process-wide pool with a fake client"""
+        self.client = Mock()
+        self.client.create_connect_token.side_effect = lambda user_id=None: f'token_{user_id}'
+        self.pool = ConnectTokenPool(client=self.client, min_remaining_seconds=60)
+        self.addCleanup(self.pool.stop)
+        for patcher in (patch.object(connect_token_pool, '_pool', self.pool),
+                        patch('modules.validator.startup_validation'),
+                        patch('modules.connect_token_pool.create_connect_token',
+                              side_effect=AssertionError('minted on submit'))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.app = AppTest.from_file(APP_PATH, default_timeout=30)
+        self.app.run()
+
+    def test_email_change_prefetches_token(self):
+        """Test leaving the e-mail field starts minting the user's token"""
+        self.app.text_input(key='client_email').input(' user@example.com ').run()
+
+        self.assertEqual(self.pool.stats()['speculative_minted'], 1)
+        self.client.create_connect_token.assert_called_once_with('user@example.com')
+
+    def test_incomplete_email_not_prefetched(self):
+        """Test a half-typed address mints nothing"""
+        self.app.text_input(key='client_email').input('user@exam').run()
+
+        self.assertEqual(self.pool.stats()['speculative_minted'], 0)
+        self.client.create_connect_token.assert_not_called()
+
+    def test_corrected_email_replaces_prefetch(self):
+        """Test correcting the e-mail discards the token prefetched for the typo"""
+        self.app.text_input(key='client_email').input('user@exampel.com').run()
+        self.app.text_input(key='client_email').input('user@example.com').run()
+
+        stats = self.pool.stats()
+        self.assertEqual((stats['speculative_discarded'], stats['speculative_pending']), (1, 1))
+
+    def test_submit_uses_prefetched_token(self):
+        """Test the submit takes the prefetched token without another mint"""
+        self.app.text_input(key='client_name').input('Maria').run()
+        self.app.text_input(key='client_email').input('user@example.com').run()
+
+        self.app.button[0].click().run()
+
+        self.assertEqual(self.app.session_state.connect_token, 'token_user@example.com')
+        self.assertEqual(self.pool.stats()['speculative_hits'], 1)
+        self.client.create_connect_token.assert_called_once_with('user@example.com')
+
+
+class TestExportForm(unittest.TestCase):
+    """Test the support export block (/?export=1)"""
+
+    def setUp(self):
+        """Run the app with an access key and a fake export writing a few bytes"""
+        self.chunks = [b'a,b\r\n', b'1,2\r\n']
+        for patcher in (patch.dict(os.environ, {'EXPORT_ACCESS_KEY': 'chave'}),
+                        patch('modules.validator.startup_validation'),
+                        patch.object(export, 'export_transactions', side_effect=self.fake_export)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.app = AppTest.from_file(APP_PATH, default_timeout=30)
+        self.app.query_params['export'] = '1'
+        self.app.run()
+
+    def fake_export(self, out, fmt, item_id, email, conn):
+        for chunk in self.chunks:
+            out.write(chunk)
+        return {'rows': len(self.chunks)}
+
+    def generate(self, target='ana@x.com'):
+        self.app.text_input[2].input('chave')
+        self.app.text_input[3].input(target)
+        self.app.button[1].click().run()
+        return self.app.session_state['export_file'] if 'export_file' in self.app.session_state else None
+
+    def test_session_holds_path_only(self):
+        """Test the export stays on disk and a new one removes the previous file"""
+        first = self.generate()
+        self.addCleanup(first.discard)
+
+        self.assertTrue(os.path.exists(first.path))
+        self.assertEqual(first.size, 10)
+        self.assertEqual(len(self.app.get('download_button')), 1)
+
+        second = self.generate('item-1')
+        self.addCleanup(second.discard)
+
+        self.assertFalse(os.path.exists(first.path))
+        self.assertTrue(os.path.exists(second.path))
+
+    def test_large_export_refused(self):
+        """Test an export over the cap points to the CLI and offers no download"""
+        with patch.object(export, 'EXPORT_APP_MAX_BYTES', 8):
+            export_file = self.generate()
+
+        self.assertIsNone(export_file)
+        self.assertIn('python -m modules.export', self.app.warning[0].value)
+        self.assertEqual(len(self.app.get('download_button')), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/circuit_breaker.py
+
+Tests cover:
+- Opening on failure rate within the window
+- Fast-fail while open and half-open single probe
+- State-transition metrics
+"""
+
+import unittest
+import time
+from unittest.mock import patch
+from modules.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test CircuitBreaker state machine"""
+    
+    def _breaker(self, **kwargs):
+        options = dict(failure_rate_threshold=0.5, window_seconds=60, min_calls=4, cooldown_seconds=0.05)
+        options.update(kwargs)
+        return CircuitBreaker('test', **options)
+    
+    def test_stays_closed_below_min_calls(self):
+        """Test failures below min_calls never open the breaker"""
+        breaker = self._breaker()
+        for _ in range(3):
+            breaker.record_failure()
+        
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertTrue(breaker.allow_request())
+    
+    def test_opens_on_failure_rate(self):
+        """Test the breaker opens when the failure rate reaches the threshold"""
+        breaker = self._breaker()
+        breaker.record_success()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+        
+        breaker.record_failure()
+        
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow_request())
+        self.assertEqual(breaker.stats()['rejected'], 1)
+    
+    def test_old_outcomes_leave_window(self):
+        """Test outcomes older than the window are not counted"""
+        breaker = self._breaker(window_seconds=10)
+        with patch('modules.circuit_breaker.time.monotonic', return_value=1000.0):
+            for _ in range(3):
+                breaker.record_failure()
+        with patch('modules.circuit_breaker.time.monotonic', return_value=1020.0):
+            breaker.record_failure()
+            self.assertEqual(breaker.stats()['window_failures'], 1)
+            self.assertEqual(breaker.stats()['state'], CLOSED)
+    
+    def test_half_open_allows_single_probe(self):
+        """Test only one probe goes through after the cool-down"""
+        breaker = self._breaker(min_calls=1)
+        breaker.record_failure()
+        time.sleep(0.06)
+        
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+    
+    def test_probe_success_closes(self):
+        """Test a successful probe closes the breaker"""
+        breaker = self._breaker(min_calls=1)
+        breaker.record_failure()
+        time.sleep(0.06)
+        breaker.allow_request()
+        
+        breaker.record_success()
+        
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.stats()['window_calls'], 0)
+    
+    def test_probe_failure_reopens(self):
+        """Test a failed probe opens the breaker again"""
+        breaker = self._breaker(min_calls=1)
+        breaker.record_failure()
+        time.sleep(0.06)
+        breaker.allow_request()
+        
+        breaker.record_failure()
+        
+        self.assertEqual(breaker.state, OPEN)
+    
+    def test_release_frees_probe(self):
+        """Test a released probe lets the next caller probe"""
+        breaker = self._breaker(min_calls=1)
+        breaker.record_failure()
+        time.sleep(0.06)
+        breaker.allow_request()
+        
+        breaker.release()
+        
+        self.assertTrue(breaker.allow_request())
+    
+    def test_transition_metrics(self):
+        """Test transitions are counted per from->to pair"""
+        breaker = self._breaker(min_calls=1)
+        breaker.record_failure()
+        time.sleep(0.06)
+        breaker.allow_request()
+        breaker.record_success()
+        
+        transitions = breaker.stats()['transitions']
+        
+        self.assertEqual(transitions, {'closed->open': 1, 'open->half_open': 1, 'half_open->closed': 1})
+    
+    def test_reset(self):
+        """Test reset closes the breaker and clears counters"""
+        breaker = self._breaker(min_calls=1, cooldown_seconds=60)
+        breaker.record_failure()
+        
+        breaker.reset()
+        
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.stats()['transitions'], {})
+    
+    def test_invalid_threshold(self):
+        """Test failure_rate_threshold validation"""
+        with self.assertRaises(ValueError):
+            CircuitBreaker('test', failure_rate_threshold=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/client_writer.py
+
+Tests cover:
+- Batching of queued rows by the background worker
+- Spill to local file on write failure and queue overflow
+- Replay of spilled rows on restart and at process start
+- Rejected rows retried one by one and quarantined; repeated item_ids
+- Flush/stop semantics
+- Sync fallback when write-behind is disabled
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import psycopg
+
+from modules.client_writer import ClientWriteBehind, save_client_deferred, start_client_writer
+
+
+class RecordingWriter:
+    """Bulk writer stand-in that records batches and can fail on demand"""
+    
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+        self.reject = set()
+        self.lock = threading.Lock()
+    
+    def __call__(self, rows):
+        rows = list(rows)
+        if self.fail:
+            raise psycopg.OperationalError("database unavailable")
+        if any(row[2] in self.reject for row in rows):
+            raise psycopg.IntegrityError("null value in column \"email\"")
+        with self.lock:
+            self.batches.append(rows)
+        return [row[2] for row in rows]
+    
+    @property
+    def rows(self):
+        return [row for batch in self.batches for row in batch]
+
+
+class WriterTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.spill_path = os.path.join(self.tmpdir, 'spill', 'clients.jsonl')
+        self.writer = RecordingWriter()
+    
+    def make(self, **kwargs):
+        options = dict(spill_path=self.spill_path, writer=self.writer,
+                       flush_interval_seconds=0.05, replay_interval_seconds=0.1)
+        options.update(kwargs)
+        queue_writer = ClientWriteBehind(**options)
+        self.addCleanup(queue_writer.stop, 2)
+        return queue_writer
+    
+    def spilled_rows(self):
+        return [tuple(line) for line in self.read_lines(self.spill_path)]
+    
+    def quarantined_rows(self):
+        return [tuple(line['row']) for line in self.read_lines(self.spill_path.replace('.jsonl', '_quarantine.jsonl'))]
+    
+    @staticmethod
+    def read_lines(path):
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as lines:
+            return [json.loads(line) for line in lines]
+    
+    def write_spill(self, rows):
+        os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+        with open(self.spill_path, 'w', encoding='utf-8') as spill:
+            for row in rows:
+                spill.write((row if isinstance(row, str) else json.dumps(list(row))) + '\n')
+
+
+class TestWriteBehind(WriterTestCase):
+    """Test queueing and batching"""
+    
+    def test_rows_written_in_batches(self):
+        """Test worker groups queued rows into bulk writes"""
+        queue_writer = self.make(batch_size=10)
+        
+        for i in range(25):
+            queue_writer.enqueue('Ana', 'ana@example.com', f'item-{i}')
+        
+        self.assertTrue(queue_writer.flush(timeout=5))
+        self.assertEqual(len(self.writer.rows), 25)
+        self.assertTrue(all(len(batch) <= 10 for batch in self.writer.batches))
+        self.assertLess(len(self.writer.batches), 25)
+        self.assertEqual(queue_writer.stats()['written'], 25)
+    
+    def test_enqueue_does_not_wait_for_database(self):
+        """Test enqueue returns while the writer is blocked"""
+        release = threading.Event()
+        
+        def slow_writer(rows):
+            release.wait(5)
+        
+        queue_writer = self.make(writer=slow_writer)
+        queue_writer.enqueue('Ana', 'ana@example.com', 'item-1')
+        queue_writer.enqueue('Bia', 'bia@example.com', 'item-2')
+        
+        self.assertGreaterEqual(queue_writer.stats()['enqueued'], 2)
+        release.set()
+    
+    def test_stop_flushes_queue(self):
+        """Test stop writes every queued row"""
+        queue_writer = self.make()
+        for i in range(5):
+            queue_writer.enqueue('Ana', 'ana@example.com', f'item-{i}')
+        
+        queue_writer.stop()
+        
+        self.assertEqual(len(self.writer.rows), 5)
+    
+    def test_invalid_batch_size(self):
+        """Test batch_size must be positive"""
+        with self.assertRaises(ValueError):
+            ClientWriteBehind(batch_size=0)
+
+
+class TestSpill(WriterTestCase):
+    """Test spill to disk and replay"""
+    
+    def test_failed_batch_spilled_and_replayed(self):
+        """Test rows survive a database outage"""
+        self.writer.fail = True
+        queue_writer = self.make()
+        queue_writer.enqueue('Ana', 'ana@example.com', 'item-1')
+        
+        self.assertFalse(queue_writer.flush(timeout=5))
+        self.assertEqual(self.spilled_rows(), [('Ana', 'ana@example.com', 'item-1')])
+        
+        self.writer.fail = False
+        self.assertTrue(queue_writer.flush(timeout=5))
+        self.assertEqual(self.writer.rows, [('Ana', 'ana@example.com', 'item-1')])
+        self.assertFalse(queue_writer.pending_spill())
+        self.assertEqual(queue_writer.stats()['replayed'], 1)
+    
+    def test_replay_on_restart(self):
+        """Test spill left by a previous process is written on start"""
+        self.writer.fail = True
+        first = self.make()
+        first.enqueue('Ana', 'ana@example.com', 'item-1')
+        first.stop()
+        self.assertEqual(len(self.spilled_rows()), 1)
+        
+        self.writer.fail = False
+        second = self.make()
+        second.start()
+        second.flush(timeout=5)
+        
+        self.assertEqual(self.writer.rows, [('Ana', 'ana@example.com', 'item-1')])
+    
+    def test_interrupted_replay_recovered(self):
+        """Test a leftover .replay file is replayed"""
+        os.makedirs(os.path.dirname(self.spill_path))
+        with open(self.spill_path + '.replay', 'w', encoding='utf-8') as replay:
+            replay.write(json.dumps(['Ana', 'ana@example.com', 'item-1']) + '\n')
+        
+        replayed = self.make().replay_spill()
+        
+        self.assertEqual(replayed, 1)
+        self.assertFalse(os.path.exists(self.spill_path + '.replay'))
+    
+    def test_repeated_item_id_replayed_once(self):
+        """Test a spill repeating an item_id is written as one row, the named one"""
+        self.write_spill([('', 'ana@example.com', 'item-1'), ('Ana', 'ana@example.com', 'item-1'),
+                          ('', 'ana@example.com', 'item-1'), ('Bia', 'bia@example.com', 'item-2')])
+        
+        self.assertEqual(self.make().replay_spill(), 2)
+        self.assertEqual(self.writer.rows, [('Ana', 'ana@example.com', 'item-1'), ('Bia', 'bia@example.com', 'item-2')])
+    
+    def test_rejected_row_quarantined(self):
+        """Test a row the database rejects doesn't hold back the rest of its batch"""
+        self.writer.reject = {'item-2'}
+        queue_writer = self.make(batch_size=10)
+        for i in range(4):
+            queue_writer.enqueue('Ana', 'ana@example.com', f'item-{i}')
+        
+        self.assertTrue(queue_writer.flush(timeout=5))
+        
+        self.assertEqual([row[2] for row in self.writer.rows], ['item-0', 'item-1', 'item-3'])
+        self.assertEqual(self.quarantined_rows(), [('Ana', 'ana@example.com', 'item-2')])
+        self.assertEqual(self.spilled_rows(), [])
+        self.assertEqual(queue_writer.stats()['quarantined'], 1)
+    
+    def test_bad_spilled_rows_dont_block_replay(self):
+        """Test rejected and unreadable spill lines are quarantined and the others written"""
+        self.writer.reject = {'item-bad'}
+        self.write_spill([('Ana', 'ana@example.com', 'item-1'), ('X', None, 'item-bad'), '{not json',
+                          ('Bia', 'bia@example.com', 'item-2')])
+        queue_writer = self.make()
+        
+        self.assertEqual(queue_writer.replay_spill(), 2)
+        
+        self.assertFalse(queue_writer.pending_spill())
+        self.assertEqual(len(self.quarantined_rows()), 2)
+        self.assertEqual([row[2] for row in self.writer.rows], ['item-1', 'item-2'])
+    
+    def test_outage_during_row_retry_keeps_remaining_rows(self):
+        """Test rows not yet retried when the database goes away are spilled again, not quarantined"""
+        calls = []
+        
+        def writer(rows):
+            rows = list(rows)
+            calls.append(rows)
+            if len(calls) == 1:
+                raise psycopg.IntegrityError("bad row")
+            if len(calls) == 3:
+                raise psycopg.OperationalError("connection lost")
+        
+        self.write_spill([('Ana', 'a@x', 'item-1'), ('Bia', 'b@x', 'item-2'), ('Caio', 'c@x', 'item-3')])
+        
+        self.assertEqual(self.make(writer=writer).replay_spill(), 1)
+        self.assertEqual(self.spilled_rows(), [('Bia', 'b@x', 'item-2'), ('Caio', 'c@x', 'item-3')])
+        self.assertEqual(self.quarantined_rows(), [])
+    
+    def test_queue_overflow_spills(self):
+        """Test rows that don't fit in the queue go to disk"""
+        release = threading.Event()
+        started = threading.Event()
+        
+        def blocked_writer(rows):
+            started.set()
+            release.wait(5)
+        
+        queue_writer = self.make(writer=blocked_writer, maxsize=1, batch_size=1)
+        queue_writer.enqueue('Ana', 'ana@example.com', 'item-0')
+        started.wait(2)
+        queue_writer.enqueue('Ana', 'ana@example.com', 'item-1')
+        queue_writer.enqueue('Ana', 'ana@example.com', 'item-2')
+        
+        self.assertEqual(self.spilled_rows(), [('Ana', 'ana@example.com', 'item-2')])
+        release.set()
+    
+    def test_enqueue_after_stop_spills(self):
+        """Test rows arriving during shutdown are not lost"""
+        queue_writer = self.make()
+        queue_writer.stop()
+        
+        queue_writer.enqueue('Ana', 'ana@example.com', 'item-1')
+        
+        self.assertEqual(len(self.spilled_rows()), 1)
+
+
+class TestSaveClientDeferred(unittest.TestCase):
+    """Test module-level entry point"""
+    
+    @patch('modules.client_writer.WRITE_BEHIND_ENABLED', False)
+    @patch('modules.client_writer.save_client')
+    def test_sync_when_disabled(self, mock_save):
+        """Test save_client is called directly by default"""
+        mock_save.return_value = 3
+        
+        self.assertEqual(save_client_deferred('Ana', 'ana@example.com', 'item-1'), 3)
+        mock_save.assert_called_once_with('Ana', 'ana@example.com', 'item-1')
+    
+    @patch('modules.client_writer.WRITE_BEHIND_ENABLED', True)
+    @patch('modules.client_writer.get_client_writer')
+    def test_started_at_process_start(self, mock_get_writer):
+        """Test the worker (and its spill replay) starts without waiting for a client"""
+        start_client_writer()
+        
+        mock_get_writer.return_value.start.assert_called_once_with()
+    
+    @patch('modules.client_writer.WRITE_BEHIND_ENABLED', False)
+    @patch('modules.client_writer.get_client_writer')
+    def test_not_started_when_disabled(self, mock_get_writer):
+        """Test nothing starts with write-behind disabled"""
+        start_client_writer()
+        
+        mock_get_writer.assert_not_called()
+    
+    @patch('modules.client_writer.WRITE_BEHIND_ENABLED', True)
+    @patch('modules.client_writer.get_client_writer')
+    @patch('modules.client_writer.save_client')
+    def test_enqueue_when_enabled(self, mock_save, mock_get_writer):
+        """Test rows are queued when write-behind is enabled"""
+        self.assertIsNone(save_client_deferred('Ana', 'ana@example.com', 'item-1'))
+        
+        mock_get_writer.return_value.enqueue.assert_called_once_with('Ana', 'ana@example.com', 'item-1')
+        mock_save.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/connect_token_pool.py
+
+Tests cover:
+- Background refill between low and high watermarks
+- Discard of expiring tokens
+- Speculative per-user tokens: replaced prefetches discarded, bounded wait
+- prefetch_connect_token only for complete e-mails
+- get_connect_token fallback to a regular mint
+"""
+
+import unittest
+import time
+import threading
+from unittest.mock import patch, Mock
+from modules import connect_token_pool
+from modules.connect_token_pool import ConnectTokenPool, get_connect_token, prefetch_connect_token
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+class TestConnectTokenPool(unittest.TestCase):
+    """Test anonymous token pool"""
+    
+    def setUp(self):
+        """Set up a fake client minting numbered tokens"""
+        self.counter = 0
+        self.lock = threading.Lock()
+        self.client = Mock()
+        self.client.create_connect_token.side_effect = self._mint
+        self.pool = ConnectTokenPool(
+            client=self.client, low_watermark=2, high_watermark=4,
+            min_remaining_seconds=60, refill_interval_seconds=0.05
+        )
+    
+    def tearDown(self):
+        """Stop background threads"""
+        self.pool.stop()
+    
+    def _mint(self, client_user_id=None):
+        with self.lock:
+            self.counter += 1
+            return f"token_{client_user_id or 'anon'}_{self.counter}"
+    
+    def test_first_take_misses_and_starts_refill(self):
+        """Test an empty pool returns None and refills up to the high watermark"""
+        self.assertIsNone(self.pool.take())
+        
+        self.assertTrue(wait_until(lambda: self.pool.size() == 4))
+        self.assertEqual(self.pool.stats()['misses'], 1)
+    
+    def test_take_returns_pooled_tokens_without_network(self):
+        """Test pooled tokens are handed out in order"""
+        self.pool.take()
+        wait_until(lambda: self.pool.size() == 4)
+        calls = self.client.create_connect_token.call_count
+        
+        token = self.pool.take()
+        
+        self.assertEqual(token, 'token_anon_1')
+        self.assertEqual(self.client.create_connect_token.call_count, calls)
+        self.assertEqual(self.pool.stats()['hits'], 1)
+    
+    def test_refill_only_below_low_watermark(self):
+        """Test taking down to the low watermark doesn't trigger a refill"""
+        self.pool.take()
+        wait_until(lambda: self.pool.size() == 4)
+        self.pool.take()
+        self.pool.take()
+        time.sleep(0.1)
+        
+        self.assertEqual(self.pool.size(), 2)
+        
+        self.pool.take()
+        
+        self.assertTrue(wait_until(lambda: self.pool.size() == 4))
+    
+    def test_expiring_tokens_discarded(self):
+        """Test tokens inside the minimum remaining lifetime are dropped"""
+        with patch('modules.connect_token_pool.token_expires_in', return_value=30):
+            self.pool.take()
+            time.sleep(0.1)
+        
+        self.assertEqual(self.pool.size(), 0)
+        self.assertGreater(self.pool.stats()['discarded_expired'], 0)
+    
+    def test_refill_failure_counted(self):
+        """Test mint errors are counted and don't kill the refill thread"""
+        self.client.create_connect_token.side_effect = ValueError('indisponível')
+        self.pool.take()
+        
+        self.assertTrue(wait_until(lambda: self.pool.stats()['refill_failures'] >= 1))
+        
+        self.client.create_connect_token.side_effect = self._mint
+        self.assertTrue(wait_until(lambda: self.pool.size() == 4))
+    
+    def test_invalid_watermarks(self):
+        """Test watermark validation"""
+        with self.assertRaises(ValueError):
+            ConnectTokenPool(client=self.client, low_watermark=5, high_watermark=2)
+
+
+class TestSpeculativeTokens(unittest.TestCase):
+    """Test per-user speculative tokens"""
+    
+    def setUp(self):
+        """Set up pool with a fake client"""
+        self.client = Mock()
+        self.client.create_connect_token.side_effect = lambda user_id=None: f'token_{user_id}'
+        self.pool = ConnectTokenPool(client=self.client, min_remaining_seconds=60)
+    
+    def tearDown(self):
+        """Stop background threads"""
+        self.pool.stop()
+    
+    def test_prefetched_token_taken_once(self):
+        """Test a prefetched token is returned once for the same user"""
+        self.pool.prefetch('user@example.com')
+        
+        self.assertEqual(self.pool.take_for_user('user@example.com'), 'token_user@example.com')
+        self.assertIsNone(self.pool.take_for_user('user@example.com'))
+        stats = self.pool.stats()
+        self.assertEqual(stats['speculative_hits'], 1)
+        self.assertEqual(stats['speculative_misses'], 1)
+    
+    def test_prefetch_deduplicated(self):
+        """Test prefetching twice mints once"""
+        self.pool.prefetch('user@example.com')
+        self.pool.prefetch('user@example.com')
+        self.pool.take_for_user('user@example.com')
+        
+        self.client.create_connect_token.assert_called_once_with('user@example.com')
+    
+    def test_take_waits_for_in_flight_mint(self):
+        """Test take_for_user waits for a mint still in progress"""
+        release = threading.Event()
+        
+        def slow_mint(user_id=None):
+            release.wait(1)
+            return f'token_{user_id}'
+        
+        self.client.create_connect_token.side_effect = slow_mint
+        self.pool.prefetch('user@example.com')
+        threading.Timer(0.05, release.set).start()
+        
+        self.assertEqual(self.pool.take_for_user('user@example.com'), 'token_user@example.com')
+    
+    def test_wait_bounded_from_prefetch_start(self):
+        """Test a stuck prefetch is waited for only until wait_seconds after it started"""
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.client.create_connect_token.side_effect = lambda user_id=None: release.wait(5) and 'late'
+        self.pool.prefetch('user@example.com')
+        time.sleep(0.1)
+        
+        start = time.monotonic()
+        self.assertIsNone(self.pool.take_for_user('user@example.com', wait_seconds=0.2))
+        
+        self.assertLess(time.monotonic() - start, 0.18)
+        self.assertEqual(self.pool.stats()['speculative_misses'], 1)
+    
+    def test_replaced_prefetch_discarded(self):
+        """Test a prefetch replaced by a corrected id is dropped, not kept pending"""
+        self.pool.prefetch('user@example.co')
+        self.pool.prefetch('user@example.com', replaces='user@example.co')
+        
+        self.assertIsNone(self.pool.take_for_user('user@example.co'))
+        self.assertEqual(self.pool.take_for_user('user@example.com'), 'token_user@example.com')
+        stats = self.pool.stats()
+        self.assertEqual(stats['speculative_discarded'], 1)
+        self.assertEqual(stats['speculative_pending'], 0)
+    
+    def test_failed_prefetch_returns_none(self):
+        """Test a failed speculative mint is ignored"""
+        self.client.create_connect_token.side_effect = ValueError('erro')
+        self.pool.prefetch('user@example.com')
+        
+        self.assertIsNone(self.pool.take_for_user('user@example.com'))
+
+
+class TestGetConnectToken(unittest.TestCase):
+    """Test get_connect_token convenience function"""
+    
+    def setUp(self):
+        """Install a process-wide pool with a fake client"""
+        self.client = Mock()
+        self.client.create_connect_token.side_effect = lambda user_id=None: f'pooled_{user_id}'
+        self.pool = ConnectTokenPool(client=self.client, min_remaining_seconds=60)
+        patcher = patch.object(connect_token_pool, '_pool', self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        """Stop background threads"""
+        self.pool.stop()
+    
+    @patch('modules.connect_token_pool.create_connect_token')
+    def test_falls_back_to_mint(self, mock_create):
+        """Test a regular mint is used when nothing was prefetched"""
+        mock_create.return_value = 'fresh_token'
+        
+        self.assertEqual(get_connect_token('user@example.com'), 'fresh_token')
+        mock_create.assert_called_once_with('user@example.com')
+    
+    def test_prefetch_only_complete_emails(self):
+        """Test half-typed addresses are not minted and a correction replaces the previous one"""
+        for partial in ('', 'user', 'user@', 'user@example', 'user @example.com', 'user@example.c'):
+            self.assertIsNone(prefetch_connect_token(partial))
+        
+        first = prefetch_connect_token('user@exampel.com')
+        second = prefetch_connect_token('user@example.com', replaces=first)
+        
+        self.assertEqual(second, 'user@example.com')
+        stats = self.pool.stats()
+        self.assertEqual((stats['speculative_minted'], stats['speculative_discarded']), (2, 1))
+        self.assertEqual(stats['speculative_pending'], 1)
+    
+    @patch('modules.connect_token_pool.create_connect_token')
+    def test_uses_prefetched_token(self, mock_create):
+        """Test the prefetched per-user token is used"""
+        self.pool.prefetch('user@example.com')
+        
+        self.assertEqual(get_connect_token('user@example.com'), 'pooled_user@example.com')
+        mock_create.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
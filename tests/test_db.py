@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/db.py
+
+Tests cover:
+- Lazy process-wide connection pool creation and configuration
+- Pool shutdown
+- Pool utilization and wait-time metrics
+- save_client borrowing connections from the pool; init_db through ensure_schema
+- save_clients bulk COPY ingestion (against a real Postgres when available:
+  repeated item_ids in one batch, name filled in on conflict)
+- execute_pipeline grouped statements
+- Prepared statement registry and prepare/execute counters
+"""
+
+import os
+import sys
+import unittest
+import threading
+from contextlib import nullcontext
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from postgres_fixture import PostgresTestCase
+from modules import db
+
+
+class PoolTestCase(unittest.TestCase):
+    """Base class that isolates the process-wide pool"""
+    
+    def setUp(self):
+        db._pool = None
+        patcher = patch('modules.db.ConnectionPool')
+        self.pool_cls = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, db, '_pool', None)
+        atexit_patcher = patch('modules.db.atexit.register')
+        self.atexit_register = atexit_patcher.start()
+        self.addCleanup(atexit_patcher.stop)
+
+
+class TestGetPool(PoolTestCase):
+    """Test get_pool/close_pool"""
+    
+    def test_pool_created_lazily_once(self):
+        """Test pool is created on first use and reused afterwards"""
+        self.pool_cls.assert_not_called()
+        
+        first = db.get_pool()
+        second = db.get_pool()
+        
+        self.assertIs(first, second)
+        self.pool_cls.assert_called_once()
+        self.atexit_register.assert_called_once_with(db.close_pool)
+    
+    def test_pool_configuration(self):
+        """Test pool uses DB config, size limits and checkout health check"""
+        db.get_pool()
+        
+        kwargs = self.pool_cls.call_args.kwargs
+        self.assertEqual(kwargs['kwargs'], db.CONNECT_KWARGS)
+        self.assertEqual(kwargs['kwargs']['target_session_attrs'], 'read-write')
+        self.assertEqual(kwargs['check'], self.pool_cls.check_connection)
+        for key in ('min_size', 'max_size', 'max_idle', 'max_lifetime', 'timeout'):
+            self.assertEqual(kwargs[key], db.POOL_CONFIG[key])
+    
+    def test_concurrent_first_use_creates_single_pool(self):
+        """Test concurrent callers share one pool"""
+        barrier = threading.Barrier(8)
+        pools = []
+        
+        def worker():
+            barrier.wait()
+            pools.append(db.get_pool())
+        
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.pool_cls.assert_called_once()
+        self.assertEqual(len(set(map(id, pools))), 1)
+    
+    def test_close_pool(self):
+        """Test close_pool closes and forgets the pool"""
+        pool = db.get_pool()
+        
+        db.close_pool()
+        
+        pool.close.assert_called_once()
+        self.assertIsNone(db._pool)
+        db.close_pool()  # idempotent
+
+
+class TestPoolStats(PoolTestCase):
+    """Test pool_stats metrics"""
+    
+    def test_empty_before_pool_created(self):
+        """Test no metrics before first use"""
+        self.assertEqual(db.pool_stats(), {})
+    
+    def test_utilization_and_wait(self):
+        """Test utilization and average wait are derived from pool stats"""
+        pool = db.get_pool()
+        pool.max_size = 10
+        pool.get_stats.return_value = {
+            'pool_size': 4,
+            'pool_available': 1,
+            'requests_num': 8,
+            'requests_wait_ms': 40,
+        }
+        
+        stats = db.pool_stats()
+        
+        self.assertEqual(stats['in_use'], 3)
+        self.assertAlmostEqual(stats['utilization'], 0.3)
+        self.assertAlmostEqual(stats['avg_wait_ms'], 5.0)
+
+
+class TestPooledQueries(PoolTestCase):
+    """Test queries borrow connections from the pool"""
+    
+    def _connection(self):
+        conn = MagicMock()
+        self.pool_cls.return_value.connection.return_value.__enter__.return_value = conn
+        return conn
+    
+    def test_save_client_uses_pool(self):
+        """Test save_client runs the insert on a pooled connection"""
+        conn = self._connection()
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.fetchone.return_value = {'id': 7}
+        
+        result = db.save_client('Ana', 'ana@example.com', 'item-1')
+        
+        self.assertEqual(result, 7)
+        self.pool_cls.return_value.connection.assert_called_once()
+        self.assertEqual(cur.execute.call_args.args[1], ('Ana', 'ana@example.com', 'item-1'))
+    
+    def test_save_client_duplicate_returns_none(self):
+        """Test existing item_id returns None"""
+        conn = self._connection()
+        conn.cursor.return_value.__enter__.return_value.fetchone.return_value = None
+        
+        self.assertIsNone(db.save_client('Ana', 'ana@example.com', 'item-1'))
+    
+    def test_lookups(self):
+        """Test lookups by item_id and email"""
+        conn = self._connection()
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.fetchone.return_value = {'item_id': 'item-1'}
+        cur.fetchall.return_value = [{'item_id': 'item-1'}]
+        
+        self.assertEqual(db.get_client_by_item_id('item-1'), {'item_id': 'item-1'})
+        self.assertEqual(db.get_clients_by_email('ana@example.com'), [{'item_id': 'item-1'}])
+        self.assertEqual(cur.execute.call_args.args, (db.SELECT_CLIENTS_BY_EMAIL_SQL, ('ana@example.com',)))
+    
+    @patch('modules.migrations.ensure_schema', return_value={'ok': True})
+    def test_init_db_runs_migrations(self, ensure_schema):
+        """Test init_db goes through ensure_schema instead of running the DDL itself"""
+        conn = self._connection()
+        
+        self.assertEqual(db.init_db(), {'ok': True})
+        
+        ensure_schema.assert_called_once_with()
+        conn.execute.assert_not_called()
+
+
+class TestSaveClients(PoolTestCase):
+    """Test save_clients bulk ingestion"""
+    
+    def setUp(self):
+        super().setUp()
+        conn = self.pool_cls.return_value.connection.return_value.__enter__.return_value
+        self.cur = conn.cursor.return_value.__enter__.return_value
+        self.copy = self.cur.copy.return_value.__enter__.return_value
+    
+    def test_rows_streamed_through_copy(self):
+        """Test tuples and dicts are written row by row from a generator"""
+        consumed = []
+        
+        def rows():
+            for i in range(3):
+                consumed.append(i)
+                yield ('Ana', 'ana@example.com', f'item-{i}')
+            yield {'name': 'Bia', 'email': 'bia@example.com', 'item_id': 'item-3'}
+        
+        self.cur.fetchall.return_value = []
+        db.save_clients(rows())
+        
+        self.assertEqual(self.copy.write_row.call_count, 4)
+        self.assertEqual(self.copy.write_row.call_args.args[0], ('Bia', 'bia@example.com', 'item-3'))
+        self.assertIn('FROM STDIN', self.cur.copy.call_args.args[0])
+    
+    def test_returns_newly_inserted_item_ids(self):
+        """Test only item_ids returned by the INSERT are reported"""
+        self.cur.fetchall.return_value = [('item-1',), ('item-3',)]
+        
+        inserted = db.save_clients([('a', 'a@x', 'item-1'), ('b', 'b@x', 'item-2'), ('c', 'c@x', 'item-3')])
+        
+        self.assertEqual(inserted, ['item-1', 'item-3'])
+        executed = [call.args[0] for call in self.cur.execute.call_args_list]
+        self.assertEqual(executed, [db.STAGING_DDL, db.BULK_INSERT_SQL])
+    
+    def test_invalid_row_raises(self):
+        """Test rows without three fields are rejected"""
+        with self.assertRaises(ValueError):
+            db.save_clients([('only-name',)])
+
+
+class TestSaveClientsPostgres(PostgresTestCase):
+    """Test save_clients against a real database"""
+    
+    def save(self, rows):
+        with patch.object(db, 'pooled_conn', lambda: nullcontext(self.conn)):
+            saved = db.save_clients(rows)
+        # The test's transaction never commits, so ON COMMIT DROP never fires
+        self.conn.execute("DROP TABLE financefly_clients_staging")
+        return saved
+    
+    def stored(self, *item_ids):
+        return dict(self.conn.execute(
+            "SELECT item_id, name FROM financefly_clients WHERE item_id = ANY(%s)", (list(item_ids),)
+        ).fetchall())
+    
+    def test_repeated_item_id_in_one_batch(self):
+        """Test a batch repeating an item_id is written once, keeping the row with a name"""
+        saved = self.save([
+            ('', 'ana@x.com', 'test-dup-1'), ('Ana', 'ana@x.com', 'test-dup-1'), ('', 'ana@x.com', 'test-dup-1'),
+            ('Bia', 'bia@x.com', 'test-dup-2'),
+        ])
+        
+        self.assertEqual(sorted(saved), ['test-dup-1', 'test-dup-2'])
+        self.assertEqual(self.stored('test-dup-1', 'test-dup-2'), {'test-dup-1': 'Ana', 'test-dup-2': 'Bia'})
+    
+    def test_existing_item_only_gets_missing_name(self):
+        """Test existing clients are reported only when their empty name is filled in"""
+        self.save([('', 'ana@x.com', 'test-dup-1'), ('Bia', 'bia@x.com', 'test-dup-2')])
+        
+        saved = self.save([('Ana', 'ana@x.com', 'test-dup-1'), ('Outra', 'bia@x.com', 'test-dup-2'),
+                           ('Outra', 'bia@x.com', 'test-dup-2')])
+        
+        self.assertEqual(saved, ['test-dup-1'])
+        self.assertEqual(self.stored('test-dup-1', 'test-dup-2'), {'test-dup-1': 'Ana', 'test-dup-2': 'Bia'})
+
+
+class TestSaveWebhookEvents(PoolTestCase):
+    """Test save_webhook_events"""
+    
+    def setUp(self):
+        super().setUp()
+        conn = self.pool_cls.return_value.connection.return_value.__enter__.return_value
+        self.cur = conn.cursor.return_value.__enter__.return_value
+        self.copy = self.cur.copy.return_value.__enter__.return_value
+    
+    def test_events_copied_and_inserted(self):
+        """Test events go through COPY, then event and client inserts"""
+        self.cur.fetchall.return_value = [('evt-1',)]
+        events = [{
+            'event_id': 'evt-1', 'event': 'item/created', 'item_id': 'item-1',
+            'client_user_id': 'ana@example.com', 'payload': {'event': 'item/created'},
+        }]
+        
+        inserted = db.save_webhook_events(events)
+        
+        self.assertEqual(inserted, ['evt-1'])
+        self.assertEqual(
+            self.copy.write_row.call_args.args[0],
+            ('evt-1', 'item/created', 'item-1', 'ana@example.com', '{"event": "item/created"}')
+        )
+        executed = [call.args[0] for call in self.cur.execute.call_args_list]
+        self.assertEqual(executed, [db.WEBHOOK_STAGING_DDL, db.WEBHOOK_INSERT_SQL, db.WEBHOOK_CLIENTS_SQL])
+
+
+class TestExecutePipeline(PoolTestCase):
+    """Test execute_pipeline"""
+    
+    def setUp(self):
+        super().setUp()
+        self.conn = self.pool_cls.return_value.connection.return_value.__enter__.return_value
+        self.conn.autocommit = False
+    
+    def test_statements_run_inside_pipeline(self):
+        """Test every statement is executed in one pipeline and results are collected"""
+        select_cur, update_cur = MagicMock(), MagicMock()
+        select_cur.fetchall.return_value = [{'id': 1}]
+        update_cur.description = None
+        self.conn.cursor.side_effect = [select_cur, update_cur]
+        
+        results = db.execute_pipeline([
+            (db.SELECT_CLIENT_BY_ITEM_ID_SQL, ('item-1',)),
+            ('UPDATE financefly_clients SET name = %s WHERE item_id = %s', ('Ana', 'item-1')),
+        ])
+        
+        self.assertEqual(results, [[{'id': 1}], None])
+        self.conn.pipeline.assert_called_once()
+        select_cur.execute.assert_called_once_with(db.SELECT_CLIENT_BY_ITEM_ID_SQL, ('item-1',))
+        select_cur.close.assert_called_once()
+        update_cur.close.assert_called_once()
+    
+    def test_autocommit_restored_on_error(self):
+        """Test the pooled connection goes back without autocommit after a failure"""
+        cur = MagicMock()
+        cur.execute.side_effect = RuntimeError('boom')
+        self.conn.cursor.return_value = cur
+        
+        with self.assertRaises(RuntimeError):
+            db.execute_pipeline([('SELECT 1', None)])
+        
+        self.assertFalse(self.conn.autocommit)
+        cur.close.assert_called_once()
+
+
+class TestPreparedStatements(unittest.TestCase):
+    """Test prepared statement registry"""
+    
+    def setUp(self):
+        db.reset_prepared_statement_stats()
+        self.addCleanup(db.reset_prepared_statement_stats)
+    
+    def _cursor(self, conn):
+        cur = MagicMock()
+        cur.connection = conn
+        return cur
+    
+    def test_prepared_once_per_connection(self):
+        """Test first execution per connection counts as prepare"""
+        first_conn, second_conn = MagicMock(), MagicMock()
+        
+        for _ in range(3):
+            db.execute_prepared(self._cursor(first_conn), 'client_exists', ('item-1',))
+        db.execute_prepared(self._cursor(second_conn), 'client_exists', ('item-1',))
+        
+        self.assertEqual(db.prepared_statement_stats()['client_exists'], {'prepares': 2, 'executes': 4})
+    
+    def test_executes_registered_sql_with_prepare(self):
+        """Test the registered SQL is executed with prepare=True"""
+        cur = self._cursor(MagicMock())
+        
+        db.execute_prepared(cur, 'insert_client', ('Ana', 'ana@example.com', 'item-1'))
+        
+        cur.execute.assert_called_once_with(
+            db.INSERT_CLIENT_SQL, ('Ana', 'ana@example.com', 'item-1'), prepare=True
+        )
+    
+    def test_unknown_statement(self):
+        """Test unregistered names are rejected"""
+        with self.assertRaises(KeyError):
+            db.execute_prepared(self._cursor(MagicMock()), 'drop_everything', ())
+    
+    def test_hot_queries_registered(self):
+        """Test insert, lookups and existence check are in the registry"""
+        self.assertEqual(
+            set(db.PREPARED_STATEMENTS),
+            {'insert_client', 'client_by_item_id', 'clients_by_email', 'client_exists'},
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
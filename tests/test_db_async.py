@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/db_async.py
+
+Tests cover:
+- Lazy async pool creation sharing config with modules/db.py
+- Async save_client/save_clients and lookups; init_db through ensure_schema
+- Pool shutdown and metrics
+"""
+
+import unittest
+from unittest.mock import patch, MagicMock, AsyncMock
+from modules import db, db_async
+
+
+class AsyncPoolTestCase(unittest.IsolatedAsyncioTestCase):
+    """Base class with a mocked AsyncConnectionPool"""
+    
+    def setUp(self):
+        db_async._pool = None
+        self.addCleanup(setattr, db_async, '_pool', None)
+        patcher = patch('modules.db_async.AsyncConnectionPool')
+        self.pool_cls = patcher.start()
+        self.addCleanup(patcher.stop)
+        
+        self.pool = self.pool_cls.return_value
+        self.pool.open = AsyncMock()
+        self.pool.close = AsyncMock()
+        self.conn = MagicMock()
+        self.pool.connection.return_value.__aenter__.return_value = self.conn
+        self.conn.execute = AsyncMock()
+        self.cur = MagicMock()
+        self.cur.execute = AsyncMock()
+        self.cur.fetchone = AsyncMock()
+        self.cur.fetchall = AsyncMock()
+        self.conn.cursor.return_value.__aenter__.return_value = self.cur
+        self.copy = MagicMock()
+        self.copy.write_row = AsyncMock()
+        self.cur.copy.return_value.__aenter__.return_value = self.copy
+
+
+class TestAsyncPool(AsyncPoolTestCase):
+    """Test get_async_pool/close_async_pool"""
+    
+    async def test_pool_created_once_with_shared_config(self):
+        """Test pool reuses sync module config and is created once"""
+        first = await db_async.get_async_pool()
+        second = await db_async.get_async_pool()
+        
+        self.assertIs(first, second)
+        self.pool_cls.assert_called_once()
+        kwargs = self.pool_cls.call_args.kwargs
+        self.assertEqual(kwargs['kwargs'], db.CONNECT_KWARGS)
+        self.assertEqual(kwargs['max_size'], db.POOL_CONFIG['max_size'])
+        self.assertFalse(kwargs['open'])
+        self.pool.open.assert_awaited()
+    
+    async def test_close_pool(self):
+        """Test close_async_pool closes and forgets the pool"""
+        await db_async.get_async_pool()
+        
+        await db_async.close_async_pool()
+        
+        self.pool.close.assert_awaited_once()
+        self.assertEqual(db_async.async_pool_stats(), {})
+
+
+class TestAsyncOperations(AsyncPoolTestCase):
+    """Test async queries"""
+    
+    async def test_init_db(self):
+        """Test init_db goes through ensure_schema instead of running the DDL itself"""
+        with patch.object(db_async, 'ensure_schema', return_value={'ok': True}) as ensure_schema:
+            self.assertEqual(await db_async.init_db(), {'ok': True})
+        
+        ensure_schema.assert_called_once_with()
+        self.conn.execute.assert_not_called()
+    
+    async def test_save_client(self):
+        """Test save_client returns the new id"""
+        self.cur.fetchone.return_value = {'id': 5}
+        
+        result = await db_async.save_client('Ana', 'ana@example.com', 'item-1')
+        
+        self.assertEqual(result, 5)
+        self.cur.execute.assert_awaited_once_with(
+            db.INSERT_CLIENT_SQL, ('Ana', 'ana@example.com', 'item-1'), prepare=True
+        )
+    
+    async def test_save_client_duplicate(self):
+        """Test existing item_id returns None"""
+        self.cur.fetchone.return_value = None
+        
+        self.assertIsNone(await db_async.save_client('Ana', 'ana@example.com', 'item-1'))
+    
+    async def test_save_clients_from_async_iterable(self):
+        """Test rows from an async generator are streamed through COPY"""
+        async def rows():
+            for i in range(3):
+                yield ('Ana', 'ana@example.com', f'item-{i}')
+        
+        self.cur.fetchall.return_value = [('item-0',), ('item-2',)]
+        
+        inserted = await db_async.save_clients(rows())
+        
+        self.assertEqual(inserted, ['item-0', 'item-2'])
+        self.assertEqual(self.copy.write_row.await_count, 3)
+    
+    async def test_save_clients_from_iterable(self):
+        """Test plain iterables and dict rows are accepted"""
+        self.cur.fetchall.return_value = []
+        
+        await db_async.save_clients([{'name': 'Ana', 'email': 'ana@example.com', 'item_id': 'item-1'}])
+        
+        self.copy.write_row.assert_awaited_once_with(('Ana', 'ana@example.com', 'item-1'))
+    
+    async def test_client_exists(self):
+        """Test existence check uses the prepared statement"""
+        self.cur.fetchone.return_value = (True,)
+        
+        self.assertTrue(await db_async.client_exists('item-1'))
+        self.cur.execute.assert_awaited_once_with(db.CLIENT_EXISTS_SQL, ('item-1',), prepare=True)
+    
+    async def test_lookups(self):
+        """Test lookups by item_id and email use the shared SQL"""
+        self.cur.fetchone.return_value = {'item_id': 'item-1'}
+        self.cur.fetchall.return_value = [{'item_id': 'item-1'}]
+        
+        self.assertEqual(await db_async.get_client_by_item_id('item-1'), {'item_id': 'item-1'})
+        self.assertEqual(await db_async.get_clients_by_email('ana@example.com'), [{'item_id': 'item-1'}])
+        
+        executed = [call.args for call in self.cur.execute.await_args_list]
+        self.assertEqual(executed, [
+            (db.SELECT_CLIENT_BY_ITEM_ID_SQL, ('item-1',)),
+            (db.SELECT_CLIENTS_BY_EMAIL_SQL, ('ana@example.com',)),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/export.py
+
+Tests cover:
+- Month-by-month server-side cursor batching and target validation
+- CSV output: header line, then each month's COPY output
+- Parquet output with one row group per month and split large months
+- Temporary export files for the app: size cap and removal
+- File names and CLI arguments
+- CSV and Parquet exports of a small item and client on real Postgres
+  (skipped when unavailable): month boundaries, one row group per month
+"""
+
+import io
+import os
+import gc
+import sys
+import csv
+import uuid
+import unittest
+from datetime import date, datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from postgres_fixture import PostgresTestCase
+from modules import export, finance_db
+
+
+def make_row(i, tx_date):
+    return (
+        'ana@x.com', 'Ana', 'item-1', 'acc-1', 'Conta', 'BANK', 'BRL', f'tx-{i}', tx_date,
+        -1000 - i, '05070000', 'Food', 'POSTED', 'DEBIT', f'compra {i}',
+        datetime(2024, 1, 1, tzinfo=timezone.utc),
+    )
+
+
+def make_batches(dates, size):
+    """(month, rows) pairs as iter_export_batches() yields them"""
+    batches = []
+    for i, day in enumerate(dates):
+        month = day.replace(day=1)
+        if not batches or batches[-1][0] != month or len(batches[-1][1]) == size:
+            batches.append((month, []))
+        batches[-1][1].append(make_row(i, day))
+    return batches
+
+
+DATES = [date(2024, 1, 5)] * 3 + [date(2024, 1, 31), date(2024, 2, 1), date(2024, 2, 2)] + [date(2024, 12, 31)] * 2
+
+
+class TestIterExportBatches(unittest.TestCase):
+    """Test iter_export_batches"""
+
+    def test_named_cursor_per_month(self):
+        """Test each month between the first and last date gets its own server-side cursor"""
+        conn = MagicMock()
+        conn.execute.return_value.fetchone.return_value = (date(2024, 11, 20), date(2025, 1, 3))
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.fetchmany.side_effect = [[('a',), ('b',)], [('c',)], [], [], [('d',)], []]
+
+        batches = list(export.iter_export_batches(item_id='item-1', conn=conn, batch_size=2))
+
+        self.assertEqual(batches, [
+            (date(2024, 11, 1), [('a',), ('b',)]),
+            (date(2024, 11, 1), [('c',)]),
+            (date(2025, 1, 1), [('d',)]),
+        ])
+        self.assertEqual(conn.cursor.call_args.kwargs, {'name': 'financefly_export'})
+        self.assertEqual([call.args[1] for call in cur.execute.call_args_list], [
+            ['item-1', date(2024, 11, 1), date(2024, 12, 1)],
+            ['item-1', date(2024, 12, 1), date(2025, 1, 1)],
+            ['item-1', date(2025, 1, 1), date(2025, 2, 1)],
+        ])
+        cur.fetchall.assert_not_called()
+
+    def test_nothing_to_export(self):
+        """Test no cursor is opened when the target has no transactions"""
+        conn = MagicMock()
+        conn.execute.return_value.fetchone.return_value = (None, None)
+
+        self.assertEqual(list(export.iter_export_batches(email='a@x.com', conn=conn)), [])
+        conn.cursor.assert_not_called()
+
+    def test_exactly_one_target(self):
+        """Test item_id and email are mutually exclusive and one is required"""
+        for kwargs in ({}, {'item_id': 'i', 'email': 'a@x.com'}):
+            with self.assertRaises(ValueError):
+                next(export.iter_export_batches(conn=MagicMock(), **kwargs))
+
+    def test_invalid_format(self):
+        """Test unknown formats are refused before querying"""
+        conn = MagicMock()
+
+        with self.assertRaises(ValueError):
+            export.export_transactions(io.BytesIO(), 'xlsx', item_id='item-1', conn=conn)
+        conn.cursor.assert_not_called()
+
+
+class TestCopyCsv(unittest.TestCase):
+    """Test copy_csv"""
+
+    def test_header_then_copy_output_per_month(self):
+        """Test each month's COPY chunks are written after one header line"""
+        conn = MagicMock()
+        conn.execute.return_value.fetchone.return_value = (date(2024, 1, 5), date(2024, 2, 2))
+        cur = conn.cursor.return_value.__enter__.return_value
+        copy = cur.copy.return_value.__enter__.return_value
+        copy.__iter__.side_effect = [iter([b'jan-1\r\n', b'jan-2\r\n']), iter([b'feb-1\r\n'])]
+        rowcounts = iter([2, 1])
+        cur.copy.return_value.__exit__.side_effect = lambda *args: setattr(cur, 'rowcount', next(rowcounts))
+        out = io.BytesIO()
+
+        stats = export.copy_csv(out, email='ana@x.com', conn=conn)
+
+        lines = list(csv.reader(io.StringIO(out.getvalue().decode('utf-8'))))
+        self.assertEqual(tuple(lines[0]), export.EXPORT_COLUMNS)
+        self.assertEqual(lines[1:], [['jan-1'], ['jan-2'], ['feb-1']])
+        self.assertEqual(stats, {'rows': 3})
+        self.assertEqual([call.args[1] for call in cur.copy.call_args_list], [
+            ['ana@x.com', date(2024, 1, 1), date(2024, 2, 1)],
+            ['ana@x.com', date(2024, 2, 1), date(2024, 3, 1)],
+        ])
+        self.assertFalse(out.closed)
+
+
+class TestWriteParquet(unittest.TestCase):
+    """Test write_parquet"""
+
+    def read(self, out):
+        out.seek(0)
+        return pq.ParquetFile(out)
+
+    def test_one_row_group_per_month(self):
+        """Test each month becomes one row group"""
+        out = io.BytesIO()
+
+        stats = export.write_parquet(make_batches(DATES, 4), out)
+
+        parquet = self.read(out)
+        groups = [parquet.read_row_group(i).column('tx_date').to_pylist() for i in range(parquet.num_row_groups)]
+        self.assertEqual(stats, {'rows': len(DATES), 'row_groups': 3})
+        self.assertEqual(groups, [DATES[:4], DATES[4:6], DATES[6:]])
+        self.assertEqual(parquet.schema_arrow, export.EXPORT_SCHEMA)
+
+    def test_large_month_split(self):
+        """Test a month above row_group_rows becomes several row groups"""
+        out = io.BytesIO()
+
+        stats = export.write_parquet(make_batches(DATES, 5), out, row_group_rows=2)
+
+        parquet = self.read(out)
+        sizes = [parquet.metadata.row_group(i).num_rows for i in range(parquet.num_row_groups)]
+        self.assertEqual(sizes, [2, 2, 2, 2])
+        self.assertEqual(stats['row_groups'], 4)
+        table = parquet.read()
+        self.assertEqual(table.column('transaction_id').to_pylist(), [f'tx-{i}' for i in range(len(DATES))])
+        self.assertEqual(table.column('amount_cents')[0].as_py(), -1000)
+
+    def test_empty_export(self):
+        """Test an export with no rows is still a valid file"""
+        out = io.BytesIO()
+
+        stats = export.write_parquet([], out)
+
+        self.assertEqual(stats['rows'], 0)
+        self.assertEqual(self.read(out).metadata.num_rows, 0)
+
+
+def fake_export(chunks):
+    """export_transactions stand-in writing the given chunks"""
+    def run(out, fmt, item_id, email, conn):
+        for chunk in chunks:
+            out.write(chunk)
+        return {'rows': len(chunks)}
+    return run
+
+
+class TestExportToTempFile(unittest.TestCase):
+    """Test export_to_temp_file"""
+
+    def test_file_kept_until_discarded(self):
+        """Test the export is on disk until discard()"""
+        with patch.object(export, 'export_transactions', side_effect=fake_export([b'a,b\r\n', b'1,2\r\n'])):
+            export_file = export.export_to_temp_file('csv', email='ana@x.com')
+
+        with export_file.open() as data:
+            self.assertEqual(data.read(), b'a,b\r\n1,2\r\n')
+        self.assertEqual((export_file.rows, export_file.size), (2, 10))
+        self.assertTrue(export_file.name.endswith('.csv'))
+
+        export_file.discard()
+        export_file.discard()
+        self.assertFalse(os.path.exists(export_file.path))
+
+    def test_removed_when_garbage_collected(self):
+        """Test dropping the last reference (the session ending) removes the file"""
+        with patch.object(export, 'export_transactions', side_effect=fake_export([b'x'])):
+            export_file = export.export_to_temp_file('csv', item_id='item-1')
+        path = export_file.path
+
+        del export_file
+        gc.collect()
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_size_cap(self):
+        """Test an export over max_bytes is refused and its partial file removed"""
+        created = []
+        real_mkstemp = export.tempfile.mkstemp
+
+        def mkstemp(**kwargs):
+            fd, path = real_mkstemp(**kwargs)
+            created.append(path)
+            return fd, path
+
+        with patch.object(export, 'export_transactions', side_effect=fake_export([b'x' * 6, b'x' * 6])), \
+                patch.object(export.tempfile, 'mkstemp', side_effect=mkstemp):
+            with self.assertRaises(ValueError) as context:
+                export.export_to_temp_file('csv', email='ana@x.com', max_bytes=10)
+
+        self.assertIn('python -m modules.export', str(context.exception))
+        self.assertFalse(os.path.exists(created[0]))
+
+
+class TestCli(unittest.TestCase):
+    """Test the command line entry point"""
+
+    def test_filename(self):
+        """Test e-mails become safe file names"""
+        with patch.object(export, 'date') as fake_date:
+            fake_date.today.return_value = date(2025, 1, 31)
+            name = export.export_filename('parquet', email='ana+1@x.com')
+
+        self.assertEqual(name, 'financefly_ana_1_at_x.com_2025-01-31.parquet')
+
+    def test_main_to_stdout(self):
+        """Test --output - streams to stdout"""
+        stats = {'rows': 1, 'duration_seconds': 0.1, 'rows_per_second': 10.0}
+        with patch.object(export, 'export_transactions', return_value=stats) as run, \
+                patch('sys.stderr', new_callable=io.StringIO):
+            export.main(['--email', 'ana@x.com', '--format', 'csv', '-o', '-'])
+
+        self.assertEqual(run.call_args.args[1:], ('csv', None, 'ana@x.com'))
+
+
+# (account, date, amount_cents, status): four months with transactions on
+# their first and last days and an empty March in between
+POSTGRES_ROWS = [
+    (0, date(2024, 1, 1), -100, 0), (1, date(2024, 1, 15), -200, 0), (0, date(2024, 1, 31), 5000, 0),
+    (0, date(2024, 2, 1), -300, 0), (1, date(2024, 2, 14), -400, 1), (0, date(2024, 2, 29), -500, 0),
+    (0, date(2024, 4, 1), -600, 0), (1, date(2024, 4, 10), -700, 0), (0, date(2024, 4, 30), -800, 1),
+    (0, date(2024, 5, 1), -900, 0), (1, date(2024, 5, 20), 1000, 0), (0, date(2024, 5, 31), -1100, 0),
+]
+
+
+class TestExportPostgres(PostgresTestCase):
+    """Test exports of a client with two items against a real database"""
+
+    def setUp(self):
+        super().setUp()
+        self.suffix = suffix = uuid.uuid4()
+        self.email = f'ana-{suffix}@x.com'
+        self.items = [f'test-item-{suffix}-a', f'test-item-{suffix}-b', f'test-item-{suffix}-other']
+        self.accounts = [str(uuid.uuid4()) for _ in self.items]
+        for item_id, account_id, email in zip(self.items, self.accounts, [self.email, self.email, f'bia-{suffix}@x.com']):
+            self.conn.execute(
+                "INSERT INTO financefly_clients (name, email, item_id) VALUES ('Ana', %s, %s)", (email, item_id)
+            )
+            self.conn.execute(
+                "INSERT INTO financefly_accounts (id, item_id, name, type, currency_code) "
+                "VALUES (%s, %s, 'Conta', 'BANK', 'BRL')",
+                (account_id, item_id),
+            )
+        self.tx_ids = [str(uuid.uuid4()) for _ in POSTGRES_ROWS]
+        rows = [
+            (self.tx_ids[i], self.accounts[account], day, amount, None, status, 0 if amount < 0 else 1,
+             f'compra {i}', None)
+            for i, (account, day, amount, status) in enumerate(POSTGRES_ROWS)
+        ]
+        # Another client's transaction in the same months stays out
+        rows.append((str(uuid.uuid4()), self.accounts[2], date(2024, 2, 1), -999, None, 0, 0, 'outro', None))
+        finance_db.save_transactions(rows, conn=self.conn)
+        # The test's transaction never commits, so ON COMMIT DROP never fires
+        self.conn.execute("DROP TABLE financefly_transactions_staging")
+
+    def test_csv_by_email(self):
+        """Test the CSV has every transaction of both items, ordered by date"""
+        out = io.BytesIO()
+
+        stats = export.export_transactions(out, 'csv', email=self.email, conn=self.conn)
+
+        lines = list(csv.DictReader(io.StringIO(out.getvalue().decode('utf-8'))))
+        self.assertEqual(stats['rows'], len(POSTGRES_ROWS))
+        self.assertEqual(tuple(lines[0]), export.EXPORT_COLUMNS)
+        self.assertEqual([line['tx_date'] for line in lines], [row[1].isoformat() for row in POSTGRES_ROWS])
+        self.assertEqual([line['transaction_id'] for line in lines], self.tx_ids)
+        self.assertEqual({line['item_id'] for line in lines}, set(self.items[:2]))
+        self.assertEqual({line['client_email'] for line in lines}, {self.email})
+        self.assertEqual([line['status'] for line in lines].count('PENDING'), 2)
+        self.assertEqual(lines[2]['type'], 'CREDIT')
+        self.assertEqual(lines[2]['amount_cents'], '5000')
+
+    def test_csv_by_item(self):
+        """Test an item export leaves out the client's other item"""
+        out = io.BytesIO()
+
+        stats = export.export_transactions(out, 'csv', item_id=self.items[1], conn=self.conn)
+
+        lines = list(csv.DictReader(io.StringIO(out.getvalue().decode('utf-8'))))
+        self.assertEqual(stats['rows'], 4)
+        self.assertEqual({line['account_id'] for line in lines}, {self.accounts[1]})
+
+    def test_parquet_row_group_per_month(self):
+        """Test the Parquet export has one row group per month with data"""
+        out = io.BytesIO()
+
+        stats = export.export_transactions(out, 'parquet', email=self.email, conn=self.conn, batch_size=2)
+
+        out.seek(0)
+        parquet = pq.ParquetFile(out)
+        groups = [parquet.read_row_group(i).column('tx_date').to_pylist() for i in range(parquet.num_row_groups)]
+        self.assertEqual((stats['rows'], stats['row_groups']), (len(POSTGRES_ROWS), 4))
+        self.assertEqual(groups, [[row[1] for row in POSTGRES_ROWS[i:i + 3]] for i in range(0, 12, 3)])
+        table = parquet.read()
+        self.assertEqual(table.column('amount_cents').to_pylist(), [row[2] for row in POSTGRES_ROWS])
+        self.assertEqual(set(table.column('account_id').to_pylist()), set(self.accounts[:2]))
+        self.assertEqual(parquet.schema_arrow, export.EXPORT_SCHEMA)
+
+    def test_nothing_to_export(self):
+        """Test an unknown e-mail gives a header-only CSV"""
+        out = io.BytesIO()
+
+        stats = export.export_transactions(out, 'csv', email=f'none-{self.suffix}@x.com', conn=self.conn)
+
+        self.assertEqual(stats['rows'], 0)
+        self.assertEqual(out.getvalue().decode('utf-8'), ','.join(export.EXPORT_COLUMNS) + '\r\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/finance_db.py
+
+Tests cover:
+- Amount conversion to integer cents
+- Pluggy transaction/account row mapping
+- Monthly partition naming, bounds and on-demand creation
+- Bulk transaction upsert statement flow
+- Monthly aggregate deletes and drift verification
+- Aggregates equal a full recompute after inserts, updates, account moves
+  and deletes (real Postgres, skipped when unavailable)
+- Pending -> posted reconciliation rounds, and its matching on real
+  Postgres (skipped when unavailable)
+- Per-item sync lag from the stored cursors (real Postgres)
+"""
+
+import os
+import sys
+import uuid
+import unittest
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from postgres_fixture import PostgresTestCase
+from modules import finance_db
+
+
+class TestConversions(unittest.TestCase):
+    """Test value and row conversions"""
+    
+    def test_to_cents(self):
+        """Test amounts are rounded to exact integer cents"""
+        self.assertEqual(finance_db.to_cents(-10.05), -1005)
+        self.assertEqual(finance_db.to_cents('1234.565'), 123457)
+        self.assertEqual(finance_db.to_cents(Decimal('0.1') + Decimal('0.2')), 30)
+        self.assertEqual(finance_db.to_cents(0.29), 29)
+        self.assertIsNone(finance_db.to_cents(None))
+    
+    def test_transaction_row(self):
+        """Test Pluggy transaction is mapped to compact columns"""
+        row = finance_db.transaction_row({
+            'id': 'tx-1',
+            'accountId': 'acc-1',
+            'date': '2024-01-31T10:00:00.000Z',
+            'amount': -10.05,
+            'categoryId': '05070000',
+            'status': 'PENDING',
+            'type': 'CREDIT',
+            'description': 'Padaria',
+            'updatedAt': '2024-01-31T10:00:00Z',
+        })
+        
+        self.assertEqual(len(row), len(finance_db.TRANSACTION_COLUMNS))
+        self.assertEqual(row, (
+            'tx-1', 'acc-1', '2024-01-31', -1005, '05070000',
+            finance_db.TRANSACTION_STATUS['PENDING'], finance_db.TRANSACTION_TYPE['CREDIT'],
+            'Padaria', '2024-01-31T10:00:00Z',
+        ))
+    
+    def test_transaction_row_defaults(self):
+        """Test missing status/type default to posted debit"""
+        row = finance_db.transaction_row({'id': 'tx-1', 'accountId': 'acc-1', 'date': '2024-01-31', 'amount': 1})
+        
+        self.assertEqual(row[5], finance_db.TRANSACTION_STATUS['POSTED'])
+        self.assertEqual(row[6], finance_db.TRANSACTION_TYPE['DEBIT'])
+        self.assertIsNone(row[4])
+    
+    def test_account_row(self):
+        """Test Pluggy account is mapped with balance in cents"""
+        row = finance_db.account_row({
+            'id': 'acc-1', 'itemId': 'item-1', 'type': 'BANK', 'subtype': 'CHECKING_ACCOUNT',
+            'name': 'Conta', 'number': '123', 'balance': 1234.56,
+        })
+        
+        self.assertEqual(row, ('acc-1', 'item-1', 'BANK', 'CHECKING_ACCOUNT', 'Conta', '123', 'BRL', 123456))
+
+
+class TestPartitions(unittest.TestCase):
+    """Test monthly partitions"""
+    
+    def test_month_bounds(self):
+        """Test partition ranges, including year rollover"""
+        self.assertEqual(finance_db._month_bounds(date(2024, 1, 1)), (date(2024, 1, 1), date(2024, 2, 1)))
+        self.assertEqual(finance_db._month_bounds(date(2024, 12, 1)), (date(2024, 12, 1), date(2025, 1, 1)))
+    
+    def test_partition_name(self):
+        """Test partition naming"""
+        self.assertEqual(finance_db.partition_name(date(2024, 3, 1)), 'financefly_transactions_2024_03')
+    
+    def test_only_missing_partitions_created(self):
+        """Test existing partitions are skipped and creation is serialized"""
+        conn = MagicMock()
+        conn.execute.return_value.fetchall.return_value = [(date(2024, 2, 1),)]
+        
+        created = finance_db.ensure_partitions(conn, [date(2024, 1, 1), date(2024, 2, 1)])
+        
+        self.assertEqual(created, [date(2024, 2, 1)])
+        executed = [call.args[0] for call in conn.execute.call_args_list]
+        self.assertIn('pg_advisory_xact_lock', executed[1])
+        self.assertEqual(len(executed), 3)
+        self.assertIn('financefly_transactions_2024_02', repr(executed[2]))
+    
+    def test_nothing_missing(self):
+        """Test no lock or DDL when every partition exists"""
+        conn = MagicMock()
+        conn.execute.return_value.fetchall.return_value = []
+        
+        self.assertEqual(finance_db.ensure_partitions(conn, [date(2024, 1, 1)]), [])
+        conn.execute.assert_called_once()
+
+
+class TestSaveTransactions(unittest.TestCase):
+    """Test bulk transaction upsert"""
+    
+    def test_statement_flow(self):
+        """Test COPY to staging, dedup, reconciled pending, analyze, partitions, categories, aggregates, moved rows and upsert"""
+        conn = MagicMock()
+        conn.execute.return_value.fetchall.return_value = []
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.fetchall.return_value = [(date(2024, 1, 1),)]
+        cur.rowcount = 2
+        copy = cur.copy.return_value.__enter__.return_value
+        rows = [('tx-1',) * 9, ('tx-2',) * 9]
+        
+        written = finance_db.save_transactions(iter(rows), conn)
+        
+        self.assertEqual(written, 2)
+        self.assertEqual(copy.write_row.call_count, 2)
+        executed = [call.args[0] for call in cur.execute.call_args_list]
+        self.assertEqual(executed[0], finance_db.TRANSACTIONS_STAGING_DDL)
+        self.assertEqual(executed[1], finance_db.DEDUP_STAGING_SQL)
+        self.assertEqual(executed[2], finance_db.DROP_RECONCILED_SQL)
+        self.assertEqual(executed[3], finance_db.ANALYZE_STAGING_SQL)
+        self.assertEqual(executed[-4:], [
+            finance_db.UPSERT_CATEGORIES_SQL,
+            finance_db.AGGREGATE_DELTA_SQL,
+            finance_db.DELETE_MOVED_SQL,
+            finance_db.UPSERT_TRANSACTIONS_SQL,
+        ])
+
+
+
+class TestAggregates(unittest.TestCase):
+    """Test monthly aggregate maintenance helpers"""
+    
+    def test_delete_transactions(self):
+        """Test deletes go through the statement that also updates aggregates"""
+        conn = MagicMock()
+        conn.execute.return_value.fetchone.return_value = (2,)
+        
+        self.assertEqual(finance_db.delete_transactions(iter(['tx-1', 'tx-2']), conn), 2)
+        query, params = conn.execute.call_args.args
+        self.assertEqual(query, finance_db.DELETE_TRANSACTIONS_SQL)
+        self.assertEqual(params, (['tx-1', 'tx-2'],))
+    
+    def test_verify_without_drift(self):
+        """Test nothing is repaired when aggregates match"""
+        conn = MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.fetchall.return_value = []
+        
+        result = finance_db.verify_aggregates(conn=conn, repair=True)
+        
+        self.assertEqual((result['drift'], result['repaired']), ([], 0))
+        cur.executemany.assert_not_called()
+    
+    def test_verify_repairs_drift(self):
+        """Test drifted account-months are rewritten with recomputed totals"""
+        conn = MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        drift = [{
+            'account_id': 'acc-1', 'month': date(2024, 1, 1),
+            'expected_income_cents': 100, 'stored_income_cents': 90,
+            'expected_expense_cents': 0, 'stored_expense_cents': 0,
+            'expected_transactions': 1, 'stored_transactions': 1,
+        }]
+        cur.fetchall.return_value = drift
+        
+        result = finance_db.verify_aggregates(['item-1'], repair=True, conn=conn)
+        
+        self.assertEqual(result['repaired'], 1)
+        cur.executemany.assert_called_once_with(finance_db.REPAIR_AGGREGATE_SQL, drift)
+        self.assertEqual(cur.execute.call_args.args[1], (['item-1'], ['item-1']))
+
+
+class FinancePostgresTestCase(PostgresTestCase):
+    """Two fresh accounts of one item, inside the test's rolled back transaction"""
+    
+    def setUp(self):
+        super().setUp()
+        self.item_id = f'test-item-{uuid.uuid4()}'
+        self.accounts = [str(uuid.uuid4()), str(uuid.uuid4())]
+        for account_id in self.accounts:
+            self.conn.execute(
+                "INSERT INTO financefly_accounts (id, item_id, type) VALUES (%s, %s, 'BANK')",
+                (account_id, self.item_id),
+            )
+    
+    def tx(self, tx_id, day, amount_cents, account=0, status=0, description='COMPRA', updated_at=None):
+        return (tx_id, self.accounts[account], day, amount_cents, None, status, 0, description, updated_at)
+    
+    def save(self, *rows):
+        saved = finance_db.save_transactions(rows, conn=self.conn)
+        # The test's transaction never commits, so ON COMMIT DROP never fires
+        self.conn.execute("DROP TABLE financefly_transactions_staging")
+        return saved
+    
+    def aggregates(self):
+        return {
+            (str(account_id), month): (income, expense, count)
+            for account_id, month, income, expense, count in self.conn.execute(
+                "SELECT account_id, month, income_cents, expense_cents, transactions "
+                "FROM financefly_monthly_aggregates WHERE account_id = ANY(%s::uuid[]) "
+                "AND (income_cents, expense_cents, transactions) <> (0, 0, 0)",
+                (self.accounts,),
+            ).fetchall()
+        }
+    
+    def assertMatchesRecompute(self):
+        self.assertEqual(finance_db.verify_aggregates([self.item_id], conn=self.conn)['drift'], [])
+
+
+class TestAggregatesPostgres(FinancePostgresTestCase):
+    """Test incremental aggregates against a full recompute on a real database"""
+    
+    def setUp(self):
+        super().setUp()
+        self.ids = [str(uuid.uuid4()) for _ in range(3)]
+        self.save(
+            self.tx(self.ids[0], date(2024, 1, 10), -1000),
+            self.tx(self.ids[1], date(2024, 1, 20), 5000),
+            self.tx(self.ids[2], date(2024, 2, 5), -300, account=1),
+        )
+    
+    def test_insert(self):
+        """Test new transactions are added per account and month"""
+        self.assertMatchesRecompute()
+        self.assertEqual(self.aggregates(), {
+            (self.accounts[0], date(2024, 1, 1)): (5000, 1000, 2),
+            (self.accounts[1], date(2024, 2, 1)): (0, 300, 1),
+        })
+    
+    def test_update_amount_and_month(self):
+        """Test changed amounts and dates move the totals, unchanged rows don't count twice"""
+        saved = self.save(
+            self.tx(self.ids[0], date(2024, 1, 10), -1500),
+            self.tx(self.ids[1], date(2024, 3, 1), 5000),
+            self.tx(self.ids[2], date(2024, 2, 5), -300, account=1),
+        )
+        
+        self.assertEqual(saved, 2)
+        self.assertMatchesRecompute()
+        self.assertEqual(self.aggregates(), {
+            (self.accounts[0], date(2024, 1, 1)): (0, 1500, 1),
+            (self.accounts[0], date(2024, 3, 1)): (5000, 0, 1),
+            (self.accounts[1], date(2024, 2, 1)): (0, 300, 1),
+        })
+    
+    def test_account_move(self):
+        """Test a transaction moved to another account alone is rewritten with the totals"""
+        saved = self.save(self.tx(self.ids[0], date(2024, 1, 10), -1000, account=1))
+        
+        self.assertEqual(saved, 1)
+        self.assertMatchesRecompute()
+        self.assertEqual(self.aggregates()[(self.accounts[1], date(2024, 1, 1))], (0, 1000, 1))
+    
+    def test_delete(self):
+        """Test deleted transactions are subtracted"""
+        deleted = finance_db.delete_transactions([self.ids[1], self.ids[2]], conn=self.conn)
+        
+        self.assertEqual(deleted, 2)
+        self.assertMatchesRecompute()
+        self.assertEqual(self.aggregates(), {(self.accounts[0], date(2024, 1, 1)): (0, 1000, 1)})
+    
+    def test_repeated_id_in_batch(self):
+        """Test a batch repeating an id counts only its latest version"""
+        tx_id = str(uuid.uuid4())
+        self.save(
+            self.tx(tx_id, date(2024, 1, 15), -100, updated_at='2024-01-15T10:00:00Z'),
+            self.tx(tx_id, date(2024, 1, 15), -200, account=1, updated_at='2024-01-15T11:00:00Z'),
+        )
+        
+        self.assertMatchesRecompute()
+        self.assertEqual(self.aggregates()[(self.accounts[1], date(2024, 1, 1))], (0, 200, 1))
+
+
+class TestReconcilePending(unittest.TestCase):
+    """Test reconcile_pending"""
+    
+    def test_rounds_until_nothing_matches(self):
+        """Test rounds repeat while pairs are found, within the pending date range"""
+        conn = MagicMock()
+        conn.execute.return_value.fetchone.side_effect = [(date(2024, 3, 1), date(2024, 3, 20)), (3,), (1,), (0,)]
+        
+        reconciled = finance_db.reconcile_pending(['acc-2', 'acc-1', 'acc-2'], window_days=5, conn=conn)
+        
+        self.assertEqual(reconciled, 4)
+        queries = [call.args[0] for call in conn.execute.call_args_list]
+        self.assertEqual(queries, [finance_db.PENDING_RANGE_SQL] + [finance_db.RECONCILE_SQL] * 3)
+        self.assertEqual(conn.execute.call_args_list[0].args[1], (['acc-1', 'acc-2'],))
+        self.assertEqual(conn.execute.call_args.args[1], {
+            'account_ids': ['acc-1', 'acc-2'], 'date_from': date(2024, 3, 1), 'date_to': date(2024, 3, 20),
+            'window': 5,
+        })
+    
+    def test_no_pending_transactions(self):
+        """Test the matching query is skipped when the accounts have nothing pending"""
+        conn = MagicMock()
+        conn.execute.return_value.fetchone.return_value = (None, None)
+        
+        self.assertEqual(finance_db.reconcile_pending(['acc-1'], conn=conn), 0)
+        self.assertEqual(conn.execute.call_count, 1)
+        self.assertEqual(finance_db.reconcile_pending([], conn=conn), 0)
+        self.assertEqual(conn.execute.call_count, 1)
+    
+    def test_match_key_like_recurring(self):
+        """Test the SQL normalization mirrors recurring.normalize_counterparty"""
+        self.assertIn("upper(COALESCE(posted_description, ''))", finance_db.RECONCILE_SQL)
+        self.assertIn("'[^[:alpha:]]+'", finance_db.RECONCILE_SQL)
+
+
+
+class TestReconcilePendingPostgres(FinancePostgresTestCase):
+    """Test RECONCILE_SQL matching on a real database"""
+    
+    DAY = date(2024, 3, 10)
+    
+    def pending(self, day_offset=0, amount_cents=-4590, account=0, description='UBER *TRIP 8812'):
+        tx_id = str(uuid.uuid4())
+        self.save(self.tx(tx_id, self.DAY + timedelta(day_offset), amount_cents, account, 1, description))
+        return tx_id
+    
+    def posted(self, day_offset=2, amount_cents=-4590, account=0, description='UBER TRIP 10/03'):
+        tx_id = str(uuid.uuid4())
+        self.save(self.tx(tx_id, self.DAY + timedelta(day_offset), amount_cents, account, 0, description))
+        return tx_id
+    
+    def reconcile(self):
+        return finance_db.reconcile_pending(self.accounts, window_days=7, conn=self.conn)
+    
+    def links(self):
+        return dict(self.conn.execute(
+            "SELECT pending_id::text, posted_id::text FROM financefly_transaction_reconciliations "
+            "WHERE account_id = ANY(%s::uuid[])", (self.accounts,)
+        ).fetchall())
+    
+    def stored_ids(self):
+        return {str(tx_id) for (tx_id,) in self.conn.execute(
+            "SELECT id FROM financefly_transactions WHERE account_id = ANY(%s::uuid[])", (self.accounts,)
+        ).fetchall()}
+    
+    def test_pending_replaced_by_posted(self):
+        """Test a match removes the pending, records the pair and keeps aggregates exact"""
+        pending_id = self.pending()
+        posted_id = self.posted()
+        
+        self.assertEqual(self.reconcile(), 1)
+        
+        self.assertEqual(self.links(), {pending_id: posted_id})
+        self.assertEqual(self.stored_ids(), {posted_id})
+        self.assertMatchesRecompute()
+        self.assertEqual(self.aggregates(), {(self.accounts[0], date(2024, 3, 1)): (0, 4590, 1)})
+    
+    def test_reconciled_pending_not_saved_again(self):
+        """Test a pending Pluggy returns again after reconciliation stays out"""
+        pending_id = self.pending()
+        posted_id = self.posted()
+        self.reconcile()
+        
+        self.save(self.tx(pending_id, self.DAY, -4590, status=1, description='UBER *TRIP 8812'))
+        
+        self.assertEqual(self.stored_ids(), {posted_id})
+        self.assertEqual(self.reconcile(), 0)
+        self.assertMatchesRecompute()
+    
+    def test_no_match(self):
+        """Test amount, account, window, description and status all have to agree"""
+        pending_id = self.pending()
+        others = {
+            self.posted(amount_cents=-4591),
+            self.posted(account=1),
+            self.posted(day_offset=8),
+            self.posted(day_offset=-2),
+            self.posted(description='99 TAXI'),
+            self.pending(description='UBER TRIP'),
+        }
+        
+        self.assertEqual(self.reconcile(), 0)
+        
+        self.assertEqual(self.links(), {})
+        self.assertEqual(self.stored_ids(), others | {pending_id})
+    
+    def test_closest_posted_wins(self):
+        """Test a pending pairs with the posted nearest in date, leaving the other"""
+        pending_id = self.pending()
+        far = self.posted(day_offset=5)
+        near = self.posted(day_offset=1)
+        
+        self.assertEqual(self.reconcile(), 1)
+        
+        self.assertEqual(self.links(), {pending_id: near})
+        self.assertEqual(self.stored_ids(), {far, near})
+    
+    def test_identical_purchases_paired_one_to_one(self):
+        """Test same-day identical purchases each take their own posted transaction"""
+        pendings = {self.pending(), self.pending(), self.pending(day_offset=1)}
+        posted = {self.posted(day_offset=1), self.posted(day_offset=2), self.posted(day_offset=3)}
+        
+        self.assertEqual(self.reconcile(), 3)
+        
+        links = self.links()
+        self.assertEqual(set(links), pendings)
+        self.assertEqual(set(links.values()), posted)
+        self.assertEqual(self.stored_ids(), posted)
+        self.assertMatchesRecompute()
+    
+    def test_posted_used_once(self):
+        """Test a posted transaction already paired is not offered to a later pending"""
+        self.pending()
+        self.posted()
+        self.reconcile()
+        late = self.pending(day_offset=1)
+        
+        self.assertEqual(self.reconcile(), 0)
+        
+        self.assertIn(late, self.stored_ids())
+
+
+
+class TestSyncLagPostgres(FinancePostgresTestCase):
+    """Test load_sync_lag on a real database"""
+    
+    def cursor(self, account, item_id, synced_seconds_ago):
+        synced_at = None
+        if synced_seconds_ago is not None:
+            synced_at = datetime.now(timezone.utc) - timedelta(seconds=synced_seconds_ago)
+        cursor = dict.fromkeys(finance_db.SYNC_CURSOR_FIELDS)
+        cursor.update(account_id=self.accounts[account], item_id=item_id, synced_at=synced_at)
+        finance_db.save_sync_cursor(cursor, conn=self.conn)
+    
+    def test_oldest_account_sync(self):
+        """Test an item's lag is its least recently synced account's, unsynced accounts give None"""
+        self.cursor(0, self.item_id, 60)
+        self.cursor(1, self.item_id, 600)
+        lag = finance_db.load_sync_lag([self.item_id, 'test-unknown-item'], conn=self.conn)
+        
+        self.assertEqual(list(lag), [self.item_id])
+        self.assertAlmostEqual(lag[self.item_id], 600, delta=5)
+        
+        self.cursor(1, self.item_id, None)
+        self.assertEqual(finance_db.load_sync_lag([self.item_id], conn=self.conn), {self.item_id: None})
+
+
+if __name__ == '__main__':
+    unittest.main()
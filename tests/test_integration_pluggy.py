@@ -22,6 +22,8 @@ from modules.pluggy_utils import PluggyClient, create_connect_token, validate_en
 from modules.db import init_db, save_client, get_conn
 
 
+# Single attempt per request; retries are covered in test_pluggy_utils.py
+@patch('modules.pluggy_utils.MAX_RETRIES', 0)
 class TestPluggyIntegrationFlow(unittest.TestCase):
     """Integration tests for complete Pluggy connection flow"""
     
@@ -37,6 +39,11 @@ class TestPluggyIntegrationFlow(unittest.TestCase):
         for key, value in self.test_env.items():
             os.environ[key] = value
         
+        # Start every test without cached API keys
+        PluggyClient.reset_api_key_cache()
+        PluggyClient.reset_rate_limiters()
+        PluggyClient.reset_circuit_breakers()
+        
         # Test configuration
         self.test_config = {
             'client_id': 'test_client_id_integration_123',
@@ -58,7 +65,7 @@ class TestPluggyIntegrationFlow(unittest.TestCase):
             if key in os.environ:
                 del os.environ[key]
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_end_to_end_token_generation_success(self, mock_post):
         """Test complete end-to-end token generation flow"""
         # Mock successful authentication response
@@ -101,7 +108,7 @@ class TestPluggyIntegrationFlow(unittest.TestCase):
         self.assertEqual(token_call[1]['headers']['X-API-KEY'], 'test_api_key_integration')
         self.assertEqual(token_call[1]['json']['clientUserId'], self.test_user_data['email'])
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_end_to_end_convenience_function(self, mock_post):
         """Test end-to-end flow using convenience function"""
         # Mock successful responses
@@ -121,7 +128,7 @@ class TestPluggyIntegrationFlow(unittest.TestCase):
         self.assertEqual(token, 'convenience_connect_token')
         self.assertEqual(mock_post.call_count, 2)
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_widget_initialization_flow(self, mock_post):
         """Test widget initialization with proper token"""
         # Mock successful API responses
@@ -470,6 +477,8 @@ class TestDatabaseIntegrationWithMockData(unittest.TestCase):
             conn.commit()
 
 
+# Single attempt per request; retries are covered in test_pluggy_utils.py
+@patch('modules.pluggy_utils.MAX_RETRIES', 0)
 class TestCompleteIntegrationFlow(unittest.TestCase):
     """Test complete integration flow combining all components"""
     
@@ -484,6 +493,10 @@ class TestCompleteIntegrationFlow(unittest.TestCase):
         for key, value in self.test_env.items():
             os.environ[key] = value
         
+        PluggyClient.reset_api_key_cache()
+        PluggyClient.reset_rate_limiters()
+        PluggyClient.reset_circuit_breakers()
+        
         # Test user data
         self.user_data = {
             'name': 'Carlos Mendes',
@@ -507,7 +520,7 @@ class TestCompleteIntegrationFlow(unittest.TestCase):
             if key in os.environ:
                 del os.environ[key]
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     @patch('requests.get')
     def test_complete_user_flow_simulation(self, mock_sdk_get, mock_api_post):
         """Test complete user flow from form submission to successful connection"""
@@ -596,7 +609,7 @@ class TestCompleteIntegrationFlow(unittest.TestCase):
         self.connection_error_data = error
         return True
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_error_recovery_scenarios(self, mock_post):
         """Test error recovery in complete flow"""
         
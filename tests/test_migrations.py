@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/migrations.py
+
+Tests cover:
+- Only pending migrations are applied, in version order
+- Transactional vs concurrent (autocommit) migrations
+- Recovery of invalid indexes left by interrupted concurrent builds
+- One-time schema initialization per process (ensure_schema)
+"""
+
+import unittest
+import threading
+from unittest.mock import patch, MagicMock
+from modules import migrations
+from modules.db import DDL
+
+
+class FakeConnection:
+    """Records executed SQL and answers the runner's queries"""
+    
+    def __init__(self, applied=(), invalid_indexes=()):
+        self.applied = set(applied)
+        self.invalid_indexes = set(invalid_indexes)
+        self.executed = []
+        self.autocommit = False
+        self.transactions = 0
+        self.lock_results = []
+    
+    def execute(self, query, params=None):
+        text = query if isinstance(query, str) else repr(query)
+        self.executed.append(text)
+        result = MagicMock()
+        if text.startswith("SELECT version FROM schema_version"):
+            result.fetchall.return_value = [(version,) for version in self.applied]
+        elif query is migrations.INVALID_INDEX_SQL:
+            result.fetchone.return_value = (1,) if params[0] in self.invalid_indexes else None
+        elif text.startswith("INSERT INTO schema_version"):
+            self.applied.add(params[0])
+        elif "pg_try_advisory_lock" in text:
+            result.fetchone.return_value = (self.lock_results.pop(0) if self.lock_results else True,)
+        return result
+    
+    def transaction(self):
+        self.transactions += 1
+        return MagicMock()
+
+
+class TestRunMigrations(unittest.TestCase):
+    """Test run_migrations"""
+    
+    def test_applies_all_pending_in_order(self):
+        """Test a fresh database gets every migration"""
+        conn = FakeConnection()
+        
+        applied = migrations.run_migrations(conn)
+        
+        self.assertEqual(applied, [m['version'] for m in migrations.MIGRATIONS])
+        self.assertIn(DDL, conn.executed)
+        self.assertTrue(any('CONCURRENTLY' in sql and 'email' in sql for sql in conn.executed))
+        self.assertTrue(any('CONCURRENTLY' in sql and 'created_at' in sql for sql in conn.executed))
+    
+    def test_idempotent(self):
+        """Test a second run applies nothing"""
+        conn = FakeConnection()
+        migrations.run_migrations(conn)
+        
+        self.assertEqual(migrations.run_migrations(conn), [])
+    
+    def test_skips_applied_versions(self):
+        """Test only versions missing from schema_version run"""
+        conn = FakeConnection(applied={1, 2})
+        
+        pending = [m['version'] for m in migrations.MIGRATIONS if m['version'] > 2]
+        self.assertEqual(migrations.run_migrations(conn), pending)
+        self.assertNotIn(DDL, conn.executed)
+    
+    def test_transactional_vs_concurrent(self):
+        """Test only non-concurrent migrations open a transaction"""
+        conn = FakeConnection()
+        custom = [
+            {'version': 1, 'description': 'tx', 'statements': ['SELECT 1']},
+            {'version': 2, 'description': 'idx', 'statements': ['CREATE INDEX CONCURRENTLY x'], 'concurrent': True},
+        ]
+        
+        migrations.run_migrations(conn, custom)
+        
+        self.assertEqual(conn.transactions, 1)
+    
+    def test_autocommit_restored(self):
+        """Test connection autocommit is restored after running"""
+        conn = FakeConnection()
+        
+        migrations.run_migrations(conn)
+        
+        self.assertFalse(conn.autocommit)
+    
+    def test_invalid_index_dropped_before_rebuild(self):
+        """Test interrupted concurrent index build is cleaned up"""
+        conn = FakeConnection(applied={1}, invalid_indexes={'financefly_clients_email_idx'})
+        
+        migrations.run_migrations(conn)
+        
+        drops = [sql for sql in conn.executed if 'DROP INDEX' in sql]
+        self.assertEqual(len(drops), 1)
+        self.assertIn('financefly_clients_email_idx', drops[0])
+    
+    def test_current_version(self):
+        """Test current_version reports the highest applied version"""
+        self.assertEqual(migrations.current_version(FakeConnection()), 0)
+        self.assertEqual(migrations.current_version(FakeConnection(applied={1, 3})), 3)
+
+
+class TestEnsureSchema(unittest.TestCase):
+    """Test ensure_schema one-time initialization"""
+    
+    def setUp(self):
+        migrations.reset_schema_status()
+        self.addCleanup(migrations.reset_schema_status)
+        self.conn = FakeConnection()
+        patcher = patch('modules.migrations.pooled_conn')
+        self.pooled_conn = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pooled_conn.return_value.__enter__.return_value = self.conn
+    
+    def test_runs_once_and_caches_success(self):
+        """Test reruns do no database work after a successful init"""
+        first = migrations.ensure_schema()
+        second = migrations.ensure_schema()
+        
+        self.assertTrue(first['ok'])
+        self.assertIs(first, second)
+        self.assertEqual(first['version'], migrations.MIGRATIONS[-1]['version'])
+        self.pooled_conn.assert_called_once()
+        self.assertIs(migrations.schema_status(), first)
+    
+    def test_advisory_lock_wraps_migrations(self):
+        """Test migrations run between advisory lock and unlock"""
+        migrations.ensure_schema()
+        
+        lock = next(i for i, sql in enumerate(self.conn.executed) if 'pg_try_advisory_lock' in sql)
+        unlock = next(i for i, sql in enumerate(self.conn.executed) if 'pg_advisory_unlock' in sql)
+        ddl = self.conn.executed.index(DDL)
+        self.assertLess(lock, ddl)
+        self.assertLess(ddl, unlock)
+        self.assertFalse(self.conn.autocommit)
+    
+    @patch('modules.migrations.SCHEMA_LOCK_POLL_SECONDS', 0)
+    def test_waits_while_another_replica_holds_lock(self):
+        """Test lock is polled until the other replica releases it"""
+        self.conn.lock_results = [False, False, True]
+        
+        self.assertTrue(migrations.ensure_schema()['ok'])
+        
+        attempts = [sql for sql in self.conn.executed if 'pg_try_advisory_lock' in sql]
+        self.assertEqual(len(attempts), 3)
+    
+    @patch('modules.migrations.SCHEMA_LOCK_POLL_SECONDS', 0)
+    @patch('modules.migrations.SCHEMA_LOCK_TIMEOUT_SECONDS', 0)
+    def test_lock_timeout_reported(self):
+        """Test a lock that is never released fails the initialization"""
+        self.conn.lock_results = [False] * 10
+        
+        result = migrations.ensure_schema()
+        
+        self.assertFalse(result['ok'])
+        self.assertNotIn(DDL, self.conn.executed)
+    
+    def test_concurrent_callers_initialize_once(self):
+        """Test concurrent first calls share one initialization"""
+        barrier = threading.Barrier(8)
+        results = []
+        
+        def worker():
+            barrier.wait()
+            results.append(migrations.ensure_schema())
+        
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.pooled_conn.assert_called_once()
+        self.assertTrue(all(result is results[0] for result in results))
+    
+    def test_failure_reported_and_retried_later(self):
+        """Test failures are cached until the retry interval elapses"""
+        self.pooled_conn.side_effect = ConnectionError('database unavailable')
+        
+        with patch('modules.migrations.SCHEMA_INIT_RETRY_SECONDS', 60):
+            failed = migrations.ensure_schema()
+            self.assertIs(migrations.ensure_schema(), failed)
+        
+        self.assertFalse(failed['ok'])
+        self.assertIn('database unavailable', failed['error'])
+        self.assertEqual(self.pooled_conn.call_count, 1)
+        
+        self.pooled_conn.side_effect = None
+        with patch('modules.migrations.SCHEMA_INIT_RETRY_SECONDS', 0):
+            migrations.reset_schema_status()
+            self.assertTrue(migrations.ensure_schema()['ok'])
+
+
+if __name__ == '__main__':
+    unittest.main()
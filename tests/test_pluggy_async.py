@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/pluggy_async.py
+
+Tests cover:
+- AsyncPluggyClient authentication and token generation coroutines
+- Shared user-facing error mapping
+- Bounded concurrency of batch token generation
+- Rate limiter, circuit breaker and API key cache shared with PluggyClient
+"""
+
+import unittest
+import threading
+import asyncio
+from unittest.mock import patch
+import httpx
+from modules.pluggy_utils import PluggyClient
+from modules.pluggy_async import AsyncPluggyClient
+
+
+class FakePluggy:
+    """httpx.MockTransport handler recording requests, answering from a list or a function"""
+
+    def __init__(self, responses=None):
+        self.responses = list(responses or [])
+        self.handler = None
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        if self.handler is not None:
+            return self.handler(request)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def json(self, index=-1):
+        return httpx.Response(200, content=self.requests[index].content).json()
+
+
+def _response(status_code, payload=None, headers=None):
+    return httpx.Response(status_code, json=payload or {}, headers=headers)
+
+
+# Single attempt per request; retries are covered in test_pluggy_utils.py
+@patch('modules.pluggy_utils.MAX_RETRIES', 0)
+class TestAsyncPluggyClient(unittest.IsolatedAsyncioTestCase):
+    """Test AsyncPluggyClient coroutines"""
+
+    def setUp(self):
+        """Set up test config, fake transport and empty shared state"""
+        self.test_config = {
+            'client_id': 'test_client_id_123',
+            'client_secret': 'test_client_secret_456',
+            'base_url': 'https://api.pluggy.ai'
+        }
+        self.pluggy = FakePluggy()
+        PluggyClient.reset_api_key_cache()
+        PluggyClient.reset_rate_limiters()
+        PluggyClient.reset_circuit_breakers()
+
+    async def asyncSetUp(self):
+        self.http = httpx.AsyncClient(transport=httpx.MockTransport(self.pluggy))
+
+    async def asyncTearDown(self):
+        await self.http.aclose()
+
+    def make(self, **kwargs):
+        return AsyncPluggyClient(self.test_config, http_client=self.http, **kwargs)
+
+    async def test_authenticate_success(self):
+        """Test successful authentication"""
+        self.pluggy.responses = [_response(200, {'apiKey': 'async_api_key'})]
+
+        async with self.make() as client:
+            api_key = await client.authenticate()
+
+        self.assertEqual(api_key, 'async_api_key')
+        self.assertEqual(str(self.pluggy.requests[0].url), 'https://api.pluggy.ai/auth')
+        self.assertEqual(PluggyClient(self.test_config)._api_key, 'async_api_key')
+
+    async def test_create_connect_token_success(self):
+        """Test connect token creation authenticates and returns the token"""
+        self.pluggy.responses = [
+            _response(200, {'apiKey': 'async_api_key'}),
+            _response(200, {'accessToken': 'async_token'}),
+        ]
+
+        async with self.make() as client:
+            token = await client.create_connect_token('user@example.com')
+
+        self.assertEqual(token, 'async_token')
+        self.assertEqual(self.pluggy.json(), {'clientUserId': 'user@example.com'})
+        self.assertEqual(self.pluggy.requests[-1].headers['X-API-KEY'], 'async_api_key')
+
+    async def test_uses_key_cached_by_sync_client(self):
+        """Test the API key cache is shared with PluggyClient"""
+        PluggyClient(self.test_config)._api_key = 'sync_api_key'
+        self.pluggy.responses = [_response(200, {'accessToken': 'async_token'})]
+
+        async with self.make() as client:
+            await client.create_connect_token()
+
+        self.assertEqual(len(self.pluggy.requests), 1)
+        self.assertEqual(self.pluggy.requests[0].headers['X-API-KEY'], 'sync_api_key')
+
+    async def test_reauthenticates_once_on_401(self):
+        """Test a revoked cached key is replaced once"""
+        PluggyClient(self.test_config)._api_key = 'revoked_key'
+        self.pluggy.responses = [
+            _response(401),
+            _response(200, {'apiKey': 'fresh_key'}),
+            _response(200, {'accessToken': 'async_token'}),
+        ]
+
+        async with self.make() as client:
+            token = await client.create_connect_token()
+
+        self.assertEqual(token, 'async_token')
+        self.assertEqual(self.pluggy.requests[-1].headers['X-API-KEY'], 'fresh_key')
+
+    async def test_error_mapping_shared_with_sync_client(self):
+        """Test 4xx/5xx responses raise the same Portuguese messages"""
+        cases = [
+            (401, 'Credenciais Pluggy inválidas'),
+            (403, 'Acesso negado pelo serviço Pluggy'),
+            (429, 'Muitas tentativas de conexão'),
+            (503, 'Serviço Pluggy temporariamente indisponível'),
+        ]
+        async with self.make() as client:
+            for status_code, message in cases:
+                self.pluggy.responses = [_response(status_code)]
+                with self.assertRaises(ValueError) as context:
+                    await client.authenticate()
+                self.assertIn(message, str(context.exception))
+
+    async def test_connect_token_bad_request(self):
+        """Test 400 from /connect_token is mapped"""
+        PluggyClient(self.test_config)._api_key = 'async_api_key'
+        self.pluggy.responses = [_response(400)]
+
+        async with self.make() as client:
+            with self.assertRaises(ValueError) as context:
+                await client.create_connect_token()
+
+        self.assertIn('Dados inválidos para geração do token', str(context.exception))
+
+    async def test_transport_errors_mapped(self):
+        """Test httpx timeouts and connection errors get the requests messages"""
+        cases = [
+            (httpx.ReadTimeout('timeout'), 'Timeout ao conectar com o serviço Pluggy'),
+            (httpx.ConnectError('refused'), 'Erro de conexão com o serviço Pluggy'),
+        ]
+        async with self.make() as client:
+            for error, message in cases:
+                self.pluggy.responses = [error]
+                with self.assertRaises(ValueError) as context:
+                    await client.authenticate()
+                self.assertIn(message, str(context.exception))
+
+    async def test_open_breaker_fails_fast(self):
+        """Test the circuit breaker shared with PluggyClient rejects without a request"""
+        breaker = PluggyClient._circuit_breaker('auth')
+        for _ in range(10):
+            breaker.record_failure()
+
+        async with self.make() as client:
+            with self.assertRaises(ValueError) as context:
+                await client.authenticate()
+
+        self.assertIn('temporariamente indisponível', str(context.exception))
+        self.assertEqual(self.pluggy.requests, [])
+
+    async def test_429_pauses_shared_limiter_and_retries(self):
+        """Test a 429 pauses the endpoint's limiter for every caller and is retried"""
+        self.pluggy.responses = [
+            _response(429, headers={'Retry-After': '0.05'}),
+            _response(200, {'apiKey': 'async_api_key'}),
+        ]
+
+        with patch('modules.pluggy_utils.MAX_RETRIES', 1):
+            async with self.make() as client:
+                api_key = await client.authenticate()
+
+        self.assertEqual(api_key, 'async_api_key')
+        stats = PluggyClient.rate_limit_stats()['auth']
+        self.assertEqual(stats['pauses'], 1)
+        self.assertEqual(stats['retries'], 1)
+        self.assertEqual(stats['acquired'], 2)
+
+    async def test_create_connect_tokens_bounded_concurrency(self):
+        """Test batch generation keeps at most max_concurrency calls in flight"""
+        state = {'in_flight': 0, 'peak': 0, 'auth_calls': 0}
+
+        async def handler(request):
+            state['in_flight'] += 1
+            state['peak'] = max(state['peak'], state['in_flight'])
+            await asyncio.sleep(0.01)
+            state['in_flight'] -= 1
+            if request.url.path == '/auth':
+                state['auth_calls'] += 1
+                return _response(200, {'apiKey': 'async_api_key'})
+            user_id = httpx.Response(200, content=request.content).json()['clientUserId']
+            return _response(200, {'accessToken': 'token_' + user_id})
+
+        self.pluggy.handler = handler
+        PluggyClient.configure_rate_limit('connect_token', rate=1000, burst=1000)
+        user_ids = [f'user{i}' for i in range(50)]
+        threads_before = threading.active_count()
+
+        async with self.make(max_concurrency=5) as client:
+            tokens = await client.create_connect_tokens(user_ids)
+
+        self.assertEqual(tokens, ['token_' + user_id for user_id in user_ids])
+        self.assertEqual(state['peak'], 5)
+        self.assertEqual(state['auth_calls'], 1)
+        self.assertEqual(threading.active_count(), threads_before)
+
+    async def test_concurrent_misses_authenticate_once(self):
+        """Test concurrent cache misses share one authentication"""
+        async def handler(request):
+            await asyncio.sleep(0.01)
+            return _response(200, {'apiKey': 'async_api_key'})
+
+        self.pluggy.handler = handler
+
+        async with self.make() as client:
+            keys = await asyncio.gather(*(client.get_api_key() for _ in range(10)))
+
+        self.assertEqual(set(keys), {'async_api_key'})
+        self.assertEqual(len(self.pluggy.requests), 1)
+
+    async def test_create_connect_tokens_returns_exceptions(self):
+        """Test failed tokens are returned as ValueError in place"""
+        PluggyClient(self.test_config)._api_key = 'async_api_key'
+        self.pluggy.responses = [
+            _response(200, {'accessToken': 'token_ok'}),
+            _response(400),
+        ]
+
+        async with self.make(max_concurrency=1) as client:
+            results = await client.create_connect_tokens(['ok', 'bad'])
+
+        self.assertEqual(results[0], 'token_ok')
+        self.assertIsInstance(results[1], ValueError)
+
+    async def test_owned_http_client_closed(self):
+        """Test aclose() closes the client it created and leaves a given one open"""
+        owned = AsyncPluggyClient(self.test_config)
+        await owned.aclose()
+
+        self.assertTrue(owned._http.is_closed)
+        async with self.make():
+            pass
+        self.assertFalse(self.http.is_closed)
+
+    def test_invalid_max_concurrency(self):
+        """Test max_concurrency must be positive"""
+        with self.assertRaises(ValueError):
+            AsyncPluggyClient(self.test_config, max_concurrency=0, http_client=self.http)
+
+
+if __name__ == '__main__':
+    unittest.main()
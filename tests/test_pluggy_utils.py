@@ -6,6 +6,11 @@ Tests cover:
 - Environment validation functions
 - PluggyClient authentication and token generation methods  
 - Error handling scenarios and edge cases
+- Process-wide API key cache
+- Shared pooled HTTP session
+- Single-flight coalescing of concurrent authentication
+- Client-side rate limiting and 429/idempotent retries (RequestAttempts policy)
+- Per-endpoint circuit breaker
 
 Requirements covered: 3.1, 3.4, 4.1
 """
@@ -13,13 +18,20 @@ Requirements covered: 3.1, 3.4, 4.1
 import unittest
 import os
 import json
+import time
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, Mock, MagicMock
 import requests
 from modules.pluggy_utils import (
     validate_environment, 
     get_pluggy_config, 
     PluggyClient, 
-    create_connect_token
+    create_connect_token,
+    get_http_session,
+    close_http_session,
+    RequestAttempts
 )
 
 
@@ -163,6 +175,8 @@ class TestEnvironmentValidation(unittest.TestCase):
             mock_validate.assert_called_once()
 
 
+# Single attempt per request; retries are covered by TestRateLimitingAndRetries
+@patch('modules.pluggy_utils.MAX_RETRIES', 0)
 class TestPluggyClient(unittest.TestCase):
     """Test PluggyClient class"""
     
@@ -173,6 +187,9 @@ class TestPluggyClient(unittest.TestCase):
             'client_secret': 'test_client_secret_456',
             'base_url': 'https://api.pluggy.ai'
         }
+        PluggyClient.reset_api_key_cache()
+        PluggyClient.reset_rate_limiters()
+        PluggyClient.reset_circuit_breakers()
         self.client = PluggyClient(self.test_config)
     
     def test_client_initialization_with_config(self):
@@ -192,7 +209,7 @@ class TestPluggyClient(unittest.TestCase):
         self.assertEqual(client.client_id, 'test_client_id_123')
         mock_validate.assert_called_once()
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_authenticate_success(self, mock_post):
         """Test successful authentication"""
         # Mock successful response
@@ -211,10 +228,10 @@ class TestPluggyClient(unittest.TestCase):
             'https://api.pluggy.ai/auth',
             headers={'accept': 'application/json', 'content-type': 'application/json'},
             json={'clientId': 'test_client_id_123', 'clientSecret': 'test_client_secret_456'},
-            timeout=15
+            timeout=(5.0, 15.0)
         )
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_authenticate_invalid_credentials(self, mock_post):
         """Test authentication with invalid credentials (401)"""
         mock_response = Mock()
@@ -226,7 +243,7 @@ class TestPluggyClient(unittest.TestCase):
         
         self.assertIn('Credenciais Pluggy inválidas', str(context.exception))
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_authenticate_forbidden(self, mock_post):
         """Test authentication with forbidden access (403)"""
         mock_response = Mock()
@@ -238,7 +255,7 @@ class TestPluggyClient(unittest.TestCase):
         
         self.assertIn('Acesso negado pelo serviço Pluggy', str(context.exception))
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_authenticate_rate_limit(self, mock_post):
         """Test authentication with rate limit (429)"""
         mock_response = Mock()
@@ -250,7 +267,7 @@ class TestPluggyClient(unittest.TestCase):
         
         self.assertIn('Muitas tentativas de conexão', str(context.exception))
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_authenticate_server_error(self, mock_post):
         """Test authentication with server error (500+)"""
         mock_response = Mock()
@@ -262,7 +279,7 @@ class TestPluggyClient(unittest.TestCase):
         
         self.assertIn('Serviço Pluggy temporariamente indisponível', str(context.exception))
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_authenticate_invalid_json_response(self, mock_post):
         """Test authentication with invalid JSON response"""
         mock_response = Mock()
@@ -275,7 +292,7 @@ class TestPluggyClient(unittest.TestCase):
         
         self.assertIn('Resposta inválida do serviço Pluggy', str(context.exception))
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_authenticate_missing_api_key(self, mock_post):
         """Test authentication with missing API key in response"""
         mock_response = Mock()
@@ -288,7 +305,7 @@ class TestPluggyClient(unittest.TestCase):
         
         self.assertIn('API key não recebida', str(context.exception))
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_authenticate_timeout_error(self, mock_post):
         """Test authentication with timeout error"""
         mock_post.side_effect = requests.exceptions.Timeout("Request timeout")
@@ -298,7 +315,7 @@ class TestPluggyClient(unittest.TestCase):
         
         self.assertIn('Timeout ao conectar com o serviço Pluggy', str(context.exception))
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_authenticate_connection_error(self, mock_post):
         """Test authentication with connection error"""
         mock_post.side_effect = requests.exceptions.ConnectionError("Connection failed")
@@ -308,7 +325,7 @@ class TestPluggyClient(unittest.TestCase):
         
         self.assertIn('Erro de conexão com o serviço Pluggy', str(context.exception))
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_create_connect_token_success(self, mock_post):
         """Test successful connect token creation"""
         # Set up authenticated client
@@ -333,10 +350,10 @@ class TestPluggyClient(unittest.TestCase):
                 'X-API-KEY': 'test_api_key_789'
             },
             json={'clientUserId': 'test_user@example.com'},
-            timeout=15
+            timeout=(5.0, 15.0)
         )
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_create_connect_token_without_user_id(self, mock_post):
         """Test connect token creation without user ID"""
         # Set up authenticated client
@@ -361,11 +378,11 @@ class TestPluggyClient(unittest.TestCase):
                 'X-API-KEY': 'test_api_key_789'
             },
             json={},
-            timeout=15
+            timeout=(5.0, 15.0)
         )
     
     @patch.object(PluggyClient, 'authenticate')
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_create_connect_token_auto_authenticate(self, mock_post, mock_authenticate):
         """Test connect token creation with automatic authentication"""
         # Client has no API key initially
@@ -383,10 +400,12 @@ class TestPluggyClient(unittest.TestCase):
         self.assertEqual(token, 'test_access_token_abc')
         mock_authenticate.assert_called_once()
     
-    @patch('modules.pluggy_utils.requests.post')
-    def test_create_connect_token_unauthorized(self, mock_post):
-        """Test connect token creation with unauthorized error (401)"""
+    @patch.object(PluggyClient, 'authenticate')
+    @patch('modules.pluggy_utils.requests.Session.post')
+    def test_create_connect_token_unauthorized(self, mock_post, mock_authenticate):
+        """Test connect token creation with unauthorized error (401) after one re-authentication"""
         self.client._api_key = 'invalid_api_key'
+        mock_authenticate.return_value = 'fresh_api_key'
         
         mock_response = Mock()
         mock_response.status_code = 401
@@ -396,8 +415,36 @@ class TestPluggyClient(unittest.TestCase):
             self.client.create_connect_token()
         
         self.assertIn('Erro de autorização ao gerar token', str(context.exception))
+        mock_authenticate.assert_called_once()
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(mock_post.call_args_list[1][1]['headers']['X-API-KEY'], 'fresh_api_key')
+    
+    @patch('modules.pluggy_utils.requests.Session.post')
+    def test_create_connect_token_reauthenticates_on_401(self, mock_post):
+        """Test a revoked cached API key is replaced once and the token request retried"""
+        self.client._api_key = 'revoked_api_key'
+        
+        unauthorized_response = Mock()
+        unauthorized_response.status_code = 401
+        
+        auth_response = Mock()
+        auth_response.status_code = 200
+        auth_response.json.return_value = {'apiKey': 'fresh_api_key'}
+        
+        token_response = Mock()
+        token_response.status_code = 200
+        token_response.json.return_value = {'accessToken': 'test_access_token_abc'}
+        
+        mock_post.side_effect = [unauthorized_response, auth_response, token_response]
+        
+        token = self.client.create_connect_token('test_user@example.com')
+        
+        self.assertEqual(token, 'test_access_token_abc')
+        self.assertEqual(self.client._api_key, 'fresh_api_key')
+        self.assertEqual(mock_post.call_args_list[2][1]['headers']['X-API-KEY'], 'fresh_api_key')
+        self.assertEqual(PluggyClient.api_key_cache_stats()['invalidations'], 1)
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_create_connect_token_bad_request(self, mock_post):
         """Test connect token creation with bad request (400)"""
         self.client._api_key = 'test_api_key_789'
@@ -412,7 +459,7 @@ class TestPluggyClient(unittest.TestCase):
         
         self.assertIn('Dados inválidos para geração do token', str(context.exception))
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_create_connect_token_missing_access_token(self, mock_post):
         """Test connect token creation with missing access token in response"""
         self.client._api_key = 'test_api_key_789'
@@ -428,6 +475,494 @@ class TestPluggyClient(unittest.TestCase):
         self.assertIn('token não recebido', str(context.exception))
 
 
+# Single attempt per request; retries are covered by TestRateLimitingAndRetries
+@patch('modules.pluggy_utils.MAX_RETRIES', 0)
+class TestApiKeyCache(unittest.TestCase):
+    """Test process-wide API key cache shared by PluggyClient instances"""
+    
+    def setUp(self):
+        """Set up test config and empty cache"""
+        self.test_config = {
+            'client_id': 'test_client_id_123',
+            'client_secret': 'test_client_secret_456',
+            'base_url': 'https://api.pluggy.ai'
+        }
+        PluggyClient.reset_api_key_cache()
+        PluggyClient.reset_rate_limiters()
+        PluggyClient.reset_circuit_breakers()
+    
+    def tearDown(self):
+        """Clean up cached keys"""
+        PluggyClient.reset_api_key_cache()
+        PluggyClient.reset_rate_limiters()
+        PluggyClient.reset_circuit_breakers()
+    
+    def _response(self, payload):
+        response = Mock()
+        response.status_code = 200
+        response.json.return_value = payload
+        return response
+    
+    def _jwt(self, expires_in):
+        """Build an unsigned JWT-like API key with the given lifetime"""
+        claims = base64.urlsafe_b64encode(
+            json.dumps({'exp': int(time.time() + expires_in)}).encode()
+        ).decode().rstrip('=')
+        return f'header.{claims}.signature'
+    
+    @patch('modules.pluggy_utils.requests.Session.post')
+    def test_api_key_shared_between_instances(self, mock_post):
+        """Test a second client reuses the key instead of calling /auth again"""
+        mock_post.side_effect = [
+            self._response({'apiKey': 'shared_api_key'}),
+            self._response({'accessToken': 'token_1'}),
+            self._response({'accessToken': 'token_2'}),
+        ]
+        
+        self.assertEqual(PluggyClient(self.test_config).create_connect_token('a@example.com'), 'token_1')
+        self.assertEqual(PluggyClient(self.test_config).create_connect_token('b@example.com'), 'token_2')
+        
+        urls = [c[0][0] for c in mock_post.call_args_list]
+        self.assertEqual(urls.count('https://api.pluggy.ai/auth'), 1)
+        stats = PluggyClient.api_key_cache_stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['cached_keys'], 1)
+    
+    def test_cache_is_keyed_by_credentials(self):
+        """Test different client ids don't share API keys"""
+        other_config = dict(self.test_config, client_id='other_client_id_789')
+        PluggyClient(self.test_config)._api_key = 'key_a'
+        
+        self.assertIsNone(PluggyClient(other_config)._api_key)
+        self.assertEqual(PluggyClient(self.test_config)._api_key, 'key_a')
+    
+    @patch('modules.pluggy_utils.requests.Session.post')
+    def test_expiring_key_is_not_served(self, mock_post):
+        """Test keys inside the expiry margin trigger a new authentication"""
+        mock_post.return_value = self._response({'apiKey': 'new_api_key'})
+        client = PluggyClient(self.test_config)
+        client._api_key = self._jwt(60)
+        
+        self.assertEqual(client.get_api_key(), 'new_api_key')
+        self.assertEqual(mock_post.call_count, 1)
+    
+    @patch('modules.pluggy_utils.requests.Session.post')
+    def test_key_refreshed_in_background_before_expiry(self, mock_post):
+        """Test keys inside the refresh window are served and refreshed in background"""
+        old_key = self._jwt(10 * 60)
+        mock_post.return_value = self._response({'apiKey': 'refreshed_api_key'})
+        client = PluggyClient(self.test_config)
+        client._api_key = old_key
+        
+        self.assertEqual(client.get_api_key(), old_key)
+        
+        deadline = time.time() + 2
+        while PluggyClient.api_key_cache_stats()['refreshes'] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        
+        self.assertEqual(PluggyClient.api_key_cache_stats()['refreshes'], 1)
+        self.assertEqual(client._api_key, 'refreshed_api_key')
+    
+    @patch('modules.pluggy_utils.requests.Session.post')
+    def test_fresh_key_not_refreshed(self, mock_post):
+        """Test keys far from expiry are served without any request"""
+        client = PluggyClient(self.test_config)
+        client._api_key = self._jwt(60 * 60)
+        
+        client.get_api_key()
+        
+        mock_post.assert_not_called()
+        self.assertEqual(PluggyClient.api_key_cache_stats()['refreshes'], 0)
+
+
+# Single attempt per request; retries are covered by TestRateLimitingAndRetries
+@patch('modules.pluggy_utils.MAX_RETRIES', 0)
+class TestHttpSessionPool(unittest.TestCase):
+    """Test shared keep-alive HTTP session used for Pluggy calls"""
+    
+    def setUp(self):
+        """Set up test config and empty cache"""
+        self.test_config = {
+            'client_id': 'test_client_id_123',
+            'client_secret': 'test_client_secret_456',
+            'base_url': 'https://api.pluggy.ai'
+        }
+        PluggyClient.reset_api_key_cache()
+        PluggyClient.reset_rate_limiters()
+        PluggyClient.reset_circuit_breakers()
+    
+    def tearDown(self):
+        """Drop the shared session so other tests get a fresh one"""
+        close_http_session()
+    
+    def test_session_shared_between_clients(self):
+        """Test every client uses the same pooled session"""
+        client_a = PluggyClient(self.test_config)
+        client_b = PluggyClient(self.test_config)
+        
+        self.assertIs(client_a._session, client_b._session)
+        self.assertIs(client_a._session, get_http_session())
+    
+    def test_session_adapter_pool_configuration(self):
+        """Test the pooled adapter is mounted for https"""
+        adapter = get_http_session().get_adapter('https://api.pluggy.ai/auth')
+        
+        self.assertEqual(adapter._pool_connections, 4)
+        self.assertEqual(adapter._pool_maxsize, 20)
+        self.assertFalse(adapter._pool_block)
+    
+    def test_close_http_session_recreates_pool(self):
+        """Test closing the session makes the next call create a new one"""
+        first = get_http_session()
+        close_http_session()
+        
+        self.assertIsNot(get_http_session(), first)
+    
+    def test_custom_session(self):
+        """Test a custom session can be injected and gets split timeouts"""
+        session = Mock()
+        response = Mock()
+        response.status_code = 200
+        response.json.return_value = {'apiKey': 'custom_session_key'}
+        session.post.return_value = response
+        
+        api_key = PluggyClient(self.test_config, session=session).authenticate()
+        
+        self.assertEqual(api_key, 'custom_session_key')
+        self.assertEqual(session.post.call_args[1]['timeout'], (5.0, 15.0))
+
+
+# Single attempt per request; retries are covered by TestRateLimitingAndRetries
+@patch('modules.pluggy_utils.MAX_RETRIES', 0)
+class TestAuthenticationSingleFlight(unittest.TestCase):
+    """Stress tests for coalescing concurrent authentication"""
+    
+    THREADS = 50
+    
+    def setUp(self):
+        """Set up test config, counting fake session and empty cache"""
+        self.test_config = {
+            'client_id': 'test_client_id_123',
+            'client_secret': 'test_client_secret_456',
+            'base_url': 'https://api.pluggy.ai'
+        }
+        PluggyClient.reset_api_key_cache()
+        PluggyClient.reset_rate_limiters()
+        PluggyClient.reset_circuit_breakers()
+        self.lock = threading.Lock()
+        self.auth_calls = 0
+        self.auth_status = 200
+        self.session = Mock()
+        self.session.post.side_effect = self._post
+        PluggyClient.configure_rate_limit('connect_token', rate=1000, burst=1000)
+    
+    def tearDown(self):
+        """Clean up cached keys"""
+        PluggyClient.reset_api_key_cache()
+        PluggyClient.reset_rate_limiters()
+        PluggyClient.reset_circuit_breakers()
+    
+    def _post(self, url, **kwargs):
+        response = Mock()
+        response.text = ''
+        if url.endswith('/auth'):
+            with self.lock:
+                self.auth_calls += 1
+            # Slow /auth so every thread misses the cache while it is in flight
+            time.sleep(0.05)
+            response.status_code = self.auth_status
+            response.json.return_value = {'apiKey': f'api_key_{self.auth_calls}'}
+        else:
+            response.status_code = 200
+            response.json.return_value = {'accessToken': 'token_' + kwargs['json']['clientUserId']}
+        return response
+    
+    def _run_concurrently(self, fn):
+        barrier = threading.Barrier(self.THREADS)
+        
+        def call(i):
+            barrier.wait()
+            try:
+                return fn(i)
+            except ValueError as error:
+                return error
+        
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            return list(executor.map(call, range(self.THREADS)))
+    
+    def test_concurrent_connect_tokens_authenticate_once(self):
+        """Test N concurrent create_connect_token calls produce exactly one /auth call"""
+        results = self._run_concurrently(
+            lambda i: PluggyClient(self.test_config, session=self.session).create_connect_token(f'user{i}')
+        )
+        
+        self.assertEqual(self.auth_calls, 1)
+        self.assertEqual(results, [f'token_user{i}' for i in range(self.THREADS)])
+        stats = PluggyClient.api_key_cache_stats()
+        self.assertEqual(stats['coalesced_auth_waits'] + 1, stats['misses'])
+    
+    def test_concurrent_callers_share_authentication_error(self):
+        """Test a failed in-flight authentication is reported to every waiter"""
+        self.auth_status = 429
+        
+        results = self._run_concurrently(
+            lambda i: PluggyClient(self.test_config, session=self.session).get_api_key()
+        )
+        
+        self.assertEqual(self.auth_calls, 1)
+        for result in results:
+            self.assertIsInstance(result, ValueError)
+            self.assertIn('Muitas tentativas de conexão', str(result))
+    
+    def test_authentication_after_failure_is_retried(self):
+        """Test a failed flight is not cached and the next caller authenticates again"""
+        self.auth_status = 503
+        client = PluggyClient(self.test_config, session=self.session)
+        with self.assertRaises(ValueError):
+            client.get_api_key()
+        
+        self.auth_status = 200
+        
+        self.assertEqual(client.get_api_key(), 'api_key_2')
+        self.assertEqual(self.auth_calls, 2)
+    
+    def test_concurrent_reauthenticate_coalesced(self):
+        """Test concurrent forced re-authentication (e.g. after 401) shares one /auth call"""
+        self._run_concurrently(
+            lambda i: PluggyClient(self.test_config, session=self.session).reauthenticate()
+        )
+        
+        self.assertEqual(self.auth_calls, 1)
+
+
+class TestRateLimitingAndRetries(unittest.TestCase):
+    """Test client-side rate limiting, 429 queueing and idempotent retries"""
+    
+    def setUp(self):
+        """Set up test client with fast backoff"""
+        self.test_config = {
+            'client_id': 'test_client_id_123',
+            'client_secret': 'test_client_secret_456',
+            'base_url': 'https://api.pluggy.ai'
+        }
+        PluggyClient.reset_api_key_cache()
+        PluggyClient.reset_rate_limiters()
+        PluggyClient.reset_circuit_breakers()
+        self.session = Mock()
+        self.client = PluggyClient(self.test_config, session=self.session)
+        backoff_patcher = patch('modules.pluggy_utils.RETRY_BACKOFF_BASE_SECONDS', 0.001)
+        backoff_patcher.start()
+        self.addCleanup(backoff_patcher.stop)
+    
+    def _response(self, status_code, payload=None, headers=None):
+        response = Mock()
+        response.status_code = status_code
+        response.text = ''
+        response.headers = headers or {}
+        response.json.return_value = payload or {}
+        return response
+    
+    def test_429_retried_after_retry_after(self):
+        """Test a 429 pauses the limiter for Retry-After and the request is retried"""
+        self.session.post.side_effect = [
+            self._response(429, headers={'Retry-After': '0.2'}),
+            self._response(200, {'apiKey': 'api_key_after_429'}),
+        ]
+        
+        start = time.monotonic()
+        api_key = self.client.authenticate()
+        
+        self.assertEqual(api_key, 'api_key_after_429')
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        stats = PluggyClient.rate_limit_stats()['auth']
+        self.assertEqual(stats['pauses'], 1)
+        self.assertEqual(stats['retries'], 1)
+    
+    def test_429_connect_token_retried(self):
+        """Test 429 on /connect_token is retried (request was not processed)"""
+        self.client._api_key = 'test_api_key_789'
+        self.session.post.side_effect = [
+            self._response(429),
+            self._response(200, {'accessToken': 'token_after_429'}),
+        ]
+        
+        self.assertEqual(self.client.create_connect_token('user@example.com'), 'token_after_429')
+    
+    def test_429_gives_up_after_max_retries(self):
+        """Test persistent 429 ends with the user-facing rate limit message"""
+        self.session.post.return_value = self._response(429)
+        
+        with patch('modules.pluggy_utils.MAX_RETRIES', 2):
+            with self.assertRaises(ValueError) as context:
+                self.client.authenticate()
+        
+        self.assertIn('Muitas tentativas de conexão', str(context.exception))
+        self.assertEqual(self.session.post.call_count, 3)
+    
+    def test_auth_transport_error_retried(self):
+        """Test /auth (idempotent) is retried after a connection error"""
+        self.session.post.side_effect = [
+            requests.exceptions.ConnectionError('reset'),
+            self._response(503),
+            self._response(200, {'apiKey': 'api_key_after_retry'}),
+        ]
+        
+        self.assertEqual(self.client.authenticate(), 'api_key_after_retry')
+        self.assertEqual(PluggyClient.rate_limit_stats()['auth']['retries'], 2)
+    
+    def test_connect_token_transport_error_not_retried(self):
+        """Test /connect_token is not retried after a transport error"""
+        self.client._api_key = 'test_api_key_789'
+        self.session.post.side_effect = requests.exceptions.Timeout('timeout')
+        
+        with self.assertRaises(ValueError) as context:
+            self.client.create_connect_token()
+        
+        self.assertIn('Timeout ao conectar com o serviço Pluggy', str(context.exception))
+        self.assertEqual(self.session.post.call_count, 1)
+    
+    def test_burst_is_queued_not_rejected(self):
+        """Test requests over the burst wait for tokens instead of failing"""
+        PluggyClient.configure_rate_limit('connect_token', rate=50, burst=2)
+        self.client._api_key = 'test_api_key_789'
+        self.session.post.return_value = self._response(200, {'accessToken': 'token'})
+        
+        start = time.monotonic()
+        tokens = [self.client.create_connect_token(f'user{i}') for i in range(7)]
+        
+        self.assertEqual(tokens, ['token'] * 7)
+        # 5 requests over the burst at 50/s need ~0.1s
+        self.assertGreaterEqual(time.monotonic() - start, 0.08)
+        stats = PluggyClient.rate_limit_stats()['connect_token']
+        self.assertEqual(stats['acquired'], 7)
+        self.assertEqual(sum(stats['wait_histogram'].values()), 7)
+    
+    def test_request_attempts_decisions(self):
+        """Test the shared policy: 429 queues at once, 5xx backs off only when idempotent"""
+        auth = RequestAttempts('auth')
+        connect = RequestAttempts('connect_token')
+        
+        self.assertEqual(auth.response(self._response(429, headers={'Retry-After': '0.05'})), 0.0)
+        self.assertGreater(auth.response(self._response(503)), 0)
+        self.assertIsNone(auth.response(self._response(200)))
+        self.assertIsNone(connect.response(self._response(503)))
+        self.assertIsNone(connect.transport_error(requests.exceptions.Timeout('timeout')))
+        self.assertEqual(auth.attempt, 2)
+        self.assertEqual(PluggyClient.rate_limit_stats()['auth']['pauses'], 1)
+        self.assertEqual(PluggyClient.rate_limit_stats()['auth']['retries'], 2)
+    
+    def test_request_attempts_stop_at_max_retries(self):
+        """Test the policy returns the outcome once MAX_RETRIES is used up"""
+        attempts = RequestAttempts('auth')
+        
+        with patch('modules.pluggy_utils.MAX_RETRIES', 1):
+            self.assertIsNotNone(attempts.transport_error(requests.exceptions.ConnectionError('reset')))
+            self.assertIsNone(attempts.transport_error(requests.exceptions.ConnectionError('reset')))
+            self.assertIsNone(attempts.response(self._response(429)))
+    
+    @patch('modules.pluggy_utils.RATE_LIMIT_MAX_WAIT_SECONDS', 0.05)
+    def test_queue_wait_timeout(self):
+        """Test a queue wait longer than the limit returns the rate limit message"""
+        PluggyClient.configure_rate_limit('connect_token', rate=0.1, burst=1)
+        self.client._api_key = 'test_api_key_789'
+        self.session.post.return_value = self._response(200, {'accessToken': 'token'})
+        self.client.create_connect_token()
+        
+        with self.assertRaises(ValueError) as context:
+            self.client.create_connect_token()
+        
+        self.assertIn('Muitas tentativas de geração de token', str(context.exception))
+        self.assertEqual(PluggyClient.rate_limit_stats()['connect_token']['timeouts'], 1)
+
+
+@patch('modules.pluggy_utils.MAX_RETRIES', 0)
+@patch('modules.pluggy_utils.BREAKER_MIN_CALLS', 3)
+@patch('modules.pluggy_utils.BREAKER_COOLDOWN_SECONDS', 0.05)
+class TestCircuitBreakerIntegration(unittest.TestCase):
+    """Test PluggyClient fails fast while an endpoint's circuit breaker is open"""
+    
+    def setUp(self):
+        """Set up authenticated test client"""
+        self.test_config = {
+            'client_id': 'test_client_id_123',
+            'client_secret': 'test_client_secret_456',
+            'base_url': 'https://api.pluggy.ai'
+        }
+        PluggyClient.reset_api_key_cache()
+        PluggyClient.reset_rate_limiters()
+        PluggyClient.reset_circuit_breakers()
+        self.session = Mock()
+        self.client = PluggyClient(self.test_config, session=self.session)
+        self.client._api_key = 'test_api_key_789'
+    
+    def _response(self, status_code, payload=None):
+        response = Mock()
+        response.status_code = status_code
+        response.text = ''
+        response.json.return_value = payload or {}
+        return response
+    
+    def _trip(self):
+        self.session.post.side_effect = requests.exceptions.Timeout('timeout')
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                self.client.create_connect_token()
+        self.session.post.reset_mock()
+    
+    def test_open_breaker_fails_fast(self):
+        """Test calls are rejected without network access while open"""
+        self._trip()
+        
+        with self.assertRaises(ValueError) as context:
+            self.client.create_connect_token()
+        
+        self.assertIn('temporariamente indisponível', str(context.exception))
+        self.session.post.assert_not_called()
+        stats = PluggyClient.circuit_breaker_stats()['connect_token']
+        self.assertEqual(stats['state'], 'open')
+        self.assertEqual(stats['rejected'], 1)
+    
+    def test_breaker_is_per_endpoint(self):
+        """Test an open /connect_token breaker doesn't block /auth"""
+        self._trip()
+        self.session.post.side_effect = None
+        self.session.post.return_value = self._response(200, {'apiKey': 'new_api_key'})
+        
+        self.assertEqual(self.client.authenticate(), 'new_api_key')
+    
+    def test_server_errors_open_breaker(self):
+        """Test 5xx responses count as failures"""
+        self.session.post.return_value = self._response(503)
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                self.client.create_connect_token()
+        
+        self.assertEqual(PluggyClient.circuit_breaker_stats()['connect_token']['state'], 'open')
+    
+    def test_client_errors_do_not_open_breaker(self):
+        """Test 4xx responses are not service failures"""
+        self.session.post.return_value = self._response(400)
+        for _ in range(5):
+            with self.assertRaises(ValueError):
+                self.client.create_connect_token()
+        
+        self.assertEqual(PluggyClient.circuit_breaker_stats()['connect_token']['state'], 'closed')
+    
+    def test_recovery_probe_closes_breaker(self):
+        """Test a successful probe after the cool-down closes the breaker"""
+        self._trip()
+        time.sleep(0.06)
+        self.session.post.side_effect = None
+        self.session.post.return_value = self._response(200, {'accessToken': 'token_after_recovery'})
+        
+        self.assertEqual(self.client.create_connect_token(), 'token_after_recovery')
+        
+        stats = PluggyClient.circuit_breaker_stats()['connect_token']
+        self.assertEqual(stats['state'], 'closed')
+        self.assertEqual(stats['transitions']['half_open->closed'], 1)
+
+
 class TestConvenienceFunctions(unittest.TestCase):
     """Test convenience functions"""
     
@@ -446,6 +981,8 @@ class TestConvenienceFunctions(unittest.TestCase):
         mock_create_token.assert_called_once_with('test_user@example.com')
 
 
+# Single attempt per request; retries are covered by TestRateLimitingAndRetries
+@patch('modules.pluggy_utils.MAX_RETRIES', 0)
 class TestErrorHandlingEdgeCases(unittest.TestCase):
     """Test error handling edge cases"""
     
@@ -456,9 +993,12 @@ class TestErrorHandlingEdgeCases(unittest.TestCase):
             'client_secret': 'test_client_secret_456',
             'base_url': 'https://api.pluggy.ai'
         }
+        PluggyClient.reset_api_key_cache()
+        PluggyClient.reset_rate_limiters()
+        PluggyClient.reset_circuit_breakers()
         self.client = PluggyClient(self.test_config)
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_authenticate_unexpected_exception(self, mock_post):
         """Test authentication with unexpected exception"""
         mock_post.side_effect = Exception("Unexpected error")
@@ -468,7 +1008,7 @@ class TestErrorHandlingEdgeCases(unittest.TestCase):
         
         self.assertIn('Erro interno ao autenticar com Pluggy', str(context.exception))
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_create_connect_token_unexpected_exception(self, mock_post):
         """Test connect token creation with unexpected exception"""
         self.client._api_key = 'test_api_key_789'
@@ -479,7 +1019,7 @@ class TestErrorHandlingEdgeCases(unittest.TestCase):
         
         self.assertIn('Erro interno ao gerar token de conexão', str(context.exception))
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_authenticate_http_error(self, mock_post):
         """Test authentication with HTTP error"""
         mock_post.side_effect = requests.exceptions.HTTPError("HTTP error")
@@ -489,7 +1029,7 @@ class TestErrorHandlingEdgeCases(unittest.TestCase):
         
         self.assertIn('Erro HTTP ao comunicar com o serviço Pluggy', str(context.exception))
     
-    @patch('modules.pluggy_utils.requests.post')
+    @patch('modules.pluggy_utils.requests.Session.post')
     def test_create_connect_token_request_exception(self, mock_post):
         """Test connect token creation with general request exception"""
         self.client._api_key = 'test_api_key_789'
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/rate_limiter.py
+
+Tests cover:
+- Token bucket burst, refill and queueing across threads
+- acquire_async() sharing the bucket with coroutines
+- Retry-After parsing and backoff
+- Queue depth and wait-time metrics
+"""
+
+import unittest
+import asyncio
+import time
+import threading
+from email.utils import formatdate
+from modules.rate_limiter import TokenBucket, parse_retry_after, backoff_delay
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test TokenBucket"""
+    
+    def test_burst_available_immediately(self):
+        """Test burst tokens are granted without waiting"""
+        bucket = TokenBucket('test', rate=1, burst=3)
+        
+        start = time.monotonic()
+        for _ in range(3):
+            self.assertTrue(bucket.acquire(timeout=0))
+        
+        self.assertLess(time.monotonic() - start, 0.05)
+        self.assertFalse(bucket.acquire(timeout=0))
+    
+    def test_refill_rate(self):
+        """Test callers over the burst wait for refill"""
+        bucket = TokenBucket('test', rate=20, burst=1)
+        bucket.acquire()
+        
+        start = time.monotonic()
+        self.assertTrue(bucket.acquire(timeout=1))
+        
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+    
+    def test_pause_blocks_all_callers(self):
+        """Test pause() delays every caller even with tokens refilled"""
+        bucket = TokenBucket('test', rate=1000, burst=10)
+        bucket.pause(0.1)
+        
+        start = time.monotonic()
+        self.assertTrue(bucket.acquire(timeout=1))
+        
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        self.assertEqual(bucket.stats()['pauses'], 1)
+    
+    def test_threads_share_bucket(self):
+        """Test concurrent callers never exceed burst + rate * elapsed"""
+        bucket = TokenBucket('test', rate=100, burst=5)
+        barrier = threading.Barrier(10)
+        granted = []
+        
+        def worker():
+            barrier.wait()
+            for _ in range(5):
+                bucket.acquire()
+                granted.append(time.monotonic())
+        
+        threads = [threading.Thread(target=worker) for _ in range(10)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+        
+        self.assertEqual(len(granted), 50)
+        self.assertLessEqual(len(granted), 5 + 100 * elapsed + 1)
+        stats = bucket.stats()
+        self.assertGreater(stats['max_queue_depth'], 1)
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['acquired'], 50)
+        self.assertEqual(sum(stats['wait_histogram'].values()), 50)
+    
+    def test_reset(self):
+        """Test reset refills tokens and clears counters"""
+        bucket = TokenBucket('test', rate=0.1, burst=1)
+        bucket.acquire()
+        bucket.pause(60)
+        
+        bucket.reset()
+        
+        self.assertTrue(bucket.acquire(timeout=0))
+        self.assertEqual(bucket.stats()['pauses'], 0)
+    
+    def test_invalid_configuration(self):
+        """Test rate and burst validation"""
+        with self.assertRaises(ValueError):
+            TokenBucket('test', rate=0, burst=1)
+        with self.assertRaises(ValueError):
+            TokenBucket('test', rate=1, burst=0)
+
+
+class TestTokenBucketAsync(unittest.IsolatedAsyncioTestCase):
+    """Test TokenBucket.acquire_async"""
+    
+    async def test_coroutines_share_bucket(self):
+        """Test coroutines wait for refill without blocking the event loop"""
+        bucket = TokenBucket('test', rate=100, burst=5)
+        ticks = []
+        
+        async def ticker():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.005)
+        
+        ticking = asyncio.create_task(ticker())
+        start = time.monotonic()
+        granted = await asyncio.gather(*(bucket.acquire_async() for _ in range(15)))
+        elapsed = time.monotonic() - start
+        ticking.cancel()
+        
+        self.assertTrue(all(granted))
+        self.assertGreaterEqual(elapsed, 0.09)
+        self.assertGreater(len(ticks), 5)
+        stats = bucket.stats()
+        self.assertEqual(stats['acquired'], 15)
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertGreater(stats['max_queue_depth'], 1)
+    
+    async def test_timeout_and_pause(self):
+        """Test a paused bucket makes acquire_async time out"""
+        bucket = TokenBucket('test', rate=1000, burst=10)
+        bucket.pause(60)
+        
+        self.assertFalse(await bucket.acquire_async(timeout=0.05))
+        self.assertEqual(bucket.stats()['timeouts'], 1)
+
+
+class TestRetryHelpers(unittest.TestCase):
+    """Test Retry-After parsing and backoff"""
+    
+    def test_parse_retry_after_seconds(self):
+        """Test delay-seconds form"""
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertEqual(parse_retry_after(' 1.5 '), 1.5)
+    
+    def test_parse_retry_after_http_date(self):
+        """Test HTTP-date form"""
+        delay = parse_retry_after(formatdate(time.time() + 30, usegmt=True))
+        
+        self.assertGreater(delay, 25)
+        self.assertLessEqual(delay, 31)
+    
+    def test_parse_retry_after_invalid(self):
+        """Test missing or invalid headers"""
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after(''))
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertEqual(parse_retry_after('-5'), 0.0)
+    
+    def test_backoff_delay_bounds(self):
+        """Test exponential backoff with jitter stays within the cap"""
+        for attempt in range(10):
+            delay = backoff_delay(attempt, base=0.5, cap=8.0)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(8.0, 0.5 * 2 ** attempt))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/recurring.py
+
+Tests cover:
+- Counterparty normalization
+- Monthly, weekly and yearly series among noise; price changes within tolerance
+- Two subscriptions of one merchant split by amount; scattered grocery amounts
+  not chained into one series; direction and clients kept apart
+- Irregular and too short series rejected; active flag
+- Agreement with a straightforward per-series reference on random data
+- The post-sync batch stage (affected clients only) and its persistence
+"""
+
+import unittest
+from datetime import date, timedelta
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+
+from modules import recurring
+
+TODAY = date(2025, 1, 20)
+
+
+def make_frame(rows):
+    """rows: (client, 'YYYY-MM-DD', amount_cents, description)"""
+    frame = pd.DataFrame(rows, columns=['client', 'tx_date', 'amount_cents', 'description'])
+    frame['item_id'] = frame['client']
+    frame['account_id'] = 'acc-' + frame['client']
+    frame['tx_date'] = pd.to_datetime(frame['tx_date'])
+    return frame[list(recurring.FRAME_COLUMNS)]
+
+
+def series(client, description, amount, first, days, count, jitter=()):
+    start = date.fromisoformat(first)
+    jitter = list(jitter) + [0] * count
+    return [
+        (client, (start + timedelta(days=days * i + jitter[i])).isoformat(), amount, f'{description} {i:02d}/12')
+        for i in range(count)
+    ]
+
+
+class TestNormalize(unittest.TestCase):
+    """Test normalize_counterparty"""
+
+    def test_digits_and_punctuation_removed(self):
+        """Test varying numbers and punctuation don't split a counterparty"""
+        keys = recurring.normalize_counterparty(pd.Series(['Netflix.com 0123', 'NETFLIX COM *9876', None, '123']))
+
+        self.assertEqual(keys.tolist(), ['NETFLIX COM', 'NETFLIX COM', '', ''])
+
+
+class TestDetectRecurring(unittest.TestCase):
+    """Test detect_recurring"""
+
+    def detect(self, rows):
+        return recurring.detect_recurring(make_frame(rows), TODAY)
+
+    def test_monthly_subscription_among_noise(self):
+        """Test a monthly charge is found and one-off purchases are not"""
+        rows = series('a', 'NETFLIX', -5590, '2024-02-05', 30, 12, jitter=[0, 1, -2, 3, 0, -1, 2, 0, 1, -3, 0, 2])
+        # Groceries: same counterparty every month, but amounts all over the place
+        rows += [('a', f'2024-{m:02d}-{d:02d}', -(1000 + 7919 * (m * d % 23)), f'MERCADO {d}')
+                 for m in range(1, 13) for d in (3, 17)]
+        rows += [('a', '2024-06-10', -5590, 'LOJA X'), ('a', '2024-06-11', -5590, 'LOJA Y')]
+
+        found = self.detect(rows)
+
+        self.assertEqual(len(found), 1)
+        row = found.iloc[0]
+        self.assertEqual((row.counterparty, row.period, row.direction, row.amount_cents, row.occurrences),
+                         ('NETFLIX', 'monthly', -1, 5590, 12))
+        self.assertTrue(row.active)
+        self.assertEqual(row.first_date, np.datetime64('2024-02-05'))
+
+    def test_weekly_and_yearly(self):
+        """Test other periods are recognized"""
+        rows = series('a', 'ACADEMIA', -3000, '2024-11-01', 7, 10)
+        rows += series('a', 'SEGURO AUTO', -250000, '2023-03-10', 365, 2, jitter=[0, 3])
+
+        found = self.detect(rows)
+
+        self.assertEqual(dict(zip(found['counterparty'], found['period'])), {'ACADEMIA': 'weekly', 'SEGURO AUTO': 'yearly'})
+
+    def test_salary_is_money_in(self):
+        """Test income series are reported with direction 1"""
+        found = self.detect(series('a', 'SALARIO EMPRESA', 800000, '2024-06-05', 30, 8))
+
+        self.assertEqual(found['direction'].tolist(), [1])
+
+    def test_price_change_within_tolerance(self):
+        """Test a small price increase keeps one series"""
+        rows = series('a', 'SPOTIFY', -1990, '2024-01-10', 30, 6) + series('a', 'SPOTIFY', -2190, '2024-07-08', 30, 6)
+
+        found = self.detect(rows)
+
+        self.assertEqual(found['occurrences'].tolist(), [12])
+
+    def test_varied_grocery_amounts_not_recurring(self):
+        """Test weekly purchases of scattered amounts don't chain into one similar-amount series"""
+        rng = np.random.default_rng(7)
+        rows = [('a', (date(2024, 6, 1) + timedelta(days=7 * i)).isoformat(), -int(rng.integers(8000, 30000)),
+                 'PAO DE ACUCAR') for i in range(40)]
+
+        self.assertEqual(len(self.detect(rows)), 0)
+
+    def test_two_subscriptions_same_merchant(self):
+        """Test different amounts of one counterparty are separate series"""
+        rows = series('a', 'GOOGLE', -990, '2024-03-01', 30, 8) + series('a', 'GOOGLE', -4990, '2024-03-15', 30, 8)
+
+        found = self.detect(rows)
+
+        self.assertEqual(found['amount_cents'].tolist(), [990, 4990])
+
+    def test_clients_kept_apart(self):
+        """Test two clients' charges are never merged into one series"""
+        rows = series('a', 'NETFLIX', -5590, '2024-09-01', 60, 3) + series('b', 'NETFLIX', -5590, '2024-10-01', 60, 3)
+
+        self.assertEqual(len(self.detect(rows)), 0)
+        self.assertEqual(len(self.detect(rows + series('b', 'NETFLIX', -5590, '2024-10-31', 60, 2))), 1)
+
+    def test_irregular_and_short_rejected(self):
+        """Test random gaps and too few occurrences are not recurring"""
+        irregular = [('a', d, -5000, 'UBER') for d in ('2024-01-03', '2024-01-05', '2024-02-20', '2024-02-21', '2024-05-01')]
+        short = series('a', 'DISNEY', -3390, '2024-11-10', 30, 2)
+
+        self.assertEqual(len(self.detect(irregular + short)), 0)
+
+    def test_cancelled_subscription_inactive(self):
+        """Test a series whose next charge is overdue is flagged inactive"""
+        found = self.detect(series('a', 'HBO', -3490, '2024-01-10', 30, 5))
+
+        self.assertFalse(found['active'].iloc[0])
+        self.assertEqual(found['next_date'].iloc[0], np.datetime64('2024-06-08'))
+
+    def test_empty(self):
+        """Test no usable transactions give an empty result"""
+        found = self.detect([('a', '2024-01-01', -100, None)])
+
+        self.assertEqual(len(found), 0)
+        self.assertEqual(list(found.columns), list(recurring.RECURRING_COLUMNS))
+
+    def test_matches_reference_on_random_data(self):
+        """Test the vectorized result equals a per-series loop over the same rules"""
+        rng = np.random.default_rng(3)
+        rows = []
+        for client in ('a', 'b', 'c'):
+            for merchant, days in (('NETFLIX', 30), ('ACADEMIA', 7), ('ALUGUEL', 30), ('IPVA', 365), ('CURSO', 14)):
+                start = date(2024, 1, 1) + timedelta(days=int(rng.integers(0, 20)))
+                # Up to two price tiers per merchant, amounts within a few percent
+                for base in rng.choice([1000, 1100, 3000, 9000], size=int(rng.integers(1, 3)), replace=False):
+                    for i in range(int(rng.integers(1, 14))):
+                        if rng.random() < 0.1:
+                            continue
+                        rows.append((client, (start + timedelta(days=days * i + int(rng.integers(-2, 3)))).isoformat(),
+                                     -int(base * rng.uniform(0.97, 1.03)), merchant))
+            for _ in range(60):
+                rows.append((client, (date(2024, 1, 1) + timedelta(days=int(rng.integers(0, 380)))).isoformat(),
+                             -int(rng.integers(100, 100000)), f'LOJA {rng.integers(0, 5)}'))
+
+        found = self.detect(rows)
+
+        self.assertGreaterEqual(found['period'].nunique(), 3)
+        self.assertEqual(
+            sorted(zip(found['client'], found['counterparty'], found['amount_cents'], found['occurrences'], found['period'])),
+            sorted(reference(make_frame(rows))),
+        )
+
+
+def reference(frame):
+    """Same rules, one series at a time with plain Python"""
+    frame = frame.assign(counterparty=recurring.normalize_counterparty(frame['description']))
+    result = []
+    for (client, counterparty, direction), group in frame.groupby(['client', 'counterparty', np.sign(frame['amount_cents'])]):
+        group = group.assign(magnitude=group['amount_cents'].abs()).sort_values('magnitude', kind='stable')
+        clusters, anchor = [], None
+        for row in group.itertuples():
+            if anchor is None or row.magnitude > anchor * (1 + recurring.RECURRING_AMOUNT_TOLERANCE):
+                clusters.append([])
+                anchor = row.magnitude
+            clusters[-1].append(row)
+        for cluster in clusters:
+            days = sorted(row.tx_date.date() for row in cluster)
+            intervals = sorted((b - a).days for a, b in zip(days, days[1:]))
+            if not intervals:
+                continue
+            median = intervals[(len(intervals) - 1) // 2]
+            for name, period, tolerance, minimum in recurring.PERIODS:
+                if abs(median - period) <= tolerance:
+                    matching = sum(abs(i - period) <= tolerance for i in intervals) / len(intervals)
+                    if len(cluster) >= minimum and matching >= recurring.RECURRING_MIN_REGULARITY:
+                        amounts = sorted(row.magnitude for row in cluster)
+                        result.append((client, counterparty, amounts[(len(amounts) - 1) // 2], len(cluster), name))
+                    break
+    return result
+
+
+class TestBatchStage(unittest.TestCase):
+    """Test detect_recurring_for_items"""
+
+    def test_only_affected_clients_reloaded_and_replaced(self):
+        """Test the stage loads every item of the affected clients and replaces their series"""
+        conn = MagicMock()
+        conn.execute.return_value.fetchall.return_value = [
+            ('a@x.com', 'item-1'), ('a@x.com', 'item-2'), ('item-9', 'item-9'),
+        ]
+        frame = make_frame(series('a@x.com', 'NETFLIX', -5590, '2024-09-05', 30, 5))
+        with patch.object(recurring, 'load_transactions', return_value=frame) as load, \
+                patch.object(recurring, 'save_recurring') as save:
+            stats = recurring.detect_recurring_for_items(['item-1', 'item-9', 'item-1'], TODAY, conn)
+
+        self.assertEqual(conn.execute.call_args.args[1], (['item-1', 'item-9'],))
+        self.assertEqual(load.call_args.args[0], {'item-1', 'item-2', 'item-9'})
+        self.assertEqual(load.call_args.args[1], TODAY - timedelta(days=recurring.RECURRING_LOOKBACK_DAYS))
+        clients, rows = save.call_args.args[:2]
+        self.assertEqual(clients, ['a@x.com', 'item-9'])
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][:3], ('a@x.com', 'NETFLIX', -1))
+        self.assertIsInstance(rows[0][-4], date)
+        self.assertEqual((stats['clients'], stats['transactions'], stats['recurring']), (2, 5, 1))
+
+    def test_nothing_changed(self):
+        """Test no query runs without affected items"""
+        conn = MagicMock()
+
+        stats = recurring.detect_recurring_for_items([], conn=conn)
+
+        self.assertEqual(stats['clients'], 0)
+        conn.execute.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/sync_scheduler.py
+
+Tests cover:
+- Global concurrency cap and per-client cap
+- Per-item mutual exclusion (duplicates, concurrent runs, advisory lock)
+- Priority by created_at and round-robin fairness across clients
+- Failure isolation and per-item progress/lag metrics
+- Post-sync stage with the items whose transactions changed
+- Worker loop and entry point
+"""
+
+import time
+import threading
+import unittest
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from modules import sync_scheduler
+from modules.sync_scheduler import SyncScheduler
+
+
+class FakeEngine:
+    """Sync engine stand-in that records order and concurrency"""
+
+    def __init__(self, seconds=0.02, fail=(), unchanged=()):
+        self.seconds = seconds
+        self.fail = set(fail)
+        self.unchanged = set(unchanged)
+        self.order = []
+        self.running = 0
+        self.max_running = 0
+        self.running_items = set()
+        self.lock = threading.Lock()
+
+    def sync_item(self, item_id, stats=None):
+        with self.lock:
+            self.order.append(item_id)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.running_items.add(item_id)
+        try:
+            stats.update(item_id=item_id, accounts=1, pages=0, transactions=0)
+            time.sleep(self.seconds)
+            if item_id in self.fail:
+                raise ValueError("Conexão bancária não encontrada na Pluggy.")
+            stats.update(pages=2, transactions=10, written=0 if item_id in self.unchanged else 10)
+            return stats
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.running_items.discard(item_id)
+
+
+@contextmanager
+def free_lock(item_id):
+    yield True
+
+
+def make_items(spec):
+    """spec: [(item_id, email)], newest first"""
+    now = datetime(2026, 1, 1)
+    return [
+        {'item_id': item_id, 'email': email, 'created_at': now - timedelta(minutes=i)}
+        for i, (item_id, email) in enumerate(spec)
+    ]
+
+
+class SchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        sync_scheduler._running_items.clear()
+        self.engine = FakeEngine()
+        self.lags = {}
+
+    def sync_lag(self, item_ids):
+        return {item_id: self.lags[item_id] for item_id in item_ids if item_id in self.lags}
+
+    def make(self, **kwargs):
+        options = dict(engine=self.engine, item_lock=free_lock, sync_lag=self.sync_lag)
+        options.update(kwargs)
+        return SyncScheduler(**options)
+
+
+class TestConcurrency(SchedulerTestCase):
+    """Test caps and mutual exclusion"""
+
+    def test_global_cap(self):
+        """Test no more than max_workers items sync at once"""
+        items = make_items([(f'item-{i}', f'c{i}@example.com') for i in range(12)])
+
+        summary = self.make(max_workers=3).run(items)
+
+        self.assertEqual(summary['done'], 12)
+        self.assertEqual(self.engine.max_running, 3)
+
+    def test_per_client_cap(self):
+        """Test one client's items don't run in parallel beyond max_per_client"""
+        items = make_items([(f'item-{i}', 'big@example.com') for i in range(6)])
+
+        self.make(max_workers=4, max_per_client=1).run(items)
+
+        self.assertEqual(self.engine.max_running, 1)
+        self.assertEqual(len(self.engine.order), 6)
+
+    def test_duplicate_items_synced_once(self):
+        """Test an item listed twice is only synced once"""
+        items = make_items([('item-1', 'a@example.com'), ('item-1', 'a@example.com'), ('item-2', 'b@example.com')])
+
+        summary = self.make().run(items)
+
+        self.assertEqual(sorted(self.engine.order), ['item-1', 'item-2'])
+        self.assertEqual(summary['items'], 2)
+
+    def test_item_running_elsewhere_in_process_is_skipped(self):
+        """Test two schedulers never sync the same item concurrently"""
+        self.engine.seconds = 0.2
+        items = make_items([('item-1', 'a@example.com')])
+        first = self.make()
+        thread = threading.Thread(target=first.run, args=(items,))
+        thread.start()
+        time.sleep(0.05)
+
+        second = self.make()
+        summary = second.run(items)
+        thread.join()
+
+        self.assertEqual(summary['skipped'], 1)
+        self.assertEqual(self.engine.order, ['item-1'])
+        self.assertEqual(second.metrics()['item-1']['error'], 'already syncing in this process')
+
+    def test_item_locked_by_another_instance_is_skipped(self):
+        """Test an advisory lock held by another replica skips the item"""
+        @contextmanager
+        def held(item_id):
+            yield item_id != 'item-2'
+
+        items = make_items([('item-1', 'a@example.com'), ('item-2', 'b@example.com')])
+        scheduler = self.make(item_lock=held)
+
+        summary = scheduler.run(items)
+
+        self.assertEqual(self.engine.order, ['item-1'])
+        self.assertEqual(summary['skipped'], 1)
+        self.assertEqual(scheduler.metrics()['item-2']['status'], 'skipped')
+
+    def test_invalid_caps(self):
+        """Test caps must be positive"""
+        with self.assertRaises(ValueError):
+            SyncScheduler(engine=self.engine, max_workers=0)
+
+
+class TestOrdering(SchedulerTestCase):
+    """Test priority and fairness"""
+
+    def test_newest_items_first(self):
+        """Test items are dispatched by created_at, newest first"""
+        items = make_items([(f'item-{i}', f'c{i}@example.com') for i in range(5)])
+        items.reverse()
+
+        self.make(max_workers=1).run(items)
+
+        self.assertEqual(self.engine.order, [f'item-{i}' for i in range(5)])
+
+    def test_items_without_created_at_go_last(self):
+        """Test missing created_at sorts after every dated item"""
+        items = make_items([('item-1', 'a@example.com')]) + [{'item_id': 'legacy', 'email': 'b@example.com'}]
+        items.reverse()
+
+        self.make(max_workers=1).run(items)
+
+        self.assertEqual(self.engine.order, ['item-1', 'legacy'])
+
+    def test_round_robin_across_clients(self):
+        """Test a client with many items can't starve the others"""
+        spec = [(f'big-{i}', 'big@example.com') for i in range(6)]
+        spec += [('small-1', 'one@example.com'), ('small-2', 'two@example.com')]
+
+        self.make(max_workers=1).run(make_items(spec))
+
+        self.assertEqual(self.engine.order[:3], ['big-0', 'small-1', 'small-2'])
+        self.assertEqual(self.engine.order[3:], [f'big-{i}' for i in range(1, 6)])
+
+    def test_items_without_email_are_their_own_client(self):
+        """Test clients are keyed by item when email is missing"""
+        items = [{'item_id': 'a'}, {'item_id': 'b'}]
+
+        self.make(max_workers=2, max_per_client=1).run(items)
+
+        self.assertEqual(self.engine.max_running, 2)
+
+
+class TestMetrics(SchedulerTestCase):
+    """Test failure isolation and metrics"""
+
+    def test_failure_does_not_stop_others(self):
+        """Test a failing item is recorded and the rest still sync"""
+        self.engine.fail = {'item-1'}
+        items = make_items([('item-0', 'a@example.com'), ('item-1', 'b@example.com'), ('item-2', 'c@example.com')])
+        scheduler = self.make()
+
+        summary = scheduler.run(items)
+
+        self.assertEqual((summary['done'], summary['failed']), (2, 1))
+        self.assertIn('não encontrada', scheduler.metrics()['item-1']['error'])
+        self.assertEqual(summary['transactions'], 20)
+
+    def test_item_metrics(self):
+        """Test wait, duration, progress and lag are reported per item"""
+        items = make_items([('item-0', 'a@example.com'), ('item-1', 'a@example.com')])
+        self.lags = {'item-0': 1.5}
+        scheduler = self.make(max_workers=1)
+
+        scheduler.run(items)
+        metrics = scheduler.metrics()
+
+        first, second = metrics['item-0'], metrics['item-1']
+        self.assertEqual(first['status'], 'done')
+        self.assertEqual((first['pages'], first['transactions']), (2, 10))
+        self.assertGreaterEqual(first['duration_seconds'], 0.02)
+        # The second item waited for the only worker
+        self.assertGreaterEqual(second['wait_seconds'], 0.02)
+        self.assertEqual(first['lag_seconds'], 1.5)
+        self.assertIsNone(second['lag_seconds'])
+        self.assertEqual(second['priority'], 1)
+
+    def test_lag_unavailable(self):
+        """Test metrics still answer when the lag can't be read"""
+        def sync_lag(item_ids):
+            raise ConnectionError("database unavailable")
+
+        scheduler = self.make(sync_lag=sync_lag)
+        scheduler.run(make_items([('item-0', 'a@example.com')]))
+
+        record = scheduler.metrics()['item-0']
+        self.assertEqual(record['status'], 'done')
+        self.assertIsNone(record['lag_seconds'])
+
+    def test_progress_visible_while_running(self):
+        """Test metrics show running items with live counters"""
+        self.engine.seconds = 0.2
+        scheduler = self.make()
+        thread = threading.Thread(target=scheduler.run, args=(make_items([('item-0', 'a@example.com')]),))
+        thread.start()
+        time.sleep(0.05)
+
+        record = scheduler.metrics()['item-0']
+        summary = scheduler.summary()
+        thread.join()
+
+        self.assertEqual(record['status'], 'running')
+        self.assertEqual(record['accounts'], 1)
+        self.assertIsNone(record['lag_seconds'])
+        self.assertEqual(summary['running'], 1)
+
+
+class TestPostSync(SchedulerTestCase):
+    """Test the post-sync batch stage"""
+
+    def test_called_with_changed_items_only(self):
+        """Test failed items and items without new or changed rows are left out"""
+        self.engine.fail = {'item-1'}
+        self.engine.unchanged = {'item-2'}
+        calls = []
+        scheduler = self.make(post_sync=lambda item_ids: calls.append(sorted(item_ids)) or {'recurring': 3})
+        items = make_items([(f'item-{i}', f'{i}@example.com') for i in range(4)])
+
+        summary = scheduler.run(items)
+
+        self.assertEqual(calls, [['item-0', 'item-3']])
+        self.assertEqual(summary['post_sync'], {'recurring': 3})
+
+    def test_not_called_when_nothing_changed(self):
+        """Test the stage is skipped when no item wrote transactions"""
+        self.engine.unchanged = {'item-0'}
+        calls = []
+        scheduler = self.make(post_sync=calls.append)
+
+        summary = scheduler.run(make_items([('item-0', 'a@example.com')]))
+
+        self.assertEqual(calls, [])
+        self.assertIsNone(summary['post_sync'])
+
+    def test_stage_failure_does_not_fail_run(self):
+        """Test an exception in the stage is recorded, the sync results stand"""
+        def stage(item_ids):
+            raise ConnectionError("database unavailable")
+
+        summary = self.make(post_sync=stage).run(make_items([('item-0', 'a@example.com')]))
+
+        self.assertEqual(summary['done'], 1)
+        self.assertIn('unavailable', summary['post_sync']['error'])
+
+
+
+class TestWorker(unittest.TestCase):
+    """Test the worker loop and entry point"""
+
+    def test_runs_until_stopped(self):
+        """Test runs repeat at the interval and a failed run doesn't stop the loop"""
+        stop = threading.Event()
+        runs = []
+
+        def run():
+            runs.append(time.monotonic())
+            if len(runs) == 1:
+                raise ConnectionError("database unavailable")
+            if len(runs) == 3:
+                stop.set()
+
+        sync_scheduler.run_forever(interval_seconds=0.05, stop_event=stop, run=run)
+
+        self.assertEqual(len(runs), 3)
+        self.assertGreaterEqual(runs[2] - runs[1], 0.04)
+
+    def test_once(self):
+        """Test --once migrates the schema and syncs a single time"""
+        calls = []
+        with patch.object(sync_scheduler, 'ensure_schema', side_effect=lambda: calls.append('schema') or {'ok': True}), \
+                patch.object(sync_scheduler, 'sync_all_items', side_effect=lambda: calls.append('sync')):
+            status = sync_scheduler.main(['--once'])
+
+        self.assertEqual(status, 0)
+        self.assertEqual(calls, ['schema', 'sync'])
+
+    def test_not_started_when_migration_fails(self):
+        """Test a failed migration exits without syncing"""
+        with patch.object(sync_scheduler, 'ensure_schema', return_value={'ok': False, 'error': 'boom'}), \
+                patch.object(sync_scheduler, 'run_forever') as loop:
+            status = sync_scheduler.main([])
+
+        self.assertEqual(status, 1)
+        loop.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/transaction_sync.py and PluggyClient data endpoints
+
+Runs PluggyClient unmodified against tests/fake_pluggy_server.py.
+
+Tests cover:
+- Account listing and transaction paging (including 401 re-auth)
+- Streaming paginator: order, bounded prefetch, early close, errors
+- Full first sync and delta-only incremental syncs
+- Resume after a crash mid-pagination
+- Pending reconciliation once each account's pages are stored
+"""
+
+import os
+import sys
+import time
+import unittest
+from unittest.mock import patch
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_pluggy_server import FakePluggyServer
+from modules.pluggy_utils import PluggyClient
+from modules.transaction_sync import TransactionSyncEngine
+
+
+class MemorySyncStore:
+    """In-memory stand-in for PostgresSyncStore"""
+    
+    def __init__(self):
+        self.cursors = {}
+        self.accounts = []
+        self.transactions = {}
+        self.pages_saved = 0
+        self.fail_on_page = None
+        self.reconciled = []
+        self.pending_to_reconcile = {}
+    
+    def load_cursor(self, account_id):
+        cursor = self.cursors.get(account_id)
+        return dict(cursor) if cursor else None
+    
+    def save_accounts(self, rows):
+        self.accounts = list(rows)
+        return len(self.accounts)
+    
+    def save_page(self, rows, cursor):
+        if self.fail_on_page is not None and self.pages_saved + 1 == self.fail_on_page:
+            raise ConnectionError("database went away")
+        # Rows and cursor are committed together; like the upsert, only
+        # new or changed rows count as written
+        written = sum(1 for row in rows if self.transactions.get(row[0]) != row)
+        for row in rows:
+            self.transactions[row[0]] = row
+        self.cursors[cursor['account_id']] = dict(cursor)
+        self.pages_saved += 1
+        return written
+    
+    def reconcile(self, account_id):
+        self.reconciled.append((account_id, self.pages_saved))
+        return self.pending_to_reconcile.pop(account_id, 0)
+
+
+class SyncTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        PluggyClient.reset_api_key_cache()
+        PluggyClient.reset_rate_limiters()
+        PluggyClient.reset_circuit_breakers()
+        for endpoint in ('auth', 'accounts', 'transactions'):
+            PluggyClient.configure_rate_limit(endpoint, rate=1000, burst=1000)
+        self.server = FakePluggyServer().start()
+        self.addCleanup(self.server.stop)
+        self.addCleanup(PluggyClient.reset_rate_limiters)
+        self.client = PluggyClient(self.server.config)
+        self.store = MemorySyncStore()
+        self.engine = TransactionSyncEngine(self.client, self.store, page_size=10, overlap_days=3)
+
+
+class TestPluggyDataEndpoints(SyncTestCase):
+    """Test PluggyClient.list_accounts/list_transactions_page"""
+    
+    def test_list_accounts(self):
+        """Test accounts of an item are returned"""
+        account = self.server.add_account('item-1')
+        
+        self.assertEqual(self.client.list_accounts('item-1'), [account])
+        self.assertEqual(self.client.list_accounts('other'), [])
+    
+    def test_transactions_page(self):
+        """Test page parameters are sent and the page is returned"""
+        account = self.server.add_account('item-1')
+        self.server.generate_transactions(account['id'], 25)
+        
+        page = self.client.list_transactions_page(account['id'], page=3, page_size=10, date_from='2000-01-01')
+        
+        self.assertEqual(page['totalPages'], 3)
+        self.assertEqual(len(page['results']), 5)
+        query = self.server.requests_for('/transactions')[-1]
+        self.assertEqual(query, {'accountId': account['id'], 'page': '3', 'pageSize': '10', 'from': '2000-01-01'})
+    
+    def test_401_reauthenticates_once(self):
+        """Test a rejected cached key is replaced and the call retried"""
+        self.server.add_account('item-1')
+        self.client.get_api_key()
+        self.server.fail_next('GET', '/accounts', 401)
+        
+        self.assertEqual(len(self.client.list_accounts('item-1')), 1)
+        self.assertEqual(len(self.server.requests_for('/auth')), 2)
+    
+    def test_404_user_message(self):
+        """Test unknown item maps to a user-friendly error"""
+        self.server.fail_next('GET', '/accounts', 404)
+        
+        with self.assertRaises(ValueError) as context:
+            self.client.list_accounts('missing')
+        
+        self.assertIn('não encontrada', str(context.exception))
+    
+    def test_5xx_retried_for_reads(self):
+        """Test GETs are retried on 503 as idempotent requests"""
+        self.server.add_account('item-1')
+        self.server.fail_next('GET', '/accounts', 503)
+        
+        with patch('modules.pluggy_utils.RETRY_BACKOFF_BASE_SECONDS', 0):
+            self.assertEqual(len(self.client.list_accounts('item-1')), 1)
+
+
+class TestTransactionPaginator(SyncTestCase):
+    """Test PluggyClient.iter_transaction_pages/iter_transactions"""
+    
+    def setUp(self):
+        super().setUp()
+        self.account = self.server.add_account('item-1')
+        self.generated = self.server.generate_transactions(self.account['id'], 95)
+    
+    def requested_pages(self):
+        return sorted(int(query['page']) for query in self.server.requests_for('/transactions'))
+    
+    def test_pages_yielded_in_order(self):
+        """Test every page is yielded once, in order, with prefetch enabled"""
+        pages = list(self.client.iter_transaction_pages(self.account['id'], page_size=10, max_in_flight=3))
+        
+        self.assertEqual([page['page'] for page in pages], list(range(1, 11)))
+        self.assertEqual(self.requested_pages(), list(range(1, 11)))
+    
+    def test_iter_transactions_yields_records(self):
+        """Test records from all pages are streamed"""
+        ids = [tx['id'] for tx in self.client.iter_transactions(self.account['id'], page_size=10)]
+        
+        self.assertEqual(sorted(ids), sorted(tx['id'] for tx in self.generated))
+    
+    def test_start_page(self):
+        """Test paging can resume from a later page"""
+        pages = list(self.client.iter_transaction_pages(self.account['id'], page_size=10, start_page=8))
+        
+        self.assertEqual([page['page'] for page in pages], [8, 9, 10])
+        self.assertEqual(self.requested_pages(), [8, 9, 10])
+    
+    def test_serial_when_prefetch_disabled(self):
+        """Test max_in_flight=0 only fetches a page when the previous one was consumed"""
+        pages = self.client.iter_transaction_pages(self.account['id'], page_size=10, max_in_flight=0)
+        
+        next(pages)
+        time.sleep(0.1)
+        self.assertEqual(self.requested_pages(), [1])
+        self.assertEqual(len(list(pages)), 9)
+    
+    def test_in_flight_window_is_bounded(self):
+        """Test a slow consumer never has more than max_in_flight pages requested ahead"""
+        pages = self.client.iter_transaction_pages(self.account['id'], page_size=10, max_in_flight=2)
+        
+        next(pages)
+        time.sleep(0.2)
+        self.assertEqual(self.requested_pages(), [1, 2, 3])
+        next(pages)
+        time.sleep(0.2)
+        self.assertEqual(self.requested_pages(), [1, 2, 3, 4])
+        pages.close()
+    
+    def test_close_stops_fetching(self):
+        """Test closing the generator early stops requesting pages"""
+        self.server.latency_seconds = 0.05
+        pages = self.client.iter_transaction_pages(self.account['id'], page_size=10, max_in_flight=2)
+        
+        next(pages)
+        pages.close()
+        time.sleep(0.3)
+        
+        self.assertLessEqual(len(self.requested_pages()), 3)
+    
+    def test_prefetch_overlaps_processing(self):
+        """Test next pages download while the current one is processed"""
+        self.server.latency_seconds = 0.05
+        
+        def consume(max_in_flight):
+            start = time.monotonic()
+            for page in self.client.iter_transaction_pages(
+                    self.account['id'], page_size=10, max_in_flight=max_in_flight):
+                time.sleep(0.05)
+            return time.monotonic() - start
+        
+        serial = consume(0)
+        prefetched = consume(2)
+        
+        # Serial ~ 10 * (latency + processing); prefetched ~ 10 * processing
+        self.assertLess(prefetched, serial * 0.75)
+    
+    def test_failed_page_raises_when_reached(self):
+        """Test a page error surfaces to the consumer after the earlier pages"""
+        fetch = self.client.list_transactions_page
+        
+        def failing(account_id, page=1, *args):
+            if page == 4:
+                raise ValueError("Conexão bancária não encontrada na Pluggy.")
+            return fetch(account_id, page, *args)
+        
+        received = []
+        with patch.object(self.client, 'list_transactions_page', side_effect=failing):
+            with self.assertRaises(ValueError):
+                for page in self.client.iter_transaction_pages(self.account['id'], page_size=10, max_in_flight=2):
+                    received.append(page['page'])
+        
+        self.assertEqual(received, [1, 2, 3])
+
+
+class TestTransactionSync(SyncTestCase):
+    """Test TransactionSyncEngine"""
+    
+    def test_first_sync_fetches_everything(self):
+        """Test initial sync pages through the lookback window"""
+        account = self.server.add_account('item-1')
+        generated = self.server.generate_transactions(account['id'], 35, days=60)
+        
+        stats = self.engine.sync_item('item-1')
+        
+        self.assertEqual(stats['accounts'], 1)
+        self.assertEqual(stats['pages'], 4)
+        self.assertEqual(len(self.store.transactions), 35)
+        self.assertEqual(len(self.store.accounts), 1)
+        cursor = self.store.cursors[account['id']]
+        self.assertEqual(cursor['last_tx_date'], max(tx['date'][:10] for tx in generated))
+        self.assertIsNone(cursor['next_page'])
+        self.assertIsNone(cursor['window_from'])
+    
+    def test_incremental_sync_fetches_delta(self):
+        """Test later syncs start from the high-water mark minus the overlap"""
+        account = self.server.add_account('item-1')
+        old_start = date.today() - timedelta(days=30)
+        self.server.generate_transactions(account['id'], 50, start=old_start, days=200)
+        self.engine.sync_item('item-1')
+        
+        new = self.server.generate_transactions(account['id'], 4, days=5)
+        requests_before = len(self.server.requests_for('/transactions'))
+        stats = self.engine.sync_item('item-1')
+        
+        self.assertEqual(stats['pages'], 1)
+        self.assertEqual(stats['transactions'], 5)  # 4 new + 1 in the overlap window
+        self.assertEqual(stats['written'], 4)
+        self.assertEqual(len(self.server.requests_for('/transactions')) - requests_before, 1)
+        from_date = self.server.requests_for('/transactions')[-1]['from']
+        self.assertEqual(from_date, (old_start - timedelta(days=3)).isoformat())
+        self.assertTrue(all(tx['id'] in self.store.transactions for tx in new))
+    
+    def test_resume_after_crash_mid_pagination(self):
+        """Test a crash while storing page 3 resumes at page 3"""
+        account = self.server.add_account('item-1')
+        self.server.generate_transactions(account['id'], 45, days=60)
+        self.store.fail_on_page = 3
+        
+        with self.assertRaises(ConnectionError):
+            self.engine.sync_item('item-1')
+        
+        self.assertEqual(self.store.cursors[account['id']]['next_page'], 3)
+        self.store.fail_on_page = None
+        pages_before = [q['page'] for q in self.server.requests_for('/transactions')]
+        
+        stats = self.engine.sync_item('item-1')
+        
+        pages_after = [q['page'] for q in self.server.requests_for('/transactions')][len(pages_before):]
+        # A page prefetched by the crashed run may still land after the snapshot
+        self.assertEqual(sorted(set(pages_after)), ['3', '4', '5'])
+        self.assertEqual(stats['resumed_accounts'], 1)
+        self.assertEqual(len(self.store.transactions), 45)
+        self.assertIsNone(self.store.cursors[account['id']]['next_page'])
+    
+    def test_empty_account(self):
+        """Test accounts without transactions close the window"""
+        account = self.server.add_account('item-1')
+        
+        stats = self.engine.sync_item('item-1')
+        
+        self.assertEqual(stats['pages'], 1)
+        self.assertIsNone(self.store.cursors[account['id']]['window_from'])
+    
+    def test_multiple_accounts(self):
+        """Test every account of the item is synced"""
+        first = self.server.add_account('item-1')
+        second = self.server.add_account('item-1', subtype='CREDIT_CARD', type='CREDIT')
+        self.server.generate_transactions(first['id'], 12)
+        self.server.generate_transactions(second['id'], 7)
+        
+        stats = self.engine.sync_item('item-1')
+        
+        self.assertEqual(stats['accounts'], 2)
+        self.assertEqual(stats['transactions'], 19)
+    
+    def test_reconcile_after_each_account(self):
+        """Test each account is reconciled once, after its last page is stored"""
+        first = self.server.add_account('item-1')
+        second = self.server.add_account('item-1')
+        self.server.generate_transactions(first['id'], 25)
+        self.server.generate_transactions(second['id'], 3)
+        self.store.pending_to_reconcile = {first['id']: 2, second['id']: 1}
+        
+        stats = self.engine.sync_item('item-1')
+        
+        self.assertEqual(self.store.reconciled, [(first['id'], 3), (second['id'], 4)])
+        self.assertEqual(stats['reconciled'], 3)
+    
+    def test_no_reconcile_after_crash(self):
+        """Test an account whose pages failed to store is not reconciled"""
+        account = self.server.add_account('item-1')
+        self.server.generate_transactions(account['id'], 25)
+        self.store.fail_on_page = 2
+        
+        with self.assertRaises(ConnectionError):
+            self.engine.sync_item('item-1')
+        
+        self.assertEqual(self.store.reconciled, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Unit tests for modules/webhooks.py
+
+Tests cover:
+- Event parsing and HTTP responses (accept, duplicate, invalid, secret, busy)
+- No secret configured refuses to start; /health is liveness only
+- main() migrates the schema before serving
+- Batched writes and retry while the database is down
+- Replay of the local event log after a crash, checkpoint and compaction
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from modules.webhooks import WebhookReceiver, WebhookEventLog, create_app, main, parse_event
+
+
+class RecordingWriter:
+    """save_webhook_events stand-in that records batches and can fail on demand"""
+
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+        self.stored = set()
+        self.lock = threading.Lock()
+
+    def __call__(self, events):
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        with self.lock:
+            self.batches.append([event['event_id'] for event in events])
+            inserted = [event['event_id'] for event in events if event['event_id'] not in self.stored]
+            self.stored.update(inserted)
+        return inserted
+
+    @property
+    def event_ids(self):
+        return [event_id for batch in self.batches for event_id in batch]
+
+
+def event(i, name='transactions/created'):
+    return {'event': name, 'eventId': f'evt-{i}', 'itemId': f'item-{i}', 'accountId': 'acc-1'}
+
+
+class ReceiverTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.log_path = os.path.join(self.tmpdir, 'log', 'events.log')
+        self.writer = RecordingWriter()
+
+    def make(self, **kwargs):
+        options = dict(log_path=self.log_path, writer=self.writer, flush_interval_seconds=0.05,
+                       retry_seconds=0.05, fsync=False)
+        options.update(kwargs)
+        receiver = WebhookReceiver(**options)
+        self.addCleanup(receiver.stop, 2)
+        return receiver
+
+
+class TestParseEvent(unittest.TestCase):
+    """Test parse_event"""
+
+    def test_pluggy_item_event(self):
+        """Test ids and client are extracted from an item/created payload"""
+        parsed = parse_event({'event': 'item/created', 'eventId': 'e1', 'itemId': 'i1', 'clientUserId': 'ana@x.com'})
+
+        self.assertEqual(
+            (parsed['event_id'], parsed['event'], parsed['item_id'], parsed['client_user_id']),
+            ('e1', 'item/created', 'i1', 'ana@x.com')
+        )
+
+    def test_missing_event_id_uses_content_hash(self):
+        """Test identical payloads without eventId get the same id"""
+        payload = {'event': 'item/updated', 'itemId': 'i1'}
+
+        self.assertEqual(parse_event(payload)['event_id'], parse_event(dict(payload))['event_id'])
+
+    def test_item_id_is_not_an_event_id(self):
+        """Test distinct events of one item without eventId are not collapsed by the item's id"""
+        created = parse_event({'event': 'item/created', 'id': 'i1', 'itemId': 'i1'})
+        updated = parse_event({'event': 'item/updated', 'id': 'i1', 'itemId': 'i1'})
+
+        self.assertNotEqual(created['event_id'], 'i1')
+        self.assertNotEqual(created['event_id'], updated['event_id'])
+
+    def test_invalid_payload(self):
+        """Test non-event payloads are rejected"""
+        for payload in (None, [], {'itemId': 'i1'}):
+            with self.assertRaises(ValueError):
+                parse_event(payload)
+
+
+class TestWebhookApp(ReceiverTestCase):
+    """Test the Flask endpoint"""
+
+    def setUp(self):
+        super().setUp()
+        self.receiver = self.make()
+        self.http = create_app(self.receiver, secret='s3cret').test_client()
+        self.headers = {'X-Webhook-Secret': 's3cret'}
+
+    def test_accepts_and_writes(self):
+        """Test an event is acknowledged and then written"""
+        response = self.http.post('/webhooks/pluggy', json=event(1), headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'status': 'accepted'})
+        self.assertTrue(self.receiver.flush(2))
+        self.assertEqual(self.writer.event_ids, ['evt-1'])
+
+    def test_duplicate_acknowledged_once(self):
+        """Test a redelivered event is acknowledged but written once"""
+        self.http.post('/webhooks/pluggy', json=event(1), headers=self.headers)
+        response = self.http.post('/webhooks/pluggy', json=event(1), headers=self.headers)
+
+        self.assertEqual(response.get_json(), {'status': 'duplicate'})
+        self.receiver.flush(2)
+        self.assertEqual(self.writer.event_ids, ['evt-1'])
+
+    def test_invalid_body(self):
+        """Test malformed bodies get 400"""
+        response = self.http.post('/webhooks/pluggy', data='not json', headers=self.headers)
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_wrong_secret(self):
+        """Test requests without the shared secret get 401"""
+        response = self.http.post('/webhooks/pluggy', json=event(1), headers={'X-Webhook-Secret': 'nope'})
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.receiver.stats()['received'], 0)
+
+    def test_missing_secret_header(self):
+        """Test requests without the header get 401"""
+        response = self.http.post('/webhooks/pluggy', json=event(1))
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_no_secret_configured(self):
+        """Test the app refuses to start without a secret instead of accepting anyone"""
+        for secret in (None, ''):
+            with self.assertRaises(ValueError):
+                create_app(self.receiver, secret=secret)
+
+    def test_health(self):
+        """Test /health answers liveness without exposing receiver stats"""
+        self.http.post('/webhooks/pluggy', json=event(1), headers=self.headers)
+
+        response = self.http.get('/health')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'status': 'ok'})
+
+    def test_busy_when_queue_full(self):
+        """Test a full queue answers 503 so Pluggy retries later"""
+        self.writer.fail = True
+        receiver = self.make(log_path=os.path.join(self.tmpdir, 'busy.log'), maxsize=1, batch_size=1)
+        http = create_app(receiver, secret='s3cret').test_client()
+
+        statuses = [http.post('/webhooks/pluggy', json=event(i), headers=self.headers).status_code for i in range(4)]
+
+        self.assertIn(503, statuses)
+        self.assertEqual(receiver.stats()['refused'], statuses.count(503))
+
+    def test_stop_with_full_queue_returns(self):
+        """Test stop() doesn't hang (e.g. in atexit) when the queue is full and the database down"""
+        self.writer.fail = True
+        receiver = self.make(log_path=os.path.join(self.tmpdir, 'full.log'), maxsize=1, batch_size=1)
+        receiver.accept(event(0))
+        # The worker holds event 0 retrying; event 1 fills the queue
+        deadline = time.monotonic() + 5
+        while not receiver.stats()['write_failures'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(receiver.accept(event(1)), 'accepted')
+        stopper = threading.Thread(target=receiver.stop, args=(0.2,), daemon=True)
+
+        stopper.start()
+        stopper.join(5)
+
+        self.assertFalse(stopper.is_alive())
+
+
+class TestMain(unittest.TestCase):
+    """Test the service entry point"""
+
+    def test_migrates_then_serves(self):
+        """Test the schema is applied before the app is built and served"""
+        calls = []
+        app = object()
+
+        with patch('modules.webhooks.ensure_schema',
+                   side_effect=lambda: calls.append('schema') or {'ok': True, 'error': None}), \
+                patch('modules.webhooks.create_app', side_effect=lambda: calls.append('app') or app):
+            status = main(serve=lambda served, **options: calls.append(served))
+
+        self.assertEqual(status, 0)
+        self.assertEqual(calls, ['schema', 'app', app])
+
+    def test_not_served_when_migration_fails(self):
+        """Test a failed migration exits instead of accepting events it can't store"""
+        served = []
+
+        with patch('modules.webhooks.ensure_schema', return_value={'ok': False, 'error': 'boom'}):
+            status = main(serve=lambda app, **options: served.append(app))
+
+        self.assertEqual(status, 1)
+        self.assertEqual(served, [])
+
+
+class TestBatching(ReceiverTestCase):
+    """Test the background writer"""
+
+    def test_events_written_in_batches(self):
+        """Test queued events are grouped into batches"""
+        receiver = self.make(batch_size=10)
+
+        for i in range(25):
+            receiver.accept(event(i))
+        receiver.flush(2)
+
+        self.assertEqual(sorted(self.writer.event_ids), sorted(f'evt-{i}' for i in range(25)))
+        self.assertLess(len(self.writer.batches), 25)
+        self.assertTrue(all(len(batch) <= 10 for batch in self.writer.batches))
+
+    def test_retries_while_database_down(self):
+        """Test a failing batch is retried until the database is back"""
+        self.writer.fail = True
+        receiver = self.make()
+        receiver.accept(event(1))
+
+        self.assertFalse(receiver.flush(0.3))
+        self.writer.fail = False
+
+        self.assertTrue(receiver.flush(2))
+        self.assertEqual(self.writer.event_ids, ['evt-1'])
+        self.assertGreater(receiver.stats()['write_failures'], 0)
+
+
+class TestRecovery(ReceiverTestCase):
+    """Test the local event log"""
+
+    def test_unwritten_events_replayed_after_crash(self):
+        """Test acknowledged events the database never got are replayed on start"""
+        self.writer.fail = True
+        crashed = self.make()
+        for i in range(3):
+            crashed.accept(event(i))
+        crashed.stop(0.1)
+        self.writer.fail = False
+
+        restarted = self.make()
+        restarted.start()
+        restarted.flush(2)
+
+        self.assertEqual(sorted(self.writer.event_ids), ['evt-0', 'evt-1', 'evt-2'])
+        self.assertEqual(restarted.stats()['replayed'], 3)
+        # Replayed ids are known again: a late redelivery is a duplicate
+        self.assertEqual(restarted.accept(event(1)), 'duplicate')
+
+    def test_written_events_not_replayed(self):
+        """Test the checkpoint skips events already in the database"""
+        first = self.make()
+        first.accept(event(1))
+        first.flush(2)
+        first.stop()
+
+        second = self.make()
+        second.accept(event(2))
+        second.flush(2)
+
+        self.assertEqual(self.writer.event_ids, ['evt-1', 'evt-2'])
+        self.assertEqual(second.stats()['replayed'], 0)
+
+    def test_partial_line_discarded(self):
+        """Test a torn last line (crash mid-append) is dropped"""
+        os.makedirs(os.path.dirname(self.log_path))
+        with open(self.log_path, 'w') as log:
+            log.write('{"event_id": "evt-1", "event": "item/updated", "payload": {}}\n{"event_id": "ev')
+
+        receiver = self.make()
+        receiver.start()
+        receiver.flush(2)
+
+        self.assertEqual(self.writer.event_ids, ['evt-1'])
+
+    def test_log_compacted_once_written(self):
+        """Test the log is truncated when everything in it is stored"""
+        receiver = self.make(compact_bytes=1)
+
+        receiver.accept(event(1))
+        receiver.flush(2)
+
+        self.assertEqual(receiver.stats()['log_bytes'], 0)
+        self.assertEqual(WebhookEventLog(self.log_path, fsync=False).checkpoint(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()